@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from app.services.ride_events import ride_events
+
+events_router = APIRouter()
+
+
+@events_router.get("/rides", response_class=StreamingResponse)
+async def stream_rides(
+    rider_id: int | None = Query(None, description="Only rides by this rider"),
+    route_id: int | None = Query(None, description="Only rides on this route"),
+):
+    """Server-sent events for rides as they are logged (replaces polling ride lists).
+
+    Each ``ride`` event carries the ride as JSON, without notes. A client that
+    stops reading gets a ``dropped`` event and the stream ends.
+    """
+    subscription = ride_events.subscribe(rider_id=rider_id, route_id=route_id)
+    return StreamingResponse(
+        ride_events.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,169 @@
+import asyncio
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import orjson
+from app.api.group_ride.schemas import (
+    GroupRideCreate, GroupRideRead, PositionUpdate, RsvpCreate, RsvpRead, TrackPointRead
+)
+from app.api.serialization import ListSerializer, ResponseSerializer
+from app.db.database import SessionLocal, get_postgres_session
+from app.db.query_budget import statement_budget
+from app.exceptions import CapacityReachedError, DuplicateResourceError, ResourceNotFoundError
+from app.services.group_ride_hub import GroupRideMember, group_rides
+import app.db.postgres_crud as pg_crud
+
+group_ride_router = APIRouter()
+
+_group_ride = ResponseSerializer(GroupRideRead)
+_rsvp = ResponseSerializer(RsvpRead)
+_rsvp_list = ListSerializer(RsvpRead)
+_track = ListSerializer(TrackPointRead)
+
+
+@group_ride_router.post("", response_model=GroupRideRead, dependencies=[statement_budget(2)])
+def create_group_ride(
+    group_ride: GroupRideCreate,
+    db: Session = Depends(get_postgres_session),
+):
+    """Plan a group ride on a route with a fixed number of places."""
+    created = pg_crud.create_group_ride(db, **group_ride.model_dump())
+    if created is None:
+        if not pg_crud.get_route_by_id(db, group_ride.route_id):
+            raise ResourceNotFoundError(resource="Route", identifier=group_ride.route_id)
+        raise ResourceNotFoundError(resource="Rider", identifier=group_ride.organizer_id)
+    return _group_ride.response(created)
+
+
+@group_ride_router.get("/{group_ride_id}", response_model=GroupRideRead, dependencies=[statement_budget(1)])
+def view_group_ride(
+    group_ride_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    group_ride = pg_crud.get_group_ride(db, group_ride_id)
+    if group_ride is None:
+        raise ResourceNotFoundError(resource="Group ride", identifier=group_ride_id)
+    return _group_ride.response(group_ride)
+
+
+@group_ride_router.post(
+    "/{group_ride_id}/rsvps",
+    response_model=RsvpRead,
+    dependencies=[statement_budget(1)],
+)
+def rsvp(
+    group_ride_id: int,
+    rsvp: RsvpCreate,
+    db: Session = Depends(get_postgres_session),
+):
+    """Claim a place on a group ride; 409 when it is full or the rider is already going."""
+    try:
+        claimed = pg_crud.claim_group_ride_slot(db, group_ride_id, rsvp.rider_id)
+    except IntegrityError:
+        db.rollback()
+        claimed = None
+    if claimed is None:
+        group_ride_exists, rider_exists, already_going = pg_crud.get_rsvp_refusal(db, group_ride_id, rsvp.rider_id)
+        if not group_ride_exists:
+            raise ResourceNotFoundError(resource="Group ride", identifier=group_ride_id)
+        if not rider_exists:
+            raise ResourceNotFoundError(resource="Rider", identifier=rsvp.rider_id)
+        if already_going:
+            raise DuplicateResourceError(
+                resource="RSVP", detail=f"Rider {rsvp.rider_id} is already going on group ride {group_ride_id}"
+            )
+        raise CapacityReachedError(resource="Group ride", identifier=group_ride_id)
+    # Rendered here: validating a returned dict needs a threadpool worker, and
+    # in a burst those are all waiting for the connections RSVPs like this hold.
+    return _rsvp.response(claimed)
+
+
+@group_ride_router.get(
+    "/{group_ride_id}/rsvps",
+    response_model=list[RsvpRead],
+    dependencies=[statement_budget(1)],
+)
+def list_rsvps(
+    group_ride_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """Riders going on a group ride, in the order they claimed their places."""
+    return _rsvp_list.response(pg_crud.get_group_ride_rsvps(db, group_ride_id))
+
+
+@group_ride_router.delete("/{group_ride_id}/rsvps/{rider_id}", dependencies=[statement_budget(1)])
+def cancel_rsvp(
+    group_ride_id: int,
+    rider_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """Give up a place on a group ride, freeing it for someone else."""
+    if not pg_crud.release_group_ride_slot(db, group_ride_id, rider_id):
+        raise ResourceNotFoundError(resource="RSVP", identifier=f"{group_ride_id}/{rider_id}")
+    return {"message": f"Rider {rider_id} is no longer going on group ride {group_ride_id}"}
+
+
+def _has_rsvp(group_ride_id: int, rider_id: int) -> bool:
+    # A short-lived session: the socket stays open far longer than this check.
+    with SessionLocal() as db:
+        return pg_crud.has_group_ride_rsvp(db, group_ride_id, rider_id)
+
+
+async def _send_updates(websocket: WebSocket, member: GroupRideMember) -> None:
+    while True:
+        message = await member.queue.get()
+        await websocket.send_text(message.decode())
+
+
+@group_ride_router.websocket("/{group_ride_id}/live")
+async def share_positions(
+    websocket: WebSocket,
+    group_ride_id: int,
+    rider_id: int = Query(..., description="The rider on this connection"),
+):
+    """Live positions of everyone on a group ride; open to riders who RSVPed.
+
+    Send ``{"lat", "lon", "speed_kmh", "heading"}`` reports as text frames.
+    Receive a ``keyframe`` of every rider's position after joining, then a
+    ``delta`` each tick someone moves (see app.services.group_ride_hub).
+    """
+    if not await run_in_threadpool(_has_rsvp, group_ride_id, rider_id):
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"Rider {rider_id} has not RSVPed to group ride {group_ride_id}",
+        )
+    await websocket.accept()
+    member = group_rides.join(group_ride_id, rider_id)
+    sender = asyncio.create_task(_send_updates(websocket, member))
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if not member.allow_report():
+                continue
+            try:
+                update = PositionUpdate.model_validate_json(message)
+            except ValidationError as exc:
+                member.send(orjson.dumps({"type": "error", "detail": exc.errors(include_url=False)}))
+                continue
+            group_rides.report(member, update)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        group_rides.leave(member)
+
+
+@group_ride_router.get(
+    "/{group_ride_id}/track",
+    response_model=list[TrackPointRead],
+    dependencies=[statement_budget(1)],
+)
+def view_track(
+    group_ride_id: int,
+    rider_id: int | None = Query(None, description="Only this rider's points"),
+    db: Session = Depends(get_postgres_session),
+):
+    """Sampled positions stored from a group ride, per rider in time order."""
+    return _track.response(pg_crud.get_group_ride_track(db, group_ride_id, rider_id))
@@ -0,0 +1,47 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+
+class PositionUpdate(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    speed_kmh: float | None = Field(None, ge=0, le=400)
+    heading: float | None = Field(None, ge=0, lt=360, description="Degrees clockwise from north")
+
+
+class TrackPointRead(BaseModel):
+    rider_id: int
+    recorded_at: datetime
+    latitude: float
+    longitude: float
+    speed_kmh: float | None = None
+    heading: float | None = None
+
+
+class GroupRideCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    route_id: int
+    organizer_id: int
+    starts_at: datetime
+    capacity: int = Field(..., ge=1, le=1000, description="Number of riders who can RSVP")
+
+
+class GroupRideRead(BaseModel):
+    id: int
+    name: str
+    route_id: int
+    organizer_id: int
+    starts_at: datetime
+    capacity: int
+    attendees: int
+    created_at: datetime
+
+
+class RsvpCreate(BaseModel):
+    rider_id: int
+
+
+class RsvpRead(BaseModel):
+    rider_id: int
+    slot: int
+    claimed_at: datetime
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Header, Response
+from app.exceptions import ResourceNotFoundError
+from app.services.heatmap import HEATMAP_TILE_CELLS, route_heatmap
+
+heatmap_router = APIRouter()
+
+
+@heatmap_router.get("/{z}/{x}/{y}", response_class=Response)
+def heatmap_tile(
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: str | None = Header(None),
+):
+    """Ride counts in one z/x/y Web Mercator tile.
+
+    The body is a gzip-compressed grid of ``X-Heatmap-Cells`` by
+    ``X-Heatmap-Cells`` little-endian uint32 counts, rows from north to south.
+    Tiles with no rides are all zeros.
+    """
+    if not (0 <= z <= route_heatmap.max_zoom and 0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise ResourceNotFoundError(resource="Tile", identifier=f"{z}/{x}/{y}")
+    data, etag = route_heatmap.tile(z, x, y)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Heatmap-Cells": str(HEATMAP_TILE_CELLS)}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        data,
+        media_type="application/octet-stream",
+        headers={**headers, "Content-Encoding": "gzip"},
+    )
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.api.location.schemas import LocationCreate, LocationRead, LocationType
+from app.db.database import get_postgres_session
+from app.db.query_budget import statement_budget
+from app.exceptions import ResourceNotFoundError
+from app.services import catalog_sync
+import app.db.postgres_crud as pg_crud
+
+location_router = APIRouter()
+
+
+@location_router.post("", response_model=LocationRead, dependencies=[statement_budget(1)])
+def create_location(
+    location: LocationCreate,
+    db: Session = Depends(get_postgres_session),
+):
+    """Add a point of interest: a fuel station, restaurant, viewpoint and so on."""
+    db_location = pg_crud.create_location(
+        db,
+        name=location.name,
+        location_type=location.location_type.value,
+        latitude=location.latitude,
+        longitude=location.longitude,
+    )
+    catalog_sync.location_saved(db, db_location)
+    return db_location
+
+
+@location_router.get("", response_model=list[LocationRead], dependencies=[statement_budget(1)])
+def list_locations(
+    location_type: LocationType | None = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_postgres_session),
+):
+    """List points of interest, optionally of one type."""
+    return pg_crud.get_location_rows(db, location_type and location_type.value, limit, offset)
+
+
+@location_router.get("/{location_id}", response_model=LocationRead, dependencies=[statement_budget(1)])
+def get_location(
+    location_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """Get a point of interest by id."""
+    location = pg_crud.get_location_by_id(db, location_id)
+    if not location:
+        raise ResourceNotFoundError(resource="Location", identifier=location_id)
+    return location
+
+
+@location_router.delete("/{location_id}", dependencies=[statement_budget(1)])
+def delete_location(
+    location_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """Delete a point of interest."""
+    if not pg_crud.delete_location(db, location_id):
+        raise ResourceNotFoundError(resource="Location", identifier=location_id)
+    catalog_sync.location_deleted(db, location_id)
+    return {"message": f"Location {location_id} deleted successfully"}
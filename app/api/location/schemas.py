@@ -0,0 +1,36 @@
+from datetime import datetime
+from enum import Enum
+from pydantic import BaseModel, Field
+
+
+class LocationType(str, Enum):
+    CITY = "city"
+    VIEWPOINT = "viewpoint"
+    FUEL_STATION = "fuel_station"
+    RESTAURANT = "restaurant"
+    REST_STOP = "rest_stop"
+    BEACH = "beach"
+
+
+class LocationCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    location_type: LocationType
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+class LocationRead(BaseModel):
+    id: int
+    name: str
+    location_type: str
+    latitude: float
+    longitude: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class LocationAlongRoute(LocationRead):
+    distance_from_route_m: float = Field(..., description="Distance to the closest point of the route's path")
+    distance_along_route_m: float = Field(..., description="Distance from the start of the route to that point")
@@ -0,0 +1,30 @@
+"""Opaque keyset cursors.
+
+A cursor is the sort key of the last row on a page, JSON-encoded and then
+URL-safe base64 encoded. Clients pass it back unchanged to get the next page.
+"""
+
+import base64
+from functools import lru_cache
+import orjson
+from pydantic import TypeAdapter
+from pydantic import ValidationError as PydanticValidationError
+from app.exceptions import ValidationError
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+@lru_cache
+def _cursor_adapter(types: tuple) -> TypeAdapter:
+    return TypeAdapter(tuple[types])
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor made by ``encode_cursor``, checking its values' types."""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return _cursor_adapter(types).validate_python(values)
+    except (ValueError, PydanticValidationError):
+        raise ValidationError(detail="Invalid cursor")
@@ -1,62 +1,177 @@
-from fastapi import APIRouter, Depends
+from functools import partial
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
-from app.api.rider.schemas import RideCreate, RideRead
-from app.db.database import get_postgres_session
-from app.exceptions import ResourceNotFoundError
+import numpy as np
+import orjson
+from app.api.rider.schemas import (
+    RideBuddiesCreate, RideCreate, RideRead, RiderLink, RideTelemetrySummary, RideTelemetryUpload
+)
+from app.db.database import after_commit, get_postgres_session
+from app.db.postgres_models import SOCIAL_GRAPH_CHANNEL
+from app.db.query_budget import statement_budget
+from app.exceptions import ResourceNotFoundError, ValidationError
+from app.services.adjacency_cache import rider_adjacency
+from app.services.ride_durations import ride_durations
+from app.services.ride_events import WORKER_ID
+from app.services.geometry import decode_path
+from app.services.ride_telemetry import (
+    TELEMETRY_ROUTE_MATCHES, TelemetryParser, encoded_bytes, telemetry_row, telemetry_samples
+)
+from app.services.route_matching import match_trace
+from app.services.route_popularity import route_popularity
 import app.db.postgres_crud as pg_crud
 import app.db.neo4j_crud as neo_crud
 
 ride_router = APIRouter()
 
 
-@ride_router.post("", response_model=RideRead, tags=["Rides"])
+@ride_router.post("", response_model=RideRead, tags=["Rides"], dependencies=[statement_budget(1)])
 def log_ride(
     ride: RideCreate,
     db: Session = Depends(get_postgres_session),
 ):
-    route = pg_crud.get_route_by_id(db, ride.route_id)
-    if not route:
-        raise ResourceNotFoundError(resource="Route", identifier=ride.route_id)
-    
-    bike = pg_crud.get_bike_by_id(db, ride.bike_id)
-    if not bike:
-        raise ResourceNotFoundError(resource="Bike", identifier=ride.bike_id)
-    
-    rider_id = bike.owner_id
-    
-    db_ride = pg_crud.create_ride(
+    logged = pg_crud.create_ride(
         db,
-        rider_id=rider_id,
         route_id=ride.route_id,
         bike_id=ride.bike_id,
         duration_minutes=ride.duration_minutes,
         notes=ride.notes,
     )
+    if not logged:
+        if not pg_crud.get_route_by_id(db, ride.route_id):
+            raise ResourceNotFoundError(resource="Route", identifier=ride.route_id)
+        raise ResourceNotFoundError(resource="Bike", identifier=ride.bike_id)
+    db_ride, experience_level = logged
     
-    ride_node = neo_crud.create_ride_node(db_ride)
-    neo_crud.connect_ride_to_rider(rider_id, db_ride.id)
+    neo_crud.create_ride_node(db_ride)
+    neo_crud.connect_ride_to_rider(db_ride.rider_id, db_ride.id)
     neo_crud.connect_ride_to_route(db_ride.id, ride.route_id)
     neo_crud.connect_ride_to_bike(db_ride.id, ride.bike_id)
+    after_commit(db, partial(route_popularity.record, db_ride.route_id, db_ride.rider_id, db_ride.completed_at))
+    after_commit(db, partial(ride_durations.record, db_ride.route_id, experience_level, db_ride.duration_minutes))
     
     return db_ride
 
 
-@ride_router.delete("/{ride_id}", tags=["Rides"])
+@ride_router.delete("/{ride_id}", tags=["Rides"], dependencies=[statement_budget(2)])
 def delete_ride(
     ride_id: int,
     db: Session = Depends(get_postgres_session),
 ):
     """Delete a logged ride (e.g., if added by mistake)"""
-    ride = pg_crud.get_ride_by_id(db, ride_id)
-    if not ride:
+    deleted = pg_crud.delete_ride(db, ride_id)
+    if not deleted:
         raise ResourceNotFoundError(resource="Ride", identifier=ride_id)
     
-    # Delete from Neo4j first
     neo_crud.delete_ride_node(ride_id)
-    
-    # Delete from PostgreSQL
-    success = pg_crud.delete_ride(db, ride_id)
-    if not success:
-        raise ResourceNotFoundError(resource="Ride", identifier=ride_id)
+    after_commit(db, partial(
+        ride_durations.discard, deleted["route_id"], deleted["experience_level"], deleted["duration_minutes"]
+    ))
+    after_commit(db, partial(route_popularity.discard, deleted["route_id"], deleted["completed_at"]))
     
     return {"message": f"Ride {ride_id} deleted successfully"}
+
+
+async def _telemetry_samples(request: Request) -> np.ndarray:
+    """Parse the body as it streams in, so a long recording is never held as text."""
+    parser = TelemetryParser(request.headers.get("content-type"))
+    try:
+        async for chunk in request.stream():
+            parser.feed(chunk)
+        return parser.close()
+    except ValueError as exc:
+        raise ValidationError(str(exc))
+
+
+@ride_router.put(
+    "/{ride_id}/telemetry",
+    response_model=RideTelemetryUpload,
+    tags=["Rides"],
+    dependencies=[statement_budget(2)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": '{"t": 1792400000.0, "lat": 45.0703, "lon": 7.6586, "ele": 239.5}\n'
+                               '{"t": 1792400001.0, "lat": 45.0704, "lon": 7.6588, "ele": 239.7}\n',
+                },
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary"},
+                    "description": "Little-endian records of float64 t, lat, lon and float32 ele, ax, ay, az",
+                },
+            },
+        },
+    },
+)
+def upload_ride_telemetry(
+    ride_id: int,
+    samples: np.ndarray = Depends(_telemetry_samples),
+    db: Session = Depends(get_postgres_session),
+):
+    """Attach recorded GPS/IMU samples to a ride, replacing any earlier upload, and compute its metrics
+    and the catalog routes it follows"""
+    telemetry = telemetry_row(samples)
+    if not pg_crud.save_ride_telemetry(db, ride_id, telemetry):
+        raise ResourceNotFoundError(resource="Ride", identifier=ride_id)
+    return RideTelemetryUpload(
+        ride_id=ride_id,
+        encoded_bytes=encoded_bytes(telemetry),
+        route_matches=match_trace(db, decode_path(telemetry["path"]), TELEMETRY_ROUTE_MATCHES),
+        **telemetry,
+    )
+
+
+@ride_router.get(
+    "/{ride_id}/telemetry",
+    response_model=RideTelemetrySummary,
+    tags=["Rides"],
+    dependencies=[statement_budget(1)],
+)
+def get_ride_telemetry(
+    ride_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """A ride's metrics computed from its telemetry"""
+    summary = pg_crud.get_ride_telemetry_summary(db, ride_id)
+    if summary is None:
+        raise ResourceNotFoundError(resource="Ride telemetry", identifier=ride_id)
+    return summary
+
+
+@ride_router.get(
+    "/{ride_id}/telemetry/samples",
+    response_class=Response,
+    tags=["Rides"],
+    dependencies=[statement_budget(1)],
+    responses={200: {"content": {"application/json": {}}}},
+)
+def get_ride_telemetry_samples(
+    ride_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """A ride's samples as columns, one array per field, null for fields that were not recorded"""
+    row = pg_crud.get_ride_telemetry_columns(db, ride_id)
+    if row is None:
+        raise ResourceNotFoundError(resource="Ride telemetry", identifier=ride_id)
+    samples = orjson.dumps(telemetry_samples(row), option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(samples, media_type="application/json")
+
+
+@ride_router.post("/{ride_id}/buddies", response_model=list[RiderLink], tags=["Rides"])
+def tag_riding_buddies(
+    ride_id: int,
+    buddies: RideBuddiesCreate,
+    db: Session = Depends(get_postgres_session),
+):
+    """Tag the riders you rode with; returns the riders that were tagged."""
+    ride = pg_crud.get_ride_by_id(db, ride_id)
+    if not ride:
+        raise ResourceNotFoundError(resource="Ride", identifier=ride_id)
+    buddy_ids = sorted(set(buddies.rider_ids) - {ride.rider_id})
+    tagged = neo_crud.tag_riding_buddies(ride.rider_id, ride.id, buddy_ids)
+    changed = [ride.rider_id, *(buddy_id for buddy_id, _ in tagged)]
+    rider_adjacency.buddies_changed(changed)
+    pg_crud.notify(db, SOCIAL_GRAPH_CHANNEL, {"origin": WORKER_ID, "rider_ids": changed})
+    return [RiderLink(id=buddy_id, name=name) for buddy_id, name in tagged]
@@ -1,16 +1,40 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from functools import partial
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.api.rider.schemas import RiderCreate, RiderRead, BikeCreate, BikeRead, RideRead
-from app.db.database import get_postgres_session
-from app.exceptions import DuplicateResourceError, ResourceNotFoundError
+from app.api.rider.schemas import (
+    RiderCreate, RiderRead, RiderSuggestion, BikeCreate, BikeRead, RideFeedPage, RideHistoryPage, RiderLink,
+    RiderLinkPage
+)
+from app.api.pagination import decode_cursor, encode_cursor
+from app.api.route.schemas import RouteRead
+from app.api.serialization import ListSerializer, ResponseSerializer
+from app.db.database import after_commit, get_postgres_session
+from app.db.postgres_models import SOCIAL_GRAPH_CHANNEL
+from app.db.query_budget import statement_budget
+from app.exceptions import DuplicateResourceError, ResourceNotFoundError, ValidationError
+from app.services import catalog_sync, ride_archive
+from app.services.adjacency_cache import FOLLOWERS, FOLLOWING, RIDING_BUDDIES, rider_adjacency
+from app.services.autocomplete import rider_names
+from app.services.feed import ride_feed
+from app.services.ride_durations import ride_durations
+from app.services.ride_events import WORKER_ID
+from app.services.route_eligibility import route_eligibility
+from app.services.route_popularity import route_popularity
 import app.db.postgres_crud as pg_crud
 import app.db.neo4j_crud as neo_crud
 
 rider_router = APIRouter()
 
+_rider_list = ListSerializer(RiderRead)
+_bike_list = ListSerializer(BikeRead)
+_ride_history = ResponseSerializer(RideHistoryPage)
+_ride_feed = ResponseSerializer(RideFeedPage)
+_route_list = ListSerializer(RouteRead)
 
-@rider_router.post("", response_model=RiderRead)
+
+@rider_router.post("", response_model=RiderRead, dependencies=[statement_budget(1)])
 def create_rider(
     rider: RiderCreate,
     db: Session = Depends(get_postgres_session),
@@ -23,6 +47,7 @@ def create_rider(
             experience_level=rider.experience_level.value,
         )
         neo_crud.create_rider_node(db_rider)
+        catalog_sync.rider_saved(db, db_rider.id, db_rider.name)
         return db_rider
     except IntegrityError:
         raise DuplicateResourceError(resource="Rider", detail=f"Rider with name '{rider.name}' already exists")
@@ -31,7 +56,21 @@ def create_rider(
 @rider_router.get("", response_model=list[RiderRead])
 def list_riders(db: Session = Depends(get_postgres_session)):
     """Get all riders."""
-    return pg_crud.get_riders(db)
+    return _rider_list.response(pg_crud.get_rider_rows(db))
+
+
+@rider_router.get("/autocomplete", response_model=list[RiderSuggestion])
+def autocomplete_riders(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_postgres_session),
+):
+    """Riders whose name starts with ``q``, for type-ahead pickers."""
+    if rider_names.enabled:
+        matches = rider_names.complete(q, limit)
+    else:
+        matches = pg_crud.get_rider_names_by_prefix(db, q, limit)
+    return [RiderSuggestion(id=rider_id, name=name) for rider_id, name in matches]
 
 
 @rider_router.get("/{rider_id}", response_model=RiderRead)
@@ -43,35 +82,79 @@ def get_rider(rider_id: int, db: Session = Depends(get_postgres_session)):
     return rider
 
 
-@rider_router.get("/{rider_id}/rides", response_model=list[RideRead])
-def view_ride_history(rider_id: int, db: Session = Depends(get_postgres_session)):
-    rider = pg_crud.get_rider_by_id(db, rider_id)
-    if not rider:
+@rider_router.get("/{rider_id}/rides", response_model=RideHistoryPage, dependencies=[statement_budget(1)])
+def view_ride_history(
+    rider_id: int,
+    completed_from: datetime | None = Query(None, alias="from", description="Only rides completed at or after this time"),
+    completed_to: datetime | None = Query(None, alias="to", description="Only rides completed before this time"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    summary: bool = Query(False, description="Include ride count and total duration for the window"),
+    include_archived: bool = Query(False, description="Also read months moved to the ride archive"),
+    db: Session = Depends(get_postgres_session),
+):
+    """A rider's rides, newest first, one page at a time."""
+    after = decode_cursor(cursor, datetime, int) if cursor else None
+    found, rides, totals = pg_crud.get_ride_history_rows(
+        db,
+        rider_id,
+        completed_from=completed_from,
+        completed_to=completed_to,
+        after=after,
+        limit=limit + 1,
+        with_summary=summary,
+    )
+    if not found:
         raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    return pg_crud.get_rides_by_rider(db, rider_id)
+    if include_archived:
+        rides, totals = _merge_archived_rides(
+            rider_id, rides, totals, completed_from, completed_to, after, limit + 1
+        )
+    next_cursor = None
+    if len(rides) > limit:
+        rides = rides[:limit]
+        next_cursor = encode_cursor(rides[-1]["completed_at"], rides[-1]["id"])
+    return _ride_history.response({"rides": rides, "next_cursor": next_cursor, "summary": totals})
+
 
+def _merge_archived_rides(rider_id, rides, totals, completed_from, completed_to, after, limit):
+    """Fold archived rides into a live history page and its summary."""
+    if totals is None:
+        archived = ride_archive.read_archived_rides(rider_id, completed_from, completed_to, after, limit)
+    else:
+        window = ride_archive.read_archived_rides(rider_id, completed_from, completed_to)
+        archived = [ride for ride in window if after is None or (ride["completed_at"], ride["id"]) < after]
+        totals = {
+            "ride_count": totals["ride_count"] + len(window),
+            "total_duration_minutes": totals["total_duration_minutes"]
+            + sum(ride["duration_minutes"] or 0 for ride in window),
+        }
+    merged = sorted(rides + archived, key=lambda ride: (ride["completed_at"], ride["id"]), reverse=True)
+    return merged[:limit], totals
 
-@rider_router.post("/{rider_id}/bikes", response_model=BikeRead)
+
+@rider_router.post("/{rider_id}/bikes", response_model=BikeRead, dependencies=[statement_budget(1)])
 def add_bike_to_garage(
     rider_id: int,
     bike: BikeCreate,
     db: Session = Depends(get_postgres_session),
 ):
     """Add bike to rider's garage."""
-    rider = pg_crud.get_rider_by_id(db, rider_id)
-    if not rider:
+    try:
+        db_bike = pg_crud.create_bike(
+            db,
+            owner_id=rider_id,
+            brand=bike.brand,
+            model=bike.model,
+            year=bike.year,
+            engine_cc=bike.engine_cc,
+        )
+    except IntegrityError:
+        # owner_id is the only constraint a bike insert can violate
         raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    
-    db_bike = pg_crud.create_bike(
-        db,
-        owner_id=rider_id,
-        brand=bike.brand,
-        model=bike.model,
-        year=bike.year,
-        engine_cc=bike.engine_cc,
-    )
     neo_crud.create_bike_node(db_bike)
     neo_crud.connect_bike_to_rider(rider_id, db_bike.id)
+    catalog_sync.garage_changed(db, rider_id)
     return db_bike
 
 
@@ -81,57 +164,176 @@ def view_garage(rider_id: int, db: Session = Depends(get_postgres_session)):
     rider = pg_crud.get_rider_by_id(db, rider_id)
     if not rider:
         raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    return pg_crud.get_bikes_by_owner(db, rider_id)
+    return _bike_list.response(pg_crud.get_bike_rows_by_owner(db, rider_id))
 
 
-@rider_router.get("/{rider_id}/bikes/{bike_id}", response_model=BikeRead)
+@rider_router.get("/{rider_id}/bikes/{bike_id}", response_model=BikeRead, dependencies=[statement_budget(1)])
 def view_bike(
     rider_id: int,
     bike_id: int,
     db: Session = Depends(get_postgres_session)
 ):
     """View a specific bike in rider's garage."""
-    rider = pg_crud.get_rider_by_id(db, rider_id)
-    if not rider:
+    rider_exists, bike = pg_crud.get_owned_bike(db, rider_id, bike_id)
+    if not rider_exists:
         raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    
-    bike = pg_crud.get_bike_by_id(db, bike_id)
     if not bike:
         raise ResourceNotFoundError(resource="Bike", identifier=bike_id)
-    
-    if bike.owner_id != rider_id:
-        raise ResourceNotFoundError(resource="Bike", identifier=bike_id, detail=f"Bike {bike_id} does not belong to rider {rider_id}")
-    
     return bike
 
 
-@rider_router.delete("/{rider_id}")
-def delete_rider(rider_id: int, db: Session = Depends(get_postgres_session)):
-    """Delete a rider and all their bikes."""
-    if not pg_crud.delete_rider(db, rider_id):
+@rider_router.delete("/{rider_id}", dependencies=[statement_budget(3)])
+def delete_rider(
+    rider_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_postgres_session),
+):
+    """Delete a rider and all their bikes and rides."""
+    rides = pg_crud.delete_rider(db, rider_id)
+    if rides is None:
         raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    neo_crud.delete_rider_node(rider_id)
+    neo_crud.retire_rider_node(rider_id)
+    background_tasks.add_task(neo_crud.purge_rider_subgraph, rider_id)
+    catalog_sync.rider_deleted(db, rider_id)
+    after_commit(db, partial(ride_durations.discard_all, rides))
+    after_commit(db, partial(route_popularity.discard_all, rides))
+    rider_adjacency.forget_rider(rider_id)
+    ride_feed.forget(rider_id)
+    pg_crud.notify(db, SOCIAL_GRAPH_CHANNEL, {"origin": WORKER_ID, "rider_ids": [rider_id], "deleted": True})
     return {"message": f"Rider {rider_id} deleted successfully"}
 
 
-@rider_router.delete("/{rider_id}/bikes/{bike_id}")
+def _set_follow(rider_id: int, target_id: int, following: bool, db: Session) -> None:
+    if rider_id == target_id:
+        raise ValidationError(detail="Riders cannot follow themselves")
+    rider_name, target_name = neo_crud.set_follow(rider_id, target_id, following)
+    if rider_name is None:
+        raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
+    if target_name is None:
+        raise ResourceNotFoundError(resource="Rider", identifier=target_id)
+    if following:
+        rider_adjacency.followed(rider_id, rider_name, target_id, target_name)
+    else:
+        rider_adjacency.unfollowed(rider_id, target_id)
+    ride_feed.forget(rider_id)
+    pg_crud.notify(db, SOCIAL_GRAPH_CHANNEL, {"origin": WORKER_ID, "rider_ids": [rider_id, target_id]})
+
+
+@rider_router.post("/{rider_id}/follow/{target_id}")
+def follow_rider(rider_id: int, target_id: int, db: Session = Depends(get_postgres_session)):
+    """Follow another rider."""
+    _set_follow(rider_id, target_id, following=True, db=db)
+    return {"message": f"Rider {rider_id} now follows rider {target_id}"}
+
+
+@rider_router.delete("/{rider_id}/follow/{target_id}")
+def unfollow_rider(rider_id: int, target_id: int, db: Session = Depends(get_postgres_session)):
+    """Stop following a rider."""
+    _set_follow(rider_id, target_id, following=False, db=db)
+    return {"message": f"Rider {rider_id} no longer follows rider {target_id}"}
+
+
+def _neighbour_page(rider_id: int, kind: str, cursor: str | None, limit: int, db: Session) -> RiderLinkPage:
+    after = decode_cursor(cursor, int)[0] if cursor else 0
+    neighbours = rider_adjacency.page(rider_id, kind, after, limit + 1)
+    if not neighbours and not pg_crud.get_rider_by_id(db, rider_id):
+        raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
+    next_cursor = None
+    if len(neighbours) > limit:
+        neighbours = neighbours[:limit]
+        next_cursor = encode_cursor(neighbours[-1][0])
+    return RiderLinkPage(
+        riders=[RiderLink(id=other_id, name=name, rides_together=rides) for other_id, name, rides in neighbours],
+        next_cursor=next_cursor,
+    )
+
+
+@rider_router.get("/{rider_id}/following", response_model=RiderLinkPage, dependencies=[statement_budget(1)])
+def list_following(
+    rider_id: int,
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_postgres_session),
+):
+    """Riders this rider follows, by id."""
+    return _neighbour_page(rider_id, FOLLOWING, cursor, limit, db)
+
+
+@rider_router.get("/{rider_id}/followers", response_model=RiderLinkPage, dependencies=[statement_budget(1)])
+def list_followers(
+    rider_id: int,
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_postgres_session),
+):
+    """Riders following this rider, by id."""
+    return _neighbour_page(rider_id, FOLLOWERS, cursor, limit, db)
+
+
+@rider_router.get("/{rider_id}/riding-buddies", response_model=RiderLinkPage, dependencies=[statement_budget(1)])
+def list_riding_buddies(
+    rider_id: int,
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_postgres_session),
+):
+    """Riders this rider has been tagged on rides with, and how many rides they shared."""
+    return _neighbour_page(rider_id, RIDING_BUDDIES, cursor, limit, db)
+
+
+@rider_router.delete("/{rider_id}/bikes/{bike_id}", dependencies=[statement_budget(1)])
 def delete_bike(
     rider_id: int,
     bike_id: int,
     db: Session = Depends(get_postgres_session)
 ):
     """Remove a bike from rider's garage."""
-    rider = pg_crud.get_rider_by_id(db, rider_id)
-    if not rider:
-        raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
-    
-    bike = pg_crud.get_bike_by_id(db, bike_id)
-    if not bike:
+    if not pg_crud.delete_owned_bike(db, rider_id, bike_id):
+        rider_exists, _ = pg_crud.get_owned_bike(db, rider_id, bike_id)
+        if not rider_exists:
+            raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
         raise ResourceNotFoundError(resource="Bike", identifier=bike_id)
-    
-    if bike.owner_id != rider_id:
-        raise ResourceNotFoundError(resource="Bike", identifier=bike_id, detail=f"Bike {bike_id} does not belong to rider {rider_id}")
-    
-    pg_crud.delete_bike(db, bike_id)
     neo_crud.delete_bike_node(bike_id)
+    catalog_sync.garage_changed(db, rider_id)
     return {"message": f"Bike {bike_id} removed from rider {rider_id}'s garage"}
+
+
+@rider_router.get("/{rider_id}/feed", response_model=RideFeedPage)
+def view_feed(
+    rider_id: int,
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_postgres_session),
+):
+    """Rides logged by the riders this rider follows, newest first."""
+    after = decode_cursor(cursor, datetime, int) if cursor else None
+    rides = ride_feed.page(db, rider_id, after, limit + 1)
+    if not rides and not pg_crud.get_rider_by_id(db, rider_id):
+        raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
+    next_cursor = None
+    if len(rides) > limit:
+        rides = rides[:limit]
+        next_cursor = encode_cursor(rides[-1]["completed_at"], rides[-1]["id"])
+    return _ride_feed.response({"rides": rides, "next_cursor": next_cursor})
+
+
+@rider_router.get(
+    "/{rider_id}/eligible-routes",
+    response_model=list[RouteRead],
+    dependencies=[statement_budget(2)],
+)
+def list_eligible_routes(
+    rider_id: int,
+    difficulty: list[str] | None = Query(None, description="Any of these difficulties"),
+    route_type: list[str] | None = Query(None, description="Any of these route types"),
+    season: list[str] | None = Query(None, description="Any of these best seasons (scenic routes)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_postgres_session),
+):
+    """Routes some bike in the rider's garage can handle, and open to their experience level, by route id."""
+    garage = route_eligibility.garage(db, rider_id)
+    if garage is None:
+        raise ResourceNotFoundError(resource="Rider", identifier=rider_id)
+    route_ids = route_eligibility.eligible(garage, difficulty, route_type, season, limit, offset)
+    return _route_list.response(ride_durations.with_percentiles(pg_crud.get_route_rows_by_ids(db, route_ids)))
@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel, Field
+from app.api.route.schemas import RouteMatch
 
 
 class ExperienceLevel(str, Enum):
@@ -24,6 +25,11 @@ class RiderRead(BaseModel):
     class Config:
         from_attributes = True
 
+class RiderSuggestion(BaseModel):
+    id: int
+    name: str
+
+
 class BikeCreate(BaseModel):
     model: str
     brand: str
@@ -61,3 +67,53 @@ class RideRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class RideSummary(BaseModel):
+    ride_count: int
+    total_duration_minutes: int
+
+
+class RideHistoryPage(BaseModel):
+    rides: list[RideRead]
+    next_cursor: str | None = None
+    summary: RideSummary | None = None
+
+
+class RideFeedPage(BaseModel):
+    rides: list[RideRead]
+    next_cursor: str | None = None
+
+
+class RiderLink(BaseModel):
+    id: int
+    name: str
+    rides_together: int | None = None
+
+
+class RiderLinkPage(BaseModel):
+    riders: list[RiderLink]
+    next_cursor: str | None = None
+
+
+class RideBuddiesCreate(BaseModel):
+    rider_ids: list[int] = Field(..., min_length=1, max_length=50)
+
+
+class RideTelemetrySummary(BaseModel):
+    ride_id: int
+    point_count: int
+    started_at: datetime
+    duration_seconds: float
+    distance_m: float
+    moving_seconds: float = Field(..., description="Time spent moving, leaving out stops and signal gaps")
+    max_speed_kmh: float = Field(..., description="Fastest speed held over a few seconds")
+    elevation_gain_m: float | None = None
+    elevation_loss_m: float | None = None
+    min_elevation_m: float | None = None
+    max_elevation_m: float | None = None
+    encoded_bytes: int = Field(..., description="Size of the stored, encoded columns")
+
+
+class RideTelemetryUpload(RideTelemetrySummary):
+    route_matches: list[RouteMatch] = Field(..., description="Catalog routes the recorded path follows, best first")
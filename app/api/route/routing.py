@@ -1,21 +1,41 @@
-from fastapi import APIRouter, Depends, Query, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Query, Body, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import Union, Annotated
+import numpy as np
+import orjson
 from app.api.route.schemas import (
     ScenicRouteCreate, HighwayRouteCreate, OffroadRouteCreate,
-    MountainRouteCreate, CoastalRouteCreate, RouteRead
+    MountainRouteCreate, CoastalRouteCreate, RouteGeometryLevel, RouteGeometrySummary, RouteMatch,
+    RoutePopularity, RouteRead, RouteStats, RouteSuggestion
 )
+from app.api.location.schemas import LocationAlongRoute, LocationType
 from app.api.route.examples import ALL_ROUTE_EXAMPLES
+from app.api.serialization import ListSerializer
 from app.db.database import get_postgres_session
-from app.exceptions import DuplicateResourceError
+from app.db.postgres_models import ROUTE_TYPE_FIELDS
+from app.db.query_budget import statement_budget
+from app.exceptions import DuplicateResourceError, ResourceNotFoundError, ValidationError
+from app.services import catalog_sync
+from app.services.autocomplete import route_names
+from app.services.geometry import decode_path, encode_path
+from app.services.heatmap import FOOTPRINT_LEVEL, encode_footprint, footprint
+from app.services.ride_durations import ride_durations
+from app.services.route_corridor import locations_along_route
+from app.services.route_geometry import parse_geometry, simplified_levels
+from app.services.route_matching import match_trace
+from app.services.route_popularity import route_popularity
+from app.services.route_similarity import route_similarity, vector_of
 import app.db.postgres_crud as pg_crud
 import app.db.neo4j_crud as neo_crud
 
 route_router = APIRouter()
 
+_route_list = ListSerializer(RouteRead)
+_popularity_list = ListSerializer(RoutePopularity)
 
-@route_router.post("", response_model=RouteRead, tags=["Routes"])
+
+@route_router.post("", response_model=RouteRead, tags=["Routes"], dependencies=[statement_budget(1)])
 def create_route(
     route: Annotated[
         Union[ScenicRouteCreate, HighwayRouteCreate, OffroadRouteCreate, MountainRouteCreate, CoastalRouteCreate],
@@ -53,55 +73,21 @@ def create_route(
 ):
     """Create a new route of various types"""
     try:
-        # Extract common fields
-        route_data = {
-            "name": route.name,
-            "start_location": route.start_location,
-            "end_location": route.end_location,
-            "distance_km": route.distance_km,
-            "difficulty": route.difficulty.value,
-            "description": route.description,
-            "route_type": route.route_type.value,
-        }
-        
-        # Add type-specific fields based on route type
-        if isinstance(route, ScenicRouteCreate):
-            route_data.update({
-                "scenic_points": route.scenic_points,
-                "best_season": route.best_season,
-                "photography_spots": route.photography_spots,
-            })
-        elif isinstance(route, HighwayRouteCreate):
-            route_data.update({
-                "speed_limit": route.speed_limit,
-                "toll_cost": route.toll_cost,
-                "rest_stops": route.rest_stops,
-                "lanes": route.lanes,
-            })
-        elif isinstance(route, OffroadRouteCreate):
-            route_data.update({
-                "terrain_type": route.terrain_type,
-                "min_bike_cc": route.min_bike_cc,
-                "technical_difficulty": route.technical_difficulty,
-                "requires_experience": route.requires_experience,
-            })
-        elif isinstance(route, MountainRouteCreate):
-            route_data.update({
-                "elevation_gain": route.elevation_gain,
-                "max_altitude": route.max_altitude,
-                "hairpin_turns": route.hairpin_turns,
-                "oxygen_required": route.oxygen_required,
-            })
-        elif isinstance(route, CoastalRouteCreate):
-            route_data.update({
-                "beach_stops": route.beach_stops,
-                "lighthouse_count": route.lighthouse_count,
-                "seafood_spots": route.seafood_spots,
-                "ocean_view_percentage": route.ocean_view_percentage,
-            })
-        
-        db_route = pg_crud.create_route(db, **route_data)
+        db_route = pg_crud.create_route(
+            db,
+            name=route.name,
+            start_location=route.start_location,
+            end_location=route.end_location,
+            distance_km=route.distance_km,
+            difficulty=route.difficulty.value,
+            description=route.description,
+            route_type=route.route_type.value,
+            details=route.model_dump(
+                mode="json", include=set(ROUTE_TYPE_FIELDS[route.route_type.value])
+            ),
+        )
         neo_crud.create_route_node(db_route)
+        catalog_sync.route_saved(db, db_route)
         return db_route
     except IntegrityError:
         raise DuplicateResourceError(resource="Route", detail=f"Route with name '{route.name}' already exists")
@@ -113,13 +99,269 @@ def list_routes(
     min_distance: float | None = Query(None),
     max_distance: float | None = Query(None),
     route_type: str | None = Query(None, description="Filter by route type: scenic, highway, offroad, mountain, coastal"),
+    sort: str | None = Query(
+        None,
+        pattern=f"^-?({'|'.join(pg_crud.ROUTE_SORT_COLUMNS)})$",
+        description="Order by estimated_time, difficulty_score, distance or name; prefix with - for descending",
+    ),
+    limit: int | None = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_postgres_session),
 ):
-    """List all routes with optional filters"""
-    return pg_crud.get_routes(
+    """List all routes with optional filters and ordering"""
+    return _route_list.response(ride_durations.with_percentiles(pg_crud.get_route_rows(
         db, 
         difficulty=difficulty, 
         min_distance=min_distance, 
         max_distance=max_distance,
-        route_type=route_type
+        route_type=route_type,
+        sort=sort,
+        limit=limit,
+        offset=offset,
+    )))
+
+
+@route_router.get("/search", response_model=list[RouteRead], tags=["Routes"])
+def search_routes(
+    q: str = Query(..., min_length=1, description="Words to match in names, descriptions, locations and stops"),
+    difficulty: str | None = Query(None),
+    min_distance: float | None = Query(None),
+    max_distance: float | None = Query(None),
+    route_type: str | None = Query(None, description="Filter by route type: scenic, highway, offroad, mountain, coastal"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_postgres_session),
+):
+    """Search routes by text, best matches first"""
+    return _route_list.response(ride_durations.with_percentiles(pg_crud.search_routes(
+        db,
+        q,
+        difficulty=difficulty,
+        min_distance=min_distance,
+        max_distance=max_distance,
+        route_type=route_type,
+        limit=limit,
+        offset=offset,
+    )))
+
+
+def _with_names(db: Session, ranked: list[dict]) -> list[dict]:
+    names = pg_crud.get_route_names(db, [route["route_id"] for route in ranked])
+    return [{**route, "name": names[route["route_id"]]} for route in ranked if route["route_id"] in names]
+
+
+@route_router.get(
+    "/popular",
+    response_model=list[RoutePopularity],
+    tags=["Routes"],
+    dependencies=[statement_budget(1)],
+)
+def popular_routes(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_postgres_session),
+):
+    """Routes ridden by the most different riders, from in-memory estimates"""
+    return _popularity_list.response(_with_names(db, route_popularity.popular(limit)))
+
+
+@route_router.get(
+    "/trending",
+    response_model=list[RoutePopularity],
+    tags=["Routes"],
+    dependencies=[statement_budget(1)],
+)
+def trending_routes(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_postgres_session),
+):
+    """Routes with the most recent rides, older rides counting for less"""
+    return _popularity_list.response(_with_names(db, route_popularity.trending(limit)))
+
+
+@route_router.get("/autocomplete", response_model=list[RouteSuggestion], tags=["Routes"])
+def autocomplete_routes(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_postgres_session),
+):
+    """Routes whose name starts with ``q``, for type-ahead pickers"""
+    if route_names.enabled:
+        matches = route_names.complete(q, limit)
+    else:
+        matches = pg_crud.get_route_names_by_prefix(db, q, limit)
+    return [RouteSuggestion(id=route_id, name=name) for route_id, name in matches]
+
+
+@route_router.get(
+    "/{route_id}/similar",
+    response_model=list[RouteRead],
+    tags=["Routes"],
+    dependencies=[statement_budget(2)],
+)
+def similar_routes(
+    route_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_postgres_session),
+):
+    """Routes most like this one in type, difficulty, distance and type-specific details, closest first"""
+    route = pg_crud.get_route_by_id(db, route_id)
+    if route is None:
+        raise ResourceNotFoundError(resource="Route", identifier=route_id)
+    nearest = route_similarity.nearest(vector_of(route), limit, exclude=route_id)
+    return _route_list.response(ride_durations.with_percentiles(
+        pg_crud.get_route_rows_by_ids(db, [similar_id for similar_id, _ in nearest])
+    ))
+
+
+@route_router.get(
+    "/{route_id}/stats",
+    response_model=RouteStats,
+    tags=["Routes"],
+    dependencies=[statement_budget(1)],
+)
+def route_stats(
+    route_id: int,
+    db: Session = Depends(get_postgres_session),
+):
+    """Ride-duration percentiles on a route, overall and per rider experience level"""
+    if not pg_crud.get_route_names(db, [route_id]):
+        raise ResourceNotFoundError(resource="Route", identifier=route_id)
+    return ride_durations.stats(route_id)
+
+
+async def _request_body(request: Request) -> bytes:
+    return await request.body()
+
+
+_GEOMETRY_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/geo+json": {
+                "schema": {"type": "object"},
+                "example": {"type": "LineString", "coordinates": [[7.6586, 45.0703], [7.6712, 45.0781]]},
+            },
+            "application/gpx+xml": {"schema": {"type": "string"}},
+        },
+    },
+}
+
+
+@route_router.post(
+    "/match",
+    response_model=list[RouteMatch],
+    tags=["Routes"],
+    dependencies=[statement_budget(1)],
+    openapi_extra=_GEOMETRY_BODY,
+)
+def match_routes(
+    body: bytes = Depends(_request_body),
+    content_type: str | None = Header(None),
+    limit: int = Query(5, ge=1, le=20),
+    db: Session = Depends(get_postgres_session),
+):
+    """The catalog routes a GPX or GeoJSON trace follows, with how much of each it covers"""
+    try:
+        points = parse_geometry(body, content_type)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
+    return match_trace(db, points, limit)
+
+
+@route_router.put(
+    "/{route_id}/geometry",
+    response_model=RouteGeometrySummary,
+    tags=["Routes"],
+    dependencies=[statement_budget(3)],
+    openapi_extra=_GEOMETRY_BODY,
+)
+def upload_route_geometry(
+    route_id: int,
+    body: bytes = Depends(_request_body),
+    content_type: str | None = Header(None),
+    db: Session = Depends(get_postgres_session),
+):
+    """Set a route's path from a GPX file or a GeoJSON LineString, replacing any previous one"""
+    try:
+        points = parse_geometry(body, content_type)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
+    path = encode_path(points)
+    # Everything derived is computed from the stored, rounded path, as the rebuild commands do.
+    points = decode_path(path)
+    cells = footprint(points)
+    levels = simplified_levels(points)
+    saved = pg_crud.save_route_geometry(
+        db, route_id, len(points), path, FOOTPRINT_LEVEL, encode_footprint(cells), levels
+    )
+    if not saved:
+        raise ResourceNotFoundError(resource="Route", identifier=route_id)
+    catalog_sync.route_geometry_saved(db, route_id, cells, points)
+    return RouteGeometrySummary(
+        route_id=route_id,
+        point_count=len(points),
+        encoded_bytes=len(path),
+        levels=[RouteGeometryLevel(zoom=level["zoom"], point_count=level["point_count"]) for level in levels],
     )
+
+
+@route_router.get(
+    "/{route_id}/geometry",
+    response_class=Response,
+    tags=["Routes"],
+    dependencies=[statement_budget(2)],
+    responses={200: {"content": {"application/geo+json": {}}}},
+)
+def get_route_geometry(
+    route_id: int,
+    zoom: int | None = Query(None, ge=0, le=24, description="Map zoom; omit for the full path"),
+    db: Session = Depends(get_postgres_session),
+):
+    """A route's path as a GeoJSON Feature, simplified to what ``zoom`` can show"""
+    geometry = pg_crud.get_route_geometry(db, route_id, zoom)
+    if geometry is None:
+        raise ResourceNotFoundError(resource="Route geometry", identifier=route_id)
+    coordinates = np.ascontiguousarray(decode_path(geometry["path"])[:, ::-1])
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+        "properties": {"route_id": route_id, "zoom": geometry["zoom"], "point_count": geometry["point_count"]},
+    }
+    return Response(orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY), media_type="application/geo+json")
+
+
+@route_router.get(
+    "/{route_id}/locations",
+    response_model=list[LocationAlongRoute],
+    tags=["Routes"],
+    dependencies=[statement_budget(2)],
+)
+def route_locations(
+    route_id: int,
+    location_type: LocationType | None = Query(None),
+    within_km: float = Query(2.0, gt=0, le=50, description="Corridor half-width around the route's path"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_postgres_session),
+):
+    """Points of interest within ``within_km`` of a route, in the order it reaches them"""
+    locations = locations_along_route(
+        db, route_id, within_km * 1000, location_type and location_type.value, limit
+    )
+    if locations is None:
+        raise ResourceNotFoundError(resource="Route geometry", identifier=route_id)
+    return locations
+
+
+@route_router.delete("/{route_id}", tags=["Routes"], dependencies=[statement_budget(1)])
+def delete_route(
+    route_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_postgres_session),
+):
+    """Delete a route and every ride logged on it"""
+    if not pg_crud.delete_route(db, route_id):
+        raise ResourceNotFoundError(resource="Route", identifier=route_id)
+    neo_crud.retire_route_node(route_id)
+    background_tasks.add_task(neo_crud.purge_route_subgraph, route_id)
+    catalog_sync.route_deleted(db, route_id)
+    return {"message": f"Route {route_id} deleted successfully"}
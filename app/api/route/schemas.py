@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Literal
+from typing import Annotated, Literal, Union
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -111,44 +111,121 @@ class CoastalRouteCreate(RouteBase):
 
 
 # Read Schemas (for responses)
-class RouteRead(BaseModel):
+# Each route type only carries its own attributes; ``RouteRead`` picks the
+# right model from ``route_type``.
+class RouteReadBase(BaseModel):
     id: int
     name: str
-    route_type: str
     start_location: str
     end_location: str
     distance_km: float
     difficulty: str
     description: str | None
     created_at: datetime
-    
-    # Scenic
+    estimated_minutes: float | None = None
+    difficulty_score: float | None = None
+    duration_p50_minutes: float | None = Field(None, description="Median logged ride duration")
+    duration_p90_minutes: float | None = Field(None, description="90th percentile logged ride duration")
+
+    class Config:
+        from_attributes = True
+
+
+class ScenicRouteRead(RouteReadBase):
+    route_type: Literal["scenic"]
     scenic_points: list[str] | None = None
     best_season: str | None = None
     photography_spots: int | None = None
-    # Highway
+
+
+class HighwayRouteRead(RouteReadBase):
+    route_type: Literal["highway"]
     speed_limit: int | None = None
     toll_cost: float | None = None
     rest_stops: list[str] | None = None
     lanes: int | None = None
-    # Offroad
+
+
+class OffroadRouteRead(RouteReadBase):
+    route_type: Literal["offroad"]
     terrain_type: str | None = None
     min_bike_cc: int | None = None
     technical_difficulty: int | None = None
     requires_experience: bool | None = None
-    # Mountain
+
+
+class MountainRouteRead(RouteReadBase):
+    route_type: Literal["mountain"]
     elevation_gain: float | None = None
     max_altitude: float | None = None
     hairpin_turns: int | None = None
     oxygen_required: bool | None = None
-    # Coastal
+
+
+class CoastalRouteRead(RouteReadBase):
+    route_type: Literal["coastal"]
     beach_stops: list[str] | None = None
     lighthouse_count: int | None = None
     seafood_spots: list[str] | None = None
     ocean_view_percentage: int | None = None
 
-    class Config:
-        from_attributes = True
+
+RouteRead = Annotated[
+    Union[ScenicRouteRead, HighwayRouteRead, OffroadRouteRead, MountainRouteRead, CoastalRouteRead],
+    Field(discriminator="route_type"),
+]
+
+
+class RouteSuggestion(BaseModel):
+    id: int
+    name: str
+
+
+class RoutePopularity(BaseModel):
+    route_id: int
+    name: str
+    unique_riders: int = Field(..., description="Estimated distinct riders, ever")
+    unique_riders_week: int = Field(..., description="Estimated distinct riders over the trending window")
+    rides: int
+    trending_score: float = Field(..., description="Rides counted with exponential time decay")
+
+
+class RideDurationStats(BaseModel):
+    timed_rides: int = Field(..., description="Rides logged with a duration")
+    duration_p50_minutes: float | None = None
+    duration_p90_minutes: float | None = None
+
+
+class ExperienceLevelDurationStats(RideDurationStats):
+    experience_level: str
+
+
+class RouteStats(RideDurationStats):
+    route_id: int
+    by_experience_level: list[ExperienceLevelDurationStats]
+
+
+class RouteGeometryLevel(BaseModel):
+    zoom: int
+    point_count: int
+
+
+class RouteGeometrySummary(BaseModel):
+    route_id: int
+    point_count: int
+    encoded_bytes: int = Field(..., description="Size of the stored, encoded path")
+    levels: list[RouteGeometryLevel] = Field(..., description="Simplified copies stored for map zoom levels")
+
+
+class RouteMatch(BaseModel):
+    route_id: int
+    name: str
+    matched: bool = Field(..., description="The trace follows the route, within the matching tolerance")
+    coverage_percent: float = Field(..., description="Share of the route's length the trace rode")
+    trace_on_route_percent: float = Field(..., description="Share of the trace's length on the route")
+    frechet_m: float | None = Field(
+        ..., description="Discrete Fréchet distance between the trace, where it joins the route, and the stretch it rode"
+    )
 
 
 def create_route_schema(route_type: RouteType, **kwargs):
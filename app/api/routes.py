@@ -5,9 +5,17 @@ from fastapi import APIRouter
 from app.api.rider.routing import rider_router
 from app.api.route.routing import route_router
 from app.api.ride.routing import ride_router
+from app.api.events.routing import events_router
+from app.api.group_ride.routing import group_ride_router
+from app.api.heatmap.routing import heatmap_router
+from app.api.location.routing import location_router
 
 
 api_router = APIRouter()
 api_router.include_router(rider_router, prefix="/riders", tags=["Riders"])
 api_router.include_router(route_router, prefix="/routes", tags=["Routes"])
 api_router.include_router(ride_router, prefix="/rides", tags=["Rides"])
+api_router.include_router(events_router, prefix="/events", tags=["Events"])
+api_router.include_router(group_ride_router, prefix="/group-rides", tags=["Group Rides"])
+api_router.include_router(heatmap_router, prefix="/heatmap", tags=["Heat Map"])
+api_router.include_router(location_router, prefix="/locations", tags=["Locations"])
@@ -0,0 +1,137 @@
+"""Maintenance commands: ``python -m app.cli <command> --help``."""
+
+import argparse
+from datetime import date, datetime
+from loguru import logger
+from app.db.database import SessionLocal
+from app.db.neo4j_crud import PURGE_BATCH_SIZE, purge_retired_subgraphs
+from app.db.ride_partitions import (
+    RIDES_PARTITION_MONTHS_AHEAD,
+    ensure_ride_partitions,
+    list_ride_partitions,
+    partition_month,
+    partition_rides,
+    rides_partitioned,
+)
+from app.services.heatmap import rebuild_footprints
+from app.services.restore import restore_snapshot
+from app.services.route_geometry import rebuild_simplifications
+from app.services.ride_archive import RIDES_ARCHIVE_DIR, archive_ride_partition
+from app.services.snapshot import SNAPSHOT_DIR, SNAPSHOT_WORKERS, export_snapshot
+
+
+def _month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def cmd_partition_rides(args) -> None:
+    with SessionLocal() as db:
+        created = partition_rides(db, months_ahead=args.months_ahead)
+        db.commit()
+    logger.info(f"rides is now partitioned by month ({len(created)} partitions)")
+
+
+def cmd_ensure_ride_partitions(args) -> None:
+    with SessionLocal() as db:
+        created = ensure_ride_partitions(db, months_ahead=args.months_ahead)
+        db.commit()
+    logger.info(f"Created {len(created)} ride partitions: {', '.join(created) or 'none needed'}")
+
+
+def cmd_archive_rides(args) -> None:
+    with SessionLocal() as db:
+        if not rides_partitioned(db):
+            raise SystemExit("rides is not partitioned; run partition-rides first")
+        old = [
+            name for name in list_ride_partitions(db)
+            if partition_month(name) is not None and partition_month(name) < args.before
+        ]
+    if args.dry_run:
+        logger.info(f"Would archive: {', '.join(old) or 'nothing'}")
+        return
+    # One transaction per month, so a failure keeps the months already done.
+    for name in old:
+        with SessionLocal() as db:
+            archive_ride_partition(db, name, archive_dir=args.archive_dir)
+            db.commit()
+
+
+def cmd_export_snapshot(args) -> None:
+    export_snapshot(args.output_dir, workers=args.workers, include_graph=not args.skip_graph)
+
+
+def cmd_restore_snapshot(args) -> None:
+    restore_snapshot(
+        args.snapshot_dir,
+        workers=args.workers,
+        include_graph=not args.skip_graph,
+        truncate=args.truncate,
+    )
+
+
+def cmd_rebuild_heatmap(args) -> None:
+    with SessionLocal() as db:
+        rebuilt = rebuild_footprints(db)
+        db.commit()
+    logger.info(f"Rasterized {rebuilt} route footprints; workers pick them up when they restart")
+
+
+def cmd_simplify_route_geometries(args) -> None:
+    with SessionLocal() as db:
+        rebuilt = rebuild_simplifications(db)
+        db.commit()
+    logger.info(f"Simplified {rebuilt} route paths")
+
+
+def cmd_purge_retired_graph(args) -> None:
+    riders, routes = purge_retired_subgraphs(batch_size=args.batch_size)
+    logger.info(f"Purged the subgraphs of {riders} deleted riders and {routes} deleted routes")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    partition = commands.add_parser("partition-rides", help="Convert rides to monthly partitions")
+    partition.add_argument("--months-ahead", type=int, default=RIDES_PARTITION_MONTHS_AHEAD)
+    partition.set_defaults(handler=cmd_partition_rides)
+
+    ensure = commands.add_parser("ensure-ride-partitions", help="Create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=RIDES_PARTITION_MONTHS_AHEAD)
+    ensure.set_defaults(handler=cmd_ensure_ride_partitions)
+
+    archive = commands.add_parser("archive-rides", help="Move whole months of rides to the archive")
+    archive.add_argument("--before", type=_month, required=True, help="Archive months before YYYY-MM")
+    archive.add_argument("--archive-dir", default=RIDES_ARCHIVE_DIR)
+    archive.add_argument("--dry-run", action="store_true")
+    archive.set_defaults(handler=cmd_archive_rides)
+
+    snapshot = commands.add_parser("export-snapshot", help="Dump PostgreSQL and Neo4j to a snapshot directory")
+    snapshot.add_argument("--output-dir", default=SNAPSHOT_DIR)
+    snapshot.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS)
+    snapshot.add_argument("--skip-graph", action="store_true", help="Only export PostgreSQL")
+    snapshot.set_defaults(handler=cmd_export_snapshot)
+
+    restore = commands.add_parser("restore-snapshot", help="Load a snapshot directory into empty databases")
+    restore.add_argument("snapshot_dir")
+    restore.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS)
+    restore.add_argument("--skip-graph", action="store_true", help="Only restore PostgreSQL")
+    restore.add_argument("--truncate", action="store_true", help="Empty the target tables and labels first")
+    restore.set_defaults(handler=cmd_restore_snapshot)
+
+    heatmap = commands.add_parser("rebuild-heatmap", help="Re-rasterize every route's heat-map footprint")
+    heatmap.set_defaults(handler=cmd_rebuild_heatmap)
+
+    simplify = commands.add_parser("simplify-route-geometries", help="Recompute every route path's zoom levels")
+    simplify.set_defaults(handler=cmd_simplify_route_geometries)
+
+    purge = commands.add_parser("purge-retired-graph", help="Purge what is left of deleted riders and routes in Neo4j")
+    purge.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+    purge.set_defaults(handler=cmd_purge_retired_graph)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import os
 from contextlib import contextmanager
+from typing import Callable
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from neo4j import GraphDatabase
+from loguru import logger
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from neo4j import GraphDatabase, WRITE_ACCESS
 from neomodel import config as neomodel_config
 
 load_dotenv()
@@ -36,6 +38,26 @@ def get_postgres_session():
         db.close()
 
 
+def after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """Run ``callback`` once ``db``'s transaction commits; it is dropped if the transaction rolls back."""
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit(session) -> None:
+    for callback in session.info.pop("after_commit", []):
+        # The data is committed whatever a callback does; don't fail the caller over it.
+        try:
+            callback()
+        except Exception:
+            logger.exception("After-commit callback failed")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_after_commit(session) -> None:
+    session.info.pop("after_commit", None)
+
+
 # Neo4j Configuration
 NEO4J_URI = os.environ.get("NEO4J_DATABASE_URL")
 NEO4J_USER = os.environ.get("NEO4J_USER")
@@ -51,6 +73,12 @@ neo4j_driver = GraphDatabase.driver(
 )
 
 
+# Sessions share one bookmark manager, so a read issued after a write in this
+# process sees that write even when it is routed to a read replica (use a
+# neo4j:// routing URL to spread reads across the cluster).
+neo4j_bookmark_manager = GraphDatabase.bookmark_manager()
+
+
 def get_neo4j_session():
     """Dependency for FastAPI to get a Neo4j session."""
     with neo4j_driver.session() as session:
@@ -58,9 +86,12 @@ def get_neo4j_session():
 
 
 @contextmanager
-def neo4j_session_context():
+def neo4j_session_context(access_mode: str = WRITE_ACCESS):
     """Context manager for Neo4j session (for use outside FastAPI dependencies)."""
-    session = neo4j_driver.session()
+    session = neo4j_driver.session(
+        default_access_mode=access_mode,
+        bookmark_manager=neo4j_bookmark_manager,
+    )
     try:
         yield session
     finally:
@@ -1,8 +1,78 @@
+import os
 from loguru import logger
+from neo4j import READ_ACCESS
 from neomodel.exceptions import DoesNotExist
 from . import postgres_models as models
+from .database import neo4j_session_context
 from .neo4j_models import RiderNode, BikeNode, RouteNode, RideNode
 
+PURGE_BATCH_SIZE = int(os.environ.get("NEO4J_PURGE_BATCH_SIZE", "1000"))
+
+# A deleted rider's or route's node is relabelled so it drops out of lookups
+# and unique constraints at once; the rest of its subgraph is purged in batches.
+DELETED_RIDER_LABEL = "DeletedRider"
+DELETED_ROUTE_LABEL = "DeletedRoute"
+
+_PURGE_RIDER_QUERIES = (
+    """
+    MATCH (:DeletedRider {postgres_id: $postgres_id})-[:COMPLETED]->(ride:RideNode)
+    WITH ride LIMIT $batch_size
+    DETACH DELETE ride
+    RETURN count(*) AS deleted
+    """,
+    """
+    MATCH (:DeletedRider {postgres_id: $postgres_id})-[:OWNS]->(bike:BikeNode)
+    WITH bike LIMIT $batch_size
+    DETACH DELETE bike
+    RETURN count(*) AS deleted
+    """,
+)
+
+_PURGE_ROUTE_QUERIES = (
+    """
+    MATCH (:DeletedRoute {postgres_id: $postgres_id})<-[:ON_ROUTE]-(ride:RideNode)
+    WITH ride LIMIT $batch_size
+    DETACH DELETE ride
+    RETURN count(*) AS deleted
+    """,
+)
+
+
+def _retire_node(label: str, retired_label: str, postgres_id: int) -> bool:
+    with neo4j_session_context() as session:
+        record = session.run(
+            f"""
+            MATCH (n:{label} {{postgres_id: $postgres_id}})
+            REMOVE n:{label}
+            SET n:{retired_label}
+            RETURN count(n) AS retired
+            """,
+            postgres_id=postgres_id,
+        ).single()
+    return bool(record["retired"])
+
+
+def _delete_batch(tx, query: str, postgres_id: int, batch_size: int) -> int:
+    return tx.run(query, postgres_id=postgres_id, batch_size=batch_size).single()["deleted"]
+
+
+def _purge_subgraph(retired_label: str, queries, postgres_id: int, batch_size: int) -> int:
+    """Run each batch query until it deletes nothing, then drop the retired node.
+
+    Every batch is its own short write transaction, so huge histories never
+    hold one giant transaction open.
+    """
+    purged = 0
+    with neo4j_session_context() as session:
+        for query in queries:
+            while deleted := session.execute_write(_delete_batch, query, postgres_id, batch_size):
+                purged += deleted
+        session.run(
+            f"MATCH (n:{retired_label} {{postgres_id: $postgres_id}}) DETACH DELETE n",
+            postgres_id=postgres_id,
+        ).consume()
+    return purged
+
 
 def create_rider_node(rider: models.Rider) -> RiderNode:
     return RiderNode(
@@ -29,14 +99,17 @@ def connect_bike_to_rider(owner_id: int, bike_id: int) -> None:
     rider_node.bikes.connect(bike_node)
 
 
-def delete_rider_node(rider_id: int) -> None:
-    try:
-        rider_node = RiderNode.nodes.get(postgres_id=rider_id)
-        rider_node.delete()
-    except DoesNotExist:
+def retire_rider_node(rider_id: int) -> None:
+    if not _retire_node("RiderNode", DELETED_RIDER_LABEL, rider_id):
         logger.warning(f"Rider node with postgres_id={rider_id} not found in Neo4j")
 
 
+def purge_rider_subgraph(rider_id: int, batch_size: int = PURGE_BATCH_SIZE) -> None:
+    """Background task removing a retired rider's rides, bikes and node."""
+    purged = _purge_subgraph(DELETED_RIDER_LABEL, _PURGE_RIDER_QUERIES, rider_id, batch_size)
+    logger.info(f"Purged rider {rider_id} subgraph ({purged} bike/ride nodes)")
+
+
 def delete_bike_node(bike_id: int) -> None:
     try:
         bike_node = BikeNode.nodes.get(postgres_id=bike_id)
@@ -57,6 +130,33 @@ def create_route_node(route: models.Route) -> RouteNode:
     ).save()
 
 
+def retire_route_node(route_id: int) -> None:
+    if not _retire_node("RouteNode", DELETED_ROUTE_LABEL, route_id):
+        logger.warning(f"Route node with postgres_id={route_id} not found in Neo4j")
+
+
+def purge_route_subgraph(route_id: int, batch_size: int = PURGE_BATCH_SIZE) -> None:
+    """Background task removing a retired route's rides and node."""
+    purged = _purge_subgraph(DELETED_ROUTE_LABEL, _PURGE_ROUTE_QUERIES, route_id, batch_size)
+    logger.info(f"Purged route {route_id} subgraph ({purged} ride nodes)")
+
+
+def purge_retired_subgraphs(batch_size: int = PURGE_BATCH_SIZE) -> tuple[int, int]:
+    """Purge every retired rider and route still in the graph; returns how many of each.
+
+    Picks up what a background purge left behind when its worker stopped
+    before the task ran or finished.
+    """
+    with neo4j_session_context(READ_ACCESS) as session:
+        riders = session.execute_read(_read_page, f"MATCH (n:{DELETED_RIDER_LABEL}) RETURN n.postgres_id")
+        routes = session.execute_read(_read_page, f"MATCH (n:{DELETED_ROUTE_LABEL}) RETURN n.postgres_id")
+    for (rider_id,) in riders:
+        purge_rider_subgraph(rider_id, batch_size)
+    for (route_id,) in routes:
+        purge_route_subgraph(route_id, batch_size)
+    return len(riders), len(routes)
+
+
 def create_ride_node(ride: models.Ride) -> RideNode:
     return RideNode(
         postgres_id=ride.id,
@@ -89,3 +189,175 @@ def delete_ride_node(ride_id: int) -> None:
         ride_node.delete()
     except DoesNotExist:
         logger.warning(f"Ride node with postgres_id={ride_id} not found in Neo4j")
+
+
+_SET_FOLLOW = """
+    OPTIONAL MATCH (a:RiderNode {postgres_id: $rider_id})
+    OPTIONAL MATCH (b:RiderNode {postgres_id: $target_id})
+    FOREACH (_ IN CASE WHEN a IS NOT NULL AND b IS NOT NULL THEN [1] ELSE [] END |
+        MERGE (a)-[:FOLLOWS]->(b))
+    RETURN a.name, b.name
+"""
+
+_REMOVE_FOLLOW = """
+    OPTIONAL MATCH (a:RiderNode {postgres_id: $rider_id})
+    OPTIONAL MATCH (b:RiderNode {postgres_id: $target_id})
+    OPTIONAL MATCH (a)-[r:FOLLOWS]->(b)
+    DELETE r
+    RETURN a.name, b.name
+"""
+
+_TAG_BUDDIES = """
+    MATCH (me:RiderNode {postgres_id: $rider_id})
+    UNWIND $buddy_ids AS buddy_id
+    MATCH (buddy:RiderNode {postgres_id: buddy_id})
+    MERGE (me)-[r:RODE_WITH]-(buddy)
+    ON CREATE SET r.rides = 0
+    SET r.rides = r.rides + CASE WHEN r.last_ride_id = $ride_id THEN 0 ELSE 1 END,
+        r.last_ride_id = $ride_id
+    RETURN buddy.postgres_id, buddy.name
+"""
+
+# Neighbour lists, keyed on the neighbour's postgres_id for cursor paging.
+_NEIGHBOUR_PATTERNS = {
+    "following": "(me)-[r:FOLLOWS]->(other:RiderNode)",
+    "followers": "(me)<-[r:FOLLOWS]-(other:RiderNode)",
+    "riding-buddies": "(me)-[r:RODE_WITH]-(other:RiderNode)",
+}
+
+
+def _single_values(tx, query: str, **params) -> list:
+    return tx.run(query, **params).single().values()
+
+
+def set_follow(rider_id: int, target_id: int, following: bool) -> tuple[str | None, str | None]:
+    """Follow or unfollow; returns both riders' names, None for a missing rider."""
+    query = _SET_FOLLOW if following else _REMOVE_FOLLOW
+    with neo4j_session_context() as session:
+        return tuple(session.execute_write(_single_values, query, rider_id=rider_id, target_id=target_id))
+
+
+def tag_riding_buddies(rider_id: int, ride_id: int, buddy_ids: list[int]) -> list[tuple[int, str]]:
+    """Record that ``rider_id`` rode ``ride_id`` with the given riders; returns those found."""
+    with neo4j_session_context() as session:
+        return session.execute_write(
+            _read_page, _TAG_BUDDIES, rider_id=rider_id, ride_id=ride_id, buddy_ids=buddy_ids
+        )
+
+
+def get_rider_neighbours(rider_id: int, kind: str, after: int, limit: int) -> list[tuple[int, str, int | None]]:
+    """(id, name, shared rides) of a rider's neighbours of one kind with ids above ``after``."""
+    query = f"""
+        MATCH (me:RiderNode {{postgres_id: $rider_id}})
+        MATCH {_NEIGHBOUR_PATTERNS[kind]}
+        WHERE other.postgres_id > $after
+        RETURN other.postgres_id, other.name, r.rides
+        ORDER BY other.postgres_id LIMIT $limit
+    """
+    with neo4j_session_context(READ_ACCESS) as session:
+        return [
+            tuple(values)
+            for values in session.execute_read(_read_page, query, rider_id=rider_id, after=after, limit=limit)
+        ]
+
+
+def get_followed_riders(rider_id: int) -> list[tuple[int, int]]:
+    """(id, follower count) of every rider ``rider_id`` follows."""
+    query = """
+        MATCH (:RiderNode {postgres_id: $rider_id})-[:FOLLOWS]->(followed:RiderNode)
+        RETURN followed.postgres_id, COUNT { (followed)<-[:FOLLOWS]-() }
+    """
+    with neo4j_session_context(READ_ACCESS) as session:
+        return [tuple(values) for values in session.execute_read(_read_page, query, rider_id=rider_id)]
+
+
+def _read_page(tx, query: str, **params) -> list:
+    return [record.values() for record in tx.run(query, **params)]
+
+
+def iter_graph_nodes(label: str, page_size: int):
+    """Yield the properties of every ``label`` node, one read transaction per page.
+
+    Pages are keyed on the indexed postgres_id, so each page is an index seek
+    however deep into the label it is.
+    """
+    query = f"""
+        MATCH (n:{label}) WHERE n.postgres_id > $after
+        RETURN n.postgres_id, properties(n)
+        ORDER BY n.postgres_id LIMIT $page_size
+    """
+    after = -1
+    with neo4j_session_context(READ_ACCESS) as session:
+        while page := session.execute_read(_read_page, query, after=after, page_size=page_size):
+            for _, properties in page:
+                yield properties
+            after = page[-1][0]
+
+
+def iter_graph_relationships(start_label: str, rel_type: str, end_label: str, page_size: int):
+    """Yield (start postgres_id, end postgres_id, properties) for every relationship of one kind."""
+    query = f"""
+        MATCH (a:{start_label})-[r:{rel_type}]->(b:{end_label})
+        WHERE a.postgres_id > $after_start
+           OR (a.postgres_id = $after_start AND b.postgres_id > $after_end)
+        RETURN a.postgres_id, b.postgres_id, properties(r)
+        ORDER BY a.postgres_id, b.postgres_id LIMIT $page_size
+    """
+    after_start, after_end = -1, -1
+    with neo4j_session_context(READ_ACCESS) as session:
+        while page := session.execute_read(
+            _read_page, query, after_start=after_start, after_end=after_end, page_size=page_size
+        ):
+            yield from page
+            after_start, after_end = page[-1][0], page[-1][1]
+
+
+def _write_rows(tx, query: str, rows: list[dict]) -> None:
+    tx.run(query, rows=rows).consume()
+
+
+def load_graph_nodes(label: str, batches) -> int:
+    """Create ``label`` nodes from batches of property dicts, one UNWIND write per batch."""
+    query = f"UNWIND $rows AS row CREATE (n:{label}) SET n = row"
+    loaded = 0
+    with neo4j_session_context() as session:
+        for rows in batches:
+            session.execute_write(_write_rows, query, rows)
+            loaded += len(rows)
+    return loaded
+
+
+def load_graph_relationships(start_label: str, rel_type: str, end_label: str, batches) -> int:
+    """Create relationships from batches of {start, end, properties} dicts keyed by postgres_id."""
+    query = f"""
+        UNWIND $rows AS row
+        MATCH (a:{start_label} {{postgres_id: row.start}})
+        MATCH (b:{end_label} {{postgres_id: row.end}})
+        CREATE (a)-[r:{rel_type}]->(b)
+        SET r = row.properties
+    """
+    loaded = 0
+    with neo4j_session_context() as session:
+        for rows in batches:
+            session.execute_write(_write_rows, query, rows)
+            loaded += len(rows)
+    return loaded
+
+
+def _clear_batch(tx, query: str, batch_size: int) -> int:
+    return tx.run(query, batch_size=batch_size).single()["deleted"]
+
+
+def clear_graph_label(label: str, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Delete every ``label`` node and its relationships, in batches."""
+    query = f"""
+        MATCH (n:{label})
+        WITH n LIMIT $batch_size
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """
+    cleared = 0
+    with neo4j_session_context() as session:
+        while deleted := session.execute_write(_clear_batch, query, batch_size):
+            cleared += deleted
+    return cleared
@@ -17,6 +17,10 @@ class RiderNode(StructuredNode):
     
     bikes = RelationshipTo('BikeNode', 'OWNS')
     rides = RelationshipTo('RideNode', 'COMPLETED')
+    following = RelationshipTo('RiderNode', 'FOLLOWS')
+    followers = RelationshipFrom('RiderNode', 'FOLLOWS')
+    # One relationship per pair of riders, counting the rides they shared.
+    riding_buddies = RelationshipTo('RiderNode', 'RODE_WITH')
 
 
 class BikeNode(StructuredNode):
@@ -47,3 +51,17 @@ class RideNode(StructuredNode):
     rider = RelationshipFrom('RiderNode', 'COMPLETED')
     route = RelationshipTo('RouteNode', 'ON_ROUTE')
     bike = RelationshipTo('BikeNode', 'USED_BIKE')
+
+
+# Every node class and (start label, type, end label) relationship in the
+# graph, for code that walks the whole graph such as snapshots.
+GRAPH_NODE_CLASSES = (RiderNode, BikeNode, RouteNode, RideNode)
+
+GRAPH_RELATIONSHIPS = (
+    ("RiderNode", "OWNS", "BikeNode"),
+    ("RiderNode", "COMPLETED", "RideNode"),
+    ("RideNode", "ON_ROUTE", "RouteNode"),
+    ("RideNode", "USED_BIKE", "BikeNode"),
+    ("RiderNode", "FOLLOWS", "RiderNode"),
+    ("RiderNode", "RODE_WITH", "RiderNode"),
+)
@@ -1,4 +1,11 @@
+from datetime import date, datetime
+import orjson
+from sqlalchemy import and_, delete, func, insert, literal, literal_column, or_, select, text, true, tuple_, union, update, Date, DateTime, Integer, LargeBinary, String, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
+from app.services.route_metrics import route_metrics
+from app.services.route_search import route_search_index
 from . import postgres_models as models
 
 
@@ -7,24 +14,34 @@ def create_rider(
     name: str,
     experience_level: str,
 ) -> models.Rider:
-    rider = models.Rider(
-        name=name,
-        experience_level=experience_level,
-    )
-    db.add(rider)
-    db.flush()
-    db.refresh(rider)
-    return rider
+    return db.scalars(
+        insert(models.Rider)
+        .values(name=name, experience_level=experience_level)
+        .returning(models.Rider)
+    ).one()
 
 
 def get_riders(db: Session) -> list[models.Rider]:
     return db.query(models.Rider).all()
 
 
+def get_rider_rows(db: Session) -> list[dict]:
+    return [dict(row) for row in db.execute(select(*models.Rider.__table__.c)).mappings()]
+
+
 def get_rider_by_id(db: Session, rider_id: int) -> models.Rider | None:
     return db.query(models.Rider).filter(models.Rider.id == rider_id).first()
 
 
+def get_rider_names_by_prefix(db: Session, prefix: str, limit: int) -> list[tuple[int, str]]:
+    return [tuple(row) for row in db.execute(
+        select(models.Rider.id, models.Rider.name)
+        .where(func.lower(models.Rider.name).startswith(prefix.lower(), autoescape=True))
+        .order_by(func.lower(models.Rider.name))
+        .limit(limit)
+    )]
+
+
 def create_bike(
     db: Session,
     owner_id: int,
@@ -33,17 +50,17 @@ def create_bike(
     year: int,
     engine_cc: int,
 ) -> models.Bike:
-    bike = models.Bike(
-        owner_id=owner_id,
-        brand=brand,
-        model=model,
-        year=year,
-        engine_cc=engine_cc,
-    )
-    db.add(bike)
-    db.flush()
-    db.refresh(bike)
-    return bike
+    return db.scalars(
+        insert(models.Bike)
+        .values(
+            owner_id=owner_id,
+            brand=brand,
+            model=model,
+            year=year,
+            engine_cc=engine_cc,
+        )
+        .returning(models.Bike)
+    ).one()
 
 
 def get_bikes(db: Session) -> list[models.Bike]:
@@ -58,20 +75,74 @@ def get_bikes_by_owner(db: Session, owner_id: int) -> list[models.Bike]:
     return db.query(models.Bike).filter(models.Bike.owner_id == owner_id).all()
 
 
-def delete_rider(db: Session, rider_id: int) -> bool:
-    rider = get_rider_by_id(db, rider_id)
-    if not rider:
-        return False
-    db.delete(rider)
-    return True
-
-
-def delete_bike(db: Session, bike_id: int) -> bool:
-    bike = get_bike_by_id(db, bike_id)
-    if not bike:
-        return False
-    db.delete(bike)
-    return True
+def get_bike_rows_by_owner(db: Session, owner_id: int) -> list[dict]:
+    return [dict(row) for row in db.execute(
+        select(*models.Bike.__table__.c).where(models.Bike.owner_id == owner_id)
+    ).mappings()]
+
+
+def get_rider_garage(db: Session, rider_id: int) -> tuple[str, int | None] | None:
+    """A rider's experience level and largest engine cc (None without bikes), or None if there is no such rider."""
+    row = db.execute(
+        select(models.Rider.experience_level, func.max(models.Bike.engine_cc))
+        .outerjoin(models.Bike, models.Bike.owner_id == models.Rider.id)
+        .where(models.Rider.id == rider_id)
+        .group_by(models.Rider.id)
+    ).first()
+    return tuple(row) if row is not None else None
+
+
+def get_owned_bike(
+    db: Session, rider_id: int, bike_id: int
+) -> tuple[bool, models.Bike | None]:
+    """Look up a rider's bike in one query.
+
+    Returns ``(rider_exists, bike)`` where ``bike`` is None when the bike does
+    not exist or belongs to someone else.
+    """
+    row = db.execute(
+        select(models.Rider.id, models.Bike)
+        .outerjoin(
+            models.Bike,
+            and_(models.Bike.owner_id == models.Rider.id, models.Bike.id == bike_id),
+        )
+        .where(models.Rider.id == rider_id)
+    ).first()
+    if row is None:
+        return False, None
+    return True, row.Bike
+
+
+def delete_rider(db: Session, rider_id: int) -> list[dict] | None:
+    """Delete a rider with their bikes and rides; returns each ride's route_id, completed_at, duration_minutes and experience_level, or None."""
+    # Rides are deleted first, so they can be returned; bikes go through ON DELETE CASCADE.
+    rides = db.execute(
+        delete(models.Ride)
+        .where(models.Ride.rider_id == rider_id)
+        .returning(
+            models.Ride.route_id,
+            models.Ride.completed_at,
+            models.Ride.duration_minutes,
+            select(models.Rider.experience_level)
+            .where(models.Rider.id == models.Ride.rider_id)
+            .correlate_except(models.Rider)
+            .scalar_subquery()
+            .label("experience_level"),
+        )
+    ).mappings().all()
+    deleted = db.execute(
+        delete(models.Rider).where(models.Rider.id == rider_id).returning(models.Rider.id)
+    ).first()
+    return [dict(ride) for ride in rides] if deleted is not None else None
+
+
+def delete_owned_bike(db: Session, rider_id: int, bike_id: int) -> bool:
+    deleted = db.execute(
+        delete(models.Bike)
+        .where(models.Bike.id == bike_id, models.Bike.owner_id == rider_id)
+        .returning(models.Bike.id)
+    ).first()
+    return deleted is not None
 
 
 def create_route(
@@ -83,68 +154,41 @@ def create_route(
     difficulty: str,
     route_type: str = "scenic",
     description: str | None = None,
-    # Scenic fields
-    scenic_points: list | None = None,
-    best_season: str | None = None,
-    photography_spots: int | None = None,
-    # Highway fields
-    speed_limit: int | None = None,
-    toll_cost: float | None = None,
-    rest_stops: list | None = None,
-    lanes: int | None = None,
-    # Offroad fields
-    terrain_type: str | None = None,
-    min_bike_cc: int | None = None,
-    technical_difficulty: int | None = None,
-    requires_experience: bool | None = None,
-    # Mountain fields
-    elevation_gain: float | None = None,
-    max_altitude: float | None = None,
-    hairpin_turns: int | None = None,
-    oxygen_required: bool | None = None,
-    # Coastal fields
-    beach_stops: list | None = None,
-    lighthouse_count: int | None = None,
-    seafood_spots: list | None = None,
-    ocean_view_percentage: int | None = None,
+    details: dict | None = None,
 ) -> models.Route:
-    route = models.Route(
-        name=name,
-        route_type=route_type,
-        start_location=start_location,
-        end_location=end_location,
-        distance_km=distance_km,
-        difficulty=difficulty,
-        description=description,
-        # Scenic
-        scenic_points=scenic_points,
-        best_season=best_season,
-        photography_spots=photography_spots,
-        # Highway
-        speed_limit=speed_limit,
-        toll_cost=toll_cost,
-        rest_stops=rest_stops,
-        lanes=lanes,
-        # Offroad
-        terrain_type=terrain_type,
-        min_bike_cc=min_bike_cc,
-        technical_difficulty=technical_difficulty,
-        requires_experience=requires_experience,
-        # Mountain
-        elevation_gain=elevation_gain,
-        max_altitude=max_altitude,
-        hairpin_turns=hairpin_turns,
-        oxygen_required=oxygen_required,
-        # Coastal
-        beach_stops=beach_stops,
-        lighthouse_count=lighthouse_count,
-        seafood_spots=seafood_spots,
-        ocean_view_percentage=ocean_view_percentage,
-    )
-    db.add(route)
-    db.flush()
-    db.refresh(route)
-    return route
+    return db.scalars(
+        insert(models.Route)
+        .values(
+            name=name,
+            route_type=route_type,
+            start_location=start_location,
+            end_location=end_location,
+            distance_km=distance_km,
+            difficulty=difficulty,
+            description=description,
+            details=details or {},
+            **route_metrics(route_type, difficulty, distance_km, details),
+        )
+        .returning(models.Route)
+    ).one()
+
+
+def _route_filters(
+    difficulty: str | None = None,
+    min_distance: float | None = None,
+    max_distance: float | None = None,
+    route_type: str | None = None,
+) -> list:
+    filters = []
+    if difficulty:
+        filters.append(models.Route.difficulty == difficulty)
+    if min_distance is not None:
+        filters.append(models.Route.distance_km >= min_distance)
+    if max_distance is not None:
+        filters.append(models.Route.distance_km <= max_distance)
+    if route_type:
+        filters.append(models.Route.route_type == route_type)
+    return filters
 
 
 def get_routes(
@@ -154,54 +198,782 @@ def get_routes(
     max_distance: float | None = None,
     route_type: str | None = None,
 ) -> list[models.Route]:
-    query = db.query(models.Route)
-    if difficulty:
-        query = query.filter(models.Route.difficulty == difficulty)
-    if min_distance is not None:
-        query = query.filter(models.Route.distance_km >= min_distance)
-    if max_distance is not None:
-        query = query.filter(models.Route.distance_km <= max_distance)
-    if route_type:
-        query = query.filter(models.Route.route_type == route_type)
-    return query.all()
+    filters = _route_filters(difficulty, min_distance, max_distance, route_type)
+    return db.query(models.Route).filter(*filters).all()
+
+
+ROUTE_SORT_COLUMNS = {
+    "estimated_time": models.Route.estimated_minutes,
+    "difficulty_score": models.Route.difficulty_score,
+    "distance": models.Route.distance_km,
+    "name": models.Route.name,
+}
+
+
+def get_route_rows(
+    db: Session,
+    difficulty: str | None = None,
+    min_distance: float | None = None,
+    max_distance: float | None = None,
+    route_type: str | None = None,
+    sort: str | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+) -> list[dict]:
+    """Routes as plain dicts with their type-specific details flattened in.
+
+    ``sort`` names a ``ROUTE_SORT_COLUMNS`` key, prefixed with ``-`` for
+    descending order.
+    """
+    filters = _route_filters(difficulty, min_distance, max_distance, route_type)
+    query = select(*models.Route.__table__.c).where(*filters)
+    if sort:
+        column = ROUTE_SORT_COLUMNS[sort.removeprefix("-")]
+        order = column.desc() if sort.startswith("-") else column.asc()
+        query = query.order_by(order.nulls_last(), models.Route.id)
+    rows = db.execute(query.limit(limit).offset(offset)).mappings()
+    return [_flatten_route_row(row) for row in rows]
+
+
+def get_route_rows_by_ids(db: Session, route_ids: list[int]) -> list[dict]:
+    """Flattened route rows in the order of ``route_ids``, skipping missing ones."""
+    if not route_ids:
+        return []
+    rows = db.execute(
+        select(*models.Route.__table__.c).where(models.Route.id.in_(route_ids))
+    ).mappings()
+    routes = {row["id"]: _flatten_route_row(row) for row in rows}
+    return [routes[route_id] for route_id in route_ids if route_id in routes]
+
+
+def _flatten_route_row(row) -> dict:
+    route = dict(row)
+    route.update(route.pop("details") or {})
+    return route
+
+
+def search_routes(
+    db: Session,
+    q: str,
+    difficulty: str | None = None,
+    min_distance: float | None = None,
+    max_distance: float | None = None,
+    route_type: str | None = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[dict]:
+    """Full-text route search, best match first, as flattened rows."""
+    filters = _route_filters(difficulty, min_distance, max_distance, route_type)
+    if db.get_bind().dialect.name == "postgresql":
+        search_vector = literal_column("routes.search_vector")
+        query = func.websearch_to_tsquery("english", q)
+        rank = func.ts_rank_cd(search_vector, query) + func.similarity(models.Route.name, q)
+        rows = db.execute(
+            select(*models.Route.__table__.c)
+            .where(or_(search_vector.op("@@")(query), models.Route.name.op("%")(q)), *filters)
+            .order_by(rank.desc(), models.Route.id)
+            .limit(limit)
+            .offset(offset)
+        ).mappings()
+        return [_flatten_route_row(row) for row in rows]
+
+    ranked = route_search_index.search(q)
+    if not ranked:
+        return []
+    if filters:
+        matching = set(db.scalars(
+            select(models.Route.id).where(models.Route.id.in_([route_id for route_id, _ in ranked]), *filters)
+        ))
+        ranked = [item for item in ranked if item[0] in matching]
+    return get_route_rows_by_ids(db, [route_id for route_id, _ in ranked[offset:offset + limit]])
 
 
 def get_route_by_id(db: Session, route_id: int) -> models.Route | None:
     return db.query(models.Route).filter(models.Route.id == route_id).first()
 
 
+def get_route_names(db: Session, route_ids: list[int]) -> dict[int, str]:
+    if not route_ids:
+        return {}
+    return dict(db.execute(select(models.Route.id, models.Route.name).where(models.Route.id.in_(route_ids))).all())
+
+
+def get_route_names_by_prefix(db: Session, prefix: str, limit: int) -> list[tuple[int, str]]:
+    return [tuple(row) for row in db.execute(
+        select(models.Route.id, models.Route.name)
+        .where(func.lower(models.Route.name).startswith(prefix.lower(), autoescape=True))
+        .order_by(func.lower(models.Route.name))
+        .limit(limit)
+    )]
+
+
+def delete_route(db: Session, route_id: int) -> bool:
+    # rides on the route go with it through ON DELETE CASCADE
+    deleted = db.execute(
+        delete(models.Route).where(models.Route.id == route_id).returning(models.Route.id)
+    ).first()
+    return deleted is not None
+
+
 def create_ride(
     db: Session,
-    rider_id: int,
     route_id: int,
     bike_id: int,
     duration_minutes: int | None = None,
     notes: str | None = None,
-) -> models.Ride:
-    ride = models.Ride(
-        rider_id=rider_id,
-        route_id=route_id,
-        bike_id=bike_id,
-        duration_minutes=duration_minutes,
-        notes=notes,
+) -> tuple[models.Ride, str] | None:
+    """Log a ride for the bike's owner in a single INSERT ... SELECT.
+
+    The rider is taken from the bike and both the bike and route must exist;
+    otherwise nothing is inserted and None is returned. Returns the ride with
+    its rider's experience level.
+    """
+    source = (
+        select(
+            models.Bike.owner_id,
+            models.Route.id,
+            models.Bike.id,
+            literal(duration_minutes, Integer),
+            literal(notes, Text),
+        )
+        .join(models.Route, models.Route.id == route_id)
+        .where(models.Bike.id == bike_id)
     )
-    db.add(ride)
-    db.flush()
-    db.refresh(ride)
-    return ride
+    row = db.execute(
+        insert(models.Ride)
+        .from_select(
+            ["rider_id", "route_id", "bike_id", "duration_minutes", "notes"],
+            source,
+        )
+        .returning(models.Ride, _owner_experience_level(bike_id))
+    ).one_or_none()
+    return tuple(row) if row else None
+
+
+def _owner_experience_level(bike_id: int):
+    # Nested rather than joined: SQLite drops table names inside RETURNING,
+    # which only stays unambiguous with one table per SELECT.
+    owner_id = select(models.Bike.owner_id).where(models.Bike.id == bike_id).scalar_subquery()
+    return select(models.Rider.experience_level).where(models.Rider.id == owner_id).scalar_subquery()
 
 
 def get_rides_by_rider(db: Session, rider_id: int) -> list[models.Ride]:
     return db.query(models.Ride).filter(models.Ride.rider_id == rider_id).all()
 
 
+def _rides_before(after: tuple[datetime, int]):
+    """Rides that sort after ``after`` in newest-first (completed_at, id) order.
+
+    Spelled with a plain bound on completed_at so the (rider_id, completed_at)
+    index can seek to the cursor.
+    """
+    rides = models.Ride.__table__
+    completed_at, ride_id = after
+    return and_(
+        rides.c.completed_at <= completed_at,
+        or_(rides.c.completed_at < completed_at, rides.c.id < ride_id),
+    )
+
+
+def get_ride_history_rows(
+    db: Session,
+    rider_id: int,
+    completed_from: datetime | None = None,
+    completed_to: datetime | None = None,
+    after: tuple[datetime, int] | None = None,
+    limit: int = 50,
+    with_summary: bool = False,
+) -> tuple[bool, list[dict], dict | None]:
+    """One page of a rider's rides, newest first, in a single statement.
+
+    ``after`` is the (completed_at, id) of the last ride already seen. The
+    summary covers the whole from/to window, not just the page. Returns
+    whether the rider exists, the page rows and the summary.
+    """
+    riders, rides = models.Rider.__table__, models.Ride.__table__
+    window = [rides.c.rider_id == rider_id]
+    if completed_from is not None:
+        window.append(rides.c.completed_at >= completed_from)
+    if completed_to is not None:
+        window.append(rides.c.completed_at < completed_to)
+
+    page_filters = list(window)
+    if after is not None:
+        page_filters.append(_rides_before(after))
+    page = (
+        select(*rides.c)
+        .where(*page_filters)
+        .order_by(rides.c.completed_at.desc(), rides.c.id.desc())
+        .limit(limit)
+        .subquery("page")
+    )
+
+    # Anchor on the rider row so an unknown rider (no rows) can be told apart
+    # from an empty page (one row of NULL ride columns).
+    columns = [riders.c.id.label("known_rider_id"), *page.c]
+    from_clause = riders.outerjoin(page, true())
+    if with_summary:
+        summary = (
+            select(
+                func.count().label("ride_count"),
+                func.coalesce(func.sum(rides.c.duration_minutes), 0).label("total_duration_minutes"),
+            )
+            .where(*window)
+            .subquery("summary")
+        )
+        columns += [summary.c.ride_count, summary.c.total_duration_minutes]
+        from_clause = from_clause.join(summary, true())
+    stmt = (
+        select(*columns)
+        .select_from(from_clause)
+        .where(riders.c.id == rider_id)
+        .order_by(page.c.completed_at.desc(), page.c.id.desc())
+    )
+    rows = db.execute(stmt).mappings().all()
+    if not rows:
+        return False, [], None
+
+    page_rows = [{name: row[name] for name in page.c.keys()} for row in rows if row["id"] is not None]
+    totals = None
+    if with_summary:
+        totals = {
+            "ride_count": rows[0]["ride_count"],
+            "total_duration_minutes": rows[0]["total_duration_minutes"],
+        }
+    return True, page_rows, totals
+
+
 def get_ride_by_id(db: Session, ride_id: int) -> models.Ride | None:
     return db.query(models.Ride).filter(models.Ride.id == ride_id).first()
 
 
-def delete_ride(db: Session, ride_id: int) -> bool:
-    ride = get_ride_by_id(db, ride_id)
-    if not ride:
+def delete_ride(db: Session, ride_id: int) -> dict | None:
+    """Delete a ride and its telemetry; returns its route_id, completed_at, duration_minutes and rider's experience_level, or None."""
+    deleted = db.execute(
+        delete(models.Ride)
+        .where(models.Ride.id == ride_id)
+        .returning(
+            models.Ride.route_id,
+            models.Ride.completed_at,
+            models.Ride.duration_minutes,
+            select(models.Rider.experience_level)
+            .where(models.Rider.id == models.Ride.rider_id)
+            .correlate_except(models.Rider)
+            .scalar_subquery()
+            .label("experience_level"),
+        )
+    ).mappings().first()
+    if not deleted:
+        return None
+    db.execute(delete(models.RideTelemetry).where(models.RideTelemetry.ride_id == ride_id))
+    return dict(deleted)
+
+
+def save_ride_telemetry(db: Session, ride_id: int, telemetry: dict) -> bool:
+    """Insert or replace a ride's telemetry, filed under its rider and route; False if there is no such ride."""
+    table = models.RideTelemetry.__table__
+    columns = ["ride_id", "rider_id", "route_id", *telemetry, "updated_at"]
+    stmt = _dialect_insert(db, models.RideTelemetry).from_select(
+        columns,
+        select(
+            models.Ride.id,
+            models.Ride.rider_id,
+            models.Ride.route_id,
+            *(literal(value, table.c[column].type) for column, value in telemetry.items()),
+            literal(datetime.utcnow(), DateTime),
+        ).where(models.Ride.id == ride_id),
+    )
+    saved = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["ride_id"],
+            set_={column: stmt.excluded[column] for column in columns[1:]},
+        ).returning(models.RideTelemetry.ride_id)
+    ).first()
+    return saved is not None
+
+
+_TELEMETRY_COLUMNS = ("times", "path", "elevations", "accelerations")
+
+
+def get_ride_telemetry_summary(db: Session, ride_id: int) -> dict | None:
+    """A ride's telemetry metrics and encoded size, without reading the columns themselves."""
+    table = models.RideTelemetry.__table__
+    encoded_bytes = sum(func.coalesce(func.length(table.c[column]), 0) for column in _TELEMETRY_COLUMNS)
+    metrics = [column for column in table.c if column.name not in _TELEMETRY_COLUMNS]
+    summary = db.execute(
+        select(*metrics, encoded_bytes.label("encoded_bytes")).where(table.c.ride_id == ride_id)
+    ).mappings().first()
+    return dict(summary) if summary else None
+
+
+def get_ride_telemetry_columns(db: Session, ride_id: int) -> dict | None:
+    """A ride's started_at and encoded telemetry columns."""
+    table = models.RideTelemetry.__table__
+    row = db.execute(
+        select(table.c.started_at, *(table.c[column] for column in _TELEMETRY_COLUMNS))
+        .where(table.c.ride_id == ride_id)
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def get_feed_rows(
+    db: Session,
+    ride_ids: list[int],
+    pull_rider_ids: list[int],
+    after: tuple[datetime, int] | None,
+    limit: int,
+) -> list[dict]:
+    """A feed page in one statement: the given rides plus the latest rides of the pulled riders.
+
+    ``ride_ids`` come from the reader's inbox and are already past the cursor;
+    rides deleted since they were pushed simply drop out.
+    """
+    rides = models.Ride.__table__
+    order = (rides.c.completed_at.desc(), rides.c.id.desc())
+    parts = []
+    if ride_ids:
+        parts.append(select(*rides.c).where(rides.c.id.in_(ride_ids)))
+    if pull_rider_ids:
+        pulled = select(*rides.c).where(rides.c.rider_id.in_(pull_rider_ids))
+        if after is not None:
+            pulled = pulled.where(_rides_before(after))
+        pulled = pulled.order_by(*order).limit(limit).subquery("pulled")
+        parts.append(select(*pulled.c))
+    if not parts:
+        return []
+    feed = union(*parts).subquery("feed")
+    stmt = select(*feed.c).order_by(feed.c.completed_at.desc(), feed.c.id.desc()).limit(limit)
+    return [{name: row[name] for name in rides.c.keys()} for row in db.execute(stmt).mappings()]
+
+
+def notify(db: Session, channel: str, payload: dict) -> None:
+    """Send a notification, delivered to listening workers when the transaction commits."""
+    db.execute(select(func.pg_notify(channel, orjson.dumps(payload).decode())))
+
+
+def get_latest_ride_keys(db: Session, rider_ids: list[int], limit: int) -> list[tuple[datetime, int]]:
+    """(completed_at, id) of the newest rides by any of the riders, newest first."""
+    rides = models.Ride.__table__
+    stmt = (
+        select(rides.c.completed_at, rides.c.id)
+        .where(rides.c.rider_id.in_(rider_ids))
+        .order_by(rides.c.completed_at.desc(), rides.c.id.desc())
+        .limit(limit)
+    )
+    return [tuple(row) for row in db.execute(stmt)]
+
+
+def add_track_points(db: Session, points: list[dict]) -> None:
+    """Bulk insert sampled group ride positions."""
+    db.execute(insert(models.GroupRideTrackPoint), points)
+
+
+def get_group_ride_track(db: Session, group_ride_id: int, rider_id: int | None = None) -> list[dict]:
+    """A group ride's stored track points, per rider in time order."""
+    points = models.GroupRideTrackPoint.__table__
+    stmt = select(*points.c).where(points.c.group_ride_id == group_ride_id)
+    if rider_id is not None:
+        stmt = stmt.where(points.c.rider_id == rider_id)
+    stmt = stmt.order_by(points.c.rider_id, points.c.recorded_at, points.c.id)
+    return [{name: row[name] for name in points.c.keys()} for row in db.execute(stmt).mappings()]
+
+
+def create_group_ride(
+    db: Session,
+    name: str,
+    route_id: int,
+    organizer_id: int,
+    starts_at: datetime,
+    capacity: int,
+) -> dict | None:
+    """Create a group ride with ``capacity`` free slots.
+
+    The route and organizer must exist; otherwise nothing is inserted and
+    None is returned.
+    """
+    source = (
+        select(
+            literal(name, String),
+            models.Route.id,
+            models.Rider.id,
+            literal(starts_at, DateTime),
+            literal(capacity, Integer),
+        )
+        .join(models.Route, models.Route.id == route_id)
+        .where(models.Rider.id == organizer_id)
+    )
+    group_rides = models.GroupRide.__table__
+    row = db.execute(
+        insert(group_rides)
+        .from_select(["name", "route_id", "organizer_id", "starts_at", "capacity"], source)
+        .returning(*group_rides.c)
+    ).mappings().one_or_none()
+    if row is None:
+        return None
+    db.execute(
+        insert(models.GroupRideSlot),
+        [{"group_ride_id": row["id"], "slot": slot} for slot in range(1, capacity + 1)],
+    )
+    return {**{name: row[name] for name in group_rides.c.keys()}, "attendees": 0}
+
+
+def get_group_ride(db: Session, group_ride_id: int) -> dict | None:
+    """A group ride with its number of attendees."""
+    group_rides, slots = models.GroupRide.__table__, models.GroupRideSlot.__table__
+    attendees = (
+        select(func.count())
+        .where(slots.c.group_ride_id == group_rides.c.id, slots.c.rider_id.is_not(None))
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(*group_rides.c, attendees.label("attendees")).where(group_rides.c.id == group_ride_id)
+    ).mappings().one_or_none()
+    return None if row is None else {name: row[name] for name in (*group_rides.c.keys(), "attendees")}
+
+
+def claim_group_ride_slot(db: Session, group_ride_id: int, rider_id: int) -> dict | None:
+    """RSVP a rider by claiming a free slot. Returns None when none is free.
+
+    One statement: waiting on slots locked by RSVPs in flight happens inside
+    the claim_group_ride_slot database function. Raises IntegrityError if the
+    rider already holds a slot on the ride or does not exist.
+    """
+    claimed = db.execute(
+        text(
+            "SELECT rider_id, slot, claimed_at "
+            "FROM claim_group_ride_slot(:group_ride_id, :rider_id, :claimed_at)"
+        ),
+        {"group_ride_id": group_ride_id, "rider_id": rider_id, "claimed_at": datetime.utcnow()},
+    ).mappings().one_or_none()
+    return None if claimed is None else dict(claimed)
+
+
+def release_group_ride_slot(db: Session, group_ride_id: int, rider_id: int) -> bool:
+    slots = models.GroupRideSlot.__table__
+    released = db.execute(
+        update(slots)
+        .where(slots.c.group_ride_id == group_ride_id, slots.c.rider_id == rider_id)
+        .values(rider_id=None, claimed_at=None)
+        .returning(slots.c.slot)
+    ).first()
+    return released is not None
+
+
+def get_group_ride_rsvps(db: Session, group_ride_id: int) -> list[dict]:
+    """The riders holding a slot on a group ride, in slot order."""
+    slots = models.GroupRideSlot.__table__
+    stmt = (
+        select(slots.c.rider_id, slots.c.slot, slots.c.claimed_at)
+        .where(slots.c.group_ride_id == group_ride_id, slots.c.rider_id.is_not(None))
+        .order_by(slots.c.slot)
+    )
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
+def has_group_ride_rsvp(db: Session, group_ride_id: int, rider_id: int) -> bool:
+    slots = models.GroupRideSlot.__table__
+    return db.execute(
+        select(slots.c.slot).where(slots.c.group_ride_id == group_ride_id, slots.c.rider_id == rider_id)
+    ).first() is not None
+
+
+def get_rsvp_refusal(db: Session, group_ride_id: int, rider_id: int) -> tuple[bool, bool, bool]:
+    """Why an RSVP claimed nothing, in one query.
+
+    Returns ``(group_ride_exists, rider_exists, already_going)``.
+    """
+    slots = models.GroupRideSlot.__table__
+    row = db.execute(select(
+        select(models.GroupRide.id).where(models.GroupRide.id == group_ride_id).exists(),
+        select(models.Rider.id).where(models.Rider.id == rider_id).exists(),
+        select(slots.c.slot).where(slots.c.group_ride_id == group_ride_id, slots.c.rider_id == rider_id).exists(),
+    )).one()
+    return tuple(row)
+
+
+def _dialect_insert(db: Session, table):
+    """An INSERT supporting ``on_conflict_do_nothing``/``on_conflict_do_update`` on the session's dialect."""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def lock_route_popularity_table(db: Session) -> None:
+    """Serialize route popularity backfills across workers until the transaction ends."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE route_popularity IN EXCLUSIVE MODE"))
+
+
+def has_route_popularity(db: Session) -> bool:
+    return db.execute(select(models.RoutePopularity.route_id).limit(1)).first() is not None
+
+
+def iter_ride_riders(
+    db: Session,
+    completed_from: datetime | None = None,
+    route_ids: list[int] | None = None,
+    batch_size: int = 100_000,
+):
+    """(route_id, rider_id, completed_at) of logged rides, optionally on some routes only, in batches."""
+    rides = models.Ride.__table__
+    stmt = select(rides.c.route_id, rides.c.rider_id, rides.c.completed_at)
+    if completed_from is not None:
+        stmt = stmt.where(rides.c.completed_at >= completed_from)
+    if route_ids is not None:
+        stmt = stmt.where(rides.c.route_id.in_(route_ids))
+    for batch in db.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        yield [tuple(row) for row in batch]
+
+
+def iter_ride_durations(db: Session, batch_size: int = 100_000):
+    """(route_id, rider experience_level, duration_minutes) of timed rides, in batches."""
+    stmt = (
+        select(models.Ride.route_id, models.Rider.experience_level, models.Ride.duration_minutes)
+        .join(models.Rider, models.Rider.id == models.Ride.rider_id)
+        .where(models.Ride.duration_minutes.is_not(None))
+    )
+    for batch in db.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        yield [tuple(row) for row in batch]
+
+
+def add_route_popularity(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(models.RoutePopularity), rows)
+
+
+def add_route_daily_riders(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(models.RouteDailyRiders), rows)
+
+
+def lock_route_popularity(db: Session, route_ids: list[int], updated_at: datetime) -> list[dict]:
+    """Lock the popularity rows of existing routes, creating empty ones first; routes since deleted are skipped."""
+    table = models.RoutePopularity.__table__
+    db.execute(
+        _dialect_insert(db, table)
+        .from_select(
+            ["route_id", "riders", "rides", "updated_at"],
+            select(models.Route.id, literal(b""), literal(0), literal(updated_at, DateTime))
+            .where(models.Route.id.in_(route_ids)),
+        )
+        .on_conflict_do_nothing()
+    )
+    rows = db.execute(
+        select(table).where(table.c.route_id.in_(route_ids)).order_by(table.c.route_id).with_for_update()
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def lock_route_daily_riders(db: Session, keys: list[tuple[int, date]]) -> list[dict]:
+    """Lock the (route_id, day) rows of existing routes, creating empty ones first."""
+    table = models.RouteDailyRiders.__table__
+    days: dict[date, list[int]] = {}
+    for route_id, day in keys:
+        days.setdefault(day, []).append(route_id)
+    for day, route_ids in days.items():
+        db.execute(
+            _dialect_insert(db, table)
+            .from_select(
+                ["route_id", "day", "riders"],
+                select(models.Route.id, literal(day, Date), literal(b"")).where(models.Route.id.in_(route_ids)),
+            )
+            .on_conflict_do_nothing()
+        )
+    rows = db.execute(
+        select(table)
+        .where(tuple_(table.c.route_id, table.c.day).in_(keys))
+        .order_by(table.c.route_id, table.c.day)
+        .with_for_update()
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def update_route_popularity(db: Session, rows: list[dict]) -> None:
+    """Bulk update popularity rows by route_id."""
+    db.execute(update(models.RoutePopularity), rows)
+
+
+def update_route_daily_riders(db: Session, rows: list[dict]) -> None:
+    """Bulk update daily rider rows by (route_id, day)."""
+    db.execute(update(models.RouteDailyRiders), rows)
+
+
+def delete_route_daily_riders_before(db: Session, day: date) -> None:
+    db.execute(delete(models.RouteDailyRiders).where(models.RouteDailyRiders.day < day))
+
+
+def delete_route_daily_riders(db: Session, route_ids: list[int]) -> None:
+    db.execute(delete(models.RouteDailyRiders).where(models.RouteDailyRiders.route_id.in_(route_ids)))
+
+
+def get_route_popularity(db: Session, updated_since: datetime | None = None):
+    """Popularity rows, optionally only those written since a time, streamed."""
+    table = models.RoutePopularity.__table__
+    stmt = select(table)
+    if updated_since is not None:
+        stmt = stmt.where(table.c.updated_at >= updated_since)
+    return db.execute(stmt.execution_options(yield_per=10_000)).mappings()
+
+
+def get_route_daily_riders(db: Session, since: date, route_ids: list[int] | None = None):
+    """Daily rider rows from a day on, optionally for some routes only, streamed."""
+    table = models.RouteDailyRiders.__table__
+    stmt = select(table).where(table.c.day >= since)
+    if route_ids is not None:
+        stmt = stmt.where(table.c.route_id.in_(route_ids))
+    return db.execute(stmt.execution_options(yield_per=10_000)).mappings()
+
+
+def save_route_geometry(
+    db: Session,
+    route_id: int,
+    point_count: int,
+    path: bytes,
+    footprint_level: int,
+    footprint: bytes,
+    levels: list[dict],
+) -> bool:
+    """Insert or replace a route's geometry and its simplified levels; False if there is no such route."""
+    columns = ["route_id", "point_count", "path", "footprint_level", "footprint", "updated_at"]
+    stmt = _dialect_insert(db, models.RouteGeometry).from_select(
+        columns,
+        select(
+            models.Route.id,
+            literal(point_count, Integer),
+            literal(path, LargeBinary),
+            literal(footprint_level, Integer),
+            literal(footprint, LargeBinary),
+            literal(datetime.utcnow(), DateTime),
+        ).where(models.Route.id == route_id),
+    )
+    saved = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["route_id"],
+            set_={column: stmt.excluded[column] for column in columns[1:]},
+        ).returning(models.RouteGeometry.route_id)
+    ).first()
+    if saved is None:
         return False
-    db.delete(ride)
+    replace_route_geometry_levels(db, [route_id], [{"route_id": route_id, **level} for level in levels])
     return True
+
+
+def replace_route_geometry_levels(db: Session, route_ids: list[int], rows: list[dict]) -> None:
+    db.execute(delete(models.RouteGeometryLevel).where(models.RouteGeometryLevel.route_id.in_(route_ids)))
+    if rows:
+        db.execute(insert(models.RouteGeometryLevel), rows)
+
+
+def get_route_geometry(db: Session, route_id: int, zoom: int | None = None) -> dict | None:
+    """A route's path as (zoom, point_count, path): the shallowest level at least ``zoom``, else the full path.
+
+    The full path has zoom None. Returns None if the route has no geometry.
+    """
+    if zoom is not None:
+        levels = models.RouteGeometryLevel.__table__
+        level = db.execute(
+            select(levels.c.zoom, levels.c.point_count, levels.c.path)
+            .where(levels.c.route_id == route_id, levels.c.zoom >= zoom)
+            .order_by(levels.c.zoom)
+            .limit(1)
+        ).mappings().first()
+        if level is not None:
+            return dict(level)
+    geometries = models.RouteGeometry.__table__
+    full = db.execute(
+        select(literal(None, Integer).label("zoom"), geometries.c.point_count, geometries.c.path)
+        .where(geometries.c.route_id == route_id)
+    ).mappings().first()
+    return dict(full) if full else None
+
+
+def get_route_match_paths(db: Session, route_ids: list[int], zoom: int) -> list[tuple[int, str, bytes]]:
+    """(route_id, name, path) of routes with geometry, each path the shallowest level at least ``zoom``, else the full one."""
+    levels = models.RouteGeometryLevel.__table__
+    geometries = models.RouteGeometry.__table__
+    level = (
+        select(
+            levels.c.route_id,
+            levels.c.path,
+            func.row_number().over(partition_by=levels.c.route_id, order_by=levels.c.zoom).label("rank"),
+        )
+        .where(levels.c.route_id.in_(route_ids), levels.c.zoom >= zoom)
+        .subquery("level")
+    )
+    stmt = (
+        select(geometries.c.route_id, models.Route.name, func.coalesce(level.c.path, geometries.c.path))
+        .join(models.Route, models.Route.id == geometries.c.route_id)
+        .outerjoin(level, and_(level.c.route_id == geometries.c.route_id, level.c.rank == 1))
+        .where(geometries.c.route_id.in_(route_ids))
+    )
+    return [tuple(row) for row in db.execute(stmt)]
+
+
+def get_route_footprints(db: Session, batch_size: int = 1000):
+    """(route_id, footprint_level, footprint, path) of every route with geometry."""
+    geometries = models.RouteGeometry.__table__
+    return db.execute(
+        select(geometries.c.route_id, geometries.c.footprint_level, geometries.c.footprint, geometries.c.path)
+        .execution_options(yield_per=batch_size)
+    ).tuples()
+
+
+def iter_route_paths(db: Session, batch_size: int = 1000):
+    """(route_id, path) of every route with geometry, in batches."""
+    geometries = models.RouteGeometry.__table__
+    stmt = select(geometries.c.route_id, geometries.c.path).order_by(geometries.c.route_id)
+    for batch in db.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        yield [tuple(row) for row in batch]
+
+
+def update_route_footprints(db: Session, rows: list[dict]) -> None:
+    """Bulk update footprints by route_id."""
+    db.execute(update(models.RouteGeometry), rows)
+
+
+def create_location(db: Session, name: str, location_type: str, latitude: float, longitude: float) -> models.Location:
+    return db.scalars(
+        insert(models.Location)
+        .values(name=name, location_type=location_type, latitude=latitude, longitude=longitude)
+        .returning(models.Location)
+    ).one()
+
+
+def get_location_by_id(db: Session, location_id: int) -> models.Location | None:
+    return db.get(models.Location, location_id)
+
+
+def get_location_rows(
+    db: Session,
+    location_type: str | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+) -> list[dict]:
+    locations = models.Location.__table__
+    stmt = select(locations).order_by(locations.c.id).limit(limit).offset(offset)
+    if location_type is not None:
+        stmt = stmt.where(locations.c.location_type == location_type)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
+def get_locations_by_ids(db: Session, location_ids: list[int]) -> dict[int, dict]:
+    if not location_ids:
+        return {}
+    locations = models.Location.__table__
+    return {row["id"]: dict(row) for row in db.execute(
+        select(locations).where(locations.c.id.in_(location_ids))
+    ).mappings()}
+
+
+def get_location_points(db: Session, batch_size: int = 10_000):
+    """(id, location_type, latitude, longitude) of every location, streamed."""
+    locations = models.Location.__table__
+    return db.execute(
+        select(locations.c.id, locations.c.location_type, locations.c.latitude, locations.c.longitude)
+        .execution_options(yield_per=batch_size)
+    ).tuples()
+
+
+def delete_location(db: Session, location_id: int) -> bool:
+    deleted = db.execute(
+        delete(models.Location).where(models.Location.id == location_id).returning(models.Location.id)
+    ).first()
+    return deleted is not None
@@ -1,6 +1,7 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from enum import Enum
-from sqlalchemy import String, ForeignKey, DateTime, Float, Text, Integer, Boolean, JSON
+from sqlalchemy import String, ForeignKey, Date, DateTime, Float, LargeBinary, Text, JSON, Index, UniqueConstraint, DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .database import Base
 
@@ -27,6 +28,36 @@ class RouteType(str, Enum):
     COASTAL = "coastal"
 
 
+class LocationType(str, Enum):
+    CITY = "city"
+    VIEWPOINT = "viewpoint"
+    FUEL_STATION = "fuel_station"
+    RESTAURANT = "restaurant"
+    REST_STOP = "rest_stop"
+    BEACH = "beach"
+
+
+ROUTE_TYPE_FIELDS: dict[str, tuple[str, ...]] = {
+    RouteType.SCENIC.value: ("scenic_points", "best_season", "photography_spots"),
+    RouteType.HIGHWAY.value: ("speed_limit", "toll_cost", "rest_stops", "lanes"),
+    RouteType.OFFROAD.value: ("terrain_type", "min_bike_cc", "technical_difficulty", "requires_experience"),
+    RouteType.MOUNTAIN.value: ("elevation_gain", "max_altitude", "hairpin_turns", "oxygen_required"),
+    RouteType.COASTAL.value: ("beach_stops", "lighthouse_count", "seafood_spots", "ocean_view_percentage"),
+}
+
+
+class _RouteDetail:
+    """Read-only attribute view of one key of ``Route.details``."""
+
+    def __set_name__(self, owner, name):
+        self.key = name
+
+    def __get__(self, route, owner=None):
+        if route is None:
+            return self
+        return (route.details or {}).get(self.key)
+
+
 class Rider(Base):
     __tablename__ = "riders"
 
@@ -39,13 +70,17 @@ class Rider(Base):
         DateTime, default=lambda: datetime.now(timezone.utc)
     )
 
+    # Bikes and rides are removed by ON DELETE CASCADE in the database, so the
+    # ORM never has to load them just to delete them.
     bikes: Mapped[list["Bike"]] = relationship(
         back_populates="owner",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     rides: Mapped[list["Ride"]] = relationship(
         back_populates="rider",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -53,7 +88,9 @@ class Bike(Base):
     __tablename__ = "bikes"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    owner_id: Mapped[int] = mapped_column(ForeignKey("riders.id"))
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("riders.id", ondelete="CASCADE"), index=True
+    )
     brand: Mapped[str] = mapped_column(String(50))
     model: Mapped[str] = mapped_column(String(50))
     year: Mapped[int] = mapped_column()
@@ -74,48 +111,77 @@ class Route(Base):
     difficulty: Mapped[str] = mapped_column(String(20), index=True)
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Derived from the fields above by app.services.route_metrics.
+    estimated_minutes: Mapped[float | None] = mapped_column(Float, nullable=True, index=True)
+    difficulty_score: Mapped[float | None] = mapped_column(Float, nullable=True, index=True)
     
+    # Type-specific attributes (see ROUTE_TYPE_FIELDS) live in one JSONB
+    # payload instead of ~20 mostly-NULL columns.
+    details: Mapped[dict] = mapped_column(
+        JSON().with_variant(JSONB(), "postgresql"), default=dict
+    )
+
     # Scenic route fields
-    scenic_points: Mapped[list | None] = mapped_column(JSON, nullable=True)
-    best_season: Mapped[str | None] = mapped_column(String(50), nullable=True)
-    photography_spots: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    
+    scenic_points = _RouteDetail()
+    best_season = _RouteDetail()
+    photography_spots = _RouteDetail()
+
     # Highway route fields
-    speed_limit: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    toll_cost: Mapped[float | None] = mapped_column(Float, nullable=True)
-    rest_stops: Mapped[list | None] = mapped_column(JSON, nullable=True)
-    lanes: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    
+    speed_limit = _RouteDetail()
+    toll_cost = _RouteDetail()
+    rest_stops = _RouteDetail()
+    lanes = _RouteDetail()
+
     # Offroad route fields
-    terrain_type: Mapped[str | None] = mapped_column(String(50), nullable=True)
-    min_bike_cc: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    technical_difficulty: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    requires_experience: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
-    
+    terrain_type = _RouteDetail()
+    min_bike_cc = _RouteDetail()
+    technical_difficulty = _RouteDetail()
+    requires_experience = _RouteDetail()
+
     # Mountain route fields
-    elevation_gain: Mapped[float | None] = mapped_column(Float, nullable=True)
-    max_altitude: Mapped[float | None] = mapped_column(Float, nullable=True)
-    hairpin_turns: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    oxygen_required: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
-    
+    elevation_gain = _RouteDetail()
+    max_altitude = _RouteDetail()
+    hairpin_turns = _RouteDetail()
+    oxygen_required = _RouteDetail()
+
     # Coastal route fields
-    beach_stops: Mapped[list | None] = mapped_column(JSON, nullable=True)
-    lighthouse_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    seafood_spots: Mapped[list | None] = mapped_column(JSON, nullable=True)
-    ocean_view_percentage: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    beach_stops = _RouteDetail()
+    lighthouse_count = _RouteDetail()
+    seafood_spots = _RouteDetail()
+    ocean_view_percentage = _RouteDetail()
 
     rides: Mapped[list["Ride"]] = relationship(
         back_populates="route",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
+class Location(Base):
+    """A typed point of interest: a fuel station, restaurant, viewpoint and so on (see app.services.route_corridor)."""
+
+    __tablename__ = "locations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(200))
+    location_type: Mapped[str] = mapped_column(String(20), index=True)
+    latitude: Mapped[float] = mapped_column(Float)
+    longitude: Mapped[float] = mapped_column(Float)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Ride(Base):
     __tablename__ = "rides"
+    __table_args__ = (
+        # History lookups filter on the owner and walk completed_at in order;
+        # the leading column also serves the ON DELETE CASCADE lookups.
+        Index("ix_rides_rider_id_completed_at", "rider_id", "completed_at"),
+        Index("ix_rides_route_id_completed_at", "route_id", "completed_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    rider_id: Mapped[int] = mapped_column(ForeignKey("riders.id"))
-    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id"))
+    rider_id: Mapped[int] = mapped_column(ForeignKey("riders.id", ondelete="CASCADE"))
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"))
     bike_id: Mapped[int] = mapped_column(ForeignKey("bikes.id"))
     completed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     duration_minutes: Mapped[int | None] = mapped_column(nullable=True)
@@ -123,3 +189,287 @@ class Ride(Base):
 
     rider: Mapped["Rider"] = relationship(back_populates="rides")
     route: Mapped["Route"] = relationship(back_populates="rides")
+
+
+class RideTelemetry(Base):
+    """A ride's recorded samples as compressed columns, with the metrics computed from them (see app.services.ride_telemetry)."""
+
+    __tablename__ = "ride_telemetry"
+
+    # No foreign key to rides: a partitioned table's key includes completed_at.
+    ride_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    rider_id: Mapped[int] = mapped_column(ForeignKey("riders.id", ondelete="CASCADE"), index=True)
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), index=True)
+    point_count: Mapped[int] = mapped_column()
+    started_at: Mapped[datetime] = mapped_column(DateTime)
+    duration_seconds: Mapped[float] = mapped_column(Float)
+    distance_m: Mapped[float] = mapped_column(Float)
+    moving_seconds: Mapped[float] = mapped_column(Float)
+    max_speed_kmh: Mapped[float] = mapped_column(Float)
+    elevation_gain_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    elevation_loss_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    min_elevation_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_elevation_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    times: Mapped[bytes] = mapped_column(LargeBinary)
+    path: Mapped[bytes] = mapped_column(LargeBinary)
+    elevations: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    accelerations: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class GroupRide(Base):
+    """A planned ride that riders RSVP to, up to its capacity."""
+
+    __tablename__ = "group_rides"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(200))
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), index=True)
+    organizer_id: Mapped[int] = mapped_column(ForeignKey("riders.id", ondelete="CASCADE"), index=True)
+    starts_at: Mapped[datetime] = mapped_column(DateTime)
+    capacity: Mapped[int] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class GroupRideSlot(Base):
+    """One place on a group ride, created free up front; an RSVP claims one.
+
+    Concurrent RSVPs each lock a different free row (FOR UPDATE SKIP LOCKED)
+    instead of all updating one attendee counter, and a ride can never have
+    more claimed slots than it has rows. Slots are claimed through the
+    claim_group_ride_slot database function below.
+    """
+
+    __tablename__ = "group_ride_slots"
+    __table_args__ = (
+        UniqueConstraint("group_ride_id", "rider_id", name="uq_group_ride_slots_group_ride_id_rider_id"),
+    )
+
+    group_ride_id: Mapped[int] = mapped_column(
+        ForeignKey("group_rides.id", ondelete="CASCADE"), primary_key=True
+    )
+    slot: Mapped[int] = mapped_column(primary_key=True)
+    # Deleting a rider frees their slots.
+    rider_id: Mapped[int | None] = mapped_column(
+        ForeignKey("riders.id", ondelete="SET NULL"), nullable=True, index=True
+    )
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class GroupRideTrackPoint(Base):
+    """A sampled position of one rider during a live group ride."""
+
+    __tablename__ = "group_ride_track_points"
+    __table_args__ = (
+        Index("ix_group_ride_track_points_group_ride_id_rider_id_recorded_at", "group_ride_id", "rider_id", "recorded_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    group_ride_id: Mapped[int] = mapped_column(ForeignKey("group_rides.id", ondelete="CASCADE"))
+    rider_id: Mapped[int] = mapped_column(ForeignKey("riders.id", ondelete="CASCADE"), index=True)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime)
+    latitude: Mapped[float] = mapped_column(Float)
+    longitude: Mapped[float] = mapped_column(Float)
+    speed_kmh: Mapped[float | None] = mapped_column(Float, nullable=True)
+    heading: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+
+def _route_type_index(name: str, route_type: RouteType, expression) -> Index:
+    """Partial index over one type's attribute, covering only that type's rows."""
+    only_type = Route.route_type == route_type.value
+    return Index(name, expression, postgresql_where=only_type, sqlite_where=only_type)
+
+
+_route_type_index("ix_routes_scenic_best_season", RouteType.SCENIC, Route.details["best_season"].as_string())
+_route_type_index("ix_routes_highway_speed_limit", RouteType.HIGHWAY, Route.details["speed_limit"].as_integer())
+_route_type_index("ix_routes_offroad_min_bike_cc", RouteType.OFFROAD, Route.details["min_bike_cc"].as_integer())
+_route_type_index("ix_routes_mountain_elevation_gain", RouteType.MOUNTAIN, Route.details["elevation_gain"].as_float())
+_route_type_index("ix_routes_coastal_ocean_view", RouteType.COASTAL, Route.details["ocean_view_percentage"].as_integer())
+
+
+# Full-text search is Postgres-only: a generated, weighted tsvector over the
+# route's text (stop names included) with a GIN index, plus a trigram index on
+# the name for fuzzy matches. Other backends use app.services.route_search.
+ROUTE_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE routes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(start_location, '') || ' ' || coalesce(end_location, '')), 'B')
+        || setweight(to_tsvector('english',
+            coalesce(details -> 'scenic_points', '[]'::jsonb)
+            || coalesce(details -> 'beach_stops', '[]'::jsonb)
+            || coalesce(details -> 'seafood_spots', '[]'::jsonb)), 'B')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX ix_routes_search_vector ON routes USING gin (search_vector)",
+    "CREATE INDEX ix_routes_name_trgm ON routes USING gin (name gin_trgm_ops)",
+)
+
+# Schema objects managed by raw DDL rather than the ORM metadata.
+POSTGRES_ONLY_SCHEMA_OBJECTS = {"search_vector", "ix_routes_search_vector", "ix_routes_name_trgm"}
+
+for _statement in ROUTE_SEARCH_DDL:
+    event.listen(Route.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+# New rides are announced on a Postgres channel for app.services.ride_events.
+# The payload leaves out notes, as NOTIFY payloads are capped at 8000 bytes.
+RIDE_EVENTS_CHANNEL = "ride_events"
+
+RIDE_NOTIFY_FUNCTION_DDL = f"""
+    CREATE OR REPLACE FUNCTION notify_ride_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{RIDE_EVENTS_CHANNEL}', json_build_object(
+            'id', NEW.id,
+            'rider_id', NEW.rider_id,
+            'route_id', NEW.route_id,
+            'bike_id', NEW.bike_id,
+            'completed_at', NEW.completed_at,
+            'duration_minutes', NEW.duration_minutes
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+RIDE_NOTIFY_TRIGGER_DDL = (
+    "CREATE TRIGGER rides_notify_created AFTER INSERT ON rides "
+    "FOR EACH ROW EXECUTE FUNCTION notify_ride_created()"
+)
+
+for _statement in (RIDE_NOTIFY_FUNCTION_DDL, RIDE_NOTIFY_TRIGGER_DDL):
+    event.listen(Ride.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+# Claims the lowest free slot of a group ride for a rider, in one round trip
+# however contended the ride is. A SKIP LOCKED claim fails when every free
+# slot is locked by an RSVP in flight; the function then waits on one. If that
+# RSVP rolls back the slot is claimed; if it commits, the locked row no longer
+# matches and nothing is claimed, so it looks again, stopping once no slot is
+# free. Each statement in the loop reads a fresh snapshot.
+GROUP_RIDE_CLAIM_FUNCTION_DDL = """
+    CREATE OR REPLACE FUNCTION claim_group_ride_slot(ride integer, claimant integer, claimed timestamp)
+    RETURNS SETOF group_ride_slots AS $$
+    DECLARE
+        claimed_slot group_ride_slots;
+    BEGIN
+        LOOP
+            UPDATE group_ride_slots SET rider_id = claimant, claimed_at = claimed
+            WHERE group_ride_id = ride AND rider_id IS NULL AND slot = (
+                SELECT slot FROM group_ride_slots
+                WHERE group_ride_id = ride AND rider_id IS NULL
+                ORDER BY slot LIMIT 1 FOR UPDATE SKIP LOCKED
+            )
+            RETURNING * INTO claimed_slot;
+            EXIT WHEN FOUND;
+            IF NOT EXISTS (SELECT FROM group_ride_slots WHERE group_ride_id = ride AND rider_id IS NULL) THEN
+                RETURN;
+            END IF;
+            UPDATE group_ride_slots SET rider_id = claimant, claimed_at = claimed
+            WHERE group_ride_id = ride AND rider_id IS NULL AND slot = (
+                SELECT slot FROM group_ride_slots
+                WHERE group_ride_id = ride AND rider_id IS NULL
+                ORDER BY slot LIMIT 1 FOR UPDATE
+            )
+            RETURNING * INTO claimed_slot;
+            EXIT WHEN FOUND;
+        END LOOP;
+        RETURN NEXT claimed_slot;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+event.listen(
+    GroupRideSlot.__table__, "after_create", DDL(GROUP_RIDE_CLAIM_FUNCTION_DDL).execute_if(dialect="postgresql")
+)
+
+# Follows, riding buddies and rider deletions are announced here, so every
+# worker can drop the neighbour lists and feed inboxes it cached for them.
+SOCIAL_GRAPH_CHANNEL = "social_graph"
+
+
+class RoutePopularity(Base):
+    """Persisted streaming sketches of a route's rides (see app.services.route_popularity)."""
+
+    __tablename__ = "route_popularity"
+
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    # HyperLogLog registers over the ids of every rider who rode the route.
+    riders: Mapped[bytes] = mapped_column(LargeBinary)
+    rides: Mapped[int] = mapped_column(default=0)
+    # log of the time-decayed ride count, anchored at a fixed epoch.
+    trend: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class RouteGeometry(Base):
+    """A route's path and heat-map footprint, compactly encoded (see app.services.geometry)."""
+
+    __tablename__ = "route_geometries"
+
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    point_count: Mapped[int] = mapped_column()
+    path: Mapped[bytes] = mapped_column(LargeBinary)
+    # Cells the path crosses on a grid 2 ** footprint_level cells wide.
+    footprint_level: Mapped[int] = mapped_column()
+    footprint: Mapped[bytes] = mapped_column(LargeBinary)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class RouteGeometryLevel(Base):
+    """A route's path simplified for one zoom level, encoded like ``RouteGeometry.path``."""
+
+    __tablename__ = "route_geometry_levels"
+
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    zoom: Mapped[int] = mapped_column(primary_key=True)
+    point_count: Mapped[int] = mapped_column()
+    path: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class RouteDailyRiders(Base):
+    """HyperLogLog registers over the riders of a route on one day."""
+
+    __tablename__ = "route_daily_riders"
+
+    route_id: Mapped[int] = mapped_column(ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    riders: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+# Writes to what the per-worker catalog indexes hold are announced here, for
+# app.services.catalog_sync, including rows removed by ON DELETE CASCADE. The
+# payload names the table and the id of the route, rider or location whose
+# index entries changed; readers look up the rest.
+CATALOG_CHANNEL = "catalog_changes"
+
+CATALOG_NOTIFY_FUNCTION_DDL = f"""
+    CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+    DECLARE
+        changed jsonb := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+    BEGIN
+        PERFORM pg_notify('{CATALOG_CHANNEL}', json_build_object(
+            'table', TG_TABLE_NAME,
+            'id', (changed ->> TG_ARGV[0])::bigint
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# table -> (column naming the changed entry, columns the indexes are built from)
+CATALOG_TRIGGER_COLUMNS = {
+    Route.__table__: ("id", "name, route_type, distance_km, difficulty, description, details"),
+    RouteGeometry.__table__: ("route_id", "path"),
+    Rider.__table__: ("id", "name, experience_level"),
+    Bike.__table__: ("owner_id", "owner_id, engine_cc"),
+    Location.__table__: ("id", "location_type, latitude, longitude"),
+}
+
+for _table, (_key, _columns) in CATALOG_TRIGGER_COLUMNS.items():
+    for _statement in (
+        CATALOG_NOTIFY_FUNCTION_DDL,
+        f"CREATE TRIGGER {_table.name}_notify_catalog AFTER INSERT OR DELETE OR UPDATE OF {_columns} "
+        f"ON {_table.name} FOR EACH ROW EXECUTE FUNCTION notify_catalog_change('{_key}')",
+    ):
+        event.listen(_table, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,74 @@
+"""Per-request SQL statement budgets.
+
+Every statement a request session sends to PostgreSQL is counted. Endpoints
+declare how many statements a successful request may issue with
+``dependencies=[statement_budget(n)]``; going over the budget logs a warning,
+or fails the request with a 500 when ``QUERY_BUDGET_STRICT`` is set (the test
+suite sets it, to catch round-trip regressions). The count is checked when the
+endpoint returns, before the response is sent. Error paths are not checked so
+they can afford extra lookups to build a precise message.
+"""
+
+import os
+from fastapi import Depends, params
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .database import engine, SessionLocal, get_postgres_session
+
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "").lower() in ("1", "true", "yes")
+
+_COUNTER_KEY = "statement_counter"
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in strict mode when a request issues more statements than budgeted."""
+
+
+class StatementCounter:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+def get_statement_counter(db: Session) -> StatementCounter:
+    return db.info.setdefault(_COUNTER_KEY, StatementCounter())
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _attach_counter(session, transaction, connection):
+    connection.info[_COUNTER_KEY] = get_statement_counter(session)
+
+
+@event.listens_for(engine, "checkin")
+def _detach_counter(dbapi_connection, connection_record):
+    connection_record.info.pop(_COUNTER_KEY, None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = conn.info.get(_COUNTER_KEY)
+    if counter is not None:
+        counter.statements.append(statement)
+
+
+def statement_budget(limit: int) -> params.Depends:
+    """Dependency limiting the number of SQL statements a request may issue."""
+
+    def _enforce_budget(db: Session = Depends(get_postgres_session)):
+        counter = get_statement_counter(db)
+        yield
+        if counter.count > limit:
+            message = (
+                f"Statement budget of {limit} exceeded ({counter.count} statements): "
+                + " | ".join(s.split(None, 1)[0] for s in counter.statements)
+            )
+            if QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    # Function scope: a request-scoped exit would only run once the response is already sent.
+    return Depends(_enforce_budget, scope="function")
@@ -0,0 +1,173 @@
+"""Monthly range partitioning of ``rides`` on ``completed_at`` (PostgreSQL only).
+
+Partitioning is opt-in: ``python -m app.cli partition-rides`` converts the
+table once, and from then on ``ensure_ride_partitions`` (run at startup and by
+``python -m app.cli ensure-ride-partitions``) keeps partitions a few months
+ahead of the clock. Partitions are named ``rides_YYYY_MM``; ``rides_default``
+catches anything outside them, and rows parked there are moved into a month's
+partition when it is created.
+"""
+
+import os
+import re
+from datetime import date, datetime
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from . import postgres_models as models
+
+RIDES_PARTITION_MONTHS_AHEAD = int(os.environ.get("RIDES_PARTITION_MONTHS_AHEAD", "3"))
+
+DEFAULT_PARTITION = "rides_default"
+
+_PARTITION_NAME = re.compile(r"^rides_(\d{4})_(\d{2})$")
+
+# Serializes partition DDL between workers starting at the same time.
+_PARTITION_LOCK_KEY = 0x72696465
+
+
+def is_ride_partition(name: str) -> bool:
+    return name == DEFAULT_PARTITION or _PARTITION_NAME.match(name) is not None
+
+
+def partition_name(month: date) -> str:
+    return f"rides_{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name: str) -> date | None:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _month_of(moment: datetime | date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def rides_partitioned(db: Session) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('rides'))"
+    )).scalar()
+
+
+def list_ride_partitions(db: Session) -> list[str]:
+    """Names of the partitions currently attached to ``rides``."""
+    return list(db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'rides'::regclass ORDER BY c.relname"
+    )).scalars())
+
+
+def _lock_partition_ddl(db: Session) -> None:
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PARTITION_LOCK_KEY})
+
+
+def _create_month_partition(db: Session, month: date) -> None:
+    """Create and attach one month's partition, taking over its rows from the default partition."""
+    name, lower, upper = partition_name(month), month, next_month(month)
+    db.execute(text(f"CREATE TABLE {name} (LIKE rides INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE completed_at >= :lower AND completed_at < :upper RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"lower": lower, "upper": upper},
+    )
+    db.execute(text(
+        f"ALTER TABLE rides ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    logger.info(f"Created ride partition {name}")
+
+
+def ensure_ride_partitions(db: Session, months_ahead: int = RIDES_PARTITION_MONTHS_AHEAD) -> list[str]:
+    """Create missing partitions from the current month to ``months_ahead`` months out.
+
+    Does nothing unless ``rides`` is partitioned. Months that were archived
+    (all before the current one) are not recreated. Returns the new partitions.
+    """
+    if not rides_partitioned(db):
+        return []
+    _lock_partition_ddl(db)
+    existing = set(list_ride_partitions(db))
+    created = []
+    month = _month_of(datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        if partition_name(month) not in existing:
+            _create_month_partition(db, month)
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def partition_rides(db: Session, months_ahead: int = RIDES_PARTITION_MONTHS_AHEAD) -> list[str]:
+    """Convert ``rides`` into a table partitioned by month of ``completed_at``.
+
+    Runs in the caller's transaction, holding an exclusive lock on ``rides``
+    while its rows are copied. The primary key becomes (id, completed_at), as
+    PostgreSQL requires the partition key in unique constraints; ids still come
+    from the same sequence. Returns the partitions created.
+    """
+    if db.bind.dialect.name != "postgresql":
+        raise RuntimeError("Ride partitioning needs PostgreSQL")
+    if rides_partitioned(db):
+        raise RuntimeError("rides is already partitioned")
+
+    _lock_partition_ddl(db)
+    db.execute(text("LOCK TABLE rides IN ACCESS EXCLUSIVE MODE"))
+    db.execute(text("ALTER TABLE rides RENAME TO rides_unpartitioned"))
+    db.execute(text("ALTER TABLE rides_unpartitioned DROP CONSTRAINT rides_pkey"))
+    for index in models.Ride.__table__.indexes:
+        db.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    foreign_keys = db.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = 'rides_unpartitioned'::regclass AND contype = 'f'"
+    )).all()
+
+    db.execute(text(
+        "CREATE TABLE rides (LIKE rides_unpartitioned INCLUDING DEFAULTS, "
+        "CONSTRAINT rides_pkey PRIMARY KEY (id, completed_at)) PARTITION BY RANGE (completed_at)"
+    ))
+    for name, definition in foreign_keys:
+        db.execute(text(f"ALTER TABLE rides ADD CONSTRAINT {name} {definition}"))
+    for index in models.Ride.__table__.indexes:
+        index.create(db.connection())
+    db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF rides DEFAULT"))
+
+    oldest = db.execute(text("SELECT min(completed_at) FROM rides_unpartitioned")).scalar()
+    month = _month_of(oldest or datetime.utcnow())
+    last = _month_of(datetime.utcnow())
+    for _ in range(months_ahead):
+        last = next_month(last)
+    created = [DEFAULT_PARTITION]
+    while month <= last:
+        db.execute(text(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF rides "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        ))
+        created.append(partition_name(month))
+        month = next_month(month)
+
+    db.execute(text("INSERT INTO rides SELECT * FROM rides_unpartitioned"))
+    # The trigger went with the old table; on the parent it covers every
+    # partition. Created after the copy, so the copied rides are not announced.
+    db.execute(text(models.RIDE_NOTIFY_TRIGGER_DDL))
+    # The id sequence belongs to the old table's column; move it before the drop.
+    db.execute(text("ALTER SEQUENCE rides_id_seq OWNED BY rides.id"))
+    db.execute(text("DROP TABLE rides_unpartitioned"))
+    db.execute(text("ANALYZE rides"))
+    return created
+
+
+def detach_ride_partition(db: Session, name: str) -> None:
+    """Detach and drop a month's partition. Its rows must already be archived."""
+    if partition_month(name) is None:
+        raise ValueError(f"{name} is not a monthly ride partition")
+    db.execute(text(f"ALTER TABLE rides DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
@@ -31,3 +31,13 @@ class ValidationError(HTTPException):
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=detail
         )
+
+
+class CapacityReachedError(HTTPException):
+    """Raised when a resource with limited places has none left."""
+    
+    def __init__(self, resource: str, identifier: Any):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{resource} with identifier '{identifier}' is full"
+        )
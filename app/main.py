@@ -1,25 +1,47 @@
 from contextlib import asynccontextmanager
-from .db.database import engine, close_neo4j_driver, close_postgres_engine, get_neo4j_session
+from .db.database import engine, SessionLocal, close_neo4j_driver, close_postgres_engine, get_neo4j_session
 from .db import postgres_models as models
+from .db.ride_partitions import ensure_ride_partitions
 from neo4j import Session as Neo4jSession
 from fastapi import FastAPI, Depends
 from app.api.routes import api_router
 from app.db.neo4j_models import RiderNode, BikeNode
+from app.services.catalog_sync import build_catalog_indexes
+from app.services.group_ride_hub import group_rides
+from app.services.ride_durations import build_duration_stats, ride_durations
+from app.services.ride_events import ride_events
+from app.services.route_popularity import route_popularity
+from app.services.route_metrics import refresh_route_metrics
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        ensure_ride_partitions(db)
+        refresh_route_metrics(db)
+        db.commit()
+        route_popularity.load(db)
+        build_duration_stats(db)
+        # After the popularity sketches: the heat-map reads their ride counts.
+        build_catalog_indexes(db)
+    await ride_events.start()
+    await group_rides.start()
+    await route_popularity.start()
+    await ride_durations.start()
     yield
     # Shutdown
+    await ride_durations.stop()
+    await route_popularity.stop()
+    await group_rides.stop()
+    await ride_events.stop()
     close_postgres_engine()
     close_neo4j_driver()
 
 
 app = FastAPI(lifespan=lifespan)
 
-models.Base.metadata.create_all(bind=engine)
-
 app.include_router(api_router)
 
 
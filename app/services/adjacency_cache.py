@@ -0,0 +1,152 @@
+"""Per-rider cache of social graph neighbour lists.
+
+Following, followers and riding-buddy lists are read far more often than they
+change, so each rider's list is fetched from Neo4j once and served from memory
+afterwards. The cache is an LRU bounded to ``SOCIAL_CACHE_MAX_RIDERS`` lists.
+Follow and unfollow update cached lists in place. Tagging buddies drops the
+affected buddy lists, since their shared-ride counts change.
+
+Every change is also announced on ``SOCIAL_GRAPH_CHANNEL``, and the other
+workers drop the lists of the riders involved (a deleted rider is removed
+from every list). All lists are dropped when the listener reconnects, since
+announcements may have been missed meanwhile.
+
+Riders with more than ``SOCIAL_CACHE_MAX_DEGREE`` neighbours are not cached;
+their lists are paged straight from Neo4j by neighbour id.
+"""
+
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import app.db.neo4j_crud as neo_crud
+from app.db.postgres_models import SOCIAL_GRAPH_CHANNEL
+from app.services.ride_events import WORKER_ID, ride_events
+
+SOCIAL_CACHE_MAX_RIDERS = int(os.environ.get("SOCIAL_CACHE_MAX_RIDERS", "10000"))
+SOCIAL_CACHE_MAX_DEGREE = int(os.environ.get("SOCIAL_CACHE_MAX_DEGREE", "1000"))
+
+FOLLOWING = "following"
+FOLLOWERS = "followers"
+RIDING_BUDDIES = "riding-buddies"
+
+# Marks a list too long to cache, so misses don't refetch it every time.
+_TOO_LARGE = None
+
+
+def _neighbour_id(neighbour: tuple) -> int:
+    return neighbour[0]
+
+
+def _slice(neighbours: list[tuple], after: int, limit: int) -> list[tuple]:
+    start = bisect_right(neighbours, after, key=_neighbour_id)
+    return neighbours[start:start + limit]
+
+
+class AdjacencyCache:
+    def __init__(self, max_riders: int, max_degree: int) -> None:
+        self.max_riders = max_riders
+        self.max_degree = max_degree
+        # (rider_id, kind) -> neighbours sorted by id, or _TOO_LARGE
+        self._lists: OrderedDict[tuple[int, str], list[tuple] | None] = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def page(self, rider_id: int, kind: str, after: int, limit: int) -> list[tuple[int, str, int | None]]:
+        """Up to ``limit`` (id, name, shared rides) neighbours with ids above ``after``."""
+        key = (rider_id, kind)
+        with self._lock:
+            cached = key in self._lists
+            if cached:
+                self._lists.move_to_end(key)
+                neighbours = self._lists[key]
+                if neighbours is not _TOO_LARGE:
+                    return _slice(neighbours, after, limit)
+            writes_seen = self._writes
+        if not cached:
+            neighbours = neo_crud.get_rider_neighbours(rider_id, kind, 0, self.max_degree + 1)
+            if len(neighbours) > self.max_degree:
+                neighbours = _TOO_LARGE
+            with self._lock:
+                # A write since the read began may be missing from what was read.
+                if self._writes == writes_seen:
+                    self._lists[key] = neighbours
+                    while len(self._lists) > self.max_riders:
+                        self._lists.popitem(last=False)
+            if neighbours is not _TOO_LARGE:
+                return _slice(neighbours, after, limit)
+        return neo_crud.get_rider_neighbours(rider_id, kind, after, limit)
+
+    def _insert(self, key, neighbour: tuple) -> None:
+        neighbours = self._lists.get(key, _TOO_LARGE)
+        if neighbours is _TOO_LARGE:
+            return
+        index = bisect_left(neighbours, neighbour[0], key=_neighbour_id)
+        if index < len(neighbours) and neighbours[index][0] == neighbour[0]:
+            return
+        neighbours.insert(index, neighbour)
+        if len(neighbours) > self.max_degree:
+            self._lists[key] = _TOO_LARGE
+
+    def _remove(self, key, neighbour_id: int) -> None:
+        neighbours = self._lists.get(key, _TOO_LARGE)
+        if neighbours is _TOO_LARGE:
+            return
+        index = bisect_left(neighbours, neighbour_id, key=_neighbour_id)
+        if index < len(neighbours) and neighbours[index][0] == neighbour_id:
+            del neighbours[index]
+
+    def followed(self, rider_id: int, rider_name: str, target_id: int, target_name: str) -> None:
+        with self._lock:
+            self._writes += 1
+            self._insert((rider_id, FOLLOWING), (target_id, target_name, None))
+            self._insert((target_id, FOLLOWERS), (rider_id, rider_name, None))
+
+    def unfollowed(self, rider_id: int, target_id: int) -> None:
+        with self._lock:
+            self._writes += 1
+            self._remove((rider_id, FOLLOWING), target_id)
+            self._remove((target_id, FOLLOWERS), rider_id)
+
+    def buddies_changed(self, rider_ids) -> None:
+        with self._lock:
+            self._writes += 1
+            for rider_id in rider_ids:
+                self._lists.pop((rider_id, RIDING_BUDDIES), None)
+
+    def forget_rider(self, rider_id: int) -> None:
+        """Drop a deleted rider's lists and remove them from everyone else's."""
+        with self._lock:
+            self._writes += 1
+            for kind in (FOLLOWING, FOLLOWERS, RIDING_BUDDIES):
+                self._lists.pop((rider_id, kind), None)
+            for key in list(self._lists):
+                self._remove(key, rider_id)
+
+    def invalidate(self, rider_ids) -> None:
+        """Drop every list of the given riders, to be fetched again when next read."""
+        with self._lock:
+            self._writes += 1
+            for rider_id in rider_ids:
+                for kind in (FOLLOWING, FOLLOWERS, RIDING_BUDDIES):
+                    self._lists.pop((rider_id, kind), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._writes += 1
+            self._lists.clear()
+
+    def graph_changed(self, change: dict) -> None:
+        """Apply a change announced by another worker."""
+        if change["origin"] == WORKER_ID:
+            return
+        if change.get("deleted"):
+            for rider_id in change["rider_ids"]:
+                self.forget_rider(rider_id)
+        else:
+            self.invalidate(change["rider_ids"])
+
+
+rider_adjacency = AdjacencyCache(SOCIAL_CACHE_MAX_RIDERS, SOCIAL_CACHE_MAX_DEGREE)
+ride_events.on_notify(SOCIAL_GRAPH_CHANNEL, rider_adjacency.graph_changed)
+ride_events.on_reconnect(rider_adjacency.clear)
@@ -0,0 +1,123 @@
+"""Prefix autocomplete over rider and route names.
+
+Names are kept in memory as a sorted array of casefolded keys, so a prefix
+lookup is one binary search plus a short forward scan. The indexes are built
+at startup and kept up to date by ``app.services.catalog_sync``. Each one has
+a memory budget; an index that outgrows it is dropped and lookups fall back
+to the database.
+"""
+
+import os
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+
+AUTOCOMPLETE_MEMORY_BUDGET_MB = int(os.environ.get("AUTOCOMPLETE_MEMORY_BUDGET_MB", "512"))
+
+# list slots, the (id, name) tuple, the id int and the id -> key dict entry
+_ENTRY_OVERHEAD_BYTES = 2 * 8 + 56 + 28 + 104
+
+
+def _entry_size(key: str, name: str) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(name) + _ENTRY_OVERHEAD_BYTES
+
+
+class PrefixIndex:
+    def __init__(self, label: str, memory_budget_bytes: int) -> None:
+        self.label = label
+        self.memory_budget_bytes = memory_budget_bytes
+        self.enabled = False
+        self.bytes_used = 0
+        self._keys: list[str] = []
+        self._entries: list[tuple[int, str]] = []
+        self._key_by_id: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def build(self, rows) -> None:
+        """Load ``(id, name)`` rows, replacing the current contents."""
+        entries = []
+        used = 0
+        for row_id, name in rows:
+            key = name.casefold()
+            used += _entry_size(key, name)
+            if used > self.memory_budget_bytes:
+                self._disable(f"{self.label} names exceed {self.memory_budget_bytes} bytes")
+                return
+            entries.append((key, row_id, name))
+        entries.sort()
+        with self._lock:
+            self._keys = [key for key, _, _ in entries]
+            self._entries = [(row_id, name) for _, row_id, name in entries]
+            self._key_by_id = {row_id: key for key, row_id, _ in entries}
+            self.bytes_used = used
+            self.enabled = True
+
+    def add(self, row_id: int, name: str) -> None:
+        """Index a name, replacing the one indexed for ``row_id`` if any."""
+        if not self.enabled:
+            return
+        key = name.casefold()
+        size = _entry_size(key, name)
+        if self.bytes_used + size > self.memory_budget_bytes:
+            self._disable(f"{self.label} names exceed {self.memory_budget_bytes} bytes")
+            return
+        with self._lock:
+            self._remove(row_id)
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, (row_id, name))
+            self._key_by_id[row_id] = key
+            self.bytes_used += size
+
+    def remove(self, row_id: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(row_id)
+
+    def _remove(self, row_id: int) -> None:
+        key = self._key_by_id.pop(row_id, None)
+        if key is None:
+            return
+        for position in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+            if self._entries[position][0] == row_id:
+                _, name = self._entries[position]
+                del self._keys[position]
+                del self._entries[position]
+                self.bytes_used -= _entry_size(key, name)
+                return
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[int, str]]:
+        """Return up to ``limit`` ``(id, name)`` pairs whose name starts with ``prefix``."""
+        key = prefix.casefold()
+        with self._lock:
+            position = bisect_left(self._keys, key)
+            matches = []
+            while (
+                position < len(self._keys)
+                and len(matches) < limit
+                and self._keys[position].startswith(key)
+            ):
+                matches.append(self._entries[position])
+                position += 1
+        return matches
+
+    def _disable(self, reason: str) -> None:
+        logger.warning(f"Autocomplete index disabled, falling back to the database: {reason}")
+        with self._lock:
+            self.enabled = False
+            self._keys, self._entries, self._key_by_id = [], [], {}
+            self.bytes_used = 0
+
+
+rider_names = PrefixIndex("rider", AUTOCOMPLETE_MEMORY_BUDGET_MB * 1024 * 1024)
+route_names = PrefixIndex("route", AUTOCOMPLETE_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def build_name_indexes(db: Session) -> None:
+    rider_names.build(db.execute(select(models.Rider.id, models.Rider.name)).yield_per(10_000))
+    route_names.build(db.execute(select(models.Route.id, models.Route.name)).yield_per(10_000))
@@ -0,0 +1,184 @@
+"""Keep every worker's in-memory catalog indexes in step with committed writes.
+
+Routes, riders, bikes and locations are mirrored in per-worker indexes: the
+route search fallback, name autocomplete, route similarity, the eligibility
+bitmaps and cached garages, the location grid, and the heat-map, route
+matcher and corridor caches built from route paths.
+
+A request changes its own worker's indexes once its transaction commits
+(``after_commit``), from the values it wrote, so a rolled-back request leaves
+them alone. Triggers on the tables announce every committed change on
+``CATALOG_CHANNEL``, cascaded deletes included. Each worker, the writer too,
+then reads the changed entry back and applies it, one change at a time and
+in commit order, so workers converge on what the database holds. After the
+listener reconnects, every index is rebuilt, since changes may have been
+missed meanwhile.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+from app.db.database import SessionLocal, after_commit
+from app.db.postgres_models import CATALOG_CHANNEL
+from app.services.autocomplete import build_name_indexes, rider_names, route_names
+from app.services.geometry import decode_path
+from app.services.heatmap import build_heatmap, footprint, route_heatmap
+from app.services.ride_durations import ride_durations
+from app.services.ride_events import ride_events
+from app.services.route_corridor import build_location_index, location_index, route_corridors
+from app.services.route_eligibility import build_eligibility_index, route_eligibility
+from app.services.route_matching import build_route_matcher, route_matcher
+from app.services.route_popularity import route_popularity
+from app.services.route_search import build_fallback_index, route_search_index
+from app.services.route_similarity import build_similarity_index, route_similarity
+import app.db.postgres_crud as pg_crud
+
+# One thread, so announced changes are applied in the order they committed.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-sync")
+
+
+def build_catalog_indexes(db: Session) -> None:
+    """Build every catalog index from the database, replacing what they hold."""
+    build_fallback_index(db)
+    build_name_indexes(db)
+    build_similarity_index(db)
+    build_eligibility_index(db)
+    build_heatmap(db)
+    build_route_matcher(db)
+    build_location_index(db)
+    route_corridors.clear()
+
+
+def _add_route(route: models.Route) -> None:
+    route_search_index.add(route)
+    route_names.add(route.id, route.name)
+    route_similarity.add(route)
+    route_eligibility.add(route)
+
+
+def _remove_route(route_id: int) -> None:
+    route_search_index.remove(route_id)
+    route_names.remove(route_id)
+    route_similarity.remove(route_id)
+    route_eligibility.remove(route_id)
+    route_popularity.forget(route_id)
+    ride_durations.forget(route_id)
+    _remove_geometry(route_id)
+
+
+def _set_geometry(route_id: int, cells: np.ndarray, points: np.ndarray) -> None:
+    route_heatmap.set_route(route_id, cells)
+    route_matcher.set_route(route_id, cells)
+    route_corridors.set_route(route_id, points)
+
+
+def _remove_geometry(route_id: int) -> None:
+    route_heatmap.forget(route_id)
+    route_matcher.forget(route_id)
+    route_corridors.forget(route_id)
+
+
+def _remove_rider(rider_id: int) -> None:
+    rider_names.remove(rider_id)
+    route_eligibility.forget_rider(rider_id)
+
+
+def route_saved(db: Session, route: models.Route) -> None:
+    # A detached copy: the session expires the route's attributes on commit.
+    values = {column.key: getattr(route, column.key) for column in models.Route.__table__.columns}
+    after_commit(db, partial(_add_route, models.Route(**values)))
+
+
+def route_deleted(db: Session, route_id: int) -> None:
+    after_commit(db, partial(_remove_route, route_id))
+
+
+def route_geometry_saved(db: Session, route_id: int, cells: np.ndarray, points: np.ndarray) -> None:
+    after_commit(db, partial(_set_geometry, route_id, cells, points))
+
+
+def rider_saved(db: Session, rider_id: int, name: str) -> None:
+    after_commit(db, partial(rider_names.add, rider_id, name))
+
+
+def rider_deleted(db: Session, rider_id: int) -> None:
+    after_commit(db, partial(_remove_rider, rider_id))
+
+
+def garage_changed(db: Session, rider_id: int) -> None:
+    after_commit(db, partial(route_eligibility.forget_rider, rider_id))
+
+
+def location_saved(db: Session, location: models.Location) -> None:
+    after_commit(db, partial(
+        location_index.add, location.id, location.location_type, location.latitude, location.longitude
+    ))
+
+
+def location_deleted(db: Session, location_id: int) -> None:
+    after_commit(db, partial(location_index.remove, location_id))
+
+
+def _apply(table: str, entry_id: int) -> None:
+    """Bring one entry's index entries up to date with the database."""
+    with SessionLocal() as db:
+        if table == models.Route.__tablename__:
+            route = pg_crud.get_route_by_id(db, entry_id)
+            if route is None:
+                _remove_route(entry_id)
+            else:
+                _add_route(route)
+        elif table == models.RouteGeometry.__tablename__:
+            geometry = pg_crud.get_route_geometry(db, entry_id)
+            if geometry is None:
+                _remove_geometry(entry_id)
+            else:
+                points = decode_path(geometry["path"])
+                _set_geometry(entry_id, footprint(points), points)
+        elif table == models.Rider.__tablename__:
+            rider = pg_crud.get_rider_by_id(db, entry_id)
+            if rider is None:
+                _remove_rider(entry_id)
+            else:
+                rider_names.add(rider.id, rider.name)
+                route_eligibility.forget_rider(entry_id)
+        elif table == models.Bike.__tablename__:
+            route_eligibility.forget_rider(entry_id)
+        elif table == models.Location.__tablename__:
+            location = pg_crud.get_location_by_id(db, entry_id)
+            if location is None:
+                location_index.remove(entry_id)
+            else:
+                location_index.add(location.id, location.location_type, location.latitude, location.longitude)
+
+
+def _apply_logged(table: str, entry_id: int) -> None:
+    try:
+        _apply(table, entry_id)
+    except Exception:
+        logger.exception(f"Failed to apply a change to {table} {entry_id} to the catalog indexes")
+
+
+def _rebuild() -> None:
+    try:
+        with SessionLocal() as db:
+            build_catalog_indexes(db)
+    except Exception:
+        logger.exception("Failed to rebuild the catalog indexes")
+
+
+def catalog_changed(change: dict) -> None:
+    """Handle a change announcement on the event loop, applying it on the sync thread."""
+    asyncio.get_running_loop().run_in_executor(_executor, _apply_logged, change["table"], change["id"])
+
+
+def listener_reconnected() -> None:
+    asyncio.get_running_loop().run_in_executor(_executor, _rebuild)
+
+
+ride_events.on_notify(CATALOG_CHANNEL, catalog_changed)
+ride_events.on_reconnect(listener_reconnected)
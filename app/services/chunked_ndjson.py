@@ -0,0 +1,57 @@
+"""Gzip-compressed NDJSON written in fixed-size chunk files.
+
+Used for the ride archive and database snapshots: rows are streamed to disk
+one at a time, so memory stays flat however many rows there are.
+"""
+
+import gzip
+import os
+import orjson
+
+
+class ChunkedNDJSONWriter:
+    """Writes rows to ``<prefix>-00000.ndjson.gz``, ``<prefix>-00001...``, each at most ``chunk_rows`` long."""
+
+    def __init__(self, directory: str, chunk_rows: int, prefix: str = "part") -> None:
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.prefix = prefix
+        self.chunks: list[dict] = []
+        self._file = None
+
+    @property
+    def rows(self) -> int:
+        return sum(chunk["rows"] for chunk in self.chunks)
+
+    def write(self, row: dict) -> dict:
+        """Append a row and return the entry of the chunk it went to, for callers to annotate."""
+        if self._file is None or self.chunks[-1]["rows"] >= self.chunk_rows:
+            self._start_chunk()
+        chunk = self.chunks[-1]
+        chunk["rows"] += 1
+        self._file.write(orjson.dumps(row) + b"\n")
+        return chunk
+
+    def _start_chunk(self) -> None:
+        self.close()
+        file_name = f"{self.prefix}-{len(self.chunks):05d}.ndjson.gz"
+        self._file = gzip.open(os.path.join(self.directory, file_name), "wb")
+        self.chunks.append({"file": file_name, "rows": 0})
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "ChunkedNDJSONWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_chunk(path: str):
+    """Yield the rows of one chunk file."""
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            yield orjson.loads(line)
@@ -0,0 +1,176 @@
+"""Hybrid push/pull feed of rides from followed riders.
+
+Push: every new ride is announced by the rides insert trigger (see
+app.services.ride_events), so each worker hears about rides logged through
+any worker, once they are committed. Its (completed_at, id) key is appended
+to the in-memory inbox of each follower who has one in that worker. An inbox
+is a ring buffer of the newest ``FEED_INBOX_SIZE`` keys, built from the
+database on a rider's first read. An inbox is registered before it is read
+from the database, so rides announced while it is being built are kept.
+
+Inboxes are rebuilt ``FEED_INBOX_TTL_SECONDS`` after they were built, however
+often they are read, and when their rider's follows change through any
+worker. At most ``FEED_MAX_INBOXES`` are kept (least recently read go first),
+and all are dropped when the listener reconnects, since announcements may
+have been missed meanwhile.
+
+Pull: riders with more than ``FEED_CELEBRITY_FOLLOWERS`` followers skip the
+fan-out. Their rides are read from the database when a follower opens the
+feed, through the (rider_id, completed_at) index.
+
+A page is the inbox keys past the cursor plus the pulled riders' rides,
+fetched and merged in one statement. Paging deeper than a full inbox reaches,
+or into keys of rides deleted since they were pushed, switches to pulling
+from every followed rider.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from loguru import logger
+from sqlalchemy.orm import Session
+import app.db.neo4j_crud as neo_crud
+import app.db.postgres_crud as pg_crud
+from app.db.postgres_models import RIDE_EVENTS_CHANNEL, SOCIAL_GRAPH_CHANNEL
+from app.services.adjacency_cache import FOLLOWERS, rider_adjacency
+from app.services.ride_events import WORKER_ID, ride_events
+
+FEED_INBOX_SIZE = int(os.environ.get("FEED_INBOX_SIZE", "500"))
+FEED_INBOX_TTL_SECONDS = float(os.environ.get("FEED_INBOX_TTL_SECONDS", "3600"))
+FEED_MAX_INBOXES = int(os.environ.get("FEED_MAX_INBOXES", "100000"))
+FEED_CELEBRITY_FOLLOWERS = int(os.environ.get("FEED_CELEBRITY_FOLLOWERS", "1000"))
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # JSON timestamps from Postgres drop trailing zeros from the fraction, which fromisoformat rejects before 3.11.
+    whole, _, fraction = value.partition(".")
+    return datetime.fromisoformat(whole).replace(microsecond=int(fraction.ljust(6, "0")) if fraction else 0)
+
+
+@dataclass
+class _Inbox:
+    rides: deque
+    # None until the inbox is built.
+    followed: list[int] | None = None
+    celebrities: list[int] | None = None
+    built_at: float = field(default_factory=time.monotonic)
+    last_read: float = field(default_factory=time.monotonic)
+
+
+class FeedStore:
+    def __init__(self, inbox_size: int, ttl_seconds: float, max_inboxes: int, celebrity_followers: int) -> None:
+        self.inbox_size = inbox_size
+        self.ttl_seconds = ttl_seconds
+        self.max_inboxes = max_inboxes
+        self.celebrity_followers = celebrity_followers
+        self._inboxes: OrderedDict[int, _Inbox] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fan_out(self, rider_id: int, completed_at: datetime, ride_id: int) -> None:
+        """Push a new ride to the inboxes of its rider's followers."""
+        try:
+            followers = rider_adjacency.page(rider_id, FOLLOWERS, 0, self.celebrity_followers + 1)
+        except Exception:
+            logger.exception(f"Failed to push ride {ride_id} to the feeds of rider {rider_id}'s followers")
+            return
+        if len(followers) > self.celebrity_followers:
+            return
+        key = (completed_at, ride_id)
+        with self._lock:
+            for follower_id, _, _ in followers:
+                inbox = self._inboxes.get(follower_id)
+                if inbox is not None:
+                    inbox.rides.append(key)
+
+    def ride_logged(self, ride: dict) -> None:
+        """Handle a ride announcement on the event loop, fanning it out on a worker thread."""
+        completed_at = _parse_timestamp(ride["completed_at"])
+        asyncio.get_running_loop().run_in_executor(None, self.fan_out, ride["rider_id"], completed_at, ride["id"])
+
+    def _build_inbox(self, db: Session, rider_id: int, inbox: _Inbox) -> None:
+        followed, celebrities = [], []
+        for followed_id, follower_count in neo_crud.get_followed_riders(rider_id):
+            (celebrities if follower_count > self.celebrity_followers else followed).append(followed_id)
+        keys = pg_crud.get_latest_ride_keys(db, followed, self.inbox_size) if followed else []
+        with self._lock:
+            # Rides pushed while reading are kept; a ride both read and pushed is kept once.
+            merged = sorted(set(keys).union(inbox.rides))[-self.inbox_size:]
+            inbox.rides = deque(merged, maxlen=self.inbox_size)
+            inbox.followed, inbox.celebrities = followed, celebrities
+
+    def _inbox(self, db: Session, rider_id: int) -> _Inbox:
+        now = time.monotonic()
+        with self._lock:
+            inbox = self._inboxes.get(rider_id)
+            if inbox is not None and now - inbox.built_at <= self.ttl_seconds:
+                inbox.last_read = now
+                self._inboxes.move_to_end(rider_id)
+                if inbox.followed is not None:
+                    return inbox
+                # Another read is building it: build one just for this read.
+                inbox, registered = _Inbox(rides=deque(maxlen=self.inbox_size)), False
+            else:
+                inbox = self._inboxes[rider_id] = _Inbox(rides=deque(maxlen=self.inbox_size))
+                self._inboxes.move_to_end(rider_id)
+                registered = True
+                # Least recently read first, so idle inboxes are at the front.
+                while self._inboxes and (
+                    len(self._inboxes) > self.max_inboxes
+                    or now - next(iter(self._inboxes.values())).last_read > self.ttl_seconds
+                ):
+                    self._inboxes.popitem(last=False)
+        try:
+            self._build_inbox(db, rider_id, inbox)
+        except Exception:
+            if registered:
+                with self._lock:
+                    if self._inboxes.get(rider_id) is inbox:
+                        del self._inboxes[rider_id]
+            raise
+        return inbox
+
+    def page(self, db: Session, rider_id: int, after: tuple[datetime, int] | None, limit: int) -> list[dict]:
+        """Up to ``limit`` feed rides older than the ``after`` cursor, newest first."""
+        inbox = self._inbox(db, rider_id)
+        with self._lock:
+            keys = sorted(set(inbox.rides), reverse=True)
+            full = len(inbox.rides) == inbox.rides.maxlen
+        if after is not None:
+            keys = [key for key in keys if key < after]
+        everyone = inbox.followed + inbox.celebrities
+        if full and len(keys) < limit:
+            # Past the inbox's horizon there may be older pushed rides it
+            # no longer holds, so read everyone's rides from the database.
+            return pg_crud.get_feed_rows(db, [], everyone, after, limit)
+        ride_ids = [ride_id for _, ride_id in keys[:limit]]
+        rides = pg_crud.get_feed_rows(db, ride_ids, inbox.celebrities, after, limit)
+        if len(rides) < limit and len(keys) > len(ride_ids):
+            # Some of the keys were of deleted rides, so the inbox holds more than this page shows.
+            return pg_crud.get_feed_rows(db, [], everyone, after, limit)
+        return rides
+
+    def forget(self, rider_id: int) -> None:
+        """Drop a rider's inbox, e.g. after they follow or unfollow someone."""
+        with self._lock:
+            self._inboxes.pop(rider_id, None)
+
+    def graph_changed(self, change: dict) -> None:
+        """Drop the inboxes of riders whose follows another worker changed."""
+        if change["origin"] != WORKER_ID:
+            for rider_id in change["rider_ids"]:
+                self.forget(rider_id)
+
+    def clear(self) -> None:
+        """Drop every inbox, e.g. after ride announcements may have been missed."""
+        with self._lock:
+            self._inboxes.clear()
+
+
+ride_feed = FeedStore(FEED_INBOX_SIZE, FEED_INBOX_TTL_SECONDS, FEED_MAX_INBOXES, FEED_CELEBRITY_FOLLOWERS)
+ride_events.on_notify(RIDE_EVENTS_CHANNEL, ride_feed.ride_logged)
+ride_events.on_notify(SOCIAL_GRAPH_CHANNEL, ride_feed.graph_changed)
+ride_events.on_reconnect(ride_feed.clear)
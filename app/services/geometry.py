@@ -0,0 +1,266 @@
+"""Compact binary encodings for route geometry, vectorized with NumPy.
+
+A path is stored like an encoded polyline, in binary: latitude and longitude
+quantized to 1e-5 degrees (about a metre), each point as the zigzagged
+difference from the previous one, written as LEB128 varints. Neighbouring GPS
+points differ by little, so most coordinates take one or two bytes instead of
+eight.
+
+Other integer columns, such as quantized timestamps, are delta-encoded the
+same way, and sorted integer sets (such as heat-map cells) as varints of the
+gaps between consecutive values.
+
+Paths are simplified with Douglas-Peucker in Web Mercator coordinates. One
+pass records, for every point, the largest tolerance that still keeps it, so
+each zoom level's simplification is just the points above its tolerance and
+every level is a subset of the more detailed ones.
+
+Paths are compared in local metres, resampled at even spacing, with the
+discrete Fréchet distance: the shortest leash that lets two walkers cover the
+two paths start to end, neither walking backwards.
+"""
+
+import io
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+
+COORDINATE_SCALE = 100_000
+
+EARTH_RADIUS_METRES = 6_371_008.8
+
+# The smallest value that takes each extra byte.
+_VARINT_LIMITS = np.uint64(1) << (7 * np.arange(1, 10, dtype=np.uint64))
+_MAX_LATITUDE = 85.05112878
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """LEB128: seven bits per byte, the high bit set on every byte but a value's last."""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    lengths = np.searchsorted(_VARINT_LIMITS, values, side="right") + 1
+    owner = np.repeat(np.arange(len(values)), lengths)
+    position = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    payload = (values[owner] >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)
+    more = (position < lengths[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return (payload | more).astype(np.uint8).tobytes()
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        raise ValueError("Truncated varint")
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def encode_deltas(values: np.ndarray) -> bytes:
+    """Encode integers, or the rows of a 2-D integer array, as zigzagged differences from the previous one."""
+    values = np.asarray(values, dtype=np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, *values.shape[1:]), dtype=np.int64))
+    return encode_varints(_zigzag(deltas.ravel()))
+
+
+def decode_deltas(data: bytes, columns: int | None = None) -> np.ndarray:
+    """The integers ``encode_deltas`` was given; pass ``columns`` for a 2-D array."""
+    deltas = _unzigzag(decode_varints(data))
+    if columns is not None:
+        deltas = deltas.reshape(-1, columns)
+    return np.cumsum(deltas, axis=0)
+
+
+def encode_path(points: np.ndarray) -> bytes:
+    """Encode an ``(n, 2)`` array of (latitude, longitude) degrees."""
+    return encode_deltas(np.round(np.asarray(points, dtype=np.float64) * COORDINATE_SCALE))
+
+
+def decode_path(data: bytes) -> np.ndarray:
+    """The ``(n, 2)`` array of (latitude, longitude) degrees ``encode_path`` was given, to 1e-5."""
+    return decode_deltas(data, 2) / COORDINATE_SCALE
+
+
+def encode_sorted(values: np.ndarray) -> bytes:
+    """Encode ascending non-negative integers as the gaps between them."""
+    values = np.asarray(values, dtype=np.uint64)
+    return encode_varints(np.diff(values, prepend=np.uint64(0)))
+
+
+def decode_sorted(data: bytes) -> np.ndarray:
+    return np.cumsum(decode_varints(data), dtype=np.uint64)
+
+
+def path_from_geojson(payload: dict) -> np.ndarray:
+    """(latitude, longitude) points of a GeoJSON LineString, or a Feature holding one.
+
+    Raises ValueError when the payload is not one, or has fewer than two points
+    or coordinates out of range.
+    """
+    if isinstance(payload, dict) and payload.get("type") == "Feature":
+        payload = payload.get("geometry")
+    if not isinstance(payload, dict) or payload.get("type") != "LineString":
+        raise ValueError("Expected a GeoJSON LineString or a Feature with a LineString geometry")
+    try:
+        # GeoJSON positions are [longitude, latitude, optional elevation].
+        coordinates = np.array([position[:2] for position in payload.get("coordinates") or []], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("LineString coordinates must be [longitude, latitude] positions") from None
+    if coordinates.ndim != 2 or len(coordinates) < 2 or coordinates.shape[1] != 2:
+        raise ValueError("A LineString needs at least two [longitude, latitude] positions")
+    points = coordinates[:, ::-1]
+    if not np.isfinite(points).all() or (np.abs(points) > (90, 180)).any():
+        raise ValueError("Coordinates out of range")
+    return points
+
+
+def path_from_gpx(data: bytes) -> np.ndarray:
+    """(latitude, longitude) points of a GPX file's track points, or its route points if it has no tracks.
+
+    Track segments are joined in document order. Raises ValueError when the
+    file is not XML, or has fewer than two points or coordinates out of range.
+    """
+    points = {"trkpt": [], "rtept": []}
+    try:
+        for _, element in ElementTree.iterparse(io.BytesIO(data)):
+            # Tags come namespaced, e.g. {http://www.topografix.com/GPX/1/1}trkpt.
+            kind = element.tag.rpartition("}")[2]
+            if kind in points:
+                points[kind].append((element.get("lat"), element.get("lon")))
+                element.clear()
+    except ElementTree.ParseError as exc:
+        raise ValueError(f"Invalid GPX: {exc}") from None
+    try:
+        points = np.array(points["trkpt"] or points["rtept"], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("GPX points need numeric lat and lon attributes") from None
+    if len(points) < 2:
+        raise ValueError("A GPX track needs at least two points")
+    if not np.isfinite(points).all() or (np.abs(points) > (90, 180)).any():
+        raise ValueError("Coordinates out of range")
+    return points
+
+
+def mercator(points: np.ndarray) -> np.ndarray:
+    """Web Mercator ``(x, y)`` of (latitude, longitude) points, with the world spanning [0, 1) and y pointing south."""
+    points = np.asarray(points, dtype=np.float64)
+    latitude = np.radians(np.clip(points[:, 0], -_MAX_LATITUDE, _MAX_LATITUDE))
+    x = (points[:, 1] + 180) / 360
+    y = (1 - np.arcsinh(np.tan(latitude)) / np.pi) / 2
+    return np.column_stack([x, y])
+
+
+def segment_lengths(points: np.ndarray) -> np.ndarray:
+    """Great-circle length in metres of each step of an ``(n, 2)`` latitude/longitude path (haversine)."""
+    latitude, longitude = np.radians(np.asarray(points, dtype=np.float64)).T
+    half_chord = (
+        np.sin(np.diff(latitude) / 2) ** 2
+        + np.cos(latitude[:-1]) * np.cos(latitude[1:]) * np.sin(np.diff(longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METRES * np.arcsin(np.sqrt(np.clip(half_chord, 0, 1)))
+
+
+def to_local(points: np.ndarray, origin_latitude: float) -> np.ndarray:
+    """Equirectangular ``(x, y)`` metres of (latitude, longitude) points, close to true within a few hundred km of ``origin_latitude``."""
+    radians = np.radians(np.asarray(points, dtype=np.float64))
+    return EARTH_RADIUS_METRES * np.column_stack([radians[:, 1] * np.cos(np.radians(origin_latitude)), radians[:, 0]])
+
+
+def path_length(xy: np.ndarray) -> float:
+    return float(np.sqrt((np.diff(xy, axis=0) ** 2).sum(axis=1)).sum())
+
+
+def resample(xy: np.ndarray, spacing: float) -> np.ndarray:
+    """Points every ``spacing`` along a projected path, and its last point."""
+    travelled = np.concatenate([[0], np.cumsum(np.sqrt((np.diff(xy, axis=0) ** 2).sum(axis=1)))])
+    stations = np.append(np.arange(0, travelled[-1], spacing), travelled[-1])
+    return np.column_stack([np.interp(stations, travelled, xy[:, 0]), np.interp(stations, travelled, xy[:, 1])])
+
+
+def pairwise_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """The ``(len(a), len(b))`` float32 distances between two sets of projected points."""
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    return np.hypot(a[:, 0, np.newaxis] - b[:, 0], a[:, 1, np.newaxis] - b[:, 1])
+
+
+def discrete_frechet(distances: np.ndarray) -> float:
+    """The discrete Fréchet distance of two point sequences, given their pairwise ``distances``.
+
+    The coupling table is filled one anti-diagonal at a time: every cell of a
+    diagonal depends only on the two before it, so each diagonal is a single
+    vectorized step and the table takes ``n + m - 1`` of them.
+    """
+    if distances.shape[0] > distances.shape[1]:
+        distances = distances.T
+    n, m = distances.shape
+    rows, columns = np.indices((n, m))
+    # Diagonal k holds cell (i, k - i) at position i, so each diagonal is one contiguous row.
+    diagonals = np.full((n + m - 1, n), np.inf, dtype=np.float32)
+    diagonals[rows + columns, rows] = distances
+    # coupling[k + 2, i + 1] is cell (i, k - i); the extra row and column of infinities stand for
+    # "before the start", except coupling[0, 0], which lets the walkers set off from (0, 0).
+    coupling = np.full((n + m + 1, n + 1), np.inf, dtype=np.float32)
+    coupling[0, 0] = 0
+    for k in range(n + m - 1):
+        low, high = max(0, k - m + 1), min(n - 1, k) + 1
+        previous = np.minimum(
+            np.minimum(coupling[k + 1, low:high], coupling[k, low:high]), coupling[k + 1, low + 1:high + 1]
+        )
+        coupling[k + 2, low + 1:high + 1] = np.maximum(previous, diagonals[k, low:high])
+    return float(coupling[n + m, n])
+
+
+def _distances_to_segments(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    direction = ends - starts
+    length = (direction ** 2).sum(axis=1)
+    along = ((points - starts) * direction).sum(axis=1) / np.where(length > 0, length, 1)
+    nearest = starts + np.clip(along, 0, 1)[:, np.newaxis] * direction
+    return np.sqrt(((points - nearest) ** 2).sum(axis=1))
+
+
+def simplification_tolerances(xy: np.ndarray, floor: float = 0.0) -> np.ndarray:
+    """For each point of a projected path, the largest Douglas-Peucker tolerance that keeps it.
+
+    The ends are kept at any tolerance. A point is never kept at a larger
+    tolerance than the point that split its segment, so the points kept at a
+    tolerance always include those kept at any larger one. Segments whose
+    points are all within ``floor`` are not split further; their points get 0.
+
+    Every segment at the same depth of the recursion is split in one
+    vectorized pass, so there are as many passes as the recursion is deep.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    tolerances = np.zeros(len(xy))
+    tolerances[[0, -1]] = np.inf
+    kept = np.array([0, len(xy) - 1])
+    interior = np.arange(1, len(xy) - 1)
+    while len(interior):
+        segment = np.searchsorted(kept, interior) - 1
+        distances = _distances_to_segments(xy[interior], xy[kept[segment]], xy[kept[segment + 1]])
+        starts = np.flatnonzero(np.diff(segment, prepend=-1))
+        group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(segment))))
+        peaks = np.maximum.reduceat(distances, starts)
+        at_peak = np.flatnonzero(distances == peaks[group])
+        farthest = at_peak[np.diff(group[at_peak], prepend=-1) != 0]
+        split = peaks > floor
+        chosen = farthest[split]
+        # The split that made this segment bounds it: its looser end.
+        bound = np.minimum(tolerances[kept[segment[chosen]]], tolerances[kept[segment[chosen] + 1]])
+        tolerances[interior[chosen]] = np.minimum(peaks[split], bound)
+        remaining = split[group]
+        remaining[chosen] = False
+        kept = np.sort(np.concatenate([kept, interior[chosen]]))
+        interior = interior[remaining]
+    return tolerances
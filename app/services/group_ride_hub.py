@@ -0,0 +1,242 @@
+"""In-memory hub for live position sharing during group rides.
+
+Each group ride is a channel of WebSocket members. Position reports only
+overwrite the rider's latest position; once per ``GROUP_RIDE_TICK_SECONDS`` a
+single tick loop broadcasts, for every channel, one message covering the
+riders that moved since the previous tick. However often a client reports,
+its group hears about it at most once per tick.
+
+Positions go out quantized: latitude and longitude in 1e-5 degrees (about a
+metre), speed in km/h and heading in degrees, all integers. A ``keyframe``
+carries absolute values. A ``delta`` names the riders who ``left`` (applied
+first) and each moved rider's change since the last broadcast; a rider the
+client does not know, new or just removed, has a base of all zeroes. A member whose
+send queue fills up has its backlog discarded and gets a fresh keyframe on the
+next tick instead.
+
+Every ``GROUP_RIDE_SAMPLE_SECONDS`` the latest position of each rider that
+reported since the last sample is written to ``group_ride_track_points``.
+Channels are per worker process, so all members of a group ride must be
+routed to the same worker.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+import orjson
+from loguru import logger
+from app.db.database import SessionLocal
+import app.db.postgres_crud as pg_crud
+
+GROUP_RIDE_TICK_SECONDS = float(os.environ.get("GROUP_RIDE_TICK_SECONDS", "1"))
+GROUP_RIDE_SAMPLE_SECONDS = float(os.environ.get("GROUP_RIDE_SAMPLE_SECONDS", "15"))
+GROUP_RIDE_SEND_QUEUE_SIZE = int(os.environ.get("GROUP_RIDE_SEND_QUEUE_SIZE", "8"))
+GROUP_RIDE_MAX_REPORTS_PER_SECOND = float(os.environ.get("GROUP_RIDE_MAX_REPORTS_PER_SECOND", "5"))
+
+COORDINATE_SCALE = 100_000
+
+
+def _quantize(update) -> tuple[int, int, int, int]:
+    return (
+        round(update.lat * COORDINATE_SCALE),
+        round(update.lon * COORDINATE_SCALE),
+        round(update.speed_kmh or 0),
+        round(update.heading or 0) % 360,
+    )
+
+
+class GroupRideMember:
+    """One WebSocket connection to a group ride channel."""
+
+    def __init__(self, group_ride_id: int, rider_id: int, queue_size: int, reports_per_second: float) -> None:
+        self.group_ride_id = group_ride_id
+        self.rider_id = rider_id
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=queue_size)
+        self.needs_keyframe = True
+        self.reports_per_second = reports_per_second
+        # Token bucket for inbound reports, allowing a burst of one second.
+        self._tokens = reports_per_second
+        self._refilled = time.monotonic()
+
+    def allow_report(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.reports_per_second, self._tokens + (now - self._refilled) * self.reports_per_second)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def send(self, message: bytes) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Deltas only make sense applied in order; start over from a keyframe.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.needs_keyframe = True
+
+
+class GroupRideChannel:
+    def __init__(self, group_ride_id: int) -> None:
+        self.group_ride_id = group_ride_id
+        self.members: set[GroupRideMember] = set()
+        # rider_id -> latest report, and its quantized form as last broadcast
+        self.latest: dict[int, tuple[object, datetime]] = {}
+        self.sent: dict[int, tuple[int, int, int, int]] = {}
+        self.left: set[int] = set()
+        self.unsampled: set[int] = set()
+        self.tick = 0
+
+    def riders(self) -> set[int]:
+        return {member.rider_id for member in self.members}
+
+    def keyframe(self) -> bytes:
+        riders = [[rider_id, *position] for rider_id, position in sorted(self.sent.items())]
+        return orjson.dumps({"type": "keyframe", "tick": self.tick, "riders": riders})
+
+    def broadcast(self) -> None:
+        """Send this tick's changes to every member."""
+        self.tick += 1
+        moved = []
+        for rider_id, (update, _) in self.latest.items():
+            position = _quantize(update)
+            previous = self.sent.get(rider_id, (0, 0, 0, 0))
+            if position != previous:
+                moved.append([rider_id, *(now - before for now, before in zip(position, previous))])
+                self.sent[rider_id] = position
+        delta = None
+        if moved or self.left:
+            delta = orjson.dumps({"type": "delta", "tick": self.tick, "riders": moved, "left": sorted(self.left)})
+            self.left.clear()
+        keyframe = None
+        for member in self.members:
+            if member.needs_keyframe:
+                keyframe = keyframe or self.keyframe()
+                member.needs_keyframe = False
+                member.send(keyframe)
+            elif delta is not None:
+                member.send(delta)
+
+    def sample(self, rider_ids=None) -> list[dict]:
+        """Track points for the riders (default all) that reported since the last sample."""
+        points = []
+        for rider_id in list(self.unsampled if rider_ids is None else self.unsampled & set(rider_ids)):
+            self.unsampled.discard(rider_id)
+            if rider_id not in self.latest:
+                continue
+            update, recorded_at = self.latest[rider_id]
+            points.append({
+                "group_ride_id": self.group_ride_id,
+                "rider_id": rider_id,
+                "recorded_at": recorded_at,
+                "latitude": update.lat,
+                "longitude": update.lon,
+                "speed_kmh": update.speed_kmh,
+                "heading": update.heading,
+            })
+        return points
+
+
+class GroupRideHub:
+    def __init__(
+        self,
+        tick_seconds: float,
+        sample_seconds: float,
+        send_queue_size: int,
+        reports_per_second: float,
+    ) -> None:
+        self.tick_seconds = tick_seconds
+        self.sample_seconds = sample_seconds
+        self.send_queue_size = send_queue_size
+        self.reports_per_second = reports_per_second
+        self._channels: dict[int, GroupRideChannel] = {}
+        # Points of channels that emptied between samples.
+        self._pending_points: list[dict] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def members(self) -> int:
+        return sum(len(channel.members) for channel in self._channels.values())
+
+    def join(self, group_ride_id: int, rider_id: int) -> GroupRideMember:
+        channel = self._channels.get(group_ride_id)
+        if channel is None:
+            channel = self._channels[group_ride_id] = GroupRideChannel(group_ride_id)
+        member = GroupRideMember(group_ride_id, rider_id, self.send_queue_size, self.reports_per_second)
+        channel.members.add(member)
+        return member
+
+    def leave(self, member: GroupRideMember) -> None:
+        channel = self._channels.get(member.group_ride_id)
+        if channel is None:
+            return
+        channel.members.discard(member)
+        if not channel.members:
+            self._pending_points.extend(channel.sample())
+            del self._channels[member.group_ride_id]
+        elif member.rider_id not in channel.riders():
+            # The rider's last connection closed.
+            self._pending_points.extend(channel.sample([member.rider_id]))
+            channel.latest.pop(member.rider_id, None)
+            if channel.sent.pop(member.rider_id, None) is not None:
+                channel.left.add(member.rider_id)
+
+    def report(self, member: GroupRideMember, update) -> None:
+        """Record a member's position (with ``lat``, ``lon``, ``speed_kmh`` and ``heading``)."""
+        channel = self._channels.get(member.group_ride_id)
+        if channel is not None:
+            channel.latest[member.rider_id] = (update, datetime.utcnow())
+            channel.unsampled.add(member.rider_id)
+
+    def _take_samples(self) -> list[dict]:
+        points, self._pending_points = self._pending_points, []
+        for channel in self._channels.values():
+            points.extend(channel.sample())
+        return points
+
+    @staticmethod
+    def _store(points: list[dict]) -> None:
+        try:
+            with SessionLocal() as db:
+                pg_crud.add_track_points(db, points)
+                db.commit()
+        except Exception:
+            logger.exception(f"Failed to store {len(points)} group ride track points")
+
+    async def _run(self) -> None:
+        next_sample = time.monotonic() + self.sample_seconds
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            for channel in list(self._channels.values()):
+                try:
+                    channel.broadcast()
+                except Exception:
+                    logger.exception(f"Group ride {channel.group_ride_id} broadcast failed")
+            if time.monotonic() >= next_sample:
+                next_sample += self.sample_seconds
+                points = self._take_samples()
+                if points:
+                    # Off the loop, so a slow insert does not delay the next tick.
+                    asyncio.get_running_loop().run_in_executor(None, self._store, points)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop ticking and store the positions not yet sampled."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        points = self._take_samples()
+        if points:
+            await asyncio.to_thread(self._store, points)
+
+
+group_rides = GroupRideHub(
+    GROUP_RIDE_TICK_SECONDS,
+    GROUP_RIDE_SAMPLE_SECONDS,
+    GROUP_RIDE_SEND_QUEUE_SIZE,
+    GROUP_RIDE_MAX_REPORTS_PER_SECOND,
+)
@@ -0,0 +1,236 @@
+"""Ride heat-map tiles: ride counts rasterized along route geometry.
+
+The map is a Web Mercator tile pyramid from zoom 0 to ``HEATMAP_MAX_ZOOM``;
+each z/x/y tile is a ``HEATMAP_TILE_CELLS`` square grid of ``uint32`` counts.
+A cell's count is the number of rides on routes whose path crosses it, so a
+route ridden 40 times adds 40 to every cell along it, once per zoom level.
+
+Paths are rasterized once, on upload, into a footprint: the sorted set of
+cells they cross at the deepest zoom, stored next to the path. A cell at a
+shallower zoom is that cell's coordinates shifted right, so every zoom level
+comes from the one footprint. Tiles are kept in memory, built at startup from
+the stored footprints and the routes' ride counts. The counts are the ones
+``route_popularity`` keeps, which already converge across workers, so tiles
+follow rides logged or deleted anywhere; they are brought up to date at most every
+``HEATMAP_REFRESH_SECONDS``, when a tile is read.
+
+Tiles are served gzip-compressed and the compressed bytes are cached until a
+ride changes the tile. ``python -m app.cli rebuild-heatmap`` re-rasterizes
+every stored footprint, needed after changing the zoom or tile size.
+"""
+
+import gzip
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+from app.services.geometry import decode_path, decode_sorted, encode_sorted, mercator
+from app.services.route_popularity import route_popularity
+import app.db.postgres_crud as pg_crud
+
+HEATMAP_MAX_ZOOM = int(os.environ.get("HEATMAP_MAX_ZOOM", "12"))
+HEATMAP_TILE_CELLS = int(os.environ.get("HEATMAP_TILE_CELLS", "64"))
+HEATMAP_REFRESH_SECONDS = float(os.environ.get("HEATMAP_REFRESH_SECONDS", "5"))
+HEATMAP_MAX_CACHED_TILES = int(os.environ.get("HEATMAP_MAX_CACHED_TILES", "4096"))
+
+_CELL_BITS = HEATMAP_TILE_CELLS.bit_length() - 1
+if HEATMAP_TILE_CELLS != 1 << _CELL_BITS:
+    raise ValueError("HEATMAP_TILE_CELLS must be a power of two")
+
+# The world is 2 ** FOOTPRINT_LEVEL cells wide at the deepest zoom.
+FOOTPRINT_LEVEL = HEATMAP_MAX_ZOOM + _CELL_BITS
+# Footprints applied together are told apart by their position in the high bits of a cell key.
+_MAX_FOOTPRINTS_PER_PASS = 1 << (63 - 2 * FOOTPRINT_LEVEL)
+_Y_BITS = np.uint64(32)
+_Y_MASK = np.uint64((1 << 32) - 1)
+
+
+def footprint(points: np.ndarray, level: int = FOOTPRINT_LEVEL) -> np.ndarray:
+    """Sorted keys (``x << 32 | y``) of the cells an ``(n, 2)`` latitude/longitude path crosses."""
+    size = 1 << level
+    x, y = (mercator(points) * size).T
+    # Sample each segment at least once per cell so the cells stay connected.
+    steps = np.maximum(np.ceil(np.maximum(np.abs(np.diff(x)), np.abs(np.diff(y)))), 1).astype(np.int64)
+    segment = np.repeat(np.arange(len(steps)), steps)
+    fraction = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+    x = np.concatenate([x[segment] + fraction * (x[segment + 1] - x[segment]), x[-1:]])
+    y = np.concatenate([y[segment] + fraction * (y[segment + 1] - y[segment]), y[-1:]])
+    cell_x = np.clip(x, 0, size - 1).astype(np.uint64)
+    cell_y = np.clip(y, 0, size - 1).astype(np.uint64)
+    return np.unique((cell_x << _Y_BITS) | cell_y)
+
+
+def encode_footprint(cells: np.ndarray) -> bytes:
+    return encode_sorted(cells)
+
+
+def decode_footprint(data: bytes) -> np.ndarray:
+    return decode_sorted(data)
+
+
+class RouteHeatmap:
+    def __init__(
+        self,
+        ride_counts: Callable[[], dict[int, int]],
+        max_zoom: int,
+        refresh_seconds: float,
+        max_cached_tiles: int,
+    ) -> None:
+        self.ride_counts = ride_counts
+        self.max_zoom = max_zoom
+        self.refresh_seconds = refresh_seconds
+        self.max_cached_tiles = max_cached_tiles
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+        self._empty = gzip.compress(np.zeros(HEATMAP_TILE_CELLS ** 2, dtype="<u4").tobytes(), mtime=0)
+
+    def _reset(self) -> None:
+        self._footprints: dict[int, np.ndarray] = {}
+        # Rides already added to the tiles, per route with a footprint.
+        self._counted: dict[int, int] = {}
+        self._tiles: dict[tuple[int, int, int], np.ndarray] = {}
+        self._compressed: OrderedDict[tuple[int, int, int], tuple[bytes, str]] = OrderedDict()
+        self._refreshed_at = 0.0
+
+    def _apply(self, changes: list[tuple[np.ndarray, int]]) -> None:
+        """Add each ``(footprint, rides)``'s rides to every tile cell it covers, at every zoom."""
+        changes = [(cells, rides) for cells, rides in changes if rides and len(cells)]
+        for start in range(0, len(changes), _MAX_FOOTPRINTS_PER_PASS):
+            self._apply_pass(changes[start:start + _MAX_FOOTPRINTS_PER_PASS])
+
+    def _apply_pass(self, changes: list[tuple[np.ndarray, int]]) -> None:
+        if not changes:
+            return
+        cells = np.concatenate([cells for cells, _ in changes])
+        rides = np.array([rides for _, rides in changes], dtype=np.int64)
+        owner = np.repeat(np.arange(len(changes), dtype=np.int64), [len(cells) for cells, _ in changes])
+        x, y = (cells >> _Y_BITS).astype(np.int64), (cells & _Y_MASK).astype(np.int64)
+        for zoom in range(self.max_zoom, -1, -1):
+            bits = zoom + _CELL_BITS
+            if zoom < self.max_zoom:
+                # Halve the coordinates; a route adds its rides once per cell, however many it merged.
+                keys = np.unique((owner << 2 * bits) | ((x >> 1) << bits) | (y >> 1))
+                owner, x, y = keys >> 2 * bits, (keys >> bits) & ((1 << bits) - 1), keys & ((1 << bits) - 1)
+            tiles = ((x >> _CELL_BITS) << bits) | (y >> _CELL_BITS)
+            index = ((y & (HEATMAP_TILE_CELLS - 1)) << _CELL_BITS) | (x & (HEATMAP_TILE_CELLS - 1))
+            order = np.argsort(tiles, kind="stable")
+            for group in np.split(order, np.flatnonzero(np.diff(tiles[order])) + 1):
+                tile = int(tiles[group[0]])
+                key = (zoom, tile >> bits, tile & ((1 << bits) - 1))
+                grid = self._tiles.get(key)
+                counts = np.zeros(HEATMAP_TILE_CELLS ** 2, dtype=np.int64) if grid is None else grid.astype(np.int64)
+                np.add.at(counts, index[group], rides[owner[group]])
+                if counts.any():
+                    self._tiles[key] = counts.clip(0).astype(np.uint32)
+                else:
+                    self._tiles.pop(key, None)
+                self._compressed.pop(key, None)
+
+    def build(self, footprints) -> None:
+        """Load ``(route_id, cells)`` footprints, replacing the current contents."""
+        counts = self.ride_counts()
+        with self._lock:
+            self._reset()
+            for route_id, cells in footprints:
+                self._footprints[route_id] = cells
+                self._counted[route_id] = counts.get(route_id, 0)
+            self._apply([(cells, self._counted[route_id]) for route_id, cells in self._footprints.items()])
+            self._refreshed_at = time.monotonic()
+            self.enabled = True
+
+    def set_route(self, route_id: int, cells: np.ndarray) -> None:
+        """Replace a route's footprint, e.g. after its geometry was uploaded."""
+        if not self.enabled:
+            return
+        rides = self.ride_counts().get(route_id, 0)
+        with self._lock:
+            old = self._footprints.get(route_id)
+            changes = [(cells, rides)] if old is None else [(old, -self._counted[route_id]), (cells, rides)]
+            self._footprints[route_id] = cells
+            self._counted[route_id] = rides
+            self._apply(changes)
+
+    def forget(self, route_id: int) -> None:
+        """Drop a deleted route."""
+        if not self.enabled:
+            return
+        with self._lock:
+            cells = self._footprints.pop(route_id, None)
+            if cells is not None:
+                self._apply([(cells, -self._counted.pop(route_id))])
+
+    def refresh(self) -> int:
+        """Bring the tiles up to date with the ride counts; returns how many routes changed."""
+        counts = self.ride_counts()
+        with self._lock:
+            changes = []
+            for route_id, cells in self._footprints.items():
+                rides = counts.get(route_id, 0)
+                if rides != self._counted[route_id]:
+                    changes.append((cells, rides - self._counted[route_id]))
+                    self._counted[route_id] = rides
+            self._apply(changes)
+            self._refreshed_at = time.monotonic()
+        return len(changes)
+
+    def tile(self, zoom: int, x: int, y: int) -> tuple[bytes, str]:
+        """A tile's gzip-compressed little-endian ``uint32`` counts, rows from north to south, and its ETag."""
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+        key = (zoom, x, y)
+        with self._lock:
+            cached = self._compressed.get(key)
+            if cached is not None:
+                self._compressed.move_to_end(key)
+                return cached
+            grid = self._tiles.get(key)
+            data = self._empty if grid is None else gzip.compress(grid.astype("<u4").tobytes(), mtime=0)
+            cached = self._compressed[key] = (data, f'"{zlib.crc32(data):08x}"')
+            while len(self._compressed) > self.max_cached_tiles:
+                self._compressed.popitem(last=False)
+            return cached
+
+
+route_heatmap = RouteHeatmap(
+    route_popularity.ride_counts,
+    HEATMAP_MAX_ZOOM,
+    HEATMAP_REFRESH_SECONDS,
+    HEATMAP_MAX_CACHED_TILES,
+)
+
+
+def build_heatmap(db: Session) -> None:
+    """Build the tiles from the stored footprints, rasterizing any made at another zoom or tile size."""
+    footprints = []
+    stale = 0
+    for route_id, level, cells, path in pg_crud.get_route_footprints(db):
+        if level == FOOTPRINT_LEVEL:
+            footprints.append((route_id, decode_footprint(cells)))
+        else:
+            footprints.append((route_id, footprint(decode_path(path))))
+            stale += 1
+    if stale:
+        logger.warning(f"{stale} route footprints are for another heat-map size; run `python -m app.cli rebuild-heatmap`")
+    route_heatmap.build(footprints)
+
+
+def rebuild_footprints(db: Session, batch_size: int = 1000) -> int:
+    """Re-rasterize every stored route path at the current zoom and tile size; returns how many."""
+    rebuilt = 0
+    for batch in pg_crud.iter_route_paths(db, batch_size):
+        pg_crud.update_route_footprints(db, [
+            {
+                "route_id": route_id,
+                "footprint_level": FOOTPRINT_LEVEL,
+                "footprint": encode_footprint(footprint(decode_path(path))),
+            }
+            for route_id, path in batch
+        ])
+        rebuilt += len(batch)
+    return rebuilt
@@ -0,0 +1,221 @@
+"""Load a snapshot written by ``app.services.snapshot`` into empty databases.
+
+PostgreSQL tables are loaded with ``COPY`` by a pool of worker processes, one
+chunk file per task. Tables go in foreign-key levels (riders and routes, then
+bikes, then rides), with every chunk of a level loading in parallel.
+Secondary indexes are dropped before the load and rebuilt in parallel after
+it, and id sequences are moved past the restored ids. The graph is loaded at
+the same time in its own process, in ``UNWIND`` batches: all nodes, then all
+relationships.
+"""
+
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import orjson
+from loguru import logger
+from sqlalchemy import text
+from app.db import postgres_models as models
+from app.db import neo4j_crud as neo_crud
+from app.db.database import engine
+from app.services.chunked_ndjson import read_chunk
+from app.services.snapshot import MANIFEST_FILE, SNAPSHOT_WORKERS
+
+RESTORE_GRAPH_BATCH_SIZE = int(os.environ.get("RESTORE_GRAPH_BATCH_SIZE", "5000"))
+
+
+def _copy_value(value) -> str:
+    """Render a value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = orjson.dumps(value).decode()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_chunk(table: str, columns: list[str], path: str) -> int:
+    buffer = io.StringIO()
+    rows = 0
+    for row in read_chunk(path):
+        buffer.write("\t".join(_copy_value(row.get(column)) for column in columns) + "\n")
+        rows += 1
+    buffer.seek(0)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        connection.commit()
+    finally:
+        connection.close()
+    return rows
+
+
+def _execute(statement: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(statement))
+
+
+def _batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _chunk_rows(directory: str, chunks: list[dict]):
+    for chunk in chunks:
+        yield from read_chunk(os.path.join(directory, chunk["file"]))
+
+
+def _restore_graph(snapshot_dir: str, graph: dict, batch_size: int) -> int:
+    nodes_dir = os.path.join(snapshot_dir, "neo4j", "nodes")
+    relationships_dir = os.path.join(snapshot_dir, "neo4j", "relationships")
+    loaded = 0
+    for entry in graph["nodes"]:
+        rows = _chunk_rows(nodes_dir, entry["chunks"])
+        loaded += neo_crud.load_graph_nodes(entry["label"], _batches(rows, batch_size))
+    for entry in graph["relationships"]:
+        rows = _chunk_rows(relationships_dir, entry["chunks"])
+        loaded += neo_crud.load_graph_relationships(
+            entry["start"], entry["type"], entry["end"], _batches(rows, batch_size)
+        )
+    return loaded
+
+
+def _table_levels(names: list[str]) -> list[list[str]]:
+    """Group tables so each group only references tables in earlier groups."""
+    tables = models.Base.metadata.tables
+    levels: dict[str, int] = {}
+
+    def level(name: str) -> int:
+        if name not in levels:
+            parents = {fk.column.table.name for fk in tables[name].foreign_keys} - {name}
+            levels[name] = 1 + max((level(parent) for parent in parents), default=-1)
+        return levels[name]
+
+    grouped: list[list[str]] = []
+    for name in names:
+        depth = level(name)
+        grouped.extend([] for _ in range(depth + 1 - len(grouped)))
+        grouped[depth].append(name)
+    return grouped
+
+
+def _prepare_tables(names: list[str], truncate: bool) -> list[str]:
+    """Check the tables are empty (or empty them) and drop their secondary indexes.
+
+    Returns the CREATE INDEX statements to run after the load.
+    """
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if truncate:
+            conn.execute(text(f"TRUNCATE {', '.join(names)} RESTART IDENTITY CASCADE"))
+        for name in names:
+            if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+                raise RuntimeError(f"Table {name} is not empty; restore with --truncate to replace it")
+        # Indexes backing a primary key or constraint stay; they are needed
+        # for foreign key checks during the load.
+        indexes = conn.execute(
+            text(
+                "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+                "JOIN pg_class i ON i.oid = x.indexrelid "
+                "JOIN pg_class t ON t.oid = x.indrelid "
+                "WHERE t.relname = ANY(:names) AND t.relnamespace = current_schema()::regnamespace "
+                "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)"
+            ),
+            {"names": names},
+        ).all()
+        for index_name, _ in indexes:
+            conn.execute(text(f"DROP INDEX {index_name}"))
+        # Restored rows are not news: keep them off the ride event streams and
+        # the catalog change announcements, which would come once per row.
+        for name in names:
+            conn.execute(text(f"ALTER TABLE {name} DISABLE TRIGGER USER"))
+    # On a partitioned table the definitions read "ON ONLY rides", which would
+    # rebuild an invalid parent index with nothing under it on the partitions.
+    return [definition.replace(" ON ONLY ", " ON ", 1) for _, definition in indexes]
+
+
+def _reset_sequences(names: list[str]) -> None:
+    with engine.begin() as conn:
+        for name in names:
+            for column in models.Base.metadata.tables[name].primary_key.columns:
+                sequence = conn.execute(
+                    text("SELECT pg_get_serial_sequence(:table, :column)"),
+                    {"table": name, "column": column.name},
+                ).scalar()
+                if sequence:
+                    conn.execute(text(
+                        f"SELECT setval('{sequence}', coalesce(max({column.name}), 0) + 1, false) FROM {name}"
+                    ))
+        for name in names:
+            conn.execute(text(f"ALTER TABLE {name} ENABLE TRIGGER USER"))
+        conn.execute(text(f"ANALYZE {', '.join(names)}"))
+
+
+def restore_snapshot(
+    snapshot_dir: str,
+    workers: int = SNAPSHOT_WORKERS,
+    include_graph: bool = True,
+    truncate: bool = False,
+    graph_batch_size: int = RESTORE_GRAPH_BATCH_SIZE,
+) -> dict:
+    """Restore a snapshot directory. Returns the number of rows loaded per store."""
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Snapshot restore needs PostgreSQL")
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), "rb") as f:
+        manifest = orjson.loads(f.read())
+    tables = {entry["name"]: entry for entry in manifest["postgres"]["tables"]}
+    graph = manifest["neo4j"] if include_graph else None
+
+    index_definitions = _prepare_tables(list(tables), truncate)
+    if graph and truncate:
+        for entry in graph["nodes"]:
+            neo_crud.clear_graph_label(entry["label"])
+
+    # Spawned, not forked, workers: each opens its own database connections.
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        graph_job = pool.submit(_restore_graph, snapshot_dir, graph, graph_batch_size) if graph else None
+        postgres_rows = 0
+        for level in _table_levels(list(tables)):
+            jobs = [
+                pool.submit(
+                    _copy_chunk,
+                    name,
+                    tables[name]["columns"],
+                    os.path.join(snapshot_dir, "postgres", name, chunk["file"]),
+                )
+                for name in level
+                for chunk in tables[name]["chunks"]
+            ]
+            postgres_rows += sum(job.result() for job in jobs)
+        copied = time.perf_counter() - started
+        for job in [pool.submit(_execute, definition) for definition in index_definitions]:
+            job.result()
+        _reset_sequences(list(tables))
+        logger.info(
+            f"Restored {postgres_rows} PostgreSQL rows in {copied:.1f}s "
+            f"({postgres_rows / max(copied, 1e-9):.0f} rows/s), indexes rebuilt "
+            f"after {time.perf_counter() - started:.1f}s"
+        )
+        graph_rows = graph_job.result() if graph_job else 0
+    if graph:
+        elapsed = time.perf_counter() - started
+        logger.info(f"Restored {graph_rows} graph nodes and relationships ({graph_rows / max(elapsed, 1e-9):.0f} rows/s)")
+    return {"postgres": postgres_rows, "neo4j": graph_rows}
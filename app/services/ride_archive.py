@@ -0,0 +1,152 @@
+"""Cold storage for old ride partitions.
+
+``archive_ride_partition`` streams one month's partition, sorted by rider, into
+gzip-compressed NDJSON chunks under ``RIDES_ARCHIVE_DIR/<partition>/`` and
+writes an ``index.json`` sidecar recording the month and each chunk's rider id
+range. The partition is detached and dropped only after the export is on disk
+and its row count checked, all while holding a lock that keeps writers out of
+the partition.
+
+``read_archived_rides`` serves history reads: it skips months outside the
+requested window and chunks whose rider range excludes the rider, so a lookup
+only decompresses the chunks that can contain matching rows.
+"""
+
+import os
+import shutil
+from datetime import datetime
+import orjson
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+from app.db.ride_partitions import detach_ride_partition, next_month, partition_month
+from app.services.chunked_ndjson import ChunkedNDJSONWriter, read_chunk
+
+RIDES_ARCHIVE_DIR = os.environ.get("RIDES_ARCHIVE_DIR", "archive/rides")
+RIDES_ARCHIVE_CHUNK_ROWS = int(os.environ.get("RIDES_ARCHIVE_CHUNK_ROWS", "50000"))
+
+_INDEX_FILE = "index.json"
+_FETCH_ROWS = 5000
+
+
+def archive_ride_partition(db: Session, name: str, archive_dir: str = RIDES_ARCHIVE_DIR) -> dict:
+    """Export a monthly partition to the archive, then detach and drop it.
+
+    Runs in the caller's transaction; commit it to release the partition.
+    Returns the partition's archive index.
+    """
+    month = partition_month(name)
+    if month is None:
+        raise ValueError(f"{name} is not a monthly ride partition")
+    target = os.path.join(archive_dir, name)
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} already exists")
+
+    db.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+    expected = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    rows = db.execute(
+        text(f"SELECT * FROM {name} ORDER BY rider_id, completed_at, id")
+        .columns(*models.Ride.__table__.c)
+        .execution_options(yield_per=_FETCH_ROWS)
+    ).mappings()
+
+    # Write into a scratch directory and rename it into place, so a crash
+    # never leaves a half-written month that readers would pick up.
+    staging = f"{target}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    with ChunkedNDJSONWriter(staging, RIDES_ARCHIVE_CHUNK_ROWS) as writer:
+        for row in rows:
+            chunk = writer.write(dict(row))
+            chunk["min_rider_id"] = min(chunk.get("min_rider_id", row["rider_id"]), row["rider_id"])
+            chunk["max_rider_id"] = max(chunk.get("max_rider_id", row["rider_id"]), row["rider_id"])
+    written = writer.rows
+    if written != expected:
+        shutil.rmtree(staging)
+        raise RuntimeError(f"Archived {written} of {expected} rows from {name}")
+
+    index = {
+        "partition": name,
+        "from": month.isoformat(),
+        "to": next_month(month).isoformat(),
+        "rows": written,
+        "chunks": writer.chunks,
+    }
+    with open(os.path.join(staging, _INDEX_FILE), "wb") as f:
+        f.write(orjson.dumps(index, option=orjson.OPT_INDENT_2))
+    os.rename(staging, target)
+
+    detach_ride_partition(db, name)
+    logger.info(f"Archived {written} rides from {name} to {target}")
+    return index
+
+
+def load_archive_indexes(archive_dir: str = RIDES_ARCHIVE_DIR) -> list[dict]:
+    """Indexes of every archived month, newest first."""
+    if not os.path.isdir(archive_dir):
+        return []
+    indexes = []
+    for entry in os.listdir(archive_dir):
+        path = os.path.join(archive_dir, entry, _INDEX_FILE)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                index = orjson.loads(f.read())
+            index["directory"] = os.path.join(archive_dir, entry)
+            indexes.append(index)
+    indexes.sort(key=lambda index: index["from"], reverse=True)
+    return indexes
+
+
+def _month_in_range(
+    index: dict,
+    completed_from: datetime | None,
+    completed_to: datetime | None,
+    after: tuple[datetime, int] | None,
+) -> bool:
+    lower, upper = datetime.fromisoformat(index["from"]), datetime.fromisoformat(index["to"])
+    if completed_from is not None and upper <= completed_from:
+        return False
+    if completed_to is not None and lower >= completed_to:
+        return False
+    return after is None or lower <= after[0]
+
+
+def _read_rider_rows(index: dict, rider_id: int):
+    for chunk in index["chunks"]:
+        if not chunk["min_rider_id"] <= rider_id <= chunk["max_rider_id"]:
+            continue
+        for row in read_chunk(os.path.join(index["directory"], chunk["file"])):
+            if row["rider_id"] == rider_id:
+                row["completed_at"] = datetime.fromisoformat(row["completed_at"])
+                yield row
+
+
+def read_archived_rides(
+    rider_id: int,
+    completed_from: datetime | None = None,
+    completed_to: datetime | None = None,
+    after: tuple[datetime, int] | None = None,
+    limit: int | None = None,
+    archive_dir: str = RIDES_ARCHIVE_DIR,
+) -> list[dict]:
+    """A rider's archived rides in the window, newest first.
+
+    ``after`` has the same meaning as for live history pages. With ``limit``,
+    months stop being read once enough rows are found.
+    """
+    found = []
+    for index in load_archive_indexes(archive_dir):
+        if limit is not None and len(found) >= limit:
+            break
+        if not _month_in_range(index, completed_from, completed_to, after):
+            continue
+        rows = [
+            row for row in _read_rider_rows(index, rider_id)
+            if (completed_from is None or row["completed_at"] >= completed_from)
+            and (completed_to is None or row["completed_at"] < completed_to)
+            and (after is None or (row["completed_at"], row["id"]) < after)
+        ]
+        rows.sort(key=lambda row: (row["completed_at"], row["id"]), reverse=True)
+        found.extend(rows)
+    return found if limit is None else found[:limit]
@@ -0,0 +1,225 @@
+"""Live stream of new rides, fed by Postgres LISTEN/NOTIFY.
+
+An insert trigger on ``rides`` publishes each new ride on
+``RIDE_EVENTS_CHANNEL``. Each worker process holds a single listening
+connection, registered with the event loop, and fans every notification out
+to its open streams. A notification is parsed once and encoded once as a
+server-sent event frame; per-stream work is one queue put.
+
+Every stream has a queue bounded to ``RIDE_EVENTS_QUEUE_SIZE`` frames. A
+client that falls that far behind is dropped instead of buffering without
+limit. It receives a final ``dropped`` event and can reconnect.
+
+Services that keep per-worker state in step across workers use the same
+connection: ``on_notify`` registers a handler for the decoded payloads of a
+channel, called on the event loop. Senders put ``WORKER_ID`` in their payloads
+to recognise their own notifications. Notifications sent while the connection
+is down are lost, so ``on_reconnect`` handlers drop whatever relies on them.
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Callable
+import orjson
+import psycopg2
+from loguru import logger
+from app.db.database import engine
+from app.db.postgres_models import RIDE_EVENTS_CHANNEL
+
+RIDE_EVENTS_QUEUE_SIZE = int(os.environ.get("RIDE_EVENTS_QUEUE_SIZE", "100"))
+RIDE_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("RIDE_EVENTS_HEARTBEAT_SECONDS", "15"))
+RIDE_EVENTS_RECONNECT_SECONDS = float(os.environ.get("RIDE_EVENTS_RECONNECT_SECONDS", "5"))
+
+# Sent along with this worker's notifications, so it can skip what it has already applied.
+WORKER_ID = uuid.uuid4().hex
+
+_HEARTBEAT = b": keepalive\n\n"
+_DROPPED = b"event: dropped\ndata: {}\n\n"
+
+
+class RideSubscription:
+    def __init__(self, rider_id: int | None, route_id: int | None, queue_size: int) -> None:
+        self.rider_id = rider_id
+        self.route_id = route_id
+        # None in the queue ends the stream.
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def matches(self, ride: dict) -> bool:
+        return (
+            (self.rider_id is None or ride["rider_id"] == self.rider_id)
+            and (self.route_id is None or ride["route_id"] == self.route_id)
+        )
+
+
+class RideEventBroker:
+    def __init__(self, queue_size: int, heartbeat_seconds: float, reconnect_seconds: float) -> None:
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reconnect_seconds = reconnect_seconds
+        # Streams are indexed by their most selective filter, so a ride is
+        # only matched against streams that can want it.
+        self._by_rider: dict[int, set[RideSubscription]] = {}
+        self._by_route: dict[int, set[RideSubscription]] = {}
+        self._unfiltered: set[RideSubscription] = set()
+        self._connection = None
+        self._fd: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._handlers: dict[str, list[Callable[[dict], None]]] = {RIDE_EVENTS_CHANNEL: []}
+        self._reconnect_handlers: list[Callable[[], None]] = []
+
+    def on_notify(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """Call ``handler`` with every payload sent on ``channel``; register before ``start``."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, handler: Callable[[], None]) -> None:
+        """Call ``handler`` after the listener reconnects, having missed notifications."""
+        self._reconnect_handlers.append(handler)
+
+    @property
+    def subscribers(self) -> int:
+        return (
+            sum(map(len, self._by_rider.values()))
+            + sum(map(len, self._by_route.values()))
+            + len(self._unfiltered)
+        )
+
+    def _bucket(self, subscription: RideSubscription) -> set[RideSubscription]:
+        if subscription.rider_id is not None:
+            return self._by_rider.setdefault(subscription.rider_id, set())
+        if subscription.route_id is not None:
+            return self._by_route.setdefault(subscription.route_id, set())
+        return self._unfiltered
+
+    def subscribe(self, rider_id: int | None = None, route_id: int | None = None) -> RideSubscription:
+        subscription = RideSubscription(rider_id, route_id, self.queue_size)
+        self._bucket(subscription).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: RideSubscription) -> None:
+        bucket = self._bucket(subscription)
+        bucket.discard(subscription)
+        if not bucket and bucket is not self._unfiltered:
+            if subscription.rider_id is not None:
+                self._by_rider.pop(subscription.rider_id, None)
+            else:
+                self._by_route.pop(subscription.route_id, None)
+
+    def _end(self, subscription: RideSubscription, dropped: bool) -> None:
+        """End a stream, discarding whatever it has not read yet."""
+        self.unsubscribe(subscription)
+        subscription.dropped = dropped
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def publish(self, ride: dict, payload: str) -> None:
+        """Fan one ride notification out to the matching streams."""
+        frame = f"id: {ride['id']}\nevent: ride\ndata: {payload}\n\n".encode()
+        candidates = [
+            *self._by_rider.get(ride["rider_id"], ()),
+            *self._by_route.get(ride["route_id"], ()),
+            *self._unfiltered,
+        ]
+        for subscription in candidates:
+            if not subscription.matches(ride):
+                continue
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("Dropping a ride event stream that fell behind")
+                self._end(subscription, dropped=True)
+
+    async def stream(self, subscription: RideSubscription):
+        """Server-sent event frames for a subscription, with keepalives while idle."""
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield _HEARTBEAT
+                    continue
+                if frame is None:
+                    if subscription.dropped:
+                        yield _DROPPED
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def _on_readable(self) -> None:
+        try:
+            self._connection.poll()
+        except psycopg2.Error as exc:
+            logger.warning(f"Ride event listener lost its connection: {exc}")
+            self._close_connection()
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+            return
+        while self._connection.notifies:
+            notify = self._connection.notifies.pop(0)
+            try:
+                data = orjson.loads(notify.payload)
+                if notify.channel == RIDE_EVENTS_CHANNEL:
+                    self.publish(data, notify.payload)
+                for handler in self._handlers.get(notify.channel, ()):
+                    handler(data)
+            except Exception:
+                logger.exception(f"Failed to handle a notification on {notify.channel}")
+
+    def _listen(self) -> None:
+        # A dedicated connection, detached from the pool, kept in autocommit
+        # so notifications arrive as soon as the inserting transaction commits.
+        pooled = engine.raw_connection()
+        pooled.detach()
+        connection = pooled.dbapi_connection
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            for channel in self._handlers:
+                cursor.execute(f"LISTEN {channel}")
+        self._connection = connection
+        self._fd = connection.fileno()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    async def _reconnect(self) -> None:
+        while self._connection is None:
+            await asyncio.sleep(self.reconnect_seconds)
+            try:
+                self._listen()
+                logger.info("Ride event listener reconnected")
+            except Exception as exc:
+                logger.warning(f"Ride event listener could not reconnect: {exc}")
+        for handler in self._reconnect_handlers:
+            handler()
+
+    async def start(self) -> None:
+        """Start listening for ride notifications on the running loop."""
+        if engine.dialect.name != "postgresql":
+            logger.warning("Ride event streams need PostgreSQL; no events will be sent")
+            return
+        self._loop = asyncio.get_running_loop()
+        self._listen()
+
+    def _close_connection(self) -> None:
+        if self._connection is None:
+            return
+        self._loop.remove_reader(self._fd)
+        try:
+            self._connection.close()
+        except psycopg2.Error:
+            pass
+        self._connection = None
+
+    async def stop(self) -> None:
+        """Stop listening and end every open stream."""
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._close_connection()
+        for bucket in [*self._by_rider.values(), *self._by_route.values(), self._unfiltered]:
+            for subscription in list(bucket):
+                self._end(subscription, dropped=False)
+
+
+ride_events = RideEventBroker(RIDE_EVENTS_QUEUE_SIZE, RIDE_EVENTS_HEARTBEAT_SECONDS, RIDE_EVENTS_RECONNECT_SECONDS)
@@ -0,0 +1,256 @@
+"""GPS/IMU telemetry recorded during a ride, stored as compressed columns.
+
+An upload is a stream of samples, either NDJSON with one object per line or
+binary ``TELEMETRY_RECORD`` records back to back::
+
+    {"t": 1792400000.0, "lat": 45.0703, "lon": 7.6586, "ele": 239.5, "ax": 0.12, "ay": -0.4, "az": 9.79}
+
+``t`` is Unix time in seconds. Elevation (metres) and acceleration (m/s²)
+are optional: left out, null or NaN where a sample has none. The body is
+parsed as it arrives, one network chunk at a time, so only the parsed
+columns are ever held in memory, never the text.
+
+A ride's samples are one ``ride_telemetry`` row rather than one row per
+point. Each column is its own delta-varint blob (see ``app.services.geometry``):
+milliseconds since the first sample, the path to 1e-5 degrees, elevation in
+decimetres and acceleration in hundredths of m/s². Samples are sorted by time
+and gaps in the optional columns are interpolated. Telemetry at 1 Hz takes
+about 5 bytes a sample with elevation, against 40 for a binary record.
+
+The metrics are computed once, on upload, over the stored columns:
+
+- distance: the great-circle steps between positions averaged over
+  ``TELEMETRY_SMOOTHING_SECONDS``, summed, leaving out steps while stopped:
+  slower than ``TELEMETRY_MOVING_SPEED_KMH`` on average over the
+  ``TELEMETRY_SPEED_WINDOW_SECONDS`` around them;
+- moving time: the time not stopped, leaving out gaps in the recording
+  longer than ``TELEMETRY_MAX_GAP_SECONDS``;
+- max speed: the fastest average over any ``TELEMETRY_SPEED_WINDOW_SECONDS``,
+  so one jumpy fix does not count;
+- elevation gain and loss: summed after averaging over
+  ``TELEMETRY_ELEVATION_WINDOW_SECONDS``, to leave out altimeter noise.
+
+An upload's response also lists the catalog routes its path follows (see
+``app.services.route_matching``), so a ride logged on the wrong route can be
+spotted; they are not stored.
+
+Telemetry is kept when the ride's partition is archived and is deleted with
+the ride, its rider or its route.
+"""
+
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import orjson
+from app.services.geometry import decode_deltas, decode_path, encode_deltas, encode_path, segment_lengths
+
+TELEMETRY_MAX_POINTS = int(os.environ.get("TELEMETRY_MAX_POINTS", "1000000"))
+TELEMETRY_MOVING_SPEED_KMH = float(os.environ.get("TELEMETRY_MOVING_SPEED_KMH", "5"))
+TELEMETRY_MAX_GAP_SECONDS = float(os.environ.get("TELEMETRY_MAX_GAP_SECONDS", "30"))
+TELEMETRY_SMOOTHING_SECONDS = float(os.environ.get("TELEMETRY_SMOOTHING_SECONDS", "2"))
+TELEMETRY_SPEED_WINDOW_SECONDS = float(os.environ.get("TELEMETRY_SPEED_WINDOW_SECONDS", "5"))
+TELEMETRY_ELEVATION_WINDOW_SECONDS = float(os.environ.get("TELEMETRY_ELEVATION_WINDOW_SECONDS", "30"))
+TELEMETRY_ROUTE_MATCHES = int(os.environ.get("TELEMETRY_ROUTE_MATCHES", "3"))
+
+# One binary sample, little-endian; NaN marks a missing optional value.
+TELEMETRY_RECORD = np.dtype([
+    ("t", "<f8"),
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("ele", "<f4"),
+    ("ax", "<f4"),
+    ("ay", "<f4"),
+    ("az", "<f4"),
+])
+
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+_ENCODED_COLUMNS = ("times", "path", "elevations", "accelerations")
+_ACCELERATION_AXES = ("ax", "ay", "az")
+_EPOCH = datetime(1970, 1, 1)
+_ELEVATION_SCALE = 10
+_ACCELERATION_SCALE = 100
+
+
+def _parse_ndjson(data: bytes) -> np.ndarray:
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    if not lines:
+        return np.zeros(0, dtype=TELEMETRY_RECORD)
+    try:
+        # One parse per chunk rather than per line.
+        samples = orjson.loads(b"[" + b",".join(lines) + b"]")
+        records = np.empty(len(samples), dtype=TELEMETRY_RECORD)
+        for name in TELEMETRY_RECORD.names:
+            records[name] = [np.nan if value is None else value for value in (sample.get(name) for sample in samples)]
+    except orjson.JSONDecodeError:
+        raise ValueError("Telemetry lines must be JSON objects") from None
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("Telemetry samples must be objects of numbers") from None
+    return records
+
+
+class TelemetryParser:
+    """Parses an upload body fed to it chunk by chunk, as NDJSON or, for ``BINARY_CONTENT_TYPE``, binary records."""
+
+    def __init__(self, content_type: str | None, max_points: int = TELEMETRY_MAX_POINTS) -> None:
+        self.binary = (content_type or "").split(";")[0].strip() == BINARY_CONTENT_TYPE
+        self.max_points = max_points
+        self.point_count = 0
+        self._pending = b""
+        self._batches: list[np.ndarray] = []
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._pending + chunk
+        if self.binary:
+            complete = len(data) - len(data) % TELEMETRY_RECORD.itemsize
+            records = np.frombuffer(data, dtype=TELEMETRY_RECORD, count=complete // TELEMETRY_RECORD.itemsize)
+        else:
+            complete = data.rfind(b"\n") + 1
+            records = _parse_ndjson(data[:complete])
+        self._pending = data[complete:]
+        self._append(records)
+
+    def _append(self, records: np.ndarray) -> None:
+        self.point_count += len(records)
+        if self.point_count > self.max_points:
+            raise ValueError(f"Telemetry is limited to {self.max_points} samples per ride")
+        if len(records):
+            self._batches.append(records)
+
+    def close(self) -> np.ndarray:
+        """The samples, sorted by time; raises ValueError unless there are at least two valid ones."""
+        if self._pending.strip():
+            if self.binary:
+                raise ValueError(f"Binary telemetry must be whole {TELEMETRY_RECORD.itemsize}-byte records")
+            self._append(_parse_ndjson(self._pending))
+        records = np.concatenate(self._batches) if self._batches else np.zeros(0, dtype=TELEMETRY_RECORD)
+        if len(records) < 2:
+            raise ValueError("Telemetry needs at least two samples")
+        required = np.column_stack([records["t"], records["lat"], records["lon"]])
+        if not np.isfinite(required).all():
+            raise ValueError("Every sample needs numeric t, lat and lon")
+        if (np.abs(required[:, 1:]) > (90, 180)).any() or (records["t"] < 0).any():
+            raise ValueError("Coordinates out of range")
+        return records[np.argsort(records["t"], kind="stable")]
+
+
+def _filled(seconds: np.ndarray, values: np.ndarray) -> np.ndarray | None:
+    """``values`` with missing ones interpolated over time; None if all are missing."""
+    values = values.astype(np.float64)
+    present = np.isfinite(values)
+    if not present.any():
+        return None
+    if present.all():
+        return values
+    return np.interp(seconds, seconds[present], values[present])
+
+
+def telemetry_row(records: np.ndarray) -> dict:
+    """The ``ride_telemetry`` columns (without ids) for parsed samples, metrics computed from what is stored."""
+    started = records["t"][0]
+    milliseconds = np.round((records["t"] - started) * 1000)
+    elevations = _filled(records["t"], records["ele"])
+    axes = [_filled(records["t"], records[axis]) for axis in _ACCELERATION_AXES]
+    accelerations = None
+    if any(axis is not None for axis in axes):
+        accelerations = np.column_stack([np.zeros(len(records)) if axis is None else axis for axis in axes])
+    row = {
+        "point_count": len(records),
+        "started_at": _EPOCH + timedelta(seconds=float(started)),
+        "times": encode_deltas(milliseconds),
+        "path": encode_path(np.column_stack([records["lat"], records["lon"]])),
+        "elevations": None if elevations is None else encode_deltas(np.round(elevations * _ELEVATION_SCALE)),
+        "accelerations": None if accelerations is None else encode_deltas(np.round(accelerations * _ACCELERATION_SCALE)),
+    }
+    columns = decode_telemetry(row)
+    return {**row, **telemetry_metrics(columns["seconds"], columns["points"], columns["elevations"])}
+
+
+def decode_telemetry(row: dict) -> dict:
+    """A stored row's columns: ``seconds`` since ``started_at``, ``points`` as (latitude, longitude),
+    ``elevations`` in metres and ``(n, 3)`` ``accelerations`` in m/s², the last two None if not recorded."""
+    return {
+        "seconds": decode_deltas(row["times"]) / 1000,
+        "points": decode_path(row["path"]),
+        "elevations": None if row["elevations"] is None else decode_deltas(row["elevations"]) / _ELEVATION_SCALE,
+        "accelerations": (
+            None if row["accelerations"] is None
+            else decode_deltas(row["accelerations"], len(_ACCELERATION_AXES)) / _ACCELERATION_SCALE
+        ),
+    }
+
+
+def telemetry_samples(row: dict) -> dict:
+    """A stored row's samples as one array per upload field, None for fields that were not recorded."""
+    columns = decode_telemetry(row)
+    points, accelerations = columns["points"], columns["accelerations"]
+    return {
+        "t": columns["seconds"] + (row["started_at"] - _EPOCH).total_seconds(),
+        "lat": points[:, 0].copy(),
+        "lon": points[:, 1].copy(),
+        "ele": columns["elevations"],
+        **{
+            axis: None if accelerations is None else accelerations[:, index].copy()
+            for index, axis in enumerate(_ACCELERATION_AXES)
+        },
+    }
+
+
+def encoded_bytes(row: dict) -> int:
+    return sum(len(row[column] or b"") for column in _ENCODED_COLUMNS)
+
+
+def _window_means(seconds: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+    """Per sample, the mean of ``values`` (or of the rows of a 2-D array) within ``window / 2`` seconds of it."""
+    # Offsetting by the first value keeps the running sums small enough to stay precise.
+    offsets = values - values[:1]
+    totals = np.concatenate([np.zeros_like(offsets[:1]), np.cumsum(offsets, axis=0)])
+    start = np.searchsorted(seconds, seconds - window / 2, side="left")
+    end = np.searchsorted(seconds, seconds + window / 2, side="right")
+    counts = (end - start).reshape(-1, *[1] * (values.ndim - 1))
+    return values[:1] + (totals[end] - totals[start]) / counts
+
+
+def telemetry_metrics(seconds: np.ndarray, points: np.ndarray, elevations: np.ndarray | None) -> dict:
+    # GPS jitter would add distance while stopped and zigzags while moving.
+    steps = segment_lengths(_window_means(seconds, points, TELEMETRY_SMOOTHING_SECONDS))
+    travelled = np.concatenate([[0], np.cumsum(steps)])
+    elapsed = np.diff(seconds)
+
+    # A step is stopped when the average speed over the window around it is below walking pace.
+    start = np.searchsorted(seconds, seconds[:-1] - TELEMETRY_SPEED_WINDOW_SECONDS / 2, side="left")
+    end = np.searchsorted(seconds, seconds[1:] + TELEMETRY_SPEED_WINDOW_SECONDS / 2, side="right") - 1
+    span = seconds[end] - seconds[start]
+    around = np.divide(travelled[end] - travelled[start], span, out=np.zeros_like(span), where=span > 0) * 3.6
+    gap = elapsed > TELEMETRY_MAX_GAP_SECONDS
+    stopped = (around < TELEMETRY_MOVING_SPEED_KMH) & ~gap
+
+    # Average speed from each sample to the first one a full window later.
+    later = np.searchsorted(seconds, seconds + TELEMETRY_SPEED_WINDOW_SECONDS, side="left")
+    start = np.flatnonzero(later < len(seconds))
+    if len(start):
+        end = later[start]
+        max_speed = ((travelled[end] - travelled[start]) / (seconds[end] - seconds[start])).max() * 3.6
+    else:
+        # The whole ride is shorter than one window.
+        max_speed = travelled[-1] / seconds[-1] * 3.6 if seconds[-1] > 0 else 0.0
+
+    metrics = {
+        "duration_seconds": round(float(seconds[-1] - seconds[0]), 1),
+        "distance_m": round(float(steps[~stopped].sum()), 1),
+        "moving_seconds": round(float(elapsed[~stopped & ~gap].sum()), 1),
+        "max_speed_kmh": round(float(max_speed), 1),
+        "elevation_gain_m": None,
+        "elevation_loss_m": None,
+        "min_elevation_m": None,
+        "max_elevation_m": None,
+    }
+    if elevations is not None:
+        climbs = np.diff(_window_means(seconds, elevations, TELEMETRY_ELEVATION_WINDOW_SECONDS))
+        metrics.update(
+            elevation_gain_m=round(float(climbs[climbs > 0].sum()), 1),
+            elevation_loss_m=round(float(-climbs[climbs < 0].sum()), 1),
+            min_elevation_m=round(float(elevations.min()), 1),
+            max_elevation_m=round(float(elevations.max()), 1),
+        )
+    return metrics
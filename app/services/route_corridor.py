@@ -0,0 +1,251 @@
+"""Points of interest along a route: "fuel stations within 2 km, in the order you reach them".
+
+Locations are kept in memory in a grid index of ``LOCATION_CELL_DEGREES``
+cells, built at startup and updated as locations are added and removed.
+
+A route's corridor is its path split into segments, with the bounding box of
+each run of ``CORRIDOR_CHUNK_SEGMENTS`` consecutive segments. It is computed
+when the route's geometry is uploaded, or when it is first asked for after a
+restart, and the ``CORRIDOR_MAX_CACHED_ROUTES`` most recently used are kept.
+
+A query widens every box by the radius and takes the locations in the grid
+cells the box covers, keeping those inside it; only they are measured, and
+only against that run's segments. Distances are in metres on a plane tangent
+at each segment, so they hold however long the route is. The distance along
+the route is to the path's closest point, so a location passed twice is
+listed where the route comes nearest to it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy.orm import Session
+from app.services.geometry import EARTH_RADIUS_METRES, decode_path, segment_lengths
+import app.db.postgres_crud as pg_crud
+
+LOCATION_CELL_DEGREES = float(os.environ.get("LOCATION_CELL_DEGREES", "0.05"))
+CORRIDOR_CHUNK_SEGMENTS = int(os.environ.get("CORRIDOR_CHUNK_SEGMENTS", "32"))
+CORRIDOR_MAX_CACHED_ROUTES = int(os.environ.get("CORRIDOR_MAX_CACHED_ROUTES", "1000"))
+
+_Y_BITS = 32
+
+
+def _expand(counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """For groups of ``counts`` items, each item's group and its position within it."""
+    group = np.repeat(np.arange(len(counts)), counts)
+    return group, np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+class LocationIndex:
+    def __init__(self, cell_degrees: float) -> None:
+        self.cell_degrees = cell_degrees
+        self._columns = int(np.ceil(360 / cell_degrees))
+        self._rows = int(np.ceil(180 / cell_degrees))
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._locations: dict[int, tuple[str, float, float]] = {}
+        # Per location type (None for all), sorted cell keys with the location in each; rebuilt on the next lookup after a change.
+        self._arrays: dict[str | None, tuple[np.ndarray, ...]] = {}
+
+    def _cell(self, latitude, longitude):
+        row = np.clip(np.floor((np.asarray(latitude) + 90) / self.cell_degrees), 0, self._rows - 1).astype(np.int64)
+        column = np.clip(np.floor((np.asarray(longitude) + 180) / self.cell_degrees), 0, self._columns - 1).astype(np.int64)
+        return row, column
+
+    def build(self, locations) -> None:
+        """Load ``(id, location_type, latitude, longitude)`` rows, replacing the current contents."""
+        loaded = {location_id: (location_type, latitude, longitude) for location_id, location_type, latitude, longitude in locations}
+        with self._lock:
+            self._reset()
+            self._locations = loaded
+            self.enabled = True
+
+    def add(self, location_id: int, location_type: str, latitude: float, longitude: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._locations[location_id] = (location_type, latitude, longitude)
+            self._arrays.clear()
+
+    def remove(self, location_id: int) -> None:
+        with self._lock:
+            if self._locations.pop(location_id, None) is not None:
+                self._arrays.clear()
+
+    def _index(self, location_type: str | None) -> tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(location_type)
+        if arrays is None:
+            located = [
+                (location_id, latitude, longitude)
+                for location_id, (kind, latitude, longitude) in self._locations.items()
+                if location_type is None or kind == location_type
+            ]
+            ids = np.array([location[0] for location in located], dtype=np.int64)
+            points = np.array([location[1:] for location in located], dtype=np.float64).reshape(-1, 2)
+            row, column = self._cell(points[:, 0], points[:, 1])
+            order = np.argsort((row << _Y_BITS) | column, kind="stable")
+            arrays = self._arrays[location_type] = (((row << _Y_BITS) | column)[order], ids[order], points[order])
+        return arrays
+
+    def within(self, low: np.ndarray, high: np.ndarray, location_type: str | None = None):
+        """Locations inside latitude/longitude boxes, as ``(box, id, latitude, longitude)`` arrays, one entry per box a location is in."""
+        with self._lock:
+            keys, ids, points = self._index(location_type)
+        first_row, first_column = self._cell(low[:, 0], low[:, 1])
+        last_row, last_column = self._cell(high[:, 0], high[:, 1])
+        width = last_column - first_column + 1
+        box, offset = _expand(width * (last_row - first_row + 1))
+        cells = ((first_row[box] + offset // width[box]) << _Y_BITS) | (first_column[box] + offset % width[box])
+        start = np.searchsorted(keys, cells, side="left")
+        hits = np.searchsorted(keys, cells, side="right") - start
+        cell, offset = _expand(hits)
+        box, position = box[cell], start[cell] + offset
+        inside = ((points[position] >= low[box]) & (points[position] <= high[box])).all(axis=1)
+        box, position = box[inside], position[inside]
+        return box, ids[position], points[position, 0], points[position, 1]
+
+
+class RouteCorridor:
+    """A route's path as segments, with the bounding box of every ``chunk`` consecutive ones."""
+
+    def __init__(self, points: np.ndarray, chunk: int = CORRIDOR_CHUNK_SEGMENTS) -> None:
+        points = np.asarray(points, dtype=np.float64)
+        if len(points) == 1:
+            points = np.repeat(points, 2, axis=0)
+        self.chunk = chunk
+        self.segments = len(points) - 1
+        radians = np.radians(points)
+        # Each segment on the plane tangent at its start, x east and y north, in metres.
+        self.starts = radians[:-1]
+        self.scales = np.cos(radians[:-1, 0])
+        delta = np.diff(radians, axis=0)
+        delta[:, 1] = (delta[:, 1] + np.pi) % (2 * np.pi) - np.pi
+        self.vectors = EARTH_RADIUS_METRES * np.column_stack([delta[:, 1] * self.scales, delta[:, 0]])
+        self.lengths = segment_lengths(points)
+        self.along = np.concatenate([[0.0], np.cumsum(self.lengths)[:-1]])
+        first = np.arange(0, self.segments, chunk)
+        self.low = np.minimum.reduceat(np.minimum(points[:-1], points[1:]), first)
+        self.high = np.maximum.reduceat(np.maximum(points[:-1], points[1:]), first)
+
+    def _offsets(self, segment: np.ndarray, latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+        """Points on the plane tangent at each segment's start, relative to it, in metres."""
+        start = self.starts[segment]
+        east = (np.radians(longitude) - start[:, 1] + np.pi) % (2 * np.pi) - np.pi
+        return EARTH_RADIUS_METRES * np.column_stack([east * self.scales[segment], np.radians(latitude) - start[:, 0]])
+
+    def nearby(self, locations: LocationIndex, radius: float, location_type: str | None = None):
+        """``(id, distance_from_route, distance_along_route)`` arrays of the locations within ``radius`` metres, in route order."""
+        pad_latitude = np.degrees(radius / EARTH_RADIUS_METRES)
+        poleward = np.maximum(np.abs(self.low[:, 0]), np.abs(self.high[:, 0]))
+        pad = np.column_stack([
+            np.full(len(self.low), pad_latitude),
+            pad_latitude / np.cos(np.radians(np.minimum(poleward + pad_latitude, 89.0))),
+        ])
+        box, ids, latitude, longitude = locations.within(self.low - pad, self.high + pad, location_type)
+        # Widened boxes overlap, so a location is in many. The route inside a box is no nearer than the
+        # box, and no further than the box's first point: only boxes no further away than the nearest
+        # first point can hold the location's closest segment.
+        point = np.column_stack([latitude, longitude])
+        outside = np.radians(np.maximum(np.maximum(self.low[box] - point, point - self.high[box]), 0))
+        scale = np.cos(np.radians(np.minimum(np.maximum(poleward[box], np.abs(latitude)), 89.0)))
+        lower = EARTH_RADIUS_METRES * np.hypot(outside[:, 0], outside[:, 1] * scale)
+        upper = np.hypot(*self._offsets(box * self.chunk, latitude, longitude).T)
+        unique_ids, location = np.unique(ids, return_inverse=True)
+        nearest = np.full(len(unique_ids), np.inf)
+        np.minimum.at(nearest, location, upper)
+        # Give or take rounding: the two bounds meet when the closest point is a box corner.
+        keep = (lower <= nearest[location] + 1e-6) & (lower <= radius + 1e-6)
+        box, ids, latitude, longitude = box[keep], ids[keep], latitude[keep], longitude[keep]
+        # Measure each location against every segment of the boxes left.
+        counts = np.minimum(self.chunk, self.segments - box * self.chunk)
+        pair, offset = _expand(counts)
+        segment = box[pair] * self.chunk + offset
+        relative = self._offsets(segment, latitude[pair], longitude[pair])
+        vector = self.vectors[segment]
+        squared = (vector ** 2).sum(axis=1)
+        fraction = np.clip(np.divide((relative * vector).sum(axis=1), squared, out=np.zeros_like(squared), where=squared > 0), 0, 1)
+        distance = np.hypot(*(relative - fraction[:, np.newaxis] * vector).T)
+        along = self.along[segment] + fraction * self.lengths[segment]
+        # The closest segment of each location, if it is close enough.
+        order = np.lexsort((distance, ids[pair]))
+        closest = order[np.unique(ids[pair][order], return_index=True)[1]]
+        closest = closest[distance[closest] <= radius]
+        closest = closest[np.argsort(along[closest], kind="stable")]
+        return ids[pair][closest], distance[closest], along[closest]
+
+
+class RouteCorridors:
+    def __init__(self, max_routes: int) -> None:
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        self._corridors: OrderedDict[int, RouteCorridor] = OrderedDict()
+
+    def _store(self, route_id: int, corridor: RouteCorridor) -> None:
+        with self._lock:
+            self._corridors[route_id] = corridor
+            self._corridors.move_to_end(route_id)
+            while len(self._corridors) > self.max_routes:
+                self._corridors.popitem(last=False)
+
+    def get(self, db: Session, route_id: int) -> RouteCorridor | None:
+        """A route's corridor, built from its stored path if not cached; None if it has no geometry."""
+        with self._lock:
+            corridor = self._corridors.get(route_id)
+            if corridor is not None:
+                self._corridors.move_to_end(route_id)
+                return corridor
+        geometry = pg_crud.get_route_geometry(db, route_id)
+        if geometry is None:
+            return None
+        corridor = RouteCorridor(decode_path(geometry["path"]))
+        self._store(route_id, corridor)
+        return corridor
+
+    def set_route(self, route_id: int, points: np.ndarray) -> None:
+        """Precompute a route's corridor, e.g. after its geometry was uploaded."""
+        self._store(route_id, RouteCorridor(points))
+
+    def forget(self, route_id: int) -> None:
+        with self._lock:
+            self._corridors.pop(route_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._corridors.clear()
+
+
+location_index = LocationIndex(LOCATION_CELL_DEGREES)
+route_corridors = RouteCorridors(CORRIDOR_MAX_CACHED_ROUTES)
+
+
+def build_location_index(db: Session) -> None:
+    location_index.build(pg_crud.get_location_points(db))
+
+
+def locations_along_route(
+    db: Session,
+    route_id: int,
+    radius: float,
+    location_type: str | None = None,
+    limit: int | None = None,
+) -> list[dict] | None:
+    """Locations within ``radius`` metres of a route, in the order it reaches them; None if it has no geometry."""
+    corridor = route_corridors.get(db, route_id)
+    if corridor is None:
+        return None
+    ids, distances, along = corridor.nearby(location_index, radius, location_type)
+    ids, distances, along = ids[:limit], distances[:limit], along[:limit]
+    rows = pg_crud.get_locations_by_ids(db, ids.tolist())
+    return [
+        {
+            **rows[location_id],
+            "distance_from_route_m": round(float(distance), 1),
+            "distance_along_route_m": round(float(position), 1),
+        }
+        for location_id, distance, position in zip(ids.tolist(), distances, along)
+        if location_id in rows
+    ]
@@ -0,0 +1,246 @@
+"""Bitmap indexes for "every route my garage can handle".
+
+A route is open to a rider when one of their bikes has at least the route's
+``min_bike_cc`` and, for routes that require experience, the rider is past
+``beginner``. Eligibility therefore depends only on a rider's largest bike
+and whether they are experienced. Riders with the same pair share one
+precomputed bitmap of eligible route ids, so the number of bitmaps follows
+the number of distinct garages, not the number of riders. A rider without
+bikes has no eligible routes.
+
+Every bitmap is a NumPy ``uint8`` array with one bit per route id. Besides
+eligibility there is one bitmap per difficulty, route type and scenic
+``best_season``, so a query is a handful of vectorized ANDs and ORs before
+the ids are unpacked. Each bitmap takes ``max route id / 8`` bytes; at a
+hundred thousand routes that is 12.5 KB, small enough to keep uncompressed.
+
+Route bitmaps are built at startup and updated as routes are written
+(see ``app.services.catalog_sync``), eligibility bitmaps included. Riders'
+garages are read from the database on first use and cached
+(``ELIGIBILITY_MAX_RIDERS`` of them, least recently used dropped first); a
+committed change to a rider's bikes or experience forgets the rider's entry.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import reduce
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+import app.db.postgres_crud as pg_crud
+
+ELIGIBILITY_MAX_RIDERS = int(os.environ.get("ELIGIBILITY_MAX_RIDERS", "100000"))
+ELIGIBILITY_MAX_GARAGES = int(os.environ.get("ELIGIBILITY_MAX_GARAGES", "1024"))
+
+_INEXPERIENCED = models.ExperienceLevel.BEGINNER.value
+
+
+def _key(value) -> str | None:
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+
+def _mask(route_id: int) -> tuple[int, int]:
+    return route_id >> 3, 0x80 >> (route_id & 7)
+
+
+class _RouteFacts:
+    __slots__ = ("difficulty", "route_type", "season", "min_bike_cc", "requires_experience")
+
+    def __init__(self, route_type, difficulty, details) -> None:
+        details = details or {}
+        self.route_type = _key(route_type)
+        self.difficulty = _key(difficulty)
+        self.season = _key(details.get("best_season"))
+        self.min_bike_cc = details.get("min_bike_cc")
+        self.requires_experience = bool(details.get("requires_experience"))
+
+    def open_to(self, garage: tuple[int, bool]) -> bool:
+        largest_cc, experienced = garage
+        return (
+            (self.min_bike_cc is None or self.min_bike_cc <= largest_cc)
+            and (experienced or not self.requires_experience)
+        )
+
+
+class RouteEligibilityIndex:
+    def __init__(self, max_riders: int, max_garages: int) -> None:
+        self.max_riders = max_riders
+        self.max_garages = max_garages
+        self.enabled = False
+        self._lock = threading.Lock()
+        # rider_id -> (largest engine cc or 0 without bikes, experienced)
+        self._garages: OrderedDict[int, tuple[int, bool]] = OrderedDict()
+        self._writes = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._size = 0
+        self._facts: dict[int, _RouteFacts] = {}
+        self._all = self._bitmap()
+        self._experience = self._bitmap()
+        self._by_min_cc: dict[int, np.ndarray] = {}
+        self._by_difficulty: dict[str, np.ndarray] = {}
+        self._by_type: dict[str, np.ndarray] = {}
+        self._by_season: dict[str, np.ndarray] = {}
+        self._eligible: OrderedDict[tuple[int, bool], np.ndarray] = OrderedDict()
+
+    def _bitmap(self) -> np.ndarray:
+        return np.zeros(self._size, dtype=np.uint8)
+
+    def _bitmaps(self):
+        yield self._all
+        yield self._experience
+        for group in (self._by_min_cc, self._by_difficulty, self._by_type, self._by_season, self._eligible):
+            yield from group.values()
+
+    def _grow(self, route_id: int) -> None:
+        needed = (route_id >> 3) + 1
+        if needed <= self._size:
+            return
+        size = max(needed, 2 * self._size, 1024)
+        pad = size - self._size
+        self._size = size
+        self._all = np.pad(self._all, (0, pad))
+        self._experience = np.pad(self._experience, (0, pad))
+        for group in (self._by_min_cc, self._by_difficulty, self._by_type, self._by_season, self._eligible):
+            for key, bitmap in group.items():
+                group[key] = np.pad(bitmap, (0, pad))
+
+    def _in(self, group: dict, key, route_id: int) -> None:
+        if key is None:
+            return
+        bitmap = group.get(key)
+        if bitmap is None:
+            bitmap = group[key] = self._bitmap()
+        byte, bit = _mask(route_id)
+        bitmap[byte] |= bit
+
+    def build(self, rows) -> None:
+        """Load ``(id, route_type, difficulty, details)`` rows, replacing the current contents and cached garages."""
+        with self._lock:
+            self._reset()
+            self._writes += 1
+            self._garages.clear()
+            for route_id, *fields in rows:
+                self._add(route_id, _RouteFacts(*fields))
+            self.enabled = True
+
+    def add(self, route: models.Route) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(route.id)
+            self._add(route.id, _RouteFacts(route.route_type, route.difficulty, route.details))
+
+    def remove(self, route_id: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(route_id)
+
+    def _add(self, route_id: int, facts: _RouteFacts) -> None:
+        self._grow(route_id)
+        self._facts[route_id] = facts
+        byte, bit = _mask(route_id)
+        self._all[byte] |= bit
+        if facts.requires_experience:
+            self._experience[byte] |= bit
+        self._in(self._by_min_cc, facts.min_bike_cc, route_id)
+        self._in(self._by_difficulty, facts.difficulty, route_id)
+        self._in(self._by_type, facts.route_type, route_id)
+        self._in(self._by_season, facts.season, route_id)
+        for garage, bitmap in self._eligible.items():
+            if facts.open_to(garage):
+                bitmap[byte] |= bit
+
+    def _remove(self, route_id: int) -> None:
+        if self._facts.pop(route_id, None) is None:
+            return
+        byte, bit = _mask(route_id)
+        for bitmap in self._bitmaps():
+            bitmap[byte] &= 0xFF ^ bit
+
+    def _eligible_for(self, garage: tuple[int, bool]) -> np.ndarray:
+        bitmap = self._eligible.get(garage)
+        if bitmap is not None:
+            self._eligible.move_to_end(garage)
+            return bitmap
+        largest_cc, experienced = garage
+        too_big = [bitmap for min_cc, bitmap in self._by_min_cc.items() if min_cc > largest_cc]
+        bitmap = self._all.copy()
+        if too_big:
+            bitmap &= ~reduce(np.bitwise_or, too_big)
+        if not experienced:
+            bitmap &= ~self._experience
+        self._eligible[garage] = bitmap
+        while len(self._eligible) > self.max_garages:
+            self._eligible.popitem(last=False)
+        return bitmap
+
+    def _any_of(self, group: dict[str, np.ndarray], keys: list[str]) -> np.ndarray:
+        bitmaps = [group[key] for key in map(_key, keys) if key in group]
+        return reduce(np.bitwise_or, bitmaps) if bitmaps else self._bitmap()
+
+    def garage(self, db: Session, rider_id: int) -> tuple[int, bool] | None:
+        """A rider's (largest engine cc, experienced), or None if there is no such rider."""
+        with self._lock:
+            if rider_id in self._garages:
+                self._garages.move_to_end(rider_id)
+                return self._garages[rider_id]
+            writes_seen = self._writes
+        row = pg_crud.get_rider_garage(db, rider_id)
+        if row is None:
+            return None
+        experience_level, largest_cc = row
+        garage = (largest_cc or 0, (experience_level or "").lower() != _INEXPERIENCED)
+        with self._lock:
+            # A bike added or removed meanwhile may not be in what we read.
+            if self._writes == writes_seen:
+                self._garages[rider_id] = garage
+                while len(self._garages) > self.max_riders:
+                    self._garages.popitem(last=False)
+        return garage
+
+    def forget_rider(self, rider_id: int) -> None:
+        """Drop a rider's cached garage, e.g. after a bike is added or removed."""
+        with self._lock:
+            self._writes += 1
+            self._garages.pop(rider_id, None)
+
+    def eligible(
+        self,
+        garage: tuple[int, bool],
+        difficulties: list[str] | None = None,
+        route_types: list[str] | None = None,
+        seasons: list[str] | None = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> list[int]:
+        """Ids of routes open to ``garage``, narrowed by any of each filter's values, ascending."""
+        if not garage[0]:
+            return []
+        with self._lock:
+            bitmap = self._eligible_for(garage).copy()
+            for group, keys in (
+                (self._by_difficulty, difficulties),
+                (self._by_type, route_types),
+                (self._by_season, seasons),
+            ):
+                if keys:
+                    bitmap &= self._any_of(group, keys)
+        route_ids = np.flatnonzero(np.unpackbits(bitmap))
+        return route_ids[offset:offset + limit].tolist()
+
+
+route_eligibility = RouteEligibilityIndex(ELIGIBILITY_MAX_RIDERS, ELIGIBILITY_MAX_GARAGES)
+
+
+def build_eligibility_index(db: Session) -> None:
+    route_eligibility.build(db.execute(select(
+        models.Route.id,
+        models.Route.route_type,
+        models.Route.difficulty,
+        models.Route.details,
+    )).yield_per(10_000))
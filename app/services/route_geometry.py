@@ -0,0 +1,75 @@
+"""Route geometry uploads and their per-zoom simplifications.
+
+An upload is a GPX file or a GeoJSON LineString. Its path is stored whole in
+``route_geometries`` and, for each zoom in ``ROUTE_GEOMETRY_ZOOMS``,
+simplified with Douglas-Peucker to one pixel of a 256-pixel tile into
+``route_geometry_levels``. A map asking for a zoom gets the first stored level
+at least that detailed, so a country-wide view of a 50,000-point track reads
+a few dozen points and never the full path. Zooms at which simplifying would
+keep every point are not stored; they are served the full path.
+
+``python -m app.cli simplify-route-geometries`` recomputes the levels of every
+stored path, for paths uploaded before this existed or after changing
+``ROUTE_GEOMETRY_ZOOMS``.
+"""
+
+import os
+import numpy as np
+import orjson
+from sqlalchemy.orm import Session
+from app.services.geometry import (
+    decode_path, encode_path, mercator, path_from_geojson, path_from_gpx, simplification_tolerances
+)
+import app.db.postgres_crud as pg_crud
+
+ROUTE_GEOMETRY_ZOOMS = sorted(int(zoom) for zoom in os.environ.get("ROUTE_GEOMETRY_ZOOMS", "6,9,12,15").split(","))
+ROUTE_GEOMETRY_MAX_POINTS = int(os.environ.get("ROUTE_GEOMETRY_MAX_POINTS", "500000"))
+
+_GPX_CONTENT_TYPES = ("application/gpx+xml", "application/xml", "text/xml")
+
+
+def parse_geometry(body: bytes, content_type: str | None) -> np.ndarray:
+    """(latitude, longitude) points of an uploaded GPX file or GeoJSON; raises ValueError if it is neither."""
+    if (content_type or "").split(";")[0].strip() in _GPX_CONTENT_TYPES or body.lstrip().startswith(b"<"):
+        points = path_from_gpx(body)
+    else:
+        try:
+            payload = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            raise ValueError("Expected GPX or GeoJSON") from None
+        points = path_from_geojson(payload)
+    if len(points) > ROUTE_GEOMETRY_MAX_POINTS:
+        raise ValueError(f"Paths are limited to {ROUTE_GEOMETRY_MAX_POINTS} points")
+    return points
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """One pixel of a 256-pixel tile at ``zoom``, in ``mercator`` units."""
+    return 1 / (256 << zoom)
+
+
+def simplified_levels(points: np.ndarray, zooms: list[int] = ROUTE_GEOMETRY_ZOOMS) -> list[dict]:
+    """``route_geometry_levels`` rows (without route_id) for a path, shallowest zoom first."""
+    if not zooms:
+        return []
+    tolerances = simplification_tolerances(mercator(points), floor=zoom_tolerance(max(zooms)))
+    levels = []
+    for zoom in sorted(zooms):
+        kept = points[tolerances > zoom_tolerance(zoom)]
+        if len(kept) == len(points):
+            break
+        levels.append({"zoom": zoom, "point_count": len(kept), "path": encode_path(kept)})
+    return levels
+
+
+def rebuild_simplifications(db: Session, batch_size: int = 1000) -> int:
+    """Recompute the levels of every stored path; returns how many paths."""
+    rebuilt = 0
+    for batch in pg_crud.iter_route_paths(db, batch_size):
+        pg_crud.replace_route_geometry_levels(db, [route_id for route_id, _ in batch], [
+            {"route_id": route_id, **level}
+            for route_id, path in batch
+            for level in simplified_levels(decode_path(path))
+        ])
+        rebuilt += len(batch)
+    return rebuilt
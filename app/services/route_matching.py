@@ -0,0 +1,190 @@
+"""Matching GPS traces to the catalog routes they follow.
+
+Candidates come from a grid index: every route with geometry is listed under
+the cells of a ``2 ** ROUTE_MATCH_CELL_LEVEL``-cell Web Mercator grid (about
+600 m at the equator) that its heat-map footprint crosses. A route is a
+candidate when at least ``ROUTE_MATCH_MIN_CELL_SHARE`` of the trace's cells
+have it in the cell or a neighbouring one. The index is kept in memory and
+built at startup from the stored footprints.
+
+Each candidate's path is read at ``ROUTE_MATCH_ZOOM`` detail and scored
+against the trace in local metres, both resampled every half tolerance (or
+further apart for traces over ``ROUTE_MATCH_MAX_POINTS`` points):
+
+- coverage: the share of the route's length within
+  ``ROUTE_MATCH_TOLERANCE_METRES`` of the trace;
+- trace on route: the share of the trace's length within it of the route;
+- Fréchet: the discrete Fréchet distance between the trace, from where it
+  joins the route to where it leaves, and the stretch of route in between,
+  in the direction it was ridden. Unlike the shares above, it notices a
+  trace that cuts corners, doubles back or leaves and rejoins the route.
+
+Routes the trace is on for less than ``ROUTE_MATCH_MIN_OVERLAP_METRES`` are
+left out. A route is matched when the Fréchet distance is within tolerance,
+give or take half the sample spacing.
+"""
+
+import os
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+from app.services.geometry import (
+    decode_path, discrete_frechet, pairwise_distances, path_length, resample, to_local
+)
+from app.services.heatmap import FOOTPRINT_LEVEL, decode_footprint, footprint
+import app.db.postgres_crud as pg_crud
+
+ROUTE_MATCH_TOLERANCE_METRES = float(os.environ.get("ROUTE_MATCH_TOLERANCE_METRES", "50"))
+ROUTE_MATCH_CELL_LEVEL = min(int(os.environ.get("ROUTE_MATCH_CELL_LEVEL", "16")), FOOTPRINT_LEVEL)
+ROUTE_MATCH_MIN_CELL_SHARE = float(os.environ.get("ROUTE_MATCH_MIN_CELL_SHARE", "0.25"))
+ROUTE_MATCH_MAX_CANDIDATES = int(os.environ.get("ROUTE_MATCH_MAX_CANDIDATES", "10"))
+ROUTE_MATCH_MAX_POINTS = int(os.environ.get("ROUTE_MATCH_MAX_POINTS", "1000"))
+ROUTE_MATCH_ZOOM = int(os.environ.get("ROUTE_MATCH_ZOOM", "14"))
+ROUTE_MATCH_MIN_OVERLAP_METRES = float(os.environ.get("ROUTE_MATCH_MIN_OVERLAP_METRES", "500"))
+
+_Y_BITS = 32
+_Y_MASK = (1 << 32) - 1
+_NEIGHBOURS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+def _coarsen(cells: np.ndarray, level: int, to_level: int) -> np.ndarray:
+    """Footprint cells at ``level`` as the cells containing them at the shallower ``to_level``."""
+    shift = np.uint64(level - to_level)
+    x, y = (cells >> np.uint64(_Y_BITS)) >> shift, (cells & np.uint64(_Y_MASK)) >> shift
+    return np.unique((x << np.uint64(_Y_BITS)) | y).astype(np.int64)
+
+
+class RouteMatcher:
+    def __init__(self, level: int) -> None:
+        self.level = level
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._cells: dict[int, np.ndarray] = {}
+        # Every route's cells, sorted, with the route each came from; rebuilt on the next lookup after a change.
+        self._keys: np.ndarray | None = None
+        self._routes: np.ndarray | None = None
+
+    def build(self, footprints) -> None:
+        """Load ``(route_id, level, cells)`` footprints, replacing the current contents."""
+        cells = {route_id: _coarsen(route_cells, level, self.level) for route_id, level, route_cells in footprints}
+        with self._lock:
+            self._reset()
+            self._cells = cells
+            self.enabled = True
+
+    def set_route(self, route_id: int, cells: np.ndarray, level: int = FOOTPRINT_LEVEL) -> None:
+        """Replace a route's footprint, e.g. after its geometry was uploaded."""
+        if not self.enabled:
+            return
+        coarse = _coarsen(cells, level, self.level)
+        with self._lock:
+            self._cells[route_id] = coarse
+            self._keys = self._routes = None
+
+    def forget(self, route_id: int) -> None:
+        """Drop a deleted route."""
+        with self._lock:
+            if self._cells.pop(route_id, None) is not None:
+                self._keys = self._routes = None
+
+    def _index(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._keys is None:
+            keys = np.concatenate([np.zeros(0, dtype=np.int64), *self._cells.values()])
+            routes = np.repeat(np.fromiter(self._cells, dtype=np.int64, count=len(self._cells)),
+                               [len(cells) for cells in self._cells.values()])
+            order = np.argsort(keys, kind="stable")
+            self._keys, self._routes = keys[order], routes[order]
+        return self._keys, self._routes
+
+    def candidates(self, points: np.ndarray, limit: int = ROUTE_MATCH_MAX_CANDIDATES) -> list[int]:
+        """Routes near enough to a latitude/longitude trace to score, the most overlapping first."""
+        cells = footprint(points, self.level).astype(np.int64)
+        x, y = cells >> _Y_BITS, cells & _Y_MASK
+        # Each trace cell with its 3 x 3 neighbourhood, so a route just across a cell border still counts.
+        around = ((x[:, np.newaxis] + _NEIGHBOURS[:, 0]) << _Y_BITS) | (y[:, np.newaxis] + _NEIGHBOURS[:, 1])
+        with self._lock:
+            keys, routes = self._index()
+        start = np.searchsorted(keys, around.ravel(), side="left")
+        end = np.searchsorted(keys, around.ravel(), side="right")
+        hits = end - start
+        owner = np.repeat(np.arange(around.size) // len(_NEIGHBOURS), hits)
+        positions = np.arange(hits.sum()) - np.repeat(np.cumsum(hits) - hits, hits) + np.repeat(start, hits)
+        # Count each route once per trace cell, however many of the neighbours it is in.
+        pairs = np.unique((routes[positions] << 32) | owner)
+        route_ids, shared = np.unique(pairs >> 32, return_counts=True)
+        share = shared / len(cells)
+        order = np.argsort(-share, kind="stable")
+        return [int(route_id) for route_id in route_ids[order][share[order] >= ROUTE_MATCH_MIN_CELL_SHARE][:limit]]
+
+
+route_matcher = RouteMatcher(ROUTE_MATCH_CELL_LEVEL)
+
+
+def build_route_matcher(db: Session) -> None:
+    footprints = []
+    for route_id, level, cells, path in pg_crud.get_route_footprints(db):
+        if level >= route_matcher.level:
+            footprints.append((route_id, level, decode_footprint(cells)))
+        else:
+            footprints.append((route_id, route_matcher.level, footprint(decode_path(path), route_matcher.level)))
+    route_matcher.build(footprints)
+
+
+def _score(trace: np.ndarray, route: np.ndarray, spacing: float) -> dict | None:
+    """How a projected trace follows a projected route; None if it is never on it for long."""
+    route_length = path_length(route)
+    if route_length == 0:
+        return None
+    route = resample(route, max(spacing, route_length / (4 * ROUTE_MATCH_MAX_POINTS)))
+    # Points are compared with points, which can be up to half a spacing further apart than the paths.
+    reach = ROUTE_MATCH_TOLERANCE_METRES + max(spacing, route_length / max(len(route) - 1, 1)) / 2
+    # Only route points within the trace's bounding box (plus reach) can be near it.
+    low, high = trace.min(axis=0) - reach, trace.max(axis=0) + reach
+    near = np.flatnonzero(((route >= low) & (route <= high)).all(axis=1))
+    if not len(near):
+        return None
+    distances = pairwise_distances(trace, route[near])
+    on_route = distances.min(axis=1) <= reach
+    # A trace that only crosses the route, or touches it at a junction, is not following it.
+    if on_route.sum() * spacing < ROUTE_MATCH_MIN_OVERLAP_METRES:
+        return None
+    covered = int((distances.min(axis=0) <= reach).sum())
+    score = {
+        "coverage_percent": round(min(covered / len(route), 1.0) * 100, 1),
+        "trace_on_route_percent": round(float(on_route.mean()) * 100, 1),
+        "frechet_m": None,
+        "matched": False,
+    }
+    joined = np.flatnonzero(on_route)
+    if len(joined) < 2:
+        return score
+    nearest = near[distances[joined].argmin(axis=1)]
+    stretch = route[nearest.min():nearest.max() + 1]
+    if np.sign(np.diff(nearest)).sum() < 0:
+        stretch = stretch[::-1]
+    frechet = discrete_frechet(pairwise_distances(trace[joined[0]:joined[-1] + 1], stretch))
+    score["frechet_m"] = round(frechet, 1)
+    score["matched"] = frechet <= reach
+    return score
+
+
+def match_trace(db: Session, points: np.ndarray, limit: int) -> list[dict]:
+    """The catalog routes a latitude/longitude trace follows best, matched ones first, then by coverage."""
+    candidates = route_matcher.candidates(points)
+    if not candidates:
+        return []
+    origin_latitude = float(points[:, 0].mean())
+    # Thin dense traces first: GPS jitter between close fixes adds length the rider never covered.
+    trace = to_local(points[::-(-len(points) // (4 * ROUTE_MATCH_MAX_POINTS))], origin_latitude)
+    spacing = max(ROUTE_MATCH_TOLERANCE_METRES / 2, path_length(trace) / ROUTE_MATCH_MAX_POINTS)
+    trace = resample(trace, spacing)
+    matches = []
+    for route_id, name, path in pg_crud.get_route_match_paths(db, candidates, ROUTE_MATCH_ZOOM):
+        score = _score(trace, to_local(decode_path(path), origin_latitude), spacing)
+        if score is not None:
+            matches.append({"route_id": route_id, "name": name, **score})
+    matches.sort(key=lambda match: (not match["matched"], -match["coverage_percent"], match["frechet_m"] or 0))
+    return matches[:limit]
@@ -0,0 +1,105 @@
+"""Derived route metrics, stored on ``routes`` so they can be sorted on.
+
+``estimated_minutes`` is the riding time at a typical pace for the route
+type: the speed limit on highways (as ``HighwayRouteCreate`` estimates it),
+slower the more technical an offroad trail is, and half a minute extra per
+mountain hairpin.
+
+``difficulty_score`` puts every route type on one 0-100 scale: 25 points per
+difficulty level above easy, plus up to 25 from the type's own details
+(technical difficulty offroad, ``MountainRouteCreate``'s elevation, hairpin
+and altitude score in the mountains).
+
+Both are computed for many routes at once with NumPy. New routes get theirs
+on insert; at startup the whole catalog is recomputed in one pass and only
+rows whose stored values differ are written, which also backfills routes
+created before the columns existed.
+"""
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+
+_CRUISING_SPEED_KMH = {
+    models.RouteType.SCENIC.value: 60,
+    models.RouteType.HIGHWAY.value: 90,  # when no speed limit is recorded
+    models.RouteType.OFFROAD.value: 40,
+    models.RouteType.MOUNTAIN.value: 45,
+    models.RouteType.COASTAL.value: 55,
+}
+_OFFROAD_SLOWDOWN_KMH = 2.5  # per technical difficulty point
+_MINUTES_PER_HAIRPIN = 0.5
+_MIN_SPEED_KMH = 10
+
+_LEVELS = {difficulty.value: level for level, difficulty in enumerate(models.Difficulty)}
+_POINTS_PER_LEVEL = 25
+_MAX_DETAIL_POINTS = 25
+# MountainRouteCreate.get_difficulty_score() worth the full detail points
+_MOUNTAIN_SCORE_CEILING = 100
+
+_DETAILS = ("speed_limit", "technical_difficulty", "elevation_gain", "max_altitude", "hairpin_turns")
+
+METRIC_COLUMNS = ("estimated_minutes", "difficulty_score")
+
+
+def compute_metrics(route_types, difficulties, distances, details) -> dict[str, np.ndarray]:
+    """Metrics for parallel sequences of route fields, one array per metric column."""
+    route_types = np.asarray(route_types, dtype=object)
+    distances = np.asarray(distances, dtype=np.float64)
+    levels = np.array([_LEVELS.get((difficulty or "").lower(), 0) for difficulty in difficulties], dtype=np.float64)
+    values = {
+        name: np.array([float((payload or {}).get(name) or 0) for payload in details], dtype=np.float64)
+        for name in _DETAILS
+    }
+    highway = route_types == models.RouteType.HIGHWAY.value
+    offroad = route_types == models.RouteType.OFFROAD.value
+    mountain = route_types == models.RouteType.MOUNTAIN.value
+
+    speed = np.array([_CRUISING_SPEED_KMH.get(route_type, 60) for route_type in route_types], dtype=np.float64)
+    speed = np.where(highway & (values["speed_limit"] > 0), values["speed_limit"], speed)
+    speed = np.where(offroad, speed - _OFFROAD_SLOWDOWN_KMH * values["technical_difficulty"], speed)
+    minutes = distances / np.maximum(speed, _MIN_SPEED_KMH) * 60
+    minutes += np.where(mountain, _MINUTES_PER_HAIRPIN * values["hairpin_turns"], 0)
+
+    mountain_score = (
+        values["elevation_gain"] / 100 + values["hairpin_turns"] * 2 + values["max_altitude"] / 500
+    ) / _MOUNTAIN_SCORE_CEILING
+    offroad_score = (values["technical_difficulty"] - 1) / 9
+    detail = np.select([mountain, offroad], [mountain_score, offroad_score], 0)
+    score = _POINTS_PER_LEVEL * levels + _MAX_DETAIL_POINTS * np.clip(detail, 0, 1)
+
+    return {"estimated_minutes": np.round(minutes, 1), "difficulty_score": np.round(score, 1)}
+
+
+def route_metrics(route_type: str, difficulty: str, distance_km: float, details: dict | None) -> dict[str, float]:
+    """Metric column values for a single route."""
+    metrics = compute_metrics([route_type], [difficulty], [distance_km], [details])
+    return {name: float(column[0]) for name, column in metrics.items()}
+
+
+def refresh_route_metrics(db: Session, batch_size: int = 10_000) -> int:
+    """Recompute every route's metrics, writing the ones that changed; returns how many did."""
+    columns = [getattr(models.Route, name) for name in METRIC_COLUMNS]
+    result = db.execute(select(
+        models.Route.id,
+        models.Route.route_type,
+        models.Route.difficulty,
+        models.Route.distance_km,
+        models.Route.details,
+        *columns,
+    )).yield_per(batch_size)
+    changes = []
+    for rows in result.partitions():
+        ids, route_types, difficulties, distances, details, *stored = zip(*rows)
+        metrics = compute_metrics(route_types, difficulties, distances, details)
+        changed = np.zeros(len(ids), dtype=bool)
+        for name, current in zip(METRIC_COLUMNS, stored):
+            current = np.array([np.nan if value is None else value for value in current], dtype=np.float64)
+            changed |= ~np.isclose(metrics[name], current)
+        for row in np.flatnonzero(changed):
+            changes.append({"id": ids[row], **{name: float(metrics[name][row]) for name in METRIC_COLUMNS}})
+    if changes:
+        # Bulk UPDATE by primary key, executemany in batches.
+        db.execute(update(models.Route), changes)
+    return len(changes)
@@ -0,0 +1,466 @@
+"""Popular and trending routes, answered from in-memory streaming sketches.
+
+For each route with rides, every worker keeps:
+
+- a HyperLogLog sketch of all its riders, whose estimate ranks
+  ``GET /routes/popular``;
+- a HyperLogLog sketch per day for the last ``ROUTE_TRENDING_DAYS`` days,
+  merged on read into the unique riders this week;
+- its ride count;
+- a ride count decayed with a half-life of ``ROUTE_TRENDING_HALF_LIFE_HOURS``,
+  which ranks ``GET /routes/trending``.
+
+The decayed count is kept as ``log(sum(exp(rate * (t - epoch))))`` over the
+ride times ``t``. Adding a ride or merging two counters is a ``logaddexp``,
+nothing needs decaying as time passes, and ordering by the stored value is
+ordering by the current score.
+
+A ride is recorded in memory once its transaction commits. A deleted ride,
+a deleted rider's included, is taken back out of the counters, and its route
+is marked for a recount: a HyperLogLog cannot forget a rider. Every
+``ROUTE_SKETCH_FLUSH_SECONDS`` a worker stores its changes in
+``route_popularity`` and ``route_daily_riders`` under row locks: sketches of
+the riders it recorded are merged in register-wise, counter changes are
+added, and the sketches of marked routes are recounted from their rides. It
+then reads back the rows written since its last flush and adopts them, with
+its own changes since on top, so workers converge within a flush interval or
+two. The tables are filled from ``rides`` on the first start.
+"""
+
+import asyncio
+import math
+import os
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.services.sketches import (
+    HLL_REGISTERS, hll_estimate, hll_estimates, hll_from_bytes, hll_merge, hll_new, hll_positions, hll_to_bytes
+)
+import app.db.postgres_crud as pg_crud
+
+ROUTE_TRENDING_HALF_LIFE_HOURS = float(os.environ.get("ROUTE_TRENDING_HALF_LIFE_HOURS", "48"))
+ROUTE_TRENDING_DAYS = int(os.environ.get("ROUTE_TRENDING_DAYS", "7"))
+ROUTE_SKETCH_FLUSH_SECONDS = float(os.environ.get("ROUTE_SKETCH_FLUSH_SECONDS", "60"))
+
+_EPOCH = np.datetime64("2020-01-01T00:00:00", "us")
+
+
+def _log_sum(a: float | None, b: float | None) -> float:
+    return float(np.logaddexp(-math.inf if a is None else a, -math.inf if b is None else b))
+
+
+def _log_diff(a: float | None, b: float | None) -> float:
+    """log(exp(a) - exp(b)), or -inf once nothing is left."""
+    a = -math.inf if a is None else a
+    if b is None or b == -math.inf:
+        return float(a)
+    if b >= a:
+        return -math.inf
+    return float(a + math.log1p(-math.exp(b - a)))
+
+
+def _merge_pending(pending: dict, key, sketch: np.ndarray) -> None:
+    current = pending.get(key)
+    if current is None:
+        pending[key] = sketch
+    else:
+        hll_merge(current, sketch)
+
+
+class RoutePopularityStore:
+    def __init__(self, half_life_hours: float, window_days: int, flush_seconds: float) -> None:
+        self.rate = math.log(2) / (half_life_hours * 3600)
+        self.window_days = window_days
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._reset()
+        self._synced_at = datetime.utcnow()
+        self._task: asyncio.Task | None = None
+
+    def _reset(self) -> None:
+        # One row per route with rides; a removed row is filled by the last one.
+        self._size = 0
+        self._row_by_id: dict[int, int] = {}
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._riders = np.zeros((0, HLL_REGISTERS), dtype=np.uint8)
+        self._estimates = np.zeros(0)
+        self._rides = np.zeros(0, dtype=np.int64)
+        self._trend = np.zeros(0)
+        self._days: dict[tuple[int, date], np.ndarray] = {}
+        # Changed in this worker but not flushed yet: sketches of the riders
+        # recorded, ride count changes, and the decayed counts of recorded and
+        # of deleted rides.
+        self._pending_riders: dict[int, np.ndarray] = {}
+        self._pending_days: dict[tuple[int, date], np.ndarray] = {}
+        self._pending_rides: dict[int, int] = {}
+        self._pending_trend: dict[int, float] = {}
+        self._pending_untrend: dict[int, float] = {}
+        # Routes with deleted rides, whose sketches the next flush recounts.
+        self._recount: set[int] = set()
+
+    def _first_day(self) -> date:
+        return datetime.utcnow().date() - timedelta(days=self.window_days - 1)
+
+    def _trend_keys(self, completed_at: np.ndarray) -> np.ndarray:
+        return self.rate * ((completed_at - _EPOCH) / np.timedelta64(1, "s"))
+
+    def _grow(self, capacity: int) -> None:
+        pad = capacity - len(self._ids)
+        self._ids = np.concatenate([self._ids, np.zeros(pad, dtype=np.int64)])
+        self._riders = np.concatenate([self._riders, np.zeros((pad, HLL_REGISTERS), dtype=np.uint8)])
+        self._estimates = np.concatenate([self._estimates, np.zeros(pad)])
+        self._rides = np.concatenate([self._rides, np.zeros(pad, dtype=np.int64)])
+        self._trend = np.concatenate([self._trend, np.full(pad, -math.inf)])
+
+    def _rows(self, route_ids: np.ndarray) -> np.ndarray:
+        new = [route_id for route_id in np.unique(route_ids).tolist() if route_id not in self._row_by_id]
+        if self._size + len(new) > len(self._ids):
+            self._grow(max(self._size + len(new), 2 * len(self._ids), 1024))
+        for route_id in new:
+            row = self._size
+            self._ids[row] = route_id
+            self._riders[row] = 0
+            self._estimates[row] = 0
+            self._rides[row] = 0
+            self._trend[row] = -math.inf
+            self._row_by_id[route_id] = row
+            self._size += 1
+        return np.array([self._row_by_id[route_id] for route_id in route_ids.tolist()], dtype=np.intp)
+
+    def _record(self, route_ids: np.ndarray, rider_ids: np.ndarray, completed_at: np.ndarray) -> None:
+        """Add a batch of rides to the sketches and counters."""
+        rows = self._rows(route_ids)
+        index, rank = hll_positions(rider_ids)
+        np.maximum.at(self._riders, (rows, index), rank)
+        np.add.at(self._rides, rows, 1)
+        np.logaddexp.at(self._trend, rows, self._trend_keys(completed_at))
+        touched = np.unique(rows)
+        self._estimates[touched] = hll_estimates(self._riders[touched])
+
+        days = completed_at.astype("datetime64[D]")
+        recent = days >= np.datetime64(self._first_day())
+        for day in np.unique(days[recent]):
+            on_day = np.flatnonzero(days == day)
+            order = on_day[np.argsort(route_ids[on_day], kind="stable")]
+            groups = np.split(order, np.flatnonzero(np.diff(route_ids[order])) + 1)
+            for group in groups:
+                key = (int(route_ids[group[0]]), day.item())
+                sketch = self._days.get(key)
+                if sketch is None:
+                    sketch = self._days[key] = hll_new()
+                np.maximum.at(sketch, index[group], rank[group])
+
+    def record(self, route_id: int, rider_id: int, completed_at: datetime) -> None:
+        """Count one logged ride, once it is committed."""
+        index, rank = (int(value[0]) for value in hll_positions([rider_id]))
+        key = self.rate * (completed_at - _EPOCH.item()).total_seconds()
+        day = completed_at.date()
+        with self._lock:
+            row = self._rows(np.array([route_id]))[0]
+            if self._riders[row, index] < rank:
+                self._riders[row, index] = rank
+                self._estimates[row] = hll_estimate(self._riders[row])
+            self._rides[row] += 1
+            self._trend[row] = _log_sum(self._trend[row], key)
+            self._pending_rides[route_id] = self._pending_rides.get(route_id, 0) + 1
+            self._pending_trend[route_id] = _log_sum(self._pending_trend.get(route_id), key)
+            sketches = [(self._pending_riders, route_id)]
+            if day >= self._first_day():
+                sketches += [(self._days, (route_id, day)), (self._pending_days, (route_id, day))]
+            for kept, sketch_key in sketches:
+                sketch = kept.get(sketch_key)
+                if sketch is None:
+                    sketch = kept[sketch_key] = hll_new()
+                sketch[index] = max(sketch[index], rank)
+
+    def discard(self, route_id: int, completed_at: datetime) -> None:
+        """Take a deleted ride out of the counters; its route's sketches are recounted on the next flush."""
+        key = self.rate * (completed_at - _EPOCH.item()).total_seconds()
+        with self._lock:
+            row = self._row_by_id.get(route_id)
+            if row is not None:
+                self._rides[row] = max(self._rides[row] - 1, 0)
+                self._trend[row] = _log_diff(self._trend[row], key) if self._rides[row] else -math.inf
+            self._pending_rides[route_id] = self._pending_rides.get(route_id, 0) - 1
+            self._pending_untrend[route_id] = _log_sum(self._pending_untrend.get(route_id), key)
+            self._recount.add(route_id)
+
+    def discard_all(self, rides: list[dict]) -> None:
+        """Take deleted rides back out, e.g. those of a deleted rider."""
+        for ride in rides:
+            self.discard(ride["route_id"], ride["completed_at"])
+
+    def forget(self, route_id: int) -> None:
+        """Drop a deleted route."""
+        with self._lock:
+            for pending in (self._pending_riders, self._pending_rides, self._pending_trend, self._pending_untrend):
+                pending.pop(route_id, None)
+            self._recount.discard(route_id)
+            for key in [key for key in self._pending_days if key[0] == route_id]:
+                del self._pending_days[key]
+            first_day = self._first_day()
+            for offset in range(self.window_days):
+                self._days.pop((route_id, first_day + timedelta(days=offset)), None)
+            row = self._row_by_id.pop(route_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                for column in (self._ids, self._riders, self._estimates, self._rides, self._trend):
+                    column[row] = column[last]
+                self._row_by_id[int(self._ids[row])] = row
+            self._size = last
+
+    def ride_counts(self) -> dict[int, int]:
+        """Rides per route with any."""
+        with self._lock:
+            return dict(zip(self._ids[:self._size].tolist(), self._rides[:self._size].tolist()))
+
+    def _stats(self, row: int, now_key: float, first_day: date) -> dict:
+        route_id = int(self._ids[row])
+        week = hll_new()
+        for offset in range(self.window_days):
+            sketch = self._days.get((route_id, first_day + timedelta(days=offset)))
+            if sketch is not None:
+                hll_merge(week, sketch)
+        return {
+            "route_id": route_id,
+            "unique_riders": round(self._estimates[row]),
+            "unique_riders_week": round(hll_estimate(week)),
+            "rides": int(self._rides[row]),
+            "trending_score": round(math.exp(self._trend[row] - now_key), 3),
+        }
+
+    def _top(self, column: str, limit: int) -> list[dict]:
+        now_key = float(self._trend_keys(np.datetime64(datetime.utcnow(), "us")))
+        first_day = self._first_day()
+        with self._lock:
+            scores = getattr(self, column)[:self._size]
+            # Routes whose rides were all deleted rank nowhere.
+            rows = np.flatnonzero(np.isfinite(scores) & (self._rides[:self._size] > 0))
+            if len(rows) > limit:
+                rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+            rows = rows[np.lexsort((self._ids[rows], -scores[rows]))]
+            return [self._stats(row, now_key, first_day) for row in rows]
+
+    def popular(self, limit: int) -> list[dict]:
+        """The routes with the most unique riders, most first."""
+        return self._top("_estimates", limit)
+
+    def trending(self, limit: int) -> list[dict]:
+        """The routes with the highest decayed ride counts, highest first."""
+        return self._top("_trend", limit)
+
+    def _merge_row(self, row: dict) -> None:
+        """Adopt a stored route_popularity row, keeping changes not flushed yet on top of it."""
+        route_id = row["route_id"]
+        position = self._rows(np.array([route_id]))[0]
+        # Replaced, not merged: a recount may have taken riders out.
+        self._riders[position] = hll_from_bytes(row["riders"])
+        if route_id in self._pending_riders:
+            hll_merge(self._riders[position], self._pending_riders[route_id])
+        self._estimates[position] = hll_estimate(self._riders[position])
+        self._rides[position] = max(row["rides"] + self._pending_rides.get(route_id, 0), 0)
+        trend = _log_diff(_log_sum(row["trend"], self._pending_trend.get(route_id)), self._pending_untrend.get(route_id))
+        self._trend[position] = trend if self._rides[position] else -math.inf
+
+    def _merge_day(self, row: dict) -> None:
+        key = (row["route_id"], row["day"])
+        sketch = hll_from_bytes(row["riders"])
+        if key in self._pending_days:
+            hll_merge(sketch, self._pending_days[key])
+        self._days[key] = sketch
+
+    def load(self, db: Session) -> None:
+        """Load the stored sketches, computing them from ``rides`` if there are none yet."""
+        with self._lock:
+            self._reset()
+        self._synced_at = datetime.utcnow()
+        pg_crud.lock_route_popularity_table(db)
+        if not pg_crud.has_route_popularity(db):
+            self._backfill(db)
+            db.commit()
+            return
+        db.commit()
+        with self._lock:
+            for row in pg_crud.get_route_popularity(db):
+                self._merge_row(row)
+            for row in pg_crud.get_route_daily_riders(db, self._first_day()):
+                self._merge_day(row)
+
+    def _backfill(self, db: Session) -> None:
+        with self._lock:
+            for batch in pg_crud.iter_ride_riders(db):
+                route_ids, rider_ids, completed_at = zip(*batch)
+                self._record(np.array(route_ids), np.array(rider_ids), np.array(completed_at, dtype="datetime64[us]"))
+            rows = [
+                {
+                    "route_id": int(self._ids[row]),
+                    "riders": hll_to_bytes(self._riders[row]),
+                    "rides": int(self._rides[row]),
+                    "trend": _log_sum(None, self._trend[row]),
+                    "updated_at": self._synced_at,
+                }
+                for row in range(self._size)
+            ]
+            days = [
+                {"route_id": route_id, "day": day, "riders": hll_to_bytes(sketch)}
+                for (route_id, day), sketch in self._days.items()
+            ]
+        if rows:
+            pg_crud.add_route_popularity(db, rows)
+            logger.info(f"Computed popularity sketches for {len(rows)} routes from their rides")
+        if days:
+            pg_crud.add_route_daily_riders(db, days)
+
+    def _count(self, db: Session, route_ids: list[int]) -> tuple[dict, dict]:
+        """Sketches of some routes' riders, overall and per recent day, read from ``rides``."""
+        first_day = np.datetime64(self._first_day())
+        riders: dict[int, np.ndarray] = {}
+        days: dict[tuple[int, date], np.ndarray] = {}
+        for batch in pg_crud.iter_ride_riders(db, route_ids=route_ids):
+            ride_routes, rider_ids, completed_at = zip(*batch)
+            ride_routes = np.array(ride_routes)
+            ride_days = np.array(completed_at, dtype="datetime64[us]").astype("datetime64[D]")
+            index, rank = hll_positions(rider_ids)
+            for route_id in np.unique(ride_routes).tolist():
+                on_route = ride_routes == route_id
+                np.maximum.at(riders.setdefault(route_id, hll_new()), index[on_route], rank[on_route])
+                for day in np.unique(ride_days[on_route & (ride_days >= first_day)]):
+                    on_day = on_route & (ride_days == day)
+                    np.maximum.at(days.setdefault((route_id, day.item()), hll_new()), index[on_day], rank[on_day])
+        return riders, days
+
+    def _write(
+        self,
+        db: Session,
+        riders: dict,
+        rides: dict,
+        trend: dict,
+        untrend: dict,
+        days: dict,
+        recount: set[int],
+        now: datetime,
+    ) -> None:
+        stored = pg_crud.lock_route_popularity(db, sorted(rides), now)
+        # Recounted under the row locks, so no other worker's flush of these routes interleaves.
+        recount = recount & {row["route_id"] for row in stored}
+        counted, counted_days = self._count(db, sorted(recount)) if recount else ({}, {})
+        updated = []
+        for row in stored:
+            route_id = row["route_id"]
+            if route_id in recount:
+                sketch = counted.get(route_id, hll_new())
+            else:
+                sketch = hll_from_bytes(row["riders"])
+                if route_id in riders:
+                    hll_merge(sketch, riders[route_id])
+            count = max(row["rides"] + rides[route_id], 0)
+            updated.append({
+                "route_id": route_id,
+                "riders": hll_to_bytes(sketch),
+                "rides": count,
+                "trend": _log_diff(_log_sum(row["trend"], trend.get(route_id)), untrend.get(route_id)) if count else None,
+                "updated_at": now,
+            })
+        pg_crud.update_route_popularity(db, updated)
+        if recount:
+            pg_crud.delete_route_daily_riders(db, sorted(recount))
+            if counted_days:
+                pg_crud.add_route_daily_riders(db, [
+                    {"route_id": route_id, "day": day, "riders": hll_to_bytes(sketch)}
+                    for (route_id, day), sketch in counted_days.items()
+                ])
+            days = {key: sketch for key, sketch in days.items() if key[0] not in recount}
+        if days:
+            stored_days = pg_crud.lock_route_daily_riders(db, sorted(days))
+            pg_crud.update_route_daily_riders(db, [
+                {
+                    "route_id": row["route_id"],
+                    "day": row["day"],
+                    "riders": hll_to_bytes(hll_merge(hll_from_bytes(row["riders"]), days[row["route_id"], row["day"]])),
+                }
+                for row in stored_days
+            ])
+
+    def flush(self) -> None:
+        """Store this worker's changes in the database and adopt other workers' changes."""
+        started = datetime.utcnow()
+        first_day = self._first_day()
+        with self._lock:
+            riders, self._pending_riders = self._pending_riders, {}
+            days, self._pending_days = self._pending_days, {}
+            rides, self._pending_rides = self._pending_rides, {}
+            trend, self._pending_trend = self._pending_trend, {}
+            untrend, self._pending_untrend = self._pending_untrend, {}
+            recount, self._recount = self._recount, set()
+            # Overlap the previous read: rows are stamped before their transaction commits.
+            since = self._synced_at - timedelta(seconds=self.flush_seconds)
+        days = {key: sketch for key, sketch in days.items() if key[1] >= first_day}
+        try:
+            with SessionLocal() as db:
+                if rides:
+                    self._write(db, riders, rides, trend, untrend, days, recount, started)
+                pg_crud.delete_route_daily_riders_before(db, first_day)
+                db.commit()
+                changed = [dict(row) for row in pg_crud.get_route_popularity(db, since)]
+                changed_days = [
+                    dict(row)
+                    for row in pg_crud.get_route_daily_riders(db, first_day, [row["route_id"] for row in changed])
+                ] if changed else []
+        except Exception:
+            logger.exception(f"Failed to store popularity sketches for {len(rides)} routes")
+            with self._lock:
+                for route_id, count in rides.items():
+                    if route_id not in self._row_by_id:
+                        continue
+                    self._pending_rides[route_id] = self._pending_rides.get(route_id, 0) + count
+                    for pending, kept in ((self._pending_trend, trend), (self._pending_untrend, untrend)):
+                        if route_id in kept:
+                            pending[route_id] = _log_sum(pending.get(route_id), kept[route_id])
+                    if route_id in riders:
+                        _merge_pending(self._pending_riders, route_id, riders[route_id])
+                    if route_id in recount:
+                        self._recount.add(route_id)
+                for key, sketch in days.items():
+                    if key[0] in self._row_by_id:
+                        _merge_pending(self._pending_days, key, sketch)
+            return
+        with self._lock:
+            for row in changed:
+                self._merge_row(row)
+            # Stored day sketches replace this worker's too, keeping days recorded since.
+            changed_ids = {row["route_id"] for row in changed}
+            for key in [key for key in self._days if key[0] in changed_ids or key[1] < first_day]:
+                del self._days[key]
+            for row in changed_days:
+                self._merge_day(row)
+            for key, sketch in self._pending_days.items():
+                if key not in self._days and key[1] >= first_day:
+                    self._days[key] = sketch.copy()
+            self._synced_at = started
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and store what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+route_popularity = RoutePopularityStore(
+    ROUTE_TRENDING_HALF_LIFE_HOURS,
+    ROUTE_TRENDING_DAYS,
+    ROUTE_SKETCH_FLUSH_SECONDS,
+)
@@ -0,0 +1,115 @@
+"""In-process inverted index for route search on non-Postgres databases.
+
+Postgres answers ``GET /routes/search`` from the ``search_vector`` GIN index.
+SQLite has no equivalent, so there the route text is indexed in memory at
+startup and kept current as routes are created or deleted. Scores follow the
+same field weights as the Postgres tsvector (name > locations/stops >
+description).
+"""
+
+import math
+import re
+import threading
+from collections import defaultdict
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+
+# ts_rank's default weights for the A/B/C classes used by search_vector
+_WEIGHT_NAME = 1.0
+_WEIGHT_PLACES = 0.4
+_WEIGHT_DESCRIPTION = 0.2
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    return [token for token in _TOKEN.findall((text or "").lower()) if len(token) > 1]
+
+
+def _weighted_terms(route: models.Route) -> dict[str, float]:
+    stops = [
+        *(route.scenic_points or []),
+        *(route.beach_stops or []),
+        *(route.seafood_spots or []),
+    ]
+    fields = (
+        (_WEIGHT_NAME, route.name),
+        (_WEIGHT_PLACES, f"{route.start_location} {route.end_location} {' '.join(stops)}"),
+        (_WEIGHT_DESCRIPTION, route.description),
+    )
+    terms: dict[str, float] = defaultdict(float)
+    for weight, text in fields:
+        for token in tokenize(text):
+            terms[token] += weight
+    return terms
+
+
+class RouteSearchIndex:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._terms: dict[int, tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    def build(self, routes) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            for route in routes:
+                self._add(route)
+            self.enabled = True
+
+    def add(self, route: models.Route) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(route.id)
+            self._add(route)
+
+    def remove(self, route_id: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(route_id)
+
+    def search(self, query: str) -> list[tuple[int, float]]:
+        """Return ``(route_id, score)`` for routes matching every query term, best first."""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        with self._lock:
+            postings = sorted((self._postings.get(token, {}) for token in tokens), key=len)
+            if not postings[0]:
+                return []
+            total = len(self._terms)
+            scores = dict.fromkeys(postings[0], 0.0)
+            for posting in postings:
+                idf = math.log(1 + total / len(posting))
+                scores = {
+                    route_id: score + posting[route_id] * idf
+                    for route_id, score in scores.items()
+                    if route_id in posting
+                }
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _add(self, route: models.Route) -> None:
+        terms = _weighted_terms(route)
+        for token, weight in terms.items():
+            self._postings[token][route.id] = weight
+        self._terms[route.id] = tuple(terms)
+
+    def _remove(self, route_id: int) -> None:
+        for token in self._terms.pop(route_id, ()):
+            posting = self._postings[token]
+            posting.pop(route_id, None)
+            if not posting:
+                del self._postings[token]
+
+
+route_search_index = RouteSearchIndex()
+
+
+def build_fallback_index(db: Session) -> None:
+    """Build the in-memory index unless the database can search natively."""
+    if db.get_bind().dialect.name != "postgresql":
+        route_search_index.build(db.query(models.Route).yield_per(1000))
@@ -0,0 +1,177 @@
+"""In-memory nearest-neighbour index for "routes like this one".
+
+Every route is a fixed-length feature vector: its route type one-hot, its
+difficulty, its distance, and the numeric type-specific details (elevation
+gain, hairpin turns, ocean view percentage, ...) together with the number of
+stops it lists. Each feature is scaled into roughly [0, 1] by a fixed scale
+taken from the schema's bounds or a typical upper value, so a vector never
+depends on which other routes exist and one route can be added or removed
+without rescaling the rest. A route type's features are zero for routes of
+other types; the one-hot already keeps types apart.
+
+The vectors are rows of one float32 NumPy matrix, kept current as routes are
+written through any worker (see ``app.services.catalog_sync``). A query is a
+single vectorized pass over it: squared Euclidean distance from
+``|a|^2 + |b|^2 - 2ab`` and ``argpartition`` for the nearest ``k``. That is a
+few milliseconds even at a hundred thousand routes, so there is no
+approximate index.
+"""
+
+import math
+import threading
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db import postgres_models as models
+
+_ROUTE_TYPES = [route_type.value for route_type in models.RouteType]
+_DIFFICULTY_LEVELS = [difficulty.value for difficulty in models.Difficulty]
+
+# (field, scale): details values divided by scale and clipped to [0, 1].
+_DETAIL_FEATURES = (
+    ("photography_spots", 20),
+    ("speed_limit", 300),
+    ("toll_cost", 100),
+    ("lanes", 8),
+    ("min_bike_cc", 1500),
+    ("technical_difficulty", 10),
+    ("requires_experience", 1),
+    ("elevation_gain", 5000),
+    ("max_altitude", 6000),
+    ("hairpin_turns", 60),
+    ("oxygen_required", 1),
+    ("lighthouse_count", 10),
+    ("ocean_view_percentage", 100),
+)
+# (field, scale): the length of a details list, scaled the same way.
+_STOP_FEATURES = (
+    ("scenic_points", 10),
+    ("rest_stops", 10),
+    ("beach_stops", 10),
+    ("seafood_spots", 10),
+)
+_MAX_DISTANCE_KM = 2000
+
+FEATURE_COUNT = len(_ROUTE_TYPES) + 2 + len(_DETAIL_FEATURES) + len(_STOP_FEATURES)
+
+
+def route_vector(route_type: str, difficulty: str, distance_km: float, details: dict | None) -> np.ndarray:
+    details = details or {}
+    vector = np.zeros(FEATURE_COUNT, dtype=np.float32)
+    if route_type in _ROUTE_TYPES:
+        vector[_ROUTE_TYPES.index(route_type)] = 1
+    column = len(_ROUTE_TYPES)
+    difficulty = (difficulty or "").lower()
+    if difficulty in _DIFFICULTY_LEVELS:
+        vector[column] = _DIFFICULTY_LEVELS.index(difficulty) / (len(_DIFFICULTY_LEVELS) - 1)
+    # Log scale: 20 km against 40 km matters more than 820 km against 840 km.
+    vector[column + 1] = math.log1p(distance_km or 0) / math.log1p(_MAX_DISTANCE_KM)
+    column += 2
+    for field, scale in _DETAIL_FEATURES:
+        vector[column] = float(details.get(field) or 0) / scale
+        column += 1
+    for field, scale in _STOP_FEATURES:
+        vector[column] = len(details.get(field) or ()) / scale
+        column += 1
+    return np.clip(vector, 0, 1, out=vector)
+
+
+def vector_of(route: models.Route) -> np.ndarray:
+    return route_vector(route.route_type, route.difficulty, route.distance_km, route.details)
+
+
+class RouteSimilarityIndex:
+    def __init__(self, initial_capacity: int = 1024) -> None:
+        self.enabled = False
+        self._initial_capacity = initial_capacity
+        self._reset(initial_capacity)
+        self._lock = threading.Lock()
+
+    def _reset(self, capacity: int) -> None:
+        # Rows [0, _size) are live; a removed row is filled by the last one.
+        self._vectors = np.zeros((capacity, FEATURE_COUNT), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._row_by_id: dict[int, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def build(self, rows) -> None:
+        """Load ``(id, route_type, difficulty, distance_km, details)`` rows, replacing the current contents."""
+        with self._lock:
+            self._reset(self._initial_capacity)
+            for route_id, *fields in rows:
+                self._add(route_id, route_vector(*fields))
+            self.enabled = True
+
+    def add(self, route: models.Route) -> None:
+        if not self.enabled:
+            return
+        vector = vector_of(route)
+        with self._lock:
+            self._remove(route.id)
+            self._add(route.id, vector)
+
+    def remove(self, route_id: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(route_id)
+
+    def nearest(self, vector: np.ndarray, k: int, exclude: int | None = None) -> list[tuple[int, float]]:
+        """Return up to ``k`` ``(route_id, distance)`` pairs closest to ``vector``, nearest first."""
+        with self._lock:
+            size = self._size
+            distances = self._norms[:size] + float(vector @ vector) - 2 * (self._vectors[:size] @ vector)
+            ids = self._ids[:size].copy()
+            skip = self._row_by_id.get(exclude)
+        if skip is not None:
+            distances[skip] = np.inf
+            size -= 1
+        k = min(k, size)
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        # Ties broken by id so equal routes come back in a stable order.
+        nearest = nearest[np.lexsort((ids[nearest], distances[nearest]))]
+        return [(int(ids[row]), math.sqrt(max(float(distances[row]), 0.0))) for row in nearest]
+
+    def _add(self, route_id: int, vector: np.ndarray) -> None:
+        if self._size == len(self._ids):
+            capacity = 2 * len(self._ids)
+            self._vectors = np.resize(self._vectors, (capacity, FEATURE_COUNT))
+            self._norms = np.resize(self._norms, capacity)
+            self._ids = np.resize(self._ids, capacity)
+        row = self._size
+        self._vectors[row] = vector
+        self._norms[row] = vector @ vector
+        self._ids[row] = route_id
+        self._row_by_id[route_id] = row
+        self._size += 1
+
+    def _remove(self, route_id: int) -> None:
+        row = self._row_by_id.pop(route_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._norms[row] = self._norms[last]
+            self._ids[row] = self._ids[last]
+            self._row_by_id[int(self._ids[row])] = row
+        self._size = last
+
+
+route_similarity = RouteSimilarityIndex()
+
+
+def build_similarity_index(db: Session) -> None:
+    route_similarity.build(db.execute(select(
+        models.Route.id,
+        models.Route.route_type,
+        models.Route.difficulty,
+        models.Route.distance_km,
+        models.Route.details,
+    )).yield_per(10_000))
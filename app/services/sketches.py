@@ -0,0 +1,111 @@
+"""Mergeable streaming sketches, vectorized with NumPy.
+
+HyperLogLog estimates how many distinct values were added to it using
+``HLL_REGISTERS`` one-byte registers (1 KB), within about 3% of the true
+count. Two sketches of the same precision merge by taking the larger of each
+register, which is idempotent: merging the same sketch twice, or a sketch
+into one that already contains it, changes nothing. That makes sketches safe
+to combine across time buckets and worker processes.
+
+The log-bucketed histogram answers quantiles over non-negative values: one
+bucket per integer below ``HISTOGRAM_EXACT_BELOW`` and buckets
+``HISTOGRAM_GROWTH`` times wider than the previous above it, so a quantile is
+exact for small values and within half a bucket (about 2.5%) for large ones.
+Unlike t-digest, its counts can be decremented, so values can be removed.
+"""
+
+import numpy as np
+
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+HISTOGRAM_EXACT_BELOW = 60
+HISTOGRAM_GROWTH = 1.05
+
+_RANK_BITS = 64 - HLL_PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64's finalizer: spreads sequential ids over all 64 bits."""
+    x = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def hll_new() -> np.ndarray:
+    return np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+
+def hll_positions(values) -> tuple[np.ndarray, np.ndarray]:
+    """The register index and rank each integer value sets."""
+    hashed = _mix64(np.asarray(values, dtype=np.int64))
+    index = (hashed >> np.uint64(_RANK_BITS)).astype(np.intp)
+    rest = hashed & np.uint64((1 << _RANK_BITS) - 1)
+    # frexp's exponent is the bit length (0 for 0); rank counts leading zeros + 1.
+    rank = _RANK_BITS + 1 - np.frexp(rest.astype(np.float64))[1]
+    return index, rank.astype(np.uint8)
+
+
+def hll_add(registers: np.ndarray, values) -> None:
+    index, rank = hll_positions(values)
+    np.maximum.at(registers, index, rank)
+
+
+def hll_merge(registers: np.ndarray, other: np.ndarray) -> np.ndarray:
+    return np.maximum(registers, other, out=registers)
+
+
+def hll_estimates(stack: np.ndarray) -> np.ndarray:
+    """Estimated distinct counts for each row of a 2-D stack of sketches."""
+    raw = _ALPHA * HLL_REGISTERS ** 2 / np.exp2(-stack.astype(np.float64)).sum(axis=1)
+    zeros = (stack == 0).sum(axis=1)
+    # Linear counting is more accurate while many registers are still empty.
+    linear = HLL_REGISTERS * np.log(HLL_REGISTERS / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * HLL_REGISTERS) & (zeros > 0), linear, raw)
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    return float(hll_estimates(registers[np.newaxis])[0])
+
+
+def hll_from_bytes(data: bytes | None) -> np.ndarray:
+    if not data:
+        return hll_new()
+    return np.frombuffer(data, dtype=np.uint8).copy()
+
+
+def hll_to_bytes(registers: np.ndarray) -> bytes:
+    return registers.tobytes()
+
+
+def histogram_buckets(values) -> np.ndarray:
+    """The bucket of each non-negative value."""
+    values = np.maximum(np.asarray(values, dtype=np.float64), 0)
+    scaled = np.log(np.maximum(values, HISTOGRAM_EXACT_BELOW) / HISTOGRAM_EXACT_BELOW) / np.log(HISTOGRAM_GROWTH)
+    return np.where(
+        values < HISTOGRAM_EXACT_BELOW, np.floor(values), HISTOGRAM_EXACT_BELOW + np.floor(scaled)
+    ).astype(np.int64)
+
+
+def histogram_bucket(value: float) -> int:
+    return int(histogram_buckets([value])[0])
+
+
+def histogram_value(bucket: int) -> float:
+    """A bucket's representative value: the value itself, or the geometric middle of a wide bucket."""
+    if bucket < HISTOGRAM_EXACT_BELOW:
+        return float(bucket)
+    return HISTOGRAM_EXACT_BELOW * HISTOGRAM_GROWTH ** (bucket - HISTOGRAM_EXACT_BELOW + 0.5)
+
+
+def histogram_quantiles(counts: dict[int, int], quantiles) -> list[float | None]:
+    """Nearest-rank quantiles of a ``{bucket: count}`` histogram, None when it is empty."""
+    total = sum(counts.values())
+    if not total:
+        return [None for _ in quantiles]
+    buckets = sorted(counts)
+    cumulative = np.cumsum([counts[bucket] for bucket in buckets])
+    ranks = np.maximum(np.ceil(np.asarray(quantiles) * total), 1)
+    return [histogram_value(buckets[position]) for position in np.searchsorted(cumulative, ranks)]
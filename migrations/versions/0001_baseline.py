@@ -0,0 +1,105 @@
+"""Baseline schema: riders, bikes, routes and rides.
+
+Databases created by ``Base.metadata.create_all`` before migrations existed
+match this revision; mark them with ``alembic stamp 0001`` before upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "riders",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("experience_level", sa.String(20), nullable=False),
+        sa.Column("joined_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_riders_name", "riders", ["name"], unique=True)
+
+    op.create_table(
+        "bikes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("brand", sa.String(50), nullable=False),
+        sa.Column("model", sa.String(50), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("engine_cc", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["riders.id"], name="bikes_owner_id_fkey"),
+    )
+
+    op.create_table(
+        "routes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(200), nullable=False),
+        sa.Column("route_type", sa.String(20), nullable=False),
+        sa.Column("start_location", sa.String(200), nullable=False),
+        sa.Column("end_location", sa.String(200), nullable=False),
+        sa.Column("distance_km", sa.Float(), nullable=False),
+        sa.Column("difficulty", sa.String(20), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("scenic_points", sa.JSON(), nullable=True),
+        sa.Column("best_season", sa.String(50), nullable=True),
+        sa.Column("photography_spots", sa.Integer(), nullable=True),
+        sa.Column("speed_limit", sa.Integer(), nullable=True),
+        sa.Column("toll_cost", sa.Float(), nullable=True),
+        sa.Column("rest_stops", sa.JSON(), nullable=True),
+        sa.Column("lanes", sa.Integer(), nullable=True),
+        sa.Column("terrain_type", sa.String(50), nullable=True),
+        sa.Column("min_bike_cc", sa.Integer(), nullable=True),
+        sa.Column("technical_difficulty", sa.Integer(), nullable=True),
+        sa.Column("requires_experience", sa.Boolean(), nullable=True),
+        sa.Column("elevation_gain", sa.Float(), nullable=True),
+        sa.Column("max_altitude", sa.Float(), nullable=True),
+        sa.Column("hairpin_turns", sa.Integer(), nullable=True),
+        sa.Column("oxygen_required", sa.Boolean(), nullable=True),
+        sa.Column("beach_stops", sa.JSON(), nullable=True),
+        sa.Column("lighthouse_count", sa.Integer(), nullable=True),
+        sa.Column("seafood_spots", sa.JSON(), nullable=True),
+        sa.Column("ocean_view_percentage", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_routes_name", "routes", ["name"], unique=True)
+    op.create_index("ix_routes_route_type", "routes", ["route_type"])
+    op.create_index("ix_routes_difficulty", "routes", ["difficulty"])
+
+    op.create_table(
+        "rides",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("rider_id", sa.Integer(), nullable=False),
+        sa.Column("route_id", sa.Integer(), nullable=False),
+        sa.Column("bike_id", sa.Integer(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=False),
+        sa.Column("duration_minutes", sa.Integer(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["rider_id"], ["riders.id"], name="rides_rider_id_fkey"),
+        sa.ForeignKeyConstraint(["route_id"], ["routes.id"], name="rides_route_id_fkey"),
+        sa.ForeignKeyConstraint(["bike_id"], ["bikes.id"], name="rides_bike_id_fkey"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("rides")
+    op.drop_index("ix_routes_difficulty", table_name="routes")
+    op.drop_index("ix_routes_route_type", table_name="routes")
+    op.drop_index("ix_routes_name", table_name="routes")
+    op.drop_table("routes")
+    op.drop_table("bikes")
+    op.drop_index("ix_riders_name", table_name="riders")
+    op.drop_table("riders")
@@ -0,0 +1,44 @@
+"""Delete bikes and rides with their rider/route in the database.
+
+Foreign keys become ON DELETE CASCADE and the referencing columns get the
+indexes the cascades need, so deleting a rider is a single statement.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_CASCADING_KEYS = (
+    ("bikes_owner_id_fkey", "bikes", "owner_id", "riders"),
+    ("rides_rider_id_fkey", "rides", "rider_id", "riders"),
+    ("rides_route_id_fkey", "rides", "route_id", "routes"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, column, referred in _CASCADING_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, referred, [column], ["id"], ondelete="CASCADE")
+    op.create_index("ix_bikes_owner_id", "bikes", ["owner_id"])
+    op.create_index("ix_rides_rider_id", "rides", ["rider_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_rides_rider_id", table_name="rides")
+    op.drop_index("ix_bikes_owner_id", table_name="bikes")
+    for name, table, column, referred in _CASCADING_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, referred, [column], ["id"])
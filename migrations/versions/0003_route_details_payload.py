@@ -0,0 +1,111 @@
+"""Move type-specific route attributes into a JSONB payload.
+
+The ~20 nullable scenic/highway/offroad/mountain/coastal columns are folded
+into ``routes.details`` (NULLs stripped), with one partial index per route
+type on the attribute that type is filtered by.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# route_type -> [(column, type)] as they existed in the wide table
+_TYPE_COLUMNS = {
+    "scenic": [
+        ("scenic_points", sa.JSON()),
+        ("best_season", sa.String(50)),
+        ("photography_spots", sa.Integer()),
+    ],
+    "highway": [
+        ("speed_limit", sa.Integer()),
+        ("toll_cost", sa.Float()),
+        ("rest_stops", sa.JSON()),
+        ("lanes", sa.Integer()),
+    ],
+    "offroad": [
+        ("terrain_type", sa.String(50)),
+        ("min_bike_cc", sa.Integer()),
+        ("technical_difficulty", sa.Integer()),
+        ("requires_experience", sa.Boolean()),
+    ],
+    "mountain": [
+        ("elevation_gain", sa.Float()),
+        ("max_altitude", sa.Float()),
+        ("hairpin_turns", sa.Integer()),
+        ("oxygen_required", sa.Boolean()),
+    ],
+    "coastal": [
+        ("beach_stops", sa.JSON()),
+        ("lighthouse_count", sa.Integer()),
+        ("seafood_spots", sa.JSON()),
+        ("ocean_view_percentage", sa.Integer()),
+    ],
+}
+
+# (index name, route_type, indexed expression)
+_PARTIAL_INDEXES = (
+    ("ix_routes_scenic_best_season", "scenic", "(details ->> 'best_season')"),
+    ("ix_routes_highway_speed_limit", "highway", "CAST((details ->> 'speed_limit') AS INTEGER)"),
+    ("ix_routes_offroad_min_bike_cc", "offroad", "CAST((details ->> 'min_bike_cc') AS INTEGER)"),
+    ("ix_routes_mountain_elevation_gain", "mountain", "CAST((details ->> 'elevation_gain') AS FLOAT)"),
+    ("ix_routes_coastal_ocean_view", "coastal", "CAST((details ->> 'ocean_view_percentage') AS INTEGER)"),
+)
+
+
+def _json_value(column: str, column_type) -> str:
+    return f"{column}::jsonb" if isinstance(column_type, sa.JSON) else column
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "routes",
+        sa.Column("details", postgresql.JSONB(), nullable=False, server_default="{}"),
+    )
+    cases = " ".join(
+        f"WHEN '{route_type}' THEN jsonb_build_object("
+        + ", ".join(f"'{name}', {_json_value(name, column_type)}" for name, column_type in columns)
+        + ")"
+        for route_type, columns in _TYPE_COLUMNS.items()
+    )
+    op.execute(
+        f"UPDATE routes SET details = COALESCE(jsonb_strip_nulls(CASE route_type {cases} END), '{{}}')"
+    )
+    op.alter_column("routes", "details", server_default=None)
+    for name, route_type, expression in _PARTIAL_INDEXES:
+        op.execute(f"CREATE INDEX {name} ON routes ({expression}) WHERE route_type = '{route_type}'")
+    for columns in _TYPE_COLUMNS.values():
+        for name, _ in columns:
+            op.drop_column("routes", name)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for columns in _TYPE_COLUMNS.values():
+        for name, column_type in columns:
+            op.add_column("routes", sa.Column(name, column_type, nullable=True))
+    assignments = []
+    for columns in _TYPE_COLUMNS.values():
+        for name, column_type in columns:
+            if isinstance(column_type, sa.JSON):
+                assignments.append(f"{name} = (details -> '{name}')::json")
+            else:
+                sql_type = column_type.compile(dialect=postgresql.dialect())
+                assignments.append(f"{name} = CAST(details ->> '{name}' AS {sql_type})")
+    op.execute(f"UPDATE routes SET {', '.join(assignments)}")
+    for name, _, _ in _PARTIAL_INDEXES:
+        op.drop_index(name, table_name="routes")
+    op.drop_column("routes", "details")
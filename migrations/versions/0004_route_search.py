@@ -0,0 +1,44 @@
+"""Full-text and trigram search over routes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        """
+        ALTER TABLE routes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(start_location, '') || ' ' || coalesce(end_location, '')), 'B')
+            || setweight(to_tsvector('english',
+                coalesce(details -> 'scenic_points', '[]'::jsonb)
+                || coalesce(details -> 'beach_stops', '[]'::jsonb)
+                || coalesce(details -> 'seafood_spots', '[]'::jsonb)), 'B')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        ) STORED
+        """
+    )
+    op.execute("CREATE INDEX ix_routes_search_vector ON routes USING gin (search_vector)")
+    op.execute("CREATE INDEX ix_routes_name_trgm ON routes USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_routes_name_trgm", table_name="routes")
+    op.drop_index("ix_routes_search_vector", table_name="routes")
+    op.drop_column("routes", "search_vector")
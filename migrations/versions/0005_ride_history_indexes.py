@@ -0,0 +1,34 @@
+"""Composite indexes for time-ordered ride history.
+
+(rider_id, completed_at) replaces the single-column rider index; it serves
+both the history pages and the rider delete cascade.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_rides_rider_id_completed_at", "rides", ["rider_id", "completed_at"])
+    op.create_index("ix_rides_route_id_completed_at", "rides", ["route_id", "completed_at"])
+    op.drop_index("ix_rides_rider_id", table_name="rides")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_rides_rider_id", "rides", ["rider_id"])
+    op.drop_index("ix_rides_route_id_completed_at", table_name="rides")
+    op.drop_index("ix_rides_rider_id_completed_at", table_name="rides")
@@ -0,0 +1,48 @@
+"""Announce new rides on the ride_events channel.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_ride_created() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('ride_events', json_build_object(
+                'id', NEW.id,
+                'rider_id', NEW.rider_id,
+                'route_id', NEW.route_id,
+                'bike_id', NEW.bike_id,
+                'completed_at', NEW.completed_at,
+                'duration_minutes', NEW.duration_minutes
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER rides_notify_created AFTER INSERT ON rides "
+        "FOR EACH ROW EXECUTE FUNCTION notify_ride_created()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS rides_notify_created ON rides")
+    op.execute("DROP FUNCTION IF EXISTS notify_ride_created()")
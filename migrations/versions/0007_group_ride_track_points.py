@@ -0,0 +1,47 @@
+"""Sampled rider positions from live group rides.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "group_ride_track_points",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("group_ride_id", sa.Integer(), nullable=False),
+        sa.Column("rider_id", sa.Integer(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("speed_kmh", sa.Float(), nullable=True),
+        sa.Column("heading", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["rider_id"], ["riders.id"], name="group_ride_track_points_rider_id_fkey", ondelete="CASCADE"
+        ),
+    )
+    op.create_index(
+        "ix_group_ride_track_points_group_ride_id_rider_id_recorded_at",
+        "group_ride_track_points",
+        ["group_ride_id", "rider_id", "recorded_at"],
+    )
+    op.create_index("ix_group_ride_track_points_rider_id", "group_ride_track_points", ["rider_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("group_ride_track_points")
@@ -0,0 +1,60 @@
+"""Group rides with RSVP slots.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "group_rides",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(200), nullable=False),
+        sa.Column("route_id", sa.Integer(), nullable=False),
+        sa.Column("organizer_id", sa.Integer(), nullable=False),
+        sa.Column("starts_at", sa.DateTime(), nullable=False),
+        sa.Column("capacity", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["route_id"], ["routes.id"], name="group_rides_route_id_fkey", ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["organizer_id"], ["riders.id"], name="group_rides_organizer_id_fkey", ondelete="CASCADE"
+        ),
+    )
+    op.create_index("ix_group_rides_route_id", "group_rides", ["route_id"])
+    op.create_index("ix_group_rides_organizer_id", "group_rides", ["organizer_id"])
+
+    op.create_table(
+        "group_ride_slots",
+        sa.Column("group_ride_id", sa.Integer(), primary_key=True),
+        sa.Column("slot", sa.Integer(), primary_key=True),
+        sa.Column("rider_id", sa.Integer(), nullable=True),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["group_ride_id"], ["group_rides.id"], name="group_ride_slots_group_ride_id_fkey", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["rider_id"], ["riders.id"], name="group_ride_slots_rider_id_fkey", ondelete="SET NULL"
+        ),
+        sa.UniqueConstraint("group_ride_id", "rider_id", name="uq_group_ride_slots_group_ride_id_rider_id"),
+    )
+    op.create_index("ix_group_ride_slots_rider_id", "group_ride_slots", ["rider_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("group_ride_slots")
+    op.drop_table("group_rides")
@@ -0,0 +1,37 @@
+"""Derived route metric columns.
+
+The application fills them at startup (app.services.route_metrics), so
+existing routes are backfilled on the first start after this revision.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("routes", sa.Column("estimated_minutes", sa.Float(), nullable=True))
+    op.add_column("routes", sa.Column("difficulty_score", sa.Float(), nullable=True))
+    op.create_index("ix_routes_estimated_minutes", "routes", ["estimated_minutes"])
+    op.create_index("ix_routes_difficulty_score", "routes", ["difficulty_score"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_routes_difficulty_score", table_name="routes")
+    op.drop_index("ix_routes_estimated_minutes", table_name="routes")
+    op.drop_column("routes", "difficulty_score")
+    op.drop_column("routes", "estimated_minutes")
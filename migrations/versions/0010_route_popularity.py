@@ -0,0 +1,49 @@
+"""Route popularity sketches.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "route_popularity",
+        sa.Column("route_id", sa.Integer(), primary_key=True),
+        sa.Column("riders", sa.LargeBinary(), nullable=False),
+        sa.Column("rides", sa.Integer(), nullable=False),
+        sa.Column("trend", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["route_id"], ["routes.id"], name="route_popularity_route_id_fkey", ondelete="CASCADE"),
+    )
+    op.create_index("ix_route_popularity_updated_at", "route_popularity", ["updated_at"])
+
+    op.create_table(
+        "route_daily_riders",
+        sa.Column("route_id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("riders", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["route_id"], ["routes.id"], name="route_daily_riders_route_id_fkey", ondelete="CASCADE"
+        ),
+    )
+    op.create_index("ix_route_daily_riders_day", "route_daily_riders", ["day"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("route_daily_riders")
+    op.drop_table("route_popularity")
@@ -0,0 +1,37 @@
+"""Route geometries.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "route_geometries",
+        sa.Column("route_id", sa.Integer(), primary_key=True),
+        sa.Column("point_count", sa.Integer(), nullable=False),
+        sa.Column("path", sa.LargeBinary(), nullable=False),
+        sa.Column("footprint_level", sa.Integer(), nullable=False),
+        sa.Column("footprint", sa.LargeBinary(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["route_id"], ["routes.id"], name="route_geometries_route_id_fkey", ondelete="CASCADE"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("route_geometries")
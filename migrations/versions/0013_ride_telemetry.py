@@ -0,0 +1,52 @@
+"""Ride GPS/IMU telemetry stored as compressed columns.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, Sequence[str], None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ride_telemetry",
+        sa.Column("ride_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("rider_id", sa.Integer(), nullable=False),
+        sa.Column("route_id", sa.Integer(), nullable=False),
+        sa.Column("point_count", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("duration_seconds", sa.Float(), nullable=False),
+        sa.Column("distance_m", sa.Float(), nullable=False),
+        sa.Column("moving_seconds", sa.Float(), nullable=False),
+        sa.Column("max_speed_kmh", sa.Float(), nullable=False),
+        sa.Column("elevation_gain_m", sa.Float(), nullable=True),
+        sa.Column("elevation_loss_m", sa.Float(), nullable=True),
+        sa.Column("min_elevation_m", sa.Float(), nullable=True),
+        sa.Column("max_elevation_m", sa.Float(), nullable=True),
+        sa.Column("times", sa.LargeBinary(), nullable=False),
+        sa.Column("path", sa.LargeBinary(), nullable=False),
+        sa.Column("elevations", sa.LargeBinary(), nullable=True),
+        sa.Column("accelerations", sa.LargeBinary(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["rider_id"], ["riders.id"], name="ride_telemetry_rider_id_fkey", ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["route_id"], ["routes.id"], name="ride_telemetry_route_id_fkey", ondelete="CASCADE"),
+    )
+    op.create_index("ix_ride_telemetry_rider_id", "ride_telemetry", ["rider_id"])
+    op.create_index("ix_ride_telemetry_route_id", "ride_telemetry", ["route_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ride_telemetry")
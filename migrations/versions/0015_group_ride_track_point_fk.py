@@ -0,0 +1,40 @@
+"""Delete group ride track points with their group ride.
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0015"
+down_revision: Union[str, Sequence[str], None] = "0014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Points recorded for group rides that no longer exist, or from before
+    # group rides were stored (0008), cannot satisfy the key.
+    op.execute(
+        "DELETE FROM group_ride_track_points t "
+        "WHERE NOT EXISTS (SELECT 1 FROM group_rides g WHERE g.id = t.group_ride_id)"
+    )
+    op.create_foreign_key(
+        "group_ride_track_points_group_ride_id_fkey",
+        "group_ride_track_points",
+        "group_rides",
+        ["group_ride_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("group_ride_track_points_group_ride_id_fkey", "group_ride_track_points", type_="foreignkey")
@@ -0,0 +1,59 @@
+"""Claim group ride slots in one statement, however contended.
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-20 01:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0016"
+down_revision: Union[str, Sequence[str], None] = "0015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION claim_group_ride_slot(ride integer, claimant integer, claimed timestamp)
+        RETURNS SETOF group_ride_slots AS $$
+        DECLARE
+            claimed_slot group_ride_slots;
+        BEGIN
+            LOOP
+                UPDATE group_ride_slots SET rider_id = claimant, claimed_at = claimed
+                WHERE group_ride_id = ride AND rider_id IS NULL AND slot = (
+                    SELECT slot FROM group_ride_slots
+                    WHERE group_ride_id = ride AND rider_id IS NULL
+                    ORDER BY slot LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING * INTO claimed_slot;
+                EXIT WHEN FOUND;
+                IF NOT EXISTS (SELECT FROM group_ride_slots WHERE group_ride_id = ride AND rider_id IS NULL) THEN
+                    RETURN;
+                END IF;
+                UPDATE group_ride_slots SET rider_id = claimant, claimed_at = claimed
+                WHERE group_ride_id = ride AND rider_id IS NULL AND slot = (
+                    SELECT slot FROM group_ride_slots
+                    WHERE group_ride_id = ride AND rider_id IS NULL
+                    ORDER BY slot LIMIT 1 FOR UPDATE
+                )
+                RETURNING * INTO claimed_slot;
+                EXIT WHEN FOUND;
+            END LOOP;
+            RETURN NEXT claimed_slot;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS claim_group_ride_slot(integer, integer, timestamp)")
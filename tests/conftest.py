@@ -0,0 +1,193 @@
+"""Test fixtures.
+
+The suite runs against a scratch PostgreSQL database named by
+``TEST_POSTGRES_DATABASE_URL``; its ``public`` schema is dropped and recreated
+on every run. Neo4j is replaced by an in-memory graph, except in tests marked
+``neo4j``: they run against the scratch graph named by ``TEST_NEO4J_DATABASE_URL``,
+emptied before each of them, and are skipped without it.
+"""
+
+import os
+import pytest
+from sqlalchemy import create_engine, text
+
+TEST_POSTGRES_DATABASE_URL = os.environ.get("TEST_POSTGRES_DATABASE_URL")
+TEST_NEO4J_DATABASE_URL = os.environ.get("TEST_NEO4J_DATABASE_URL")
+
+# Without a test database the app still has to import, so that the suite is
+# collected and then skipped; the engine never connects to this placeholder.
+os.environ["POSTGRES_DATABASE_URL"] = TEST_POSTGRES_DATABASE_URL or "postgresql://localhost/unconfigured"
+os.environ["NEO4J_DATABASE_URL"] = TEST_NEO4J_DATABASE_URL or "bolt://localhost:7687"
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "neo4j")
+os.environ["QUERY_BUDGET_STRICT"] = "1"
+# Popularity sketches are only flushed when a test asks for it.
+os.environ.setdefault("ROUTE_SKETCH_FLUSH_SECONDS", "3600")
+
+if TEST_POSTGRES_DATABASE_URL is not None:
+    _engine = create_engine(TEST_POSTGRES_DATABASE_URL)
+    with _engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE"))
+        connection.execute(text("CREATE SCHEMA public"))
+    _engine.dispose()
+
+from fastapi.testclient import TestClient  # noqa: E402
+import app.db.database as database  # noqa: E402
+import app.db.neo4j_crud as neo_crud  # noqa: E402
+from app.db.database import neo4j_session_context  # noqa: E402
+from app.db.postgres_models import Base  # noqa: E402
+from app.db.query_budget import get_statement_counter  # noqa: E402
+from app.main import app  # noqa: E402
+
+database.engine.echo = False
+if TEST_POSTGRES_DATABASE_URL is not None:
+    Base.metadata.create_all(database.engine)
+
+
+def pytest_collection_modifyitems(config, items) -> None:
+    if TEST_POSTGRES_DATABASE_URL is None:
+        skip = pytest.mark.skip(reason="TEST_POSTGRES_DATABASE_URL is not set")
+        for item in items:
+            item.add_marker(skip)
+    elif TEST_NEO4J_DATABASE_URL is None:
+        skip = pytest.mark.skip(reason="TEST_NEO4J_DATABASE_URL is not set")
+        for item in items:
+            if item.get_closest_marker("neo4j"):
+                item.add_marker(skip)
+
+
+class FakeGraph:
+    """The parts of the social graph the API reads back, kept in memory."""
+
+    def __init__(self) -> None:
+        self.names: dict[int, str] = {}
+        self.following: dict[int, set[int]] = {}
+        self.followers: dict[int, set[int]] = {}
+        self.buddies: dict[int, dict[int, int]] = {}
+
+    def create_rider_node(self, rider) -> None:
+        self.names[rider.id] = rider.name
+
+    def retire_rider_node(self, rider_id: int) -> None:
+        self.names.pop(rider_id, None)
+        for target_id in self.following.pop(rider_id, set()):
+            self.followers[target_id].discard(rider_id)
+        for follower_id in self.followers.pop(rider_id, set()):
+            self.following[follower_id].discard(rider_id)
+        for buddy_id in self.buddies.pop(rider_id, {}):
+            self.buddies[buddy_id].pop(rider_id, None)
+
+    def set_follow(self, rider_id: int, target_id: int, following: bool):
+        if rider_id in self.names and target_id in self.names:
+            if following:
+                self.following.setdefault(rider_id, set()).add(target_id)
+                self.followers.setdefault(target_id, set()).add(rider_id)
+            else:
+                self.following.get(rider_id, set()).discard(target_id)
+                self.followers.get(target_id, set()).discard(rider_id)
+        return self.names.get(rider_id), self.names.get(target_id)
+
+    def tag_riding_buddies(self, rider_id: int, ride_id: int, buddy_ids: list[int]):
+        tagged = [buddy_id for buddy_id in buddy_ids if buddy_id in self.names]
+        for buddy_id in tagged:
+            for one, other in ((rider_id, buddy_id), (buddy_id, rider_id)):
+                rides = self.buddies.setdefault(one, {})
+                rides[other] = rides.get(other, 0) + 1
+        return [(buddy_id, self.names[buddy_id]) for buddy_id in tagged]
+
+    def get_rider_neighbours(self, rider_id: int, kind: str, after: int, limit: int):
+        if kind == "riding-buddies":
+            neighbours = self.buddies.get(rider_id, {}).items()
+        else:
+            graph = self.following if kind == "following" else self.followers
+            neighbours = ((other, None) for other in graph.get(rider_id, ()))
+        return sorted((other, self.names[other], rides) for other, rides in neighbours if other > after)[:limit]
+
+    def get_followed_riders(self, rider_id: int):
+        return [
+            (target_id, len(self.followers.get(target_id, ())))
+            for target_id in sorted(self.following.get(rider_id, ()))
+        ]
+
+
+@pytest.fixture(autouse=True)
+def graph(request, monkeypatch) -> FakeGraph | None:
+    if request.node.get_closest_marker("neo4j"):
+        with neo4j_session_context() as session:
+            session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS").consume()
+        return None
+    fake = FakeGraph()
+    for name in dir(neo_crud):
+        function = getattr(neo_crud, name)
+        if callable(function) and getattr(function, "__module__", None) == neo_crud.__name__:
+            monkeypatch.setattr(neo_crud, name, getattr(fake, name, lambda *args, **kwargs: None))
+    return fake
+
+
+@pytest.fixture
+def empty_database() -> None:
+    """Empty every table; ids keep counting up, so state cached from earlier tests never matches."""
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with database.engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+@pytest.fixture
+def client(empty_database):
+    """A client for an app started on empty tables."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def statements():
+    """The SQL statements each request issued, one list per request, oldest first."""
+    sessions = []
+
+    def _recording_session():
+        for db in database.get_postgres_session():
+            sessions.append(db)
+            yield db
+
+    app.dependency_overrides[database.get_postgres_session] = _recording_session
+    yield lambda: [get_statement_counter(db).statements for db in sessions]
+    app.dependency_overrides.pop(database.get_postgres_session, None)
+
+
+class Api:
+    """Shortcuts creating the records most tests need."""
+
+    def __init__(self, client: TestClient) -> None:
+        self.client = client
+
+    def _post(self, path: str, body: dict) -> dict:
+        response = self.client.post(path, json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def rider(self, name: str = "Rider", experience_level: str = "INTERMEDIATE") -> dict:
+        return self._post("/riders", {"name": name, "experience_level": experience_level})
+
+    def bike(self, rider_id: int, engine_cc: int = 650) -> dict:
+        return self._post(f"/riders/{rider_id}/bikes", {
+            "model": "Model", "brand": "Brand", "year": 2020, "engine_cc": engine_cc,
+        })
+
+    def route(self, name: str = "Route", **fields) -> dict:
+        body = {
+            "name": name,
+            "start_location": "Turin",
+            "end_location": "Aosta",
+            "distance_km": 120,
+            "difficulty": "MODERATE",
+            "route_type": "scenic",
+        }
+        return self._post("/routes", {**body, **fields})
+
+    def ride(self, bike_id: int, route_id: int, duration_minutes: int | None = 90) -> dict:
+        return self._post("/rides", {"bike_id": bike_id, "route_id": route_id, "duration_minutes": duration_minutes})
+
+
+@pytest.fixture
+def api(client) -> Api:
+    return Api(client)
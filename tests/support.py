@@ -0,0 +1,62 @@
+"""Helpers shared by tests and benchmarks."""
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+import numpy as np
+import uvicorn
+from sqlalchemy import insert
+import app.db.database as database
+
+
+def insert_rows(model, rows: list[dict]) -> list[int]:
+    """Bulk insert rows straight into a model's table, returning their ids in order."""
+    table = model.__table__
+    with database.engine.begin() as connection:
+        return list(connection.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars())
+
+
+def wait_for(condition, seconds: float = 5) -> bool:
+    """Poll ``condition`` until it holds, e.g. for a notification from another worker to arrive."""
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@contextmanager
+def serving(app) -> Iterator[str]:
+    """Run ``app`` under uvicorn in a thread, for clients that need a real socket; yields its base URL."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    try:
+        assert wait_for(lambda: server.started, seconds=10)
+        yield f"127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def timings(function, repeat: int) -> np.ndarray:
+    """Wall-clock milliseconds of ``repeat`` calls."""
+    elapsed = np.empty(repeat)
+    for run in range(repeat):
+        started = time.perf_counter()
+        function(run)
+        elapsed[run] = (time.perf_counter() - started) * 1000
+    return elapsed
+
+
+def report(title: str, rows: list[tuple[str, np.ndarray]], unit: str = "ms") -> None:
+    """Print median and 95th percentile timings, one line per case."""
+    print(f"\n{title}")
+    for label, elapsed in rows:
+        print(f"  {label:<40} p50 {np.percentile(elapsed, 50):8.2f} {unit}   p95 {np.percentile(elapsed, 95):8.2f} {unit}")
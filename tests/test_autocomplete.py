@@ -0,0 +1,62 @@
+import time
+import numpy as np
+import pytest
+from app.services.autocomplete import PrefixIndex, route_names
+from tests.support import report, timings
+
+
+def _names(client, kind: str, q: str, limit: int = 10) -> list[str]:
+    response = client.get(f"/{kind}/autocomplete", params={"q": q, "limit": limit})
+    assert response.status_code == 200, response.text
+    return [match["name"] for match in response.json()]
+
+
+def test_prefix_matches_rank_by_name_ignoring_case(api):
+    for name in ("Bob", "adele", "Ada", "ADAM", "Madame"):
+        api.rider(name)
+    assert _names(api.client, "riders", "ad") == ["Ada", "ADAM", "adele"]
+    assert _names(api.client, "riders", "AD", limit=2) == ["Ada", "ADAM"]
+    assert _names(api.client, "riders", "ada") == ["Ada", "ADAM"]
+    assert _names(api.client, "riders", "%") == []
+    assert _names(api.client, "riders", "adamo") == []
+
+
+def test_index_follows_writes_and_agrees_with_the_database(api, monkeypatch):
+    routes = {name: api.route(name)["id"] for name in ("Stelvio", "stelvio pass", "Gavia", "Stelvio North")}
+    assert _names(api.client, "routes", "stel") == ["Stelvio", "Stelvio North", "stelvio pass"]
+    assert api.client.delete(f"/routes/{routes['Stelvio North']}").status_code == 200
+    api.route("Stelvio East")
+    indexed = _names(api.client, "routes", "stel")
+    assert indexed == ["Stelvio", "Stelvio East", "stelvio pass"]
+    monkeypatch.setattr(route_names, "enabled", False)
+    assert sorted(_names(api.client, "routes", "stel")) == sorted(indexed)
+
+
+def test_index_over_its_memory_budget_is_dropped():
+    index = PrefixIndex("test", memory_budget_bytes=2000)
+    index.build([(1, "Ada"), (2, "Grace")])
+    assert index.enabled and index.complete("g", 10) == [(2, "Grace")]
+    index.add(3, "A very long name " * 100)
+    assert not index.enabled and index.bytes_used == 0
+
+
+@pytest.mark.benchmark
+def test_autocomplete_at_a_million_names():
+    """Build time, memory and lookup latency of one index holding 1,000,000 names."""
+    generator = np.random.default_rng(30)
+    words = ["Alpine", "Bonette", "Col", "Colle", "Dolomiti", "Gavia", "Grand", "Lago", "Monte", "Passo",
+             "Riviera", "San", "Stelvio", "Strada", "Valle", "Vecchia"]
+    picks = generator.integers(0, len(words), (1_000_000, 2))
+    names = [f"{words[first]} {words[second]} {number}" for number, (first, second) in enumerate(picks.tolist())]
+    index = PrefixIndex("benchmark", memory_budget_bytes=2**31)
+    started = time.perf_counter()
+    index.build(enumerate(names))
+    built_seconds = time.perf_counter() - started
+    assert index.enabled
+    rows = []
+    for length in (1, 3, 8, 14):
+        prefixes = [names[position][:length] for position in generator.integers(0, len(names), 1000)]
+        assert all(len(index.complete(prefix, 10)) > 0 for prefix in prefixes)
+        rows.append((f"{length}-character prefix, top 10", timings(lambda run: index.complete(prefixes[run], 10), 1000) * 1000))
+    print(f"\nBuilt in {built_seconds:.1f} s, {index.bytes_used / 2**20:.0f} MB of the memory budget")
+    report("Autocomplete over 1,000,000 names", rows, unit="us")
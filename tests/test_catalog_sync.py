@@ -0,0 +1,88 @@
+"""In-memory catalog indexes follow committed writes, made through this worker or another."""
+
+import app.db.postgres_crud as pg_crud
+from app.db.database import SessionLocal
+from app.services import catalog_sync
+from tests.support import wait_for
+
+
+def _names(client, kind: str, prefix: str) -> list[str]:
+    response = client.get(f"/{kind}/autocomplete", params={"q": prefix})
+    assert response.status_code == 200, response.text
+    return [match["name"] for match in response.json()]
+
+
+def _ids(client, path: str) -> list[int]:
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    return [route["id"] for route in response.json()]
+
+
+def test_rolled_back_writes_leave_the_indexes_alone(client):
+    with SessionLocal() as db:
+        rider = pg_crud.create_rider(db, "Ghost", "beginner")
+        catalog_sync.rider_saved(db, rider.id, rider.name)
+        db.rollback()
+    assert _names(client, "riders", "Gho") == []
+    with SessionLocal() as db:
+        rider = pg_crud.create_rider(db, "Ghost", "beginner")
+        catalog_sync.rider_saved(db, rider.id, rider.name)
+        db.commit()
+    assert _names(client, "riders", "Gho") == ["Ghost"]
+
+
+def test_routes_written_through_another_worker_are_indexed(api):
+    rider = api.rider("Ada")["id"]
+    api.bike(rider, engine_cc=900)
+    first = api.route("Colle del Nivolet")["id"]
+    # Written and committed outside this app's requests, as another worker would.
+    with SessionLocal() as db:
+        second = pg_crud.create_route(db, "Colle del Sestriere", "Turin", "Sestriere", 110, "MODERATE").id
+        db.commit()
+    assert wait_for(lambda: _names(api.client, "routes", "Colle") == ["Colle del Nivolet", "Colle del Sestriere"])
+    assert _ids(api.client, f"/routes/{first}/similar") == [second]
+    assert _ids(api.client, f"/riders/{rider}/eligible-routes") == [first, second]
+
+    with SessionLocal() as db:
+        assert pg_crud.delete_route(db, second)
+        db.commit()
+    assert wait_for(lambda: _names(api.client, "routes", "Colle") == ["Colle del Nivolet"])
+    assert _ids(api.client, f"/routes/{first}/similar") == []
+    assert _ids(api.client, f"/riders/{rider}/eligible-routes") == [first]
+
+
+def test_riders_and_garages_changed_through_another_worker_are_indexed(api):
+    route = api.route("Colle del Nivolet")["id"]
+    rider = api.rider("Ada")["id"]
+    assert _ids(api.client, f"/riders/{rider}/eligible-routes") == []
+    with SessionLocal() as db:
+        pg_crud.create_bike(db, owner_id=rider, brand="Brand", model="Model", year=2020, engine_cc=650)
+        other = pg_crud.create_rider(db, "Adele", "beginner").id
+        db.commit()
+    assert wait_for(lambda: _ids(api.client, f"/riders/{rider}/eligible-routes") == [route])
+    assert wait_for(lambda: _names(api.client, "riders", "Ad") == ["Ada", "Adele"])
+
+    with SessionLocal() as db:
+        assert pg_crud.delete_rider(db, other) is not None
+        db.commit()
+    assert wait_for(lambda: _names(api.client, "riders", "Ad") == ["Ada"])
+
+
+def test_locations_added_through_another_worker_are_found_along_routes(api):
+    route = api.route("Colle del Nivolet")["id"]
+    path = {"type": "LineString", "coordinates": [[7.0 + i * 0.01, 45.5] for i in range(50)]}
+    response = api.client.put(f"/routes/{route}/geometry", json=path, headers={"content-type": "application/geo+json"})
+    assert response.status_code == 200, response.text
+    assert api.client.get(f"/routes/{route}/locations").json() == []
+    with SessionLocal() as db:
+        location = pg_crud.create_location(db, "Rifugio", "rest_stop", 45.5, 7.2).id
+        db.commit()
+
+    def found() -> list[int]:
+        return [location["id"] for location in api.client.get(f"/routes/{route}/locations").json()]
+
+    assert wait_for(lambda: found() == [location])
+    with SessionLocal() as db:
+        assert pg_crud.delete_location(db, location)
+        db.commit()
+    assert wait_for(lambda: found() == [])
@@ -0,0 +1,68 @@
+import orjson
+import pytest
+from sqlalchemy import func, select
+from app.db import neo4j_crud as neo_crud
+from app.db import postgres_models as models
+from app.db.database import SessionLocal, neo4j_session_context
+
+
+def _telemetry(client, ride_id: int) -> None:
+    body = b"\n".join(
+        orjson.dumps({"t": 1792400000.0 + second, "lat": 45.07 + second / 10_000, "lon": 7.68})
+        for second in range(60)
+    )
+    response = client.put(f"/rides/{ride_id}/telemetry", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+
+
+def _left_in_postgres(rider_id: int) -> dict[str, int]:
+    with SessionLocal() as db:
+        return {
+            model.__tablename__: db.scalar(select(func.count()).select_from(model).where(column == rider_id))
+            for model, column in (
+                (models.Ride, models.Ride.rider_id),
+                (models.Bike, models.Bike.owner_id),
+                (models.RideTelemetry, models.RideTelemetry.rider_id),
+            )
+        }
+
+
+def test_deleting_a_rider_removes_their_bikes_rides_and_telemetry(api):
+    ada, grace = api.rider("Ada")["id"], api.rider("Grace")["id"]
+    route = api.route()["id"]
+    for rider in (ada, grace):
+        bike = api.bike(rider)["id"]
+        for _ in range(2):
+            _telemetry(api.client, api.ride(bike, route)["id"])
+    assert _left_in_postgres(ada) == {"rides": 2, "bikes": 1, "ride_telemetry": 2}
+
+    assert api.client.delete(f"/riders/{ada}").status_code == 200
+    assert _left_in_postgres(ada) == {"rides": 0, "bikes": 0, "ride_telemetry": 0}
+    assert _left_in_postgres(grace) == {"rides": 2, "bikes": 1, "ride_telemetry": 2}
+    assert api.client.delete(f"/riders/{ada}").status_code == 404
+
+
+def _graph_counts() -> dict[str, int]:
+    with neo4j_session_context() as session:
+        return dict(session.run("MATCH (n) UNWIND labels(n) AS label RETURN label, count(*)").values())
+
+
+@pytest.mark.neo4j
+def test_retired_subgraphs_left_behind_are_purged_in_batches(api):
+    ada, grace = api.rider("Ada")["id"], api.rider("Grace")["id"]
+    routes = [api.route(f"Route {number}")["id"] for number in range(2)]
+    for rider in (ada, grace):
+        bike = api.bike(rider)["id"]
+        for route in routes:
+            api.ride(bike, route)
+    # As a worker that stopped before running its purge tasks leaves them.
+    neo_crud.retire_rider_node(ada)
+    neo_crud.retire_route_node(routes[1])
+    assert _graph_counts() == {
+        "RiderNode": 1, "DeletedRider": 1, "BikeNode": 2, "RouteNode": 1, "DeletedRoute": 1, "RideNode": 4,
+    }
+
+    assert neo_crud.purge_retired_subgraphs(batch_size=1) == (1, 1)
+    # Grace keeps her bike and her ride on the remaining route.
+    assert _graph_counts() == {"RiderNode": 1, "BikeNode": 1, "RouteNode": 1, "RideNode": 1}
+    assert neo_crud.purge_retired_subgraphs() == (0, 0)
@@ -0,0 +1,145 @@
+import random
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import app.db.postgres_crud as pg_crud
+from app.db import postgres_models as models
+from app.db.database import SessionLocal
+from app.main import app
+from app.services.feed import ride_feed
+from tests.support import insert_rows, report, timings, wait_for
+
+
+def _feed(client, rider_id: int, limit: int = 100) -> list[int]:
+    """Every ride id in a rider's feed, paging through it."""
+    ride_ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/riders/{rider_id}/feed", params=params)
+        assert response.status_code == 200, response.text
+        ride_ids += [ride["id"] for ride in response.json()["rides"]]
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            return ride_ids
+
+
+@pytest.fixture
+def riders(api):
+    reader, author, other = api.rider("Reader"), api.rider("Author"), api.rider("Other")
+    route = api.route()
+    bikes = {rider["id"]: api.bike(rider["id"])["id"] for rider in (reader, author, other)}
+    return reader["id"], author["id"], other["id"], route["id"], bikes
+
+
+def test_feed_pages_through_followed_riders_newest_first(api, riders):
+    reader, author, other, route, bikes = riders
+    logged = [api.ride(bikes[rider], route)["id"] for rider in [author, other] * 6]
+    assert api.client.post(f"/riders/{reader}/follow/{author}").status_code == 200
+    expected = sorted(logged[::2], reverse=True)
+    assert _feed(api.client, reader, limit=4) == expected
+    # Following someone rebuilds the inbox with their earlier rides.
+    assert api.client.post(f"/riders/{reader}/follow/{other}").status_code == 200
+    assert _feed(api.client, reader, limit=5) == sorted(logged, reverse=True)
+
+
+def test_rides_logged_through_another_worker_are_pushed(api, riders):
+    reader, author, _, route, bikes = riders
+    api.client.post(f"/riders/{reader}/follow/{author}")
+    first = api.ride(bikes[author], route)["id"]
+    assert _feed(api.client, reader) == [first]
+    # Written and committed outside this app's requests, as another worker would.
+    with SessionLocal() as db:
+        ride, _ = pg_crud.create_ride(db, route_id=route, bike_id=bikes[author])
+        second = ride.id
+        db.commit()
+    assert wait_for(lambda: _feed(api.client, reader) == [second, first])
+
+
+def test_deleted_rides_do_not_cut_the_feed_short(api, riders):
+    reader, author, _, route, bikes = riders
+    api.client.post(f"/riders/{reader}/follow/{author}")
+    logged = [api.ride(bikes[author], route)["id"] for _ in range(10)]
+    assert _feed(api.client, reader) == logged[::-1]
+    for ride_id in logged[-4:]:
+        assert api.client.delete(f"/rides/{ride_id}").status_code == 200
+    assert _feed(api.client, reader, limit=3) == logged[-5::-1]
+
+
+def test_celebrity_rides_are_pulled(api, riders, monkeypatch):
+    reader, author, other, route, bikes = riders
+    monkeypatch.setattr(ride_feed, "celebrity_followers", 1)
+    api.client.post(f"/riders/{reader}/follow/{author}")
+    api.client.post(f"/riders/{other}/follow/{author}")
+    assert _feed(api.client, reader) == []
+    ride_ids = [api.ride(bikes[author], route)["id"] for _ in range(3)]
+    assert _feed(api.client, reader, limit=2) == ride_ids[::-1]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("distribution", ["uniform", "skewed"])
+def test_feed_latency(empty_database, graph, distribution):
+    """Feed pages for readers following 10, 100 or 1000 riders.
+
+    Uniform: everyone is equally likely to be followed, so nobody passes the
+    celebrity threshold and feeds are pushed. Skewed: who is followed is
+    Zipf-distributed, so the most followed riders' rides are pulled.
+    """
+    generator = np.random.default_rng(37)
+    rider_count, ride_count, readers_per_size = 5000, 200_000, 30
+    rider_ids = insert_rows(models.Rider, [
+        {"name": f"Rider {number}", "experience_level": "intermediate"} for number in range(rider_count)
+    ])
+    bike_ids = insert_rows(models.Bike, [
+        {"owner_id": rider_id, "brand": "Brand", "model": "Model", "year": 2020, "engine_cc": 650}
+        for rider_id in rider_ids
+    ])
+    with SessionLocal() as db:
+        route_id = pg_crud.create_route(db, "Route", "Turin", "Aosta", 120, "MODERATE").id
+        db.commit()
+    authors = generator.integers(0, rider_count, ride_count)
+    now = datetime.utcnow()
+    seconds = np.sort(generator.integers(0, 90 * 86400, ride_count))[::-1]
+    insert_rows(models.Ride, [
+        {
+            "rider_id": rider_ids[author],
+            "route_id": route_id,
+            "bike_id": bike_ids[author],
+            "completed_at": now - timedelta(seconds=int(second)),
+            "duration_minutes": 60,
+        }
+        for author, second in zip(authors.tolist(), seconds.tolist())
+    ])
+
+    weights = np.ones(rider_count) if distribution == "uniform" else 1 / np.arange(1, rider_count + 1) ** 1.1
+    weights /= weights.sum()
+    readers = {size: [] for size in (10, 100, 1000)}
+    for position, rider_id in enumerate(rider_ids):
+        size = (10, 100, 1000)[position % 3]
+        readers[size].append(rider_id)
+        graph.names[rider_id] = f"Rider {position}"
+        for target in generator.choice(rider_count, size, replace=False, p=weights).tolist():
+            if rider_ids[target] != rider_id:
+                graph.following.setdefault(rider_id, set()).add(rider_ids[target])
+                graph.followers.setdefault(rider_ids[target], set()).add(rider_id)
+    celebrities = sum(len(followers) > ride_feed.celebrity_followers for followers in graph.followers.values())
+
+    with TestClient(app) as client:
+        def first_page(reader_ids):
+            return lambda run: client.get(f"/riders/{reader_ids[run]}/feed", params={"limit": 20})
+
+        def fifth_page(reader_ids):
+            def read(run):
+                cursor = None
+                for _ in range(5):
+                    params = {"limit": 20, **({"cursor": cursor} if cursor else {})}
+                    cursor = client.get(f"/riders/{reader_ids[run]}/feed", params=params).json()["next_cursor"]
+            return read
+
+        rows = []
+        for size, reader_ids in readers.items():
+            sample = random.Random(size).sample(reader_ids, readers_per_size)
+            rows.append((f"following {size}, first read (build)", timings(first_page(sample), len(sample))))
+            rows.append((f"following {size}, first page", timings(first_page(sample), len(sample))))
+            rows.append((f"following {size}, five pages", timings(fifth_page(sample), len(sample)) / 5))
+    report(f"Feed latency, {distribution} follows, {celebrities} celebrities, {ride_count} rides", rows)
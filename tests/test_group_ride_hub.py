@@ -0,0 +1,205 @@
+import asyncio
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import orjson
+import pytest
+from fastapi import WebSocketDisconnect
+from websockets.asyncio.client import connect
+import app.db.postgres_crud as pg_crud
+from app.api.group_ride.schemas import PositionUpdate
+from app.db import postgres_models as models
+from app.db.database import SessionLocal
+from app.main import app
+from app.services.group_ride_hub import COORDINATE_SCALE, GroupRideHub, group_rides
+from tests.support import insert_rows, report, serving, wait_for
+
+# Load test positions encode the report's sequence number in the latitude.
+BASE_LAT, LAT_STEP = 4_500_000, 10
+
+
+def _apply(known: dict[int, list[int]], message: dict) -> list[int]:
+    """Update a client's view of the riders' positions; returns the riders who moved."""
+    if message["type"] == "keyframe":
+        known.clear()
+        known.update({rider_id: position for rider_id, *position in message["riders"]})
+        return []
+    for rider_id in message["left"]:
+        known.pop(rider_id, None)
+    for rider_id, *change in message["riders"]:
+        known[rider_id] = [before + delta for before, delta in zip(known.get(rider_id, [0, 0, 0, 0]), change)]
+    return [rider_id for rider_id, *_ in message["riders"]]
+
+
+def _received(member) -> list[dict]:
+    messages = []
+    while not member.queue.empty():
+        messages.append(orjson.loads(member.queue.get_nowait()))
+    return messages
+
+
+def _at(lat: float, lon: float) -> PositionUpdate:
+    return PositionUpdate(lat=lat, lon=lon, speed_kmh=52.4, heading=359.6)
+
+
+def test_ticks_send_coalesced_deltas_and_keyframes_to_slow_members():
+    hub = GroupRideHub(tick_seconds=1, sample_seconds=15, send_queue_size=2, reports_per_second=5)
+    ada, grace = hub.join(1, 10), hub.join(1, 20)
+    channel = hub._channels[1]
+    hub.report(ada, _at(45.0, 7.0))
+    hub.report(ada, _at(45.00123, 7.0))
+    channel.broadcast()
+    known = {}
+    for message in _received(grace):
+        _apply(known, message)
+    # One keyframe, of nobody yet, then one delta carrying only the later report.
+    assert known == {10: [4_500_123, 700_000, 52, 0]}
+
+    hub.report(grace, _at(45.1, 7.1))
+    hub.report(ada, _at(45.2, 7.0))
+    channel.broadcast()
+    message = _received(ada)[-1]
+    assert message["type"] == "delta" and sorted(rider_id for rider_id, *_ in message["riders"]) == [10, 20]
+    for message in _received(grace):
+        _apply(known, message)
+    assert known[10][0] == round(45.2 * COORDINATE_SCALE) and known[20][:2] == [4_510_000, 710_000]
+
+    # Grace stops reading: once her queue overflows she gets a keyframe instead of the backlog.
+    for step in range(3):
+        hub.report(ada, _at(45.3 + step / 100, 7.0))
+        channel.broadcast()
+    channel.broadcast()
+    messages = _received(grace)
+    assert [message["type"] for message in messages] == ["keyframe"]
+    caught_up = {}
+    _apply(caught_up, messages[0])
+    assert caught_up[10][0] == 4_532_000
+
+    hub.leave(grace)
+    channel.broadcast()
+    assert _received(ada)[-1]["left"] == [20]
+
+
+def _group_ride(rider_ids: list[int]) -> int:
+    with SessionLocal() as db:
+        route = pg_crud.create_route(db, f"Route {rider_ids[0]}", "Turin", "Aosta", 120, "MODERATE").id
+        group_ride = pg_crud.create_group_ride(
+            db, "Sunday loop", route, rider_ids[0], datetime.utcnow() + timedelta(days=1), len(rider_ids)
+        )["id"]
+        for rider_id in rider_ids:
+            pg_crud.claim_group_ride_slot(db, group_ride, rider_id)
+        db.commit()
+    return group_ride
+
+
+def test_positions_reach_the_other_riders_over_websockets(client, monkeypatch):
+    monkeypatch.setattr(group_rides, "tick_seconds", 0.02)
+    ada, grace, stranger = insert_rows(models.Rider, [
+        {"name": name, "experience_level": "beginner"} for name in ("Ada", "Grace", "Stranger")
+    ])
+    group_ride = _group_ride([ada, grace])
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(f"/group-rides/{group_ride}/live?rider_id={stranger}") as websocket:
+            websocket.receive_text()
+    assert refused.value.code == 1008
+
+    with client.websocket_connect(f"/group-rides/{group_ride}/live?rider_id={ada}") as ada_socket:
+        with client.websocket_connect(f"/group-rides/{group_ride}/live?rider_id={grace}") as grace_socket:
+            known = {}
+            assert _apply(known, grace_socket.receive_json()) == [] and known == {}
+            ada_socket.send_json({"lat": 45.07031, "lon": 7.68614, "speed_kmh": 40, "heading": 90})
+            assert _apply(known, grace_socket.receive_json()) == [ada]
+            assert known == {ada: [4_507_031, 768_614, 40, 90]}
+            ada_socket.send_text("not json")
+            assert ada_socket.receive_json()["type"] == "keyframe"
+            assert ada_socket.receive_json()["type"] == "delta"
+            assert ada_socket.receive_json()["type"] == "error"
+            grace_socket.send_json({"lat": 45.1, "lon": 7.7})
+            assert wait_for(lambda: group_rides._channels[group_ride].sent.get(grace) is not None)
+        assert wait_for(lambda: len(group_rides._channels[group_ride].members) == 1)
+        messages = [ada_socket.receive_json(), ada_socket.receive_json()]
+        assert messages[-1]["left"] == [grace]
+
+
+async def _ride_along(host: str, group_rides_by_id: dict[int, list[int]], seconds: int) -> dict:
+    sent_at: dict[int, list[float]] = {}
+    lags: list[float] = []
+    counts = {"messages": 0, "keyframes": 0}
+
+    async def ride(group_ride_id: int, rider_id: int, lon: int) -> None:
+        url = f"ws://{host}/group-rides/{group_ride_id}/live?rider_id={rider_id}"
+        async with connect(url, max_queue=None) as websocket:
+            known: dict[int, list[int]] = {}
+
+            async def receive() -> None:
+                async for text in websocket:
+                    received = time.perf_counter()
+                    message = orjson.loads(text)
+                    counts["messages"] += 1
+                    counts["keyframes"] += message["type"] == "keyframe"
+                    for moved in _apply(known, message):
+                        if moved != rider_id:
+                            lags.append(received - sent_at[moved][(known[moved][0] - BASE_LAT) // LAT_STEP])
+
+            receiver = asyncio.create_task(receive())
+            sent = sent_at.setdefault(rider_id, [])
+            # Spread reports over the tick, as riders' phones would be.
+            await asyncio.sleep(rider_id % 100 / 100)
+            for count in range(seconds):
+                sent.append(time.perf_counter())
+                await websocket.send(orjson.dumps({
+                    "lat": (BASE_LAT + count * LAT_STEP) / COORDINATE_SCALE, "lon": lon / COORDINATE_SCALE,
+                    "speed_kmh": 50, "heading": 90,
+                }).decode())
+                await asyncio.sleep(1)
+            await asyncio.sleep(1.5)
+            receiver.cancel()
+
+    await asyncio.gather(*(
+        ride(group_ride_id, rider_id, 700_000 + position)
+        for group_ride_id, rider_ids in group_rides_by_id.items()
+        for position, rider_id in enumerate(rider_ids)
+    ))
+    return {"lags": lags, **counts}
+
+
+def _clients(host: str, group_rides_by_id: dict[int, list[int]], seconds: int, results) -> None:
+    """The riders' side of the load test, in its own process so it does not share the server's interpreter."""
+    results.put(asyncio.run(_ride_along(host, group_rides_by_id, seconds)))
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("riders", [100, 300, 600])
+def test_one_worker_shares_positions_of_hundreds_of_riders(empty_database, riders):
+    """Riders in groups of 30 each report once a second for 20 s through one uvicorn worker.
+
+    Lag is from a rider sending a position to another member of the group
+    receiving it, so it includes waiting for the next one-second tick.
+    """
+    seconds, group_size = 20, 30
+    rider_ids = insert_rows(models.Rider, [
+        {"name": f"Rider {number}", "experience_level": "beginner"} for number in range(riders)
+    ])
+    groups = {
+        _group_ride(rider_ids[start:start + group_size]): rider_ids[start:start + group_size]
+        for start in range(0, riders, group_size)
+    }
+    with serving(app) as host:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        clients = context.Process(target=_clients, args=(host, groups, seconds, results))
+        cpu_started, started = time.process_time(), time.perf_counter()
+        clients.start()
+        outcome = results.get(timeout=seconds + 120)
+        elapsed = time.perf_counter() - started
+        server_cpu = time.process_time() - cpu_started
+        clients.join()
+    lags = np.array(outcome["lags"]) * 1000
+    expected = sum(len(members) * (len(members) - 1) for members in groups.values()) * seconds
+    print(
+        f"\n{riders} riders: {outcome['messages'] / elapsed:,.0f} messages/s delivered, "
+        f"{len(lags) / expected:.0%} of position updates seen, {outcome['keyframes']} keyframes, "
+        f"server CPU {server_cpu / elapsed:.0%} of a core"
+    )
+    report(f"Position lag, {riders} riders in groups of {group_size}", [("report to peer", lags)])
@@ -0,0 +1,181 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import httpx
+import numpy as np
+import pytest
+from sqlalchemy import select
+import app.db.postgres_crud as pg_crud
+from app.db import postgres_models as models
+from app.db.database import SessionLocal
+from app.db.query_budget import get_statement_counter
+from app.main import app
+from tests.support import insert_rows, serving
+
+
+def _group_ride(capacity: int) -> int:
+    with SessionLocal() as db:
+        organizer = pg_crud.create_rider(db, "Organizer", "expert").id
+        route = pg_crud.create_route(db, "Route", "Turin", "Aosta", 120, "MODERATE").id
+        group_ride = pg_crud.create_group_ride(
+            db, "Sunday loop", route, organizer, datetime.utcnow() + timedelta(days=1), capacity
+        )
+        db.commit()
+    return group_ride["id"]
+
+
+@pytest.mark.parametrize("round_", range(3))
+def test_concurrent_rsvps_never_oversubscribe_or_turn_riders_away(empty_database, round_):
+    """Riders who will commit all get a place, even while others hold the free slots and roll back."""
+    capacity, abandoning = 5, 15
+    group_ride_id = _group_ride(capacity)
+    rider_ids = insert_rows(models.Rider, [
+        {"name": f"Rider {round_}-{number}", "experience_level": "beginner"} for number in range(capacity + abandoning)
+    ])
+    committing = set(rider_ids[::(capacity + abandoning) // capacity][:capacity])
+    start = threading.Barrier(len(rider_ids))
+    results: dict[int, dict | None] = {}
+    statements: dict[int, int] = {}
+
+    def rsvp(rider_id: int) -> None:
+        with SessionLocal() as db:
+            start.wait()
+            results[rider_id] = pg_crud.claim_group_ride_slot(db, group_ride_id, rider_id)
+            statements[rider_id] = get_statement_counter(db).count
+            # Hold the slot for a while, so others find every free slot locked.
+            time.sleep(0.05)
+            if rider_id in committing:
+                db.commit()
+            else:
+                db.rollback()
+
+    threads = [threading.Thread(target=rsvp, args=(rider_id,)) for rider_id in rider_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[rider_id] is not None for rider_id in committing)
+    # Waiting on locked slots happens inside the one statement.
+    assert set(statements.values()) == {1}
+    slots = models.GroupRideSlot.__table__
+    with SessionLocal() as db:
+        held = db.execute(
+            select(slots.c.rider_id).where(slots.c.group_ride_id == group_ride_id, slots.c.rider_id.is_not(None))
+        ).scalars().all()
+    assert sorted(held) == sorted(committing)
+
+
+def test_slot_freed_while_waiting_is_claimed(empty_database):
+    """A claim blocked on an RSVP in flight takes a slot released meanwhile instead of calling the ride full."""
+    group_ride_id = _group_ride(capacity=2)
+    holder, claimer, waiter = insert_rows(models.Rider, [
+        {"name": name, "experience_level": "beginner"} for name in ("Holder", "Claimer", "Waiter")
+    ])
+    with SessionLocal() as db:
+        assert pg_crud.claim_group_ride_slot(db, group_ride_id, holder)["slot"] == 1
+        db.commit()
+    with SessionLocal() as claiming, SessionLocal() as releasing:
+        assert pg_crud.claim_group_ride_slot(claiming, group_ride_id, claimer)["slot"] == 2
+        assert pg_crud.release_group_ride_slot(releasing, group_ride_id, holder)
+        result = {}
+
+        def wait_for_slot() -> None:
+            with SessionLocal() as db:
+                result["claimed"] = pg_crud.claim_group_ride_slot(db, group_ride_id, waiter)
+                db.commit()
+
+        thread = threading.Thread(target=wait_for_slot)
+        thread.start()
+        time.sleep(0.2)
+        # Slot 1 is freed while the waiter is blocked on slot 2, which is then taken.
+        releasing.commit()
+        claiming.commit()
+        thread.join()
+    assert result["claimed"] is not None and result["claimed"]["slot"] == 1
+
+
+def _burst(host: str, requests: list[tuple[str, str, dict | None]]) -> list[tuple[int, float]]:
+    """Send ``(method, path, body)`` requests all at once, one connection each; returns statuses and latencies."""
+    start = threading.Barrier(len(requests))
+    outcomes = [None] * len(requests)
+    with httpx.Client(base_url=f"http://{host}", timeout=60, limits=httpx.Limits(max_connections=len(requests))) as client:
+
+        def send(position: int) -> None:
+            method, path, body = requests[position]
+            start.wait()
+            started = time.perf_counter()
+            status = client.request(method, path, json=body).status_code
+            outcomes[position] = status, time.perf_counter() - started
+
+        threads = [threading.Thread(target=send, args=(position,)) for position in range(len(requests))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return outcomes
+
+
+def test_rsvp_burst_through_the_api_stays_within_budget_and_fast(empty_database):
+    """300 riders RSVP at once for 100 places through one uvicorn worker, under strict statement budgets.
+
+    Contention must not slow RSVPs down: they are compared with a burst of as
+    many reads of the group ride through the same worker.
+    """
+    capacity, riders = 100, 300
+    group_ride_id = _group_ride(capacity)
+    rider_ids = insert_rows(models.Rider, [
+        {"name": f"Rider {number}", "experience_level": "beginner"} for number in range(riders)
+    ])
+    with serving(app) as host:
+        reads = _burst(host, [("GET", f"/group-rides/{group_ride_id}", None)] * riders)
+        rsvps = _burst(host, [
+            ("POST", f"/group-rides/{group_ride_id}/rsvps", {"rider_id": rider_id}) for rider_id in rider_ids
+        ])
+        held = httpx.get(f"http://{host}/group-rides/{group_ride_id}/rsvps").json()
+
+    statuses = [status for status, _ in rsvps]
+    # A request over its budget would have failed with a 500.
+    assert (statuses.count(200), statuses.count(409)) == (capacity, riders - capacity)
+    assert sorted(rsvp["slot"] for rsvp in held) == list(range(1, capacity + 1))
+    read_p95, rsvp_p95 = (np.percentile([seconds for _, seconds in burst], 95) for burst in (reads, rsvps))
+    assert rsvp_p95 < 2 * read_p95, f"p95 RSVP {rsvp_p95:.2f} s against p95 read {read_p95:.2f} s"
+
+
+def test_full_ride_turns_riders_away(api):
+    rider, other = api.rider("Ada")["id"], api.rider("Grace")["id"]
+    route = api.route()["id"]
+    group_ride = api.client.post("/group-rides", json={
+        "name": "Sunday loop",
+        "route_id": route,
+        "organizer_id": rider,
+        "starts_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "capacity": 1,
+    }).json()["id"]
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": rider}).status_code == 200
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": rider}).status_code == 409
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": other}).status_code == 409
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": other + 1000}).status_code == 404
+    assert api.client.post(f"/group-rides/{group_ride + 1000}/rsvps", json={"rider_id": other}).status_code == 404
+    assert api.client.delete(f"/group-rides/{group_ride}/rsvps/{rider}").status_code == 200
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": other}).json()["slot"] == 1
+
+
+def test_track_points_go_with_their_group_ride(api):
+    rider = api.rider("Ada")["id"]
+    route = api.route()["id"]
+    group_ride = api.client.post("/group-rides", json={
+        "name": "Sunday loop",
+        "route_id": route,
+        "organizer_id": rider,
+        "starts_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "capacity": 1,
+    }).json()["id"]
+    insert_rows(models.GroupRideTrackPoint, [
+        {"group_ride_id": group_ride, "rider_id": rider, "recorded_at": datetime.utcnow(), "latitude": 45.0, "longitude": 7.0}
+    ])
+    assert len(api.client.get(f"/group-rides/{group_ride}/track").json()) == 1
+    # Deleting the route deletes its group rides, and now their track points.
+    assert api.client.delete(f"/routes/{route}").status_code == 200
+    with SessionLocal() as db:
+        assert db.query(models.GroupRideTrackPoint).count() == 0
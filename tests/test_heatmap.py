@@ -0,0 +1,69 @@
+import numpy as np
+import orjson
+import app.db.postgres_crud as pg_crud
+from app.cli import main as cli
+from app.db.database import SessionLocal
+from app.services.geometry import mercator
+from app.services.heatmap import HEATMAP_MAX_ZOOM, HEATMAP_TILE_CELLS, build_heatmap, encode_footprint, route_heatmap
+
+# East along the 45th parallel, then north: every cell either leg crosses is a run along one axis.
+CORNERS = [(45.0, 7.0), (45.0, 7.5), (45.4, 7.5)]
+
+
+def _expected_cells(zoom: int) -> set[tuple[int, int]]:
+    """Global (x, y) cells of the path at ``zoom``, worked out leg by leg."""
+    size = HEATMAP_TILE_CELLS << zoom
+    (west, south), (east, _), (_, north) = (mercator(CORNERS) * size).astype(int).tolist()
+    return {(x, south) for x in range(west, east + 1)} | {(east, y) for y in range(north, south + 1)}
+
+
+def _counts(client, zoom: int, tiles: set[tuple[int, int]]) -> dict[tuple[int, int], int]:
+    """Non-zero cells of the given tiles, by global (x, y)."""
+    found = {}
+    for tile_x, tile_y in tiles:
+        response = client.get(f"/heatmap/{zoom}/{tile_x}/{tile_y}")
+        assert response.status_code == 200, response.text
+        grid = np.frombuffer(response.content, dtype="<u4").reshape(HEATMAP_TILE_CELLS, HEATMAP_TILE_CELLS)
+        for row, column in zip(*np.nonzero(grid)):
+            found[(tile_x * HEATMAP_TILE_CELLS + int(column), tile_y * HEATMAP_TILE_CELLS + int(row))] = int(grid[row, column])
+    return found
+
+
+def _pyramid(client) -> dict[int, dict[tuple[int, int], int]]:
+    return {
+        zoom: _counts(client, zoom, {(x // HEATMAP_TILE_CELLS, y // HEATMAP_TILE_CELLS) for x, y in _expected_cells(zoom)})
+        for zoom in range(HEATMAP_MAX_ZOOM + 1)
+    }
+
+
+def _footprints(db) -> dict[int, tuple[int, bytes]]:
+    return {route_id: (level, cells) for route_id, level, cells, _ in pg_crud.get_route_footprints(db)}
+
+
+def test_rides_add_to_the_cells_along_their_route_at_every_zoom(api, monkeypatch):
+    monkeypatch.setattr(route_heatmap, "refresh_seconds", 0)
+    route = api.route("Canavese")["id"]
+    elsewhere = api.route("No path")["id"]
+    path = {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in CORNERS]}
+    assert api.client.put(f"/routes/{route}/geometry", content=orjson.dumps(path)).status_code == 200
+    bike = api.bike(api.rider()["id"])["id"]
+    for route_id in (route, route, route, elsewhere):
+        api.ride(bike, route_id)
+
+    tiles = _pyramid(api.client)
+    for zoom, counts in tiles.items():
+        assert counts == dict.fromkeys(_expected_cells(zoom), 3), zoom
+    assert len(tiles[HEATMAP_MAX_ZOOM]) > 500
+
+    # Footprints left at another size are re-rasterized to the same cells.
+    with SessionLocal() as db:
+        stored = _footprints(db)
+        pg_crud.update_route_footprints(db, [
+            {"route_id": route, "footprint_level": 1, "footprint": encode_footprint(np.zeros(0, dtype=np.uint64))}
+        ])
+        db.commit()
+    cli(["rebuild-heatmap"])
+    with SessionLocal() as db:
+        assert _footprints(db) == stored
+        build_heatmap(db)
+    assert _pyramid(api.client) == tiles
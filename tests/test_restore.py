@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import orjson
+import pytest
+from sqlalchemy import select, text
+from app.cli import main as cli
+from app.db import neo4j_crud as neo_crud
+from app.db import postgres_models as models
+from app.db.database import SessionLocal, engine
+from app.db.neo4j_models import GRAPH_RELATIONSHIPS
+from app.db.ride_partitions import partition_rides
+from app.services.restore import _execute, _prepare_tables, _reset_sequences
+
+
+def _indexes(table: str) -> set[str]:
+    with engine.connect() as conn:
+        return set(conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": table}
+        ).scalars())
+
+
+def _invalid_indexes() -> list[str]:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid"
+        )).scalars().all()
+
+
+def test_indexes_of_partitioned_rides_are_rebuilt_on_every_partition(empty_database):
+    with SessionLocal() as db:
+        created = partition_rides(db, months_ahead=1)
+        db.commit()
+    partition = created[-1]
+    before = _indexes("rides"), _indexes(partition)
+    try:
+        definitions = _prepare_tables(["rides"], truncate=True)
+        assert definitions and not any(" ONLY " in definition for definition in definitions)
+        for definition in definitions:
+            _execute(definition)
+        _reset_sequences(["rides"])
+        assert (_indexes("rides"), _indexes(partition)) == before
+        assert _invalid_indexes() == []
+    finally:
+        # Later tests expect the plain table the models create.
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE rides CASCADE"))
+        models.Base.metadata.create_all(engine)
+
+
+def _seed(api) -> None:
+    """A little of everything: garages, rides with telemetry, a route path, follows and a group ride."""
+    riders = [api.rider(name)["id"] for name in ("Ada", "Grace", "Linus")]
+    bikes = [api.bike(rider)["id"] for rider in riders]
+    routes = [
+        api.route("Stelvio", route_type="mountain", elevation_gain=1800, max_altitude=2757, hairpin_turns=48)["id"],
+        api.route("Langhe")["id"],
+    ]
+    path = {"type": "LineString", "coordinates": [[7.68 + step / 100, 45.07 + step / 200] for step in range(50)]}
+    assert api.client.put(f"/routes/{routes[0]}/geometry", content=orjson.dumps(path)).status_code == 200
+    rides = [api.ride(bike, route)["id"] for bike in bikes for route in routes]
+    telemetry = b"\n".join(
+        orjson.dumps({"t": 1792400000.0 + second, "lat": 45.07, "lon": 7.68 + second / 10_000, "ele": 240.5})
+        for second in range(30)
+    )
+    assert api.client.put(f"/rides/{rides[0]}/telemetry", content=telemetry).status_code == 200
+    assert api.client.post(f"/rides/{rides[0]}/buddies", json={"rider_ids": riders[1:]}).status_code == 200
+    assert api.client.post(f"/riders/{riders[1]}/follow/{riders[0]}").status_code == 200
+    group_ride = api.client.post("/group-rides", json={
+        "name": "Sunday loop", "route_id": routes[0], "organizer_id": riders[0],
+        "starts_at": (datetime.utcnow() + timedelta(days=3)).isoformat(), "capacity": 10,
+    }).json()["id"]
+    assert api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": riders[2]}).status_code == 200
+
+
+def _postgres_rows() -> dict[str, list[tuple]]:
+    with engine.connect() as conn:
+        return {
+            table.name: [tuple(row) for row in conn.execute(select(table).order_by(*table.primary_key.columns))]
+            for table in models.Base.metadata.sorted_tables
+        }
+
+
+def test_a_snapshot_restores_every_postgres_row(api, tmp_path):
+    _seed(api)
+    before = _postgres_rows()
+    assert all(before[table] for table in ("riders", "bikes", "rides", "ride_telemetry", "group_ride_slots"))
+    cli(["export-snapshot", "--output-dir", str(tmp_path), "--workers", "2", "--skip-graph"])
+    (snapshot,) = tmp_path.iterdir()
+    # Later writes are undone by the restore.
+    api.rider("Margaret")
+    cli(["restore-snapshot", str(snapshot), "--workers", "2", "--skip-graph", "--truncate"])
+    assert _postgres_rows() == before
+    # Sequences move past the restored ids.
+    assert api.rider("Barbara")["id"] > max(row[0] for row in before["riders"])
+
+
+def _graph_relationships() -> dict[str, list[tuple]]:
+    return {
+        f"{start}-{rel_type}->{end}": sorted(
+            (first, second, tuple(sorted(properties.items())))
+            for first, second, properties in neo_crud.iter_graph_relationships(start, rel_type, end, 2)
+        )
+        for start, rel_type, end in GRAPH_RELATIONSHIPS
+    }
+
+
+@pytest.mark.neo4j
+def test_a_snapshot_restores_the_graph(api, tmp_path):
+    _seed(api)
+    before = _postgres_rows(), _graph_relationships()
+    assert all(before[1].values())
+    cli(["export-snapshot", "--output-dir", str(tmp_path), "--workers", "2"])
+    (snapshot,) = tmp_path.iterdir()
+    cli(["restore-snapshot", str(snapshot), "--workers", "2", "--truncate"])
+    assert (_postgres_rows(), _graph_relationships()) == before
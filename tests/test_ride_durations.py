@@ -0,0 +1,55 @@
+import app.db.postgres_crud as pg_crud
+from app.db.database import SessionLocal
+from app.services.ride_durations import RideDurationStats, ride_durations
+
+
+def _stats(client, route_id: int) -> tuple[int, dict[str, int]]:
+    response = client.get(f"/routes/{route_id}/stats")
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    return stats["timed_rides"], {level["experience_level"]: level["timed_rides"] for level in stats["by_experience_level"]}
+
+
+def test_deleted_riders_rides_are_taken_out(api):
+    route = api.route()["id"]
+    novice, expert = api.rider("Ada", "BEGINNER")["id"], api.rider("Grace", "EXPERT")["id"]
+    novice_bike, expert_bike = api.bike(novice)["id"], api.bike(expert)["id"]
+    for minutes in (60, 70):
+        api.ride(novice_bike, route, minutes)
+    ride = api.ride(expert_bike, route, 50)["id"]
+    assert _stats(api.client, route) == (3, {"beginner": 2, "expert": 1})
+    assert api.client.delete(f"/riders/{novice}").status_code == 200
+    assert _stats(api.client, route) == (1, {"expert": 1})
+    assert api.client.delete(f"/rides/{ride}").status_code == 200
+    assert _stats(api.client, route) == (0, {})
+
+
+def test_rides_logged_through_another_worker_are_counted_after_a_rebuild(api):
+    route = api.route()["id"]
+    bike = api.bike(api.rider("Ada", "BEGINNER")["id"])["id"]
+    api.ride(bike, route, 60)
+    with SessionLocal() as db:
+        pg_crud.create_ride(db, route_id=route, bike_id=bike, duration_minutes=80)
+        db.commit()
+    assert _stats(api.client, route) == (1, {"beginner": 1})
+    ride_durations._rebuild_from_database()
+    assert _stats(api.client, route) == (2, {"beginner": 2})
+
+
+def test_changes_made_during_a_rebuild_are_kept():
+    stats = RideDurationStats(rebuild_seconds=60)
+    stats.rebuild([[(1, "beginner", 30), (1, "beginner", 45)]])
+
+    def batches():
+        yield [(1, "beginner", 30)]
+        # Committed after the rebuild's read began, so it is not in what follows.
+        stats.record(1, "expert", 90)
+        stats.discard(1, "beginner", 30)
+        yield [(1, "beginner", 45)]
+
+    stats.rebuild(batches())
+    summary = stats.stats(1)
+    assert summary["timed_rides"] == 2
+    assert [(level["experience_level"], level["timed_rides"]) for level in summary["by_experience_level"]] == [
+        ("beginner", 1), ("expert", 1)
+    ]
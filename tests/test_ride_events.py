@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import httpx
+import orjson
+from sqlalchemy import text
+import app.db.postgres_crud as pg_crud
+from app.db import postgres_models as models
+from app.db.database import SessionLocal, engine
+from app.db.postgres_models import RIDE_EVENTS_CHANNEL
+from app.db.ride_partitions import partition_rides
+from app.main import app
+from tests.support import insert_rows, serving, wait_for
+
+
+def _listener():
+    connection = engine.raw_connection()
+    connection.detach()
+    listener = connection.dbapi_connection
+    listener.set_session(autocommit=True)
+    with listener.cursor() as cursor:
+        cursor.execute(f"LISTEN {RIDE_EVENTS_CHANNEL}")
+    return listener
+
+
+def _announced(listener) -> list[dict]:
+    listener.poll()
+    return [orjson.loads(notify.payload) for notify in listener.notifies]
+
+
+def test_partitioning_announces_none_of_the_copied_rides(empty_database):
+    rider = insert_rows(models.Rider, [{"name": "Ada", "experience_level": "beginner"}])[0]
+    bike = insert_rows(models.Bike, [
+        {"owner_id": rider, "model": "Model", "brand": "Brand", "year": 2020, "engine_cc": 650}
+    ])[0]
+    route = insert_rows(models.Route, [{
+        "name": "Route", "route_type": "scenic", "start_location": "Turin", "end_location": "Aosta",
+        "distance_km": 120, "difficulty": "MODERATE", "details": {},
+    }])[0]
+    insert_rows(models.Ride, [
+        {"rider_id": rider, "bike_id": bike, "route_id": route, "completed_at": datetime.utcnow() - timedelta(days=day)}
+        for day in range(0, 200, 10)
+    ])
+    listener = _listener()
+    try:
+        with SessionLocal() as db:
+            partition_rides(db, months_ahead=1)
+            db.commit()
+        with SessionLocal() as db:
+            ride, _ = pg_crud.create_ride(db, route_id=route, bike_id=bike)
+            logged = ride.id
+            db.commit()
+        # Notifications arrive in commit order: anything from the copy would come first.
+        assert wait_for(lambda: _announced(listener))
+        assert [ride["id"] for ride in _announced(listener)] == [logged]
+    finally:
+        listener.close()
+        # Later tests expect the plain table the models create.
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE rides CASCADE"))
+        models.Base.metadata.create_all(engine)
+
+
+def test_logged_rides_reach_event_streams(empty_database):
+    with serving(app) as host, httpx.Client(base_url=f"http://{host}", timeout=5) as client:
+        ada, grace = (
+            client.post("/riders", json={"name": name, "experience_level": "INTERMEDIATE"}).json()["id"]
+            for name in ("Ada", "Grace")
+        )
+        bikes = {
+            rider: client.post(f"/riders/{rider}/bikes", json={
+                "model": "Model", "brand": "Brand", "year": 2020, "engine_cc": 650,
+            }).json()["id"]
+            for rider in (ada, grace)
+        }
+        route = client.post("/routes", json={
+            "name": "Route", "start_location": "Turin", "end_location": "Aosta", "distance_km": 120,
+            "difficulty": "MODERATE", "route_type": "scenic",
+        }).json()["id"]
+        with client.stream("GET", "/events/rides", params={"rider_id": ada}) as stream:
+            assert stream.headers["content-type"].startswith("text/event-stream")
+            # Grace's ride is filtered out; Ada's is the first event on the stream.
+            client.post("/rides", json={"bike_id": bikes[grace], "route_id": route, "duration_minutes": 30})
+            logged = client.post("/rides", json={"bike_id": bikes[ada], "route_id": route, "duration_minutes": 90})
+            lines = stream.iter_lines()
+            frame = [next(lines) for _ in range(3)]
+    ride = logged.json()
+    assert frame[:2] == [f"id: {ride['id']}", "event: ride"]
+    event = orjson.loads(frame[2].removeprefix("data: "))
+    assert (event["id"], event["rider_id"], event["route_id"], event["duration_minutes"]) == (ride["id"], ada, route, 90)
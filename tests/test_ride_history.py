@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import text
+from app.cli import main as cli
+from app.db import postgres_models as models
+from app.db.database import SessionLocal, engine
+from app.db.ride_partitions import list_ride_partitions
+from tests.support import insert_rows, report, timings
+
+START = datetime(2026, 6, 1, 8)
+
+
+def _history(client, rider_id: int, **params) -> dict:
+    response = client.get(f"/riders/{rider_id}/rides", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _pages(client, rider_id: int, **params) -> list[list[int]]:
+    pages, cursor = [], None
+    while True:
+        body = _history(client, rider_id, **params, **({"cursor": cursor} if cursor else {}))
+        pages.append([ride["id"] for ride in body["rides"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def _rides(rider: dict, bike_id: int, route_id: int, days: list[int], durations: list[int | None]) -> list[int]:
+    return insert_rows(models.Ride, [
+        {
+            "rider_id": rider["id"],
+            "bike_id": bike_id,
+            "route_id": route_id,
+            "completed_at": START + timedelta(days=day),
+            "duration_minutes": duration,
+        }
+        for day, duration in zip(days, durations)
+    ])
+
+
+def test_history_pages_newest_first_with_a_window_summary(api):
+    ada, grace = api.rider("Ada"), api.rider("Grace")
+    route = api.route()["id"]
+    # Two rides share a completion time, so paging has to break the tie by id.
+    days = [0, 1, 1, 2, 3, 4, 5]
+    ride_ids = _rides(ada, api.bike(ada["id"])["id"], route, days, [60, None, 30, 45, 90, 20, 75])
+    _rides(grace, api.bike(grace["id"])["id"], route, days, [10] * len(days))
+    newest_first = [ride_id for _, ride_id in sorted(zip(days, ride_ids), reverse=True)]
+
+    pages = _pages(api.client, ada["id"], limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == newest_first
+    assert _history(api.client, ada["id"])["summary"] is None
+
+    window = {"from": (START + timedelta(days=1)).isoformat(), "to": (START + timedelta(days=4)).isoformat()}
+    in_window = [ride_id for day, ride_id in sorted(zip(days, ride_ids), reverse=True) if 1 <= day < 4]
+    first = _history(api.client, ada["id"], limit=2, summary=True, **window)
+    assert [ride["id"] for ride in first["rides"]] == in_window[:2]
+    # The summary covers the whole window, on every page.
+    assert first["summary"] == {"ride_count": 4, "total_duration_minutes": 165}
+    second = _history(api.client, ada["id"], limit=2, summary=True, cursor=first["next_cursor"], **window)
+    assert [ride["id"] for ride in second["rides"]] == in_window[2:]
+    assert second["summary"] == first["summary"] and second["next_cursor"] is None
+
+    newcomer = api.rider("Linus")["id"]
+    assert _history(api.client, newcomer, summary=True) == {
+        "rides": [], "next_cursor": None, "summary": {"ride_count": 0, "total_duration_minutes": 0}
+    }
+    assert api.client.get(f"/riders/{newcomer + 1000}/rides").status_code == 404
+
+
+@pytest.fixture
+def partitioned(api):
+    """Partition rides for one test, then go back to the plain table the models create."""
+    yield lambda: cli(["partition-rides", "--months-ahead", "1"])
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE rides CASCADE"))
+    models.Base.metadata.create_all(engine)
+
+
+def test_archived_months_are_read_back_with_include_archived(api, partitioned, tmp_path, monkeypatch):
+    # The archive lives under the working directory unless RIDES_ARCHIVE_DIR says otherwise.
+    monkeypatch.chdir(tmp_path)
+    ada, grace = api.rider("Ada"), api.rider("Grace")
+    route = api.route()["id"]
+    # Days -85 to -75 fall in March, which is archived; days 0 to 20 are in June.
+    days = [-85, -80, -75, 0, 10, 20]
+    ride_ids = _rides(ada, api.bike(ada["id"])["id"], route, days, [10, 20, 30, 40, 50, 60])
+    _rides(grace, api.bike(grace["id"])["id"], route, [-78, 5], [15, 25])
+    partitioned()
+    cli(["archive-rides", "--before", "2026-04"])
+
+    with SessionLocal() as db:
+        partitions = list_ride_partitions(db)
+        assert "rides_2026_06" in partitions and "rides_2026_03" not in partitions
+        assert db.execute(text("SELECT to_regclass('rides_2026_03')")).scalar() is None
+    assert (tmp_path / "archive" / "rides" / "rides_2026_03" / "index.json").is_file()
+
+    newest_first = ride_ids[::-1]
+    live = _history(api.client, ada["id"], summary=True)
+    assert [ride["id"] for ride in live["rides"]] == newest_first[:3]
+    assert live["summary"] == {"ride_count": 3, "total_duration_minutes": 150}
+
+    everything = _history(api.client, ada["id"], summary=True, include_archived=True)
+    assert [ride["id"] for ride in everything["rides"]] == newest_first
+    assert everything["summary"] == {"ride_count": 6, "total_duration_minutes": 210}
+    archived = everything["rides"][-1]
+    assert (archived["route_id"], archived["duration_minutes"]) == (route, 10)
+    assert archived["completed_at"].startswith((START - timedelta(days=85)).isoformat())
+    # Pages run on from the live months into the archived one.
+    assert sum(_pages(api.client, ada["id"], limit=4, include_archived=True), []) == newest_first
+    window = {"from": "2026-03-01T00:00:00", "to": "2026-04-01T00:00:00"}
+    in_march = _history(api.client, ada["id"], include_archived=True, **window)
+    assert [ride["id"] for ride in in_march["rides"]] == newest_first[3:]
+
+
+@pytest.mark.benchmark
+def test_history_page_for_a_rider_with_20k_rides(api):
+    """Pages of a 20,000-ride history among 400,000 rides: the newest, a deep one and a summarized window."""
+    generator = np.random.default_rng(32)
+    route = api.route()["id"]
+    riders = [api.rider(f"Rider {number}") for number in range(20)]
+    bikes = [api.bike(rider["id"])["id"] for rider in riders]
+    for rider, bike in zip(riders, bikes):
+        days = np.sort(generator.uniform(0, 3 * 365, 20_000))
+        insert_rows(models.Ride, [
+            {
+                "rider_id": rider["id"],
+                "bike_id": bike,
+                "route_id": route,
+                "completed_at": START - timedelta(days=float(day)),
+                "duration_minutes": 60,
+            }
+            for day in days.tolist()
+        ])
+    rider = riders[0]["id"]
+    deep_cursor = None
+    for _ in range(100):
+        deep_cursor = _history(api.client, rider, limit=100, **({"cursor": deep_cursor} if deep_cursor else {}))["next_cursor"]
+    window = {"from": (START - timedelta(days=120)).isoformat(), "to": (START - timedelta(days=90)).isoformat()}
+    cases = {
+        "newest 50": {},
+        "50 after 10,000 rides": {"cursor": deep_cursor},
+        "50 in a month, with summary": {"summary": True, **window},
+        "200 in a year, with summary": {
+            "limit": 200, "summary": True, "from": (START - timedelta(days=365)).isoformat()
+        },
+    }
+    rows = [(label, timings(lambda _: _history(api.client, rider, **params), 50)) for label, params in cases.items()]
+    report("Ride history pages, 20,000 rides of 400,000 (through the API)", rows)
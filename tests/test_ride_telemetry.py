@@ -0,0 +1,96 @@
+import httpx
+import numpy as np
+import orjson
+import pytest
+from app.main import app
+from app.services.geometry import EARTH_RADIUS_METRES
+from app.services.ride_telemetry import BINARY_CONTENT_TYPE, TELEMETRY_RECORD
+from tests.support import report, serving, timings
+
+START = 1792400000.0
+METRES_PER_DEGREE = EARTH_RADIUS_METRES * np.pi / 180
+
+
+def _trace(legs: list[tuple[float, float, float, float]], rate_hz: float = 1) -> np.ndarray:
+    """Samples riding due north, one leg per (start second, end second, speed m/s, climb m/s); time between legs is a gap."""
+    records, travelled, elevation = [], 0.0, 200.0
+    for first, last, speed, climb in legs:
+        seconds = np.arange(first, last, 1 / rate_hz)
+        travelled_at = travelled + speed * (seconds - first)
+        leg = np.zeros(len(seconds), dtype=TELEMETRY_RECORD)
+        leg["t"] = START + seconds
+        leg["lat"] = 45 + travelled_at / METRES_PER_DEGREE
+        leg["lon"] = 7.5
+        leg["ele"] = elevation + climb * (seconds - first)
+        leg["ax"], leg["ay"], leg["az"] = 0.1, -0.2, 9.8
+        records.append(leg)
+        travelled += speed * (last - first)
+        elevation += climb * (last - first)
+    return np.concatenate(records)
+
+
+def _ndjson(records: np.ndarray) -> bytes:
+    return b"\n".join(orjson.dumps(dict(zip(TELEMETRY_RECORD.names, record.tolist()))) for record in records)
+
+
+def test_metrics_of_a_known_ride(api):
+    # 10 km climbing 300 m at 60 km/h, 5 minutes stopped, 9 km descending 100 m at 108 km/h,
+    # 100 s without signal, then 1 km on the flat at 36 km/h.
+    records = _trace([(0, 600, 50 / 3, 0.5), (600, 900, 0, 0), (900, 1200, 30, -1 / 3), (1300, 1401, 10, 0)])
+    bike = api.bike(api.rider()["id"])["id"]
+    ride = api.ride(bike, api.route()["id"])["id"]
+    # Sent out of order: samples are sorted by time.
+    shuffled = np.random.default_rng(48).permutation(records)
+    response = api.client.put(f"/rides/{ride}/telemetry", content=_ndjson(shuffled))
+    assert response.status_code == 200, response.text
+    uploaded = response.json()
+
+    assert uploaded["point_count"] == len(records)
+    assert uploaded["duration_seconds"] == 1400
+    assert uploaded["distance_m"] == pytest.approx(20_000, rel=0.005)
+    # Smoothing blurs a few seconds at each start and stop.
+    assert uploaded["moving_seconds"] == pytest.approx(1000, abs=5)
+    assert uploaded["max_speed_kmh"] == pytest.approx(108, abs=0.5)
+    assert (uploaded["min_elevation_m"], uploaded["max_elevation_m"]) == (200, 500)
+    # Averaging over 30 s trims the first few metres of the climb.
+    assert uploaded["elevation_gain_m"] == pytest.approx(300, abs=5)
+    assert uploaded["elevation_loss_m"] == pytest.approx(100, abs=5)
+    summary = api.client.get(f"/rides/{ride}/telemetry").json()
+    assert {name: summary[name] for name in summary if name != "started_at"} == {
+        name: uploaded[name] for name in summary if name != "started_at"
+    }
+
+    # The same samples as binary records give the same metrics.
+    binary = api.client.put(
+        f"/rides/{ride}/telemetry", content=records.tobytes(), headers={"content-type": BINARY_CONTENT_TYPE}
+    ).json()
+    assert {name: binary[name] for name in summary} == {name: uploaded[name] for name in summary}
+
+
+@pytest.mark.benchmark
+def test_ingest_rate_of_one_connection(api):
+    """Uploads over one keep-alive connection: a 10 h ride at 1 Hz and a 1 h ride at 25 Hz, as NDJSON and binary."""
+    bike = api.bike(api.rider()["id"])["id"]
+    ride = api.ride(bike, api.route()["id"])["id"]
+    traces = {
+        "10 h at 1 Hz": _trace([(0, 36_000, 20, 0.01)]),
+        "1 h at 25 Hz": _trace([(0, 3600, 20, 0.01)], rate_hz=25),
+    }
+    rows = []
+    with serving(app) as host, httpx.Client(base_url=f"http://{host}", timeout=120) as client:
+        for label, records in traces.items():
+            for encoding, content_type, body in (
+                ("NDJSON", "application/x-ndjson", _ndjson(records)),
+                ("binary", BINARY_CONTENT_TYPE, records.tobytes()),
+            ):
+                def upload(_):
+                    response = client.put(f"/rides/{ride}/telemetry", content=body, headers={"content-type": content_type})
+                    assert response.status_code == 200, response.text
+
+                elapsed = timings(upload, 5)
+                print(
+                    f"\n{label}, {encoding}: {len(records) / np.median(elapsed) * 1000:,.0f} points/s, "
+                    f"{len(body) / 2**20:.1f} MB"
+                )
+                rows.append((f"{label}, {encoding}", elapsed))
+    report("Telemetry upload through one connection", rows)
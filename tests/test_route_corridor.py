@@ -0,0 +1,71 @@
+import numpy as np
+import orjson
+import pytest
+from app.services.geometry import EARTH_RADIUS_METRES
+
+METRES_PER_DEGREE = EARTH_RADIUS_METRES * np.pi / 180
+# 20 km east, 4 km north and 20 km back west: the two long legs pass the same places.
+CORNERS = np.array([(0, 0), (20_000, 0), (20_000, 4000), (0, 4000)], dtype=float)
+
+
+def _lat_lon(xy: np.ndarray) -> np.ndarray:
+    """Latitude and longitude of local (east, north) metres around 45N 7.5E."""
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    return np.column_stack([
+        45 + xy[:, 1] / METRES_PER_DEGREE,
+        7.5 + xy[:, 0] / (METRES_PER_DEGREE * np.cos(np.radians(45))),
+    ])
+
+
+def _along(client, route_id: int, **params) -> list[tuple[str, float, float]]:
+    response = client.get(f"/routes/{route_id}/locations", params=params)
+    assert response.status_code == 200, response.text
+    return [
+        (location["name"], location["distance_from_route_m"], location["distance_along_route_m"])
+        for location in response.json()
+    ]
+
+
+def _approx(expected: list[tuple[str, float, float]]) -> list:
+    return [(name, pytest.approx(distance, abs=25), pytest.approx(along, abs=25)) for name, distance, along in expected]
+
+
+def test_locations_are_filtered_by_type_and_radius_in_the_order_the_route_reaches_them(api):
+    route = api.route("Out and back")["id"]
+    # A point every 250 m, so the legs span several bounding boxes each.
+    path = np.concatenate([
+        np.linspace(start, end, int(np.linalg.norm(end - start) // 250), endpoint=False)
+        for start, end in zip(CORNERS, CORNERS[1:])
+    ] + [CORNERS[-1:]])
+    geometry = {"type": "LineString", "coordinates": _lat_lon(path)[:, ::-1].tolist()}
+    assert api.client.put(f"/routes/{route}/geometry", content=orjson.dumps(geometry)).status_code == 200
+
+    # (east, north) metres: Trattoria and Ristoro are passed on the way out and again on the way back.
+    for name, location_type, xy in [
+        ("Ristoro", "fuel_station", (5000, 3000)),
+        ("Agip", "fuel_station", (2000, 500)),
+        ("Far north", "fuel_station", (10_000, 20_000)),
+        ("Trattoria", "restaurant", (10_000, 1500)),
+        ("Corner", "fuel_station", (20_500, 2000)),
+        ("Tamoil", "fuel_station", (15_000, -2500)),
+    ]:
+        (latitude, longitude), = _lat_lon(xy).tolist()
+        response = api.client.post("/locations", json={
+            "name": name, "location_type": location_type, "latitude": latitude, "longitude": longitude,
+        })
+        assert response.status_code == 200, response.text
+
+    # Ristoro is 3 km from the way out but 1 km from the way back, so it is listed on the way back.
+    assert _along(api.client, route, location_type="fuel_station", within_km=2) == _approx([
+        ("Agip", 500, 2000), ("Corner", 500, 22_000), ("Ristoro", 1000, 39_000),
+    ])
+    # Trattoria is nearer the way out.
+    assert _along(api.client, route, within_km=3) == _approx([
+        ("Agip", 500, 2000), ("Trattoria", 1500, 10_000), ("Tamoil", 2500, 15_000),
+        ("Corner", 500, 22_000), ("Ristoro", 1000, 39_000),
+    ])
+    assert [name for name, *_ in _along(api.client, route, within_km=0.6)] == ["Agip", "Corner"]
+    assert [name for name, *_ in _along(api.client, route, location_type="restaurant")] == ["Trattoria"]
+    assert [name for name, *_ in _along(api.client, route, within_km=3, limit=2)] == ["Agip", "Trattoria"]
+    assert _along(api.client, route, location_type="beach", within_km=50) == []
+    assert api.client.get(f"/routes/{api.route('No path')['id']}/locations").status_code == 404
@@ -0,0 +1,66 @@
+import numpy as np
+import orjson
+from app.services.geometry import mercator
+from app.services.route_geometry import zoom_tolerance
+
+# Three long waves with a 30 m zigzag on top: the zigzag shows from zoom 15, so that level is never stored.
+_STEPS = np.arange(2001)
+PATH = np.column_stack([
+    45 + 0.2 * np.sin(_STEPS / 2000 * 6 * np.pi) + 0.0003 * (_STEPS % 2),
+    7 + _STEPS * 0.0005,
+]).round(5)
+
+
+def _upload(client, route_id: int, points: np.ndarray) -> dict:
+    path = {"type": "LineString", "coordinates": points[:, ::-1].tolist()}
+    response = client.put(f"/routes/{route_id}/geometry", content=orjson.dumps(path))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _geometry(client, route_id: int, zoom: int | None = None) -> tuple[int | None, np.ndarray]:
+    response = client.get(f"/routes/{route_id}/geometry", params={} if zoom is None else {"zoom": zoom})
+    assert response.status_code == 200, response.text
+    feature = response.json()
+    points = np.array(feature["geometry"]["coordinates"])[:, ::-1]
+    assert feature["properties"]["point_count"] == len(points)
+    return feature["properties"]["zoom"], points
+
+
+def _farthest_left_out(points: np.ndarray, kept: np.ndarray) -> float:
+    """Largest distance, in mercator units, from a point of the path to the segment of ``kept`` spanning it."""
+    xy, kept_xy = mercator(points), mercator(kept)
+    # Longitude only grows along PATH, so it places each point between two kept ones.
+    segment = np.clip(np.searchsorted(kept[:, 1], points[:, 1], side="right") - 1, 0, len(kept) - 2)
+    start, end = kept_xy[segment], kept_xy[segment + 1]
+    along = np.clip(((xy - start) * (end - start)).sum(axis=1) / ((end - start) ** 2).sum(axis=1), 0, 1)
+    return float(np.sqrt(((start + along[:, None] * (end - start) - xy) ** 2).sum(axis=1)).max())
+
+
+def test_zooms_read_the_shallowest_stored_level_that_shows_them(api):
+    route = api.route("Waves")["id"]
+    summary = _upload(api.client, route, PATH)
+    assert summary["point_count"] == len(PATH)
+    levels = {level["zoom"]: level["point_count"] for level in summary["levels"]}
+    assert list(levels) == [6, 9, 12]
+    assert levels[6] < levels[9] < levels[12] < len(PATH)
+
+    for zoom, stored in [(0, 6), (6, 6), (7, 9), (9, 9), (10, 12), (12, 12)]:
+        served, points = _geometry(api.client, route, zoom)
+        assert served == stored and len(points) == levels[stored]
+        assert (points[[0, -1]] == PATH[[0, -1]]).all()
+        assert np.isin(points[:, 1], PATH[:, 1]).all()
+        # Every point left out is within a pixel of the simplified line at the level's zoom.
+        assert _farthest_left_out(PATH, points) <= zoom_tolerance(stored)
+    for zoom in (13, 15, 24, None):
+        served, points = _geometry(api.client, route, zoom)
+        assert served is None and np.allclose(points, PATH)
+
+
+def test_paths_that_never_simplify_are_served_whole(api):
+    route = api.route("Straight")["id"]
+    straight = np.array([[45.0, 7.0], [45.1, 7.1]])
+    assert _upload(api.client, route, straight)["levels"] == []
+    served, points = _geometry(api.client, route, 6)
+    assert served is None and np.allclose(points, straight)
+    assert api.client.get(f"/routes/{api.route('No path')['id']}/geometry", params={"zoom": 6}).status_code == 404
@@ -0,0 +1,77 @@
+import numpy as np
+import orjson
+import pytest
+from app.services.geometry import EARTH_RADIUS_METRES
+
+METRES_PER_DEGREE = EARTH_RADIUS_METRES * np.pi / 180
+# 10 km east, then 10 km north.
+CORNERS = [(0, 0), (10_000, 0), (10_000, 10_000)]
+
+
+def _walk(corners: list[tuple[float, float]], spacing: float) -> np.ndarray:
+    """Points every ``spacing`` metres along straight legs between local (east, north) corners."""
+    legs = []
+    for start, end in zip(corners, corners[1:]):
+        start, end = np.array(start, dtype=float), np.array(end, dtype=float)
+        steps = max(int(np.linalg.norm(end - start) // spacing), 1)
+        legs.append(start + (end - start) * np.arange(steps)[:, None] / steps)
+    return np.concatenate([*legs, [corners[-1]]])
+
+
+def _lat_lon(xy: np.ndarray) -> list[list[float]]:
+    """GeoJSON [longitude, latitude] coordinates of local metres around 45N 7.5E."""
+    latitude = 45 + xy[:, 1] / METRES_PER_DEGREE
+    longitude = 7.5 + xy[:, 0] / (METRES_PER_DEGREE * np.cos(np.radians(45)))
+    return np.column_stack([longitude, latitude]).tolist()
+
+
+def _line(xy: np.ndarray) -> bytes:
+    return orjson.dumps({"type": "LineString", "coordinates": _lat_lon(xy)})
+
+
+def _match(client, xy: np.ndarray, jitter: float = 5) -> dict[str, dict]:
+    # GPS wander across the direction of travel.
+    noisy = xy + jitter * np.where(np.arange(len(xy)) % 2, 1, -1)[:, None] * np.array([0.6, 0.8])
+    response = client.post("/routes/match", content=_line(noisy))
+    assert response.status_code == 200, response.text
+    return {match["name"]: match for match in response.json()}
+
+
+@pytest.fixture
+def corner(api) -> None:
+    for name, corners in (("Corner", CORNERS), ("Far away", [(200_000, 0), (210_000, 0)])):
+        route = api.route(name)["id"]
+        response = api.client.put(f"/routes/{route}/geometry", content=_line(_walk(corners, 100)))
+        assert response.status_code == 200, response.text
+
+
+def test_traces_along_the_route_match_with_their_coverage(api, corner):
+    ridden = _match(api.client, _walk(CORNERS, 15))
+    assert list(ridden) == ["Corner"]
+    assert ridden["Corner"]["matched"] and ridden["Corner"]["frechet_m"] < 20
+    assert ridden["Corner"]["coverage_percent"] >= 99 and ridden["Corner"]["trace_on_route_percent"] >= 99
+
+    # The first 6 km of the 20 km route, then 2 km off it to the south.
+    partial = _match(api.client, _walk([(0, 0), (6000, 0), (6000, -2000)], 15))["Corner"]
+    assert partial["matched"]
+    assert partial["coverage_percent"] == pytest.approx(30, abs=2)
+    assert partial["trace_on_route_percent"] == pytest.approx(75, abs=2)
+
+    # Riding it from the far end counts: the route is compared in the direction ridden.
+    backwards = _match(api.client, _walk(CORNERS[::-1], 15))["Corner"]
+    assert backwards["matched"] and backwards["coverage_percent"] >= 99
+
+
+def test_the_frechet_check_rejects_corner_cuts_and_turnarounds(api, corner):
+    # Leaves the route 3 km before the corner and rejoins it 3 km past, 2 km from the corner at most.
+    cut = _match(api.client, _walk([(0, 0), (7000, 0), (10_000, 3000), (10_000, 10_000)], 15))["Corner"]
+    assert not cut["matched"] and cut["frechet_m"] > 1500
+    assert cut["coverage_percent"] == pytest.approx(70, abs=2)
+
+    # Out 8 km and back again: every point is on the route, but not in the order the route goes.
+    turnaround = _match(api.client, _walk([(0, 0), (8000, 0), (0, 0)], 15))["Corner"]
+    assert not turnaround["matched"] and turnaround["frechet_m"] > 3000
+    assert turnaround["trace_on_route_percent"] >= 99
+    assert turnaround["coverage_percent"] == pytest.approx(40, abs=2)
+
+    assert _match(api.client, _walk([(100_000, 0), (110_000, 0)], 15)) == {}
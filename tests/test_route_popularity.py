@@ -0,0 +1,62 @@
+import app.db.postgres_crud as pg_crud
+from app.db.database import SessionLocal
+from app.services.route_popularity import RoutePopularityStore, route_popularity
+
+
+def _counts(store: RoutePopularityStore, route_id: int) -> tuple[int, int] | None:
+    for route in store.popular(100):
+        if route["route_id"] == route_id:
+            return route["unique_riders"], route["rides"]
+    return None
+
+
+def _ride_elsewhere(store: RoutePopularityStore, route_id: int, bike_id: int) -> None:
+    """Log a ride as another worker would."""
+    with SessionLocal() as db:
+        ride, _ = pg_crud.create_ride(db, route_id=route_id, bike_id=bike_id)
+        db.commit()
+        store.record(ride.route_id, ride.rider_id, ride.completed_at)
+
+
+def test_deleted_rides_are_taken_out(api):
+    route = api.route()["id"]
+    ada, grace = api.rider("Ada")["id"], api.rider("Grace")["id"]
+    ada_bike, grace_bike = api.bike(ada)["id"], api.bike(grace)["id"]
+    api.ride(ada_bike, route)
+    api.ride(ada_bike, route)
+    ride = api.ride(grace_bike, route)["id"]
+    assert _counts(route_popularity, route) == (2, 3)
+    assert api.client.delete(f"/riders/{ada}").status_code == 200
+    assert route_popularity.ride_counts()[route] == 1
+    route_popularity.flush()
+    assert _counts(route_popularity, route) == (1, 1)
+    assert [trending["route_id"] for trending in api.client.get("/routes/trending").json()] == [route]
+    assert api.client.delete(f"/rides/{ride}").status_code == 200
+    route_popularity.flush()
+    assert _counts(route_popularity, route) is None
+    assert api.client.get("/routes/trending").json() == []
+
+
+def test_recounts_reach_other_workers(api):
+    route = api.route()["id"]
+    ada, grace, linus = (api.rider(name)["id"] for name in ("Ada", "Grace", "Linus"))
+    ada_bike, grace_bike, linus_bike = (api.bike(rider)["id"] for rider in (ada, grace, linus))
+    other = RoutePopularityStore(half_life_hours=48, window_days=7, flush_seconds=60)
+    with SessionLocal() as db:
+        other.load(db)
+    api.ride(ada_bike, route)
+    _ride_elsewhere(other, route, grace_bike)
+    route_popularity.flush()
+    other.flush()
+    route_popularity.flush()
+    assert _counts(route_popularity, route) == _counts(other, route) == (2, 2)
+
+    assert api.client.delete(f"/riders/{ada}").status_code == 200
+    route_popularity.flush()
+    # Recorded before the other worker hears of the recount, and kept on top of it.
+    _ride_elsewhere(other, route, linus_bike)
+    other.flush()
+    route_popularity.flush()
+    assert _counts(route_popularity, route) == _counts(other, route) == (2, 2)
+    week = {route["route_id"]: route["unique_riders_week"] for route in other.popular(100)}
+    assert week[route] == 2
@@ -0,0 +1,72 @@
+import numpy as np
+from app.db import postgres_models as models
+from app.services.route_similarity import RouteSimilarityIndex, route_vector
+
+
+def _similar(client, route_id: int, limit: int = 10) -> list[int]:
+    response = client.get(f"/routes/{route_id}/similar", params={"limit": limit})
+    assert response.status_code == 200, response.text
+    return [route["id"] for route in response.json()]
+
+
+def test_similar_routes_are_ranked_by_type_difficulty_and_details(api):
+    stelvio = api.route(
+        "Stelvio", route_type="mountain", difficulty="HARD", distance_km=50,
+        elevation_gain=1800, max_altitude=2757, hairpin_turns=48,
+    )["id"]
+    gavia = api.route(
+        "Gavia", route_type="mountain", difficulty="HARD", distance_km=45,
+        elevation_gain=1400, max_altitude=2621, hairpin_turns=20,
+    )["id"]
+    hill = api.route(
+        "Superga", route_type="mountain", difficulty="EASY", distance_km=20,
+        elevation_gain=450, max_altitude=672, hairpin_turns=4,
+    )["id"]
+    langhe = api.route("Langhe", route_type="scenic", difficulty="HARD", distance_km=50)["id"]
+    assietta = api.route(
+        "Assietta", route_type="offroad", difficulty="HARD", distance_km=50, terrain_type="gravel", technical_difficulty=6,
+    )["id"]
+    assert _similar(api.client, stelvio) == [gavia, hill, langhe, assietta]
+    assert _similar(api.client, stelvio, limit=2) == [gavia, hill]
+    # Every other route is of another type; the offroad one also differs in its offroad details.
+    assert _similar(api.client, langhe) == [gavia, hill, stelvio, assietta]
+    assert api.client.delete(f"/routes/{gavia}").status_code == 200
+    assert _similar(api.client, stelvio, limit=1) == [hill]
+    assert api.client.get("/routes/999999/similar").status_code == 404
+
+
+def test_nearest_matches_a_full_scan_as_routes_come_and_go():
+    generator = np.random.default_rng(41)
+    route_types = [route_type.value for route_type in models.RouteType]
+    difficulties = [difficulty.value for difficulty in models.Difficulty]
+    routes = {
+        route_id: (
+            route_types[generator.integers(len(route_types))],
+            difficulties[generator.integers(len(difficulties))],
+            float(generator.uniform(5, 800)),
+            {
+                "elevation_gain": float(generator.uniform(0, 3000)),
+                "hairpin_turns": int(generator.integers(0, 60)),
+                "ocean_view_percentage": int(generator.integers(0, 100)),
+                "speed_limit": int(generator.integers(50, 130)),
+                "rest_stops": ["stop"] * int(generator.integers(0, 5)),
+            },
+        )
+        for route_id in range(1, 2001)
+    }
+    index = RouteSimilarityIndex(initial_capacity=16)
+    index.build((route_id, *fields) for route_id, fields in routes.items())
+    for route_id in generator.choice(list(routes), 500, replace=False).tolist():
+        index.remove(route_id)
+        del routes[route_id]
+
+    ids = np.array(list(routes))
+    vectors = np.array([route_vector(*fields) for fields in routes.values()], dtype=np.float64)
+    for query in generator.choice(ids, 50, replace=False).tolist():
+        vector = route_vector(*routes[query])
+        distances = np.sqrt(((vectors - vector) ** 2).sum(axis=1))
+        distances[ids == query] = np.inf
+        expected = ids[np.lexsort((ids, distances))[:10]]
+        found = index.nearest(vector, 10, exclude=query)
+        assert [route_id for route_id, _ in found] == expected.tolist()
+        assert np.allclose([distance for _, distance in found], np.sort(distances)[:10], atol=1e-3)
@@ -0,0 +1,171 @@
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from app.api.route.schemas import HighwayRouteCreate, MountainRouteCreate, RouteReadBase
+from app.db import postgres_models as models
+from app.db.database import SessionLocal
+from app.db.postgres_models import ROUTE_TYPE_FIELDS
+from app.services.route_metrics import refresh_route_metrics
+from tests.support import insert_rows, report, timings
+
+ROUTES = {
+    "scenic": {"scenic_points": ["La Morra"], "best_season": "autumn", "photography_spots": 3},
+    "highway": {"speed_limit": 130, "toll_cost": 12.5, "rest_stops": ["Ivrea"], "lanes": 3},
+    "offroad": {"terrain_type": "gravel", "min_bike_cc": 450, "technical_difficulty": 6, "requires_experience": True},
+    "mountain": {"elevation_gain": 1800.0, "max_altitude": 2757.0, "hairpin_turns": 48, "oxygen_required": False},
+    "coastal": {"beach_stops": ["Alassio"], "lighthouse_count": 2, "seafood_spots": [], "ocean_view_percentage": 80},
+}
+COMMON_FIELDS = set(RouteReadBase.model_fields) | {"route_type"}
+
+
+def test_routes_carry_only_their_types_fields(api):
+    created = {
+        route_type: api.route(f"{route_type.title()} route", route_type=route_type, **fields)
+        for route_type, fields in ROUTES.items()
+    }
+    listed = {route["id"]: route for route in api.client.get("/routes").json()}
+    for route_type, route in created.items():
+        for read in (route, listed[route["id"]]):
+            assert set(read) == COMMON_FIELDS | set(ROUTE_TYPE_FIELDS[route_type])
+            assert read["route_type"] == route_type
+            assert {field: read[field] for field in ROUTES[route_type]} == ROUTES[route_type]
+    mountain = api.client.get("/routes", params={"route_type": "mountain"}).json()
+    assert [route["id"] for route in mountain] == [created["mountain"]["id"]]
+    assert api.client.post("/routes", json={
+        "name": "Stelvio", "start_location": "Bormio", "end_location": "Prato", "distance_km": 50,
+        "difficulty": "HARD", "route_type": "mountain", "speed_limit": 90,
+    }).status_code == 422
+
+
+def _listed(client, **params) -> list[str]:
+    response = client.get("/routes", params=params)
+    assert response.status_code == 200, response.text
+    return [route["name"] for route in response.json()]
+
+
+def test_routes_sort_by_estimated_time_with_unscored_routes_last(api):
+    common = {"start_location": "Turin", "end_location": "Aosta", "difficulty": "MODERATE"}
+    highway = api.route("Autostrada", route_type="highway", distance_km=300, **ROUTES["highway"])
+    # Scenic routes ride at 60 km/h, so Langhe and Roero tie and keep their id order.
+    for name, route_type, distance_km in (
+        ("Langhe", "scenic", 60), ("Roero", "scenic", 60), ("Riviera", "coastal", 110),
+    ):
+        api.route(name, route_type=route_type, distance_km=distance_km)
+    api.route("Stelvio", route_type="mountain", distance_km=50, **ROUTES["mountain"])
+    api.route("Assietta", route_type="offroad", distance_km=40, **ROUTES["offroad"])
+    # Written straight to the table, as before the metric columns existed.
+    insert_rows(models.Route, [{
+        "name": "Legacy", "route_type": "scenic", "distance_km": 10, "details": {}, **common,
+    }])
+
+    expected = HighwayRouteCreate(name="Autostrada", distance_km=300, **common, **ROUTES["highway"])
+    assert highway["estimated_minutes"] == round(expected.calculate_estimated_time(), 1) == 138.5
+    # Stelvio is 66.7 minutes at 45 km/h plus 24 for its hairpins; Assietta 96 at 40 - 6 * 2.5 km/h.
+    assert _listed(api.client, sort="estimated_time") == [
+        "Langhe", "Roero", "Stelvio", "Assietta", "Riviera", "Autostrada", "Legacy",
+    ]
+    assert _listed(api.client, sort="-estimated_time") == [
+        "Autostrada", "Riviera", "Assietta", "Stelvio", "Langhe", "Roero", "Legacy",
+    ]
+    assert _listed(api.client, sort="-estimated_time", route_type="scenic", limit=2) == ["Langhe", "Roero"]
+    assert api.client.get("/routes", params={"sort": "toll_cost"}).status_code == 422
+
+
+def test_refresh_writes_the_metrics_the_route_schemas_compute(empty_database):
+    common = {"start_location": "Bormio", "end_location": "Prato", "distance_km": 50}
+    mountains = {
+        "Stelvio": {"elevation_gain": 1800.0, "max_altitude": 2757.0, "hairpin_turns": 48},
+        "Superga": {"elevation_gain": 450.0, "max_altitude": 672.0, "hairpin_turns": 4},
+    }
+    highways = {"A5": 130, "Tangenziale": 90}
+    route_ids = insert_rows(models.Route, [
+        *({"name": name, "route_type": "mountain", "difficulty": "HARD", "details": details, **common}
+          for name, details in mountains.items()),
+        *({"name": name, "route_type": "highway", "difficulty": "EASY", "details": {"speed_limit": limit}, **common}
+          for name, limit in highways.items()),
+    ])
+    with SessionLocal() as db:
+        assert refresh_route_metrics(db) == len(route_ids)
+        db.commit()
+        stored = {
+            route.name: (route.estimated_minutes, route.difficulty_score)
+            for route in db.query(models.Route).filter(models.Route.id.in_(route_ids))
+        }
+        assert refresh_route_metrics(db) == 0
+
+    for name, details in mountains.items():
+        score = MountainRouteCreate(name=name, difficulty="HARD", **common, **details).get_difficulty_score()
+        # Hard is two levels above easy; a schema score of 100 or more earns all 25 detail points.
+        assert stored[name][1] == round(2 * 25 + 25 * min(score / 100, 1), 1)
+    assert stored["Stelvio"][1] == 75 and stored["Superga"][1] == 53.5
+    for name, limit in highways.items():
+        minutes = HighwayRouteCreate(name=name, difficulty="EASY", speed_limit=limit, **common).calculate_estimated_time()
+        assert stored[name] == (round(minutes, 1), 0)
+
+
+def _wide_columns() -> dict:
+    """Type-specific columns of the wide routes table migration 0003 replaced."""
+    path = Path(__file__).parents[1] / "migrations" / "versions" / "0003_route_details_payload.py"
+    spec = importlib.util.spec_from_file_location("route_details_payload", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return {
+        name: column_type.compile(dialect=postgresql.dialect())
+        for columns in migration._TYPE_COLUMNS.values()
+        for name, column_type in columns
+    }
+
+
+@pytest.mark.benchmark
+def test_route_layout_width_and_list_throughput(empty_database):
+    """Row width and 10,000-row list reads, JSONB details against the former wide table."""
+    count, repeat = 10_000, 10
+    route_types = list(ROUTES)
+    insert_rows(models.Route, [
+        {
+            "name": f"Route {number}",
+            "route_type": route_types[number % len(route_types)],
+            "start_location": "Turin",
+            "end_location": "Aosta",
+            "distance_km": 120.0,
+            "difficulty": "MODERATE",
+            "description": "Along the valley",
+            "created_at": datetime.utcnow(),
+            "estimated_minutes": 120.0,
+            "difficulty_score": 25.0,
+            "details": ROUTES[route_types[number % len(route_types)]],
+        }
+        for number in range(count)
+    ])
+    common = [column.name for column in models.Route.__table__.columns if column.name != "details"]
+    wide = _wide_columns()
+    with SessionLocal() as db:
+        db.execute(text(
+            f"CREATE TEMPORARY TABLE routes_wide AS SELECT {', '.join(f'r.{name}' for name in common)}, d.* "
+            f"FROM routes r, jsonb_to_record(r.details) AS d({', '.join(f'{name} {type_}' for name, type_ in wide.items())})"
+        ))
+        widths = {
+            table: db.execute(text(f"SELECT avg(pg_column_size(ROW({', '.join(columns)}))) FROM {table}")).scalar()
+            for table, columns in (("routes", [*common, "details"]), ("routes_wide", [*common, *wide]))
+        }
+        encoder = TypeAdapter(list[dict])
+
+        def read_details(_=None) -> bytes:
+            routes = db.execute(text("SELECT * FROM routes")).mappings()
+            return encoder.dump_json([{**{name: route[name] for name in common}, **route["details"]} for route in routes])
+
+        def read_wide(_=None) -> bytes:
+            return encoder.dump_json([dict(row) for row in db.execute(text("SELECT * FROM routes_wide")).mappings()])
+
+        sizes = {"routes": len(read_details()), "routes_wide": len(read_wide())}
+        rows = [
+            ("JSONB details, flattened", timings(read_details, repeat)),
+            ("wide table, every column", timings(read_wide, repeat)),
+        ]
+    print(f"\nAverage row width: details {widths['routes']:.0f} B, wide {widths['routes_wide']:.0f} B")
+    print(f"Response size: details {sizes['routes'] / count:.0f} B/route, wide {sizes['routes_wide'] / count:.0f} B/route")
+    report(f"Reading and serializing {count:,} routes", rows)
@@ -0,0 +1,139 @@
+"""List endpoints render the same JSON in every serialization mode."""
+
+from datetime import datetime, timedelta
+import pytest
+import app.api.serialization as serialization
+import app.db.postgres_crud as pg_crud
+from app.api.rider.schemas import BikeRead, RideRead, RiderRead
+from app.api.route.schemas import RouteRead
+from app.api.serialization import ListSerializer
+from app.db import postgres_models as models
+from app.db.database import SessionLocal
+from app.services.ride_durations import ride_durations
+from tests.support import insert_rows, report, timings
+
+MODES = ["trusted", "validated", "default"]
+
+
+@pytest.fixture
+def paths(api) -> list[str]:
+    ada, grace = api.rider("Ada", "BEGINNER")["id"], api.rider("Grace", "EXPERT")["id"]
+    bike = api.bike(ada, engine_cc=900)["id"]
+    api.bike(grace)
+    routes = [
+        api.route("Langhe", description="Vineyards", scenic_points=["La Morra"], best_season="autumn"),
+        api.route("A5", route_type="highway", speed_limit=130, toll_cost=12.5, rest_stops=["Ivrea"]),
+        api.route("Assietta", route_type="offroad", terrain_type="gravel", technical_difficulty=6),
+        api.route("Stelvio", route_type="mountain", elevation_gain=1800, max_altitude=2757, hairpin_turns=48),
+        api.route("Riviera", route_type="coastal", beach_stops=["Alassio"], ocean_view_percentage=80),
+    ]
+    for route in routes:
+        api.ride(bike, route["id"], duration_minutes=75)
+    api.ride(bike, routes[0]["id"], duration_minutes=None)
+    api.client.post(f"/riders/{grace}/follow/{ada}")
+    group_ride = api.client.post("/group-rides", json={
+        "name": "Sunday loop",
+        "route_id": routes[0]["id"],
+        "organizer_id": ada,
+        "starts_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "capacity": 4,
+    }).json()["id"]
+    api.client.post(f"/group-rides/{group_ride}/rsvps", json={"rider_id": grace})
+    return [
+        "/riders",
+        f"/riders/{ada}/bikes",
+        f"/riders/{ada}/rides",
+        f"/riders/{ada}/rides?limit=2&summary=true",
+        f"/riders/{grace}/feed",
+        f"/riders/{ada}/eligible-routes",
+        "/routes",
+        "/routes?sort=distance",
+        "/routes/search?q=stelvio",
+        "/routes/popular",
+        "/routes/trending",
+        f"/routes/{routes[3]['id']}/similar",
+        f"/group-rides/{group_ride}",
+        f"/group-rides/{group_ride}/rsvps",
+    ]
+
+
+def test_trusted_rows_match_the_response_models(client, paths, monkeypatch):
+    """Rows serialized without validation are what validating them against the response model gives."""
+    for path in paths:
+        bodies = {}
+        for mode in MODES:
+            monkeypatch.setattr(serialization, "SERIALIZATION_MODE", mode)
+            response = client.get(path)
+            assert response.status_code == 200, (path, mode, response.text)
+            bodies[mode] = response.json()
+        assert bodies["trusted"], path
+        assert bodies["trusted"] == bodies["validated"] == bodies["default"], path
+
+
+ROUTE_DETAILS = {
+    "scenic": {"scenic_points": ["La Morra", "Barolo"], "best_season": "autumn", "photography_spots": 3},
+    "highway": {"speed_limit": 130, "toll_cost": 12.5, "rest_stops": ["Ivrea"], "lanes": 3},
+    "offroad": {"terrain_type": "gravel", "min_bike_cc": 450, "technical_difficulty": 6, "requires_experience": True},
+    "mountain": {"elevation_gain": 1800.0, "max_altitude": 2757.0, "hairpin_turns": 48, "oxygen_required": False},
+    "coastal": {"beach_stops": ["Alassio"], "lighthouse_count": 2, "seafood_spots": [], "ocean_view_percentage": 80},
+}
+
+
+@pytest.mark.benchmark
+def test_list_serialization_per_row(empty_database, monkeypatch):
+    """Each list serializer on 10,000 rows read from the database, trusted against validated."""
+    count, repeat = 10_000, 10
+    rider_ids = insert_rows(models.Rider, [
+        {"name": f"Rider {number}", "experience_level": "intermediate"} for number in range(count)
+    ])
+    owner = rider_ids[0]
+    bike_ids = insert_rows(models.Bike, [
+        {"owner_id": owner, "brand": "Brand", "model": f"Model {number}", "year": 2020, "engine_cc": 650}
+        for number in range(count)
+    ])
+    route_types = list(ROUTE_DETAILS)
+    route_ids = insert_rows(models.Route, [
+        {
+            "name": f"Route {number}",
+            "route_type": route_types[number % len(route_types)],
+            "start_location": "Turin",
+            "end_location": "Aosta",
+            "distance_km": 120.0,
+            "difficulty": "MODERATE",
+            "description": "Along the valley",
+            "created_at": datetime.utcnow(),
+            "estimated_minutes": 120.0,
+            "difficulty_score": 25.0,
+            "details": ROUTE_DETAILS[route_types[number % len(route_types)]],
+        }
+        for number in range(count)
+    ])
+    now = datetime.utcnow()
+    insert_rows(models.Ride, [
+        {
+            "rider_id": owner,
+            "route_id": route_ids[number],
+            "bike_id": bike_ids[number],
+            "completed_at": now - timedelta(minutes=number),
+            "duration_minutes": 60,
+            "notes": "Dry roads",
+        }
+        for number in range(count)
+    ])
+    with SessionLocal() as db:
+        lists = {
+            "riders": (RiderRead, pg_crud.get_rider_rows(db)),
+            "bikes": (BikeRead, pg_crud.get_bike_rows_by_owner(db, owner)),
+            "rides": (RideRead, pg_crud.get_ride_history_rows(db, owner, limit=count)[1]),
+            "routes": (RouteRead, ride_durations.with_percentiles(pg_crud.get_route_rows(db))),
+        }
+    rows = []
+    for name, (item_type, items) in lists.items():
+        assert len(items) == count
+        serializer = ListSerializer(item_type)
+        for mode in ("trusted", "validated"):
+            monkeypatch.setattr(serialization, "SERIALIZATION_MODE", mode)
+            serializer.response(items)
+            # Milliseconds per list to microseconds per row.
+            rows.append((f"{name}, {mode}", timings(lambda _: serializer.response(items), repeat) * 1000 / count))
+    report(f"Serializing {count:,}-row lists, per row", rows, unit="us")
@@ -0,0 +1,57 @@
+import app.db.postgres_crud as pg_crud
+from app.db.database import SessionLocal
+from app.db.postgres_models import SOCIAL_GRAPH_CHANNEL
+from tests.support import wait_for
+
+
+def _neighbours(client, rider_id: int, kind: str, limit: int = 100) -> list[int]:
+    rider_ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/riders/{rider_id}/{kind}", params=params)
+        assert response.status_code == 200, response.text
+        rider_ids += [rider["id"] for rider in response.json()["riders"]]
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            return rider_ids
+
+
+def _changed_elsewhere(rider_ids: list[int], deleted: bool = False) -> None:
+    """Announce a change as another worker would after writing it to the graph."""
+    with SessionLocal() as db:
+        pg_crud.notify(db, SOCIAL_GRAPH_CHANNEL, {"origin": "another worker", "rider_ids": rider_ids, "deleted": deleted})
+        db.commit()
+
+
+def test_neighbour_lists_page_by_id(api):
+    rider = api.rider("Ada")["id"]
+    others = [api.rider(f"Rider {number}")["id"] for number in range(7)]
+    for other in others:
+        assert api.client.post(f"/riders/{rider}/follow/{other}").status_code == 200
+    assert api.client.post(f"/riders/{others[0]}/follow/{rider}").status_code == 200
+    assert _neighbours(api.client, rider, "following", limit=3) == others
+    assert _neighbours(api.client, rider, "followers") == [others[0]]
+    assert api.client.delete(f"/riders/{rider}/follow/{others[3]}").status_code == 200
+    assert _neighbours(api.client, rider, "following", limit=2) == others[:3] + others[4:]
+    assert _neighbours(api.client, others[3], "followers") == []
+
+
+def test_follows_through_another_worker_reach_cached_lists(api, graph):
+    reader, author = api.rider("Reader")["id"], api.rider("Author")["id"]
+    ride = api.ride(api.bike(author)["id"], api.route()["id"])["id"]
+    assert _neighbours(api.client, reader, "following") == []
+    assert api.client.get(f"/riders/{reader}/feed").json()["rides"] == []
+    graph.set_follow(reader, author, True)
+    _changed_elsewhere([reader, author])
+    assert wait_for(lambda: _neighbours(api.client, reader, "following") == [author])
+    assert _neighbours(api.client, author, "followers") == [reader]
+    assert [ride["id"] for ride in api.client.get(f"/riders/{reader}/feed").json()["rides"]] == [ride]
+
+
+def test_riders_deleted_through_another_worker_leave_cached_lists(api, graph):
+    rider, follower = api.rider("Ada")["id"], api.rider("Grace")["id"]
+    api.client.post(f"/riders/{follower}/follow/{rider}")
+    assert _neighbours(api.client, rider, "followers") == [follower]
+    graph.retire_rider_node(follower)
+    _changed_elsewhere([follower], deleted=True)
+    assert wait_for(lambda: _neighbours(api.client, rider, "followers") == [])
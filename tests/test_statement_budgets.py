@@ -0,0 +1,114 @@
+"""Every write endpoint issues exactly the statements it is budgeted for."""
+
+from datetime import datetime, timedelta
+import orjson
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.db.database import get_postgres_session
+from app.db.query_budget import statement_budget
+
+LINE = {"type": "LineString", "coordinates": [[7.6586 + i * 0.001, 45.0703 + i * 0.001] for i in range(200)]}
+TELEMETRY = b"".join(
+    orjson.dumps({"t": 1792400000.0 + i, "lat": 45.0703 + i * 0.0002, "lon": 7.6586 + i * 0.0002, "ele": 240.0}) + b"\n"
+    for i in range(600)
+)
+
+
+def _count(statements) -> int:
+    return len(statements()[-1])
+
+
+@pytest.fixture
+def setup(api):
+    rider = api.rider("Ada")
+    bike = api.bike(rider["id"])
+    route = api.route("Colle del Nivolet")
+    return rider, bike, route
+
+
+def test_rider_writes(api, setup, statements):
+    rider, _, _ = setup
+    api.rider("Grace")
+    assert _count(statements) == 1
+    bike = api.bike(rider["id"])
+    assert _count(statements) == 1
+    assert api.client.delete(f"/riders/{rider['id']}/bikes/{bike['id']}").status_code == 200
+    assert _count(statements) == 1
+    assert api.client.delete(f"/riders/{rider['id']}").status_code == 200
+    assert _count(statements) == 3
+
+
+def test_route_writes(api, setup, statements):
+    _, _, route = setup
+    api.route("Stelvio", route_type="mountain", elevation_gain=1800, max_altitude=2757)
+    assert _count(statements) == 1
+    response = api.client.put(
+        f"/routes/{route['id']}/geometry", content=orjson.dumps(LINE), headers={"content-type": "application/geo+json"}
+    )
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 3
+    response = api.client.post("/routes/match", content=orjson.dumps(LINE), headers={"content-type": "application/geo+json"})
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 1
+    assert api.client.delete(f"/routes/{route['id']}").status_code == 200
+    assert _count(statements) == 1
+
+
+def test_ride_writes(api, setup, statements):
+    _, bike, route = setup
+    # With a path stored, the upload also reads the routes the recording may follow.
+    api.client.put(f"/routes/{route['id']}/geometry", content=orjson.dumps(LINE), headers={"content-type": "application/geo+json"})
+    ride = api.ride(bike["id"], route["id"])
+    assert _count(statements) == 1
+    response = api.client.put(
+        f"/rides/{ride['id']}/telemetry", content=TELEMETRY, headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 2
+    assert api.client.delete(f"/rides/{ride['id']}").status_code == 200
+    assert _count(statements) == 2
+
+
+def test_group_ride_writes(api, setup, statements):
+    rider, _, route = setup
+    response = api.client.post("/group-rides", json={
+        "name": "Sunday loop",
+        "route_id": route["id"],
+        "organizer_id": rider["id"],
+        "starts_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "capacity": 2,
+    })
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 2
+    group_ride_id = response.json()["id"]
+    response = api.client.post(f"/group-rides/{group_ride_id}/rsvps", json={"rider_id": rider["id"]})
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 1
+    assert api.client.delete(f"/group-rides/{group_ride_id}/rsvps/{rider['id']}").status_code == 200
+    assert _count(statements) == 1
+
+
+def test_location_writes(api, statements):
+    response = api.client.post("/locations", json={
+        "name": "Rifugio", "location_type": "rest_stop", "latitude": 45.5, "longitude": 7.2,
+    })
+    assert response.status_code == 200, response.text
+    assert _count(statements) == 1
+    assert api.client.delete(f"/locations/{response.json()['id']}").status_code == 200
+    assert _count(statements) == 1
+
+
+def test_strict_budget_fails_the_request():
+    budgeted = FastAPI()
+
+    @budgeted.get("/", dependencies=[statement_budget(1)])
+    def two_statements(db: Session = Depends(get_postgres_session)):
+        db.execute(text("SELECT 1"))
+        db.execute(text("SELECT 2"))
+        return {}
+
+    with TestClient(budgeted, raise_server_exceptions=False) as client:
+        assert client.get("/").status_code == 500